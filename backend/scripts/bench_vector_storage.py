@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Recall vs. memory benchmark for the vector storage profiles.
+
+Simulates what Qdrant does for each `vector_storage_profile` on a synthetic,
+clustered corpus (code embeddings are strongly clustered by repo/language):
+
+* float  - exact cosine search over float32 vectors
+* int8   - scalar quantization (per-dimension 0.99 quantile clipping)
+* binary - 1 bit per dimension, hamming-distance candidate search
+
+Quantized profiles are measured with and without rescoring: the top
+`limit * oversampling` candidates from the compressed index are re-ranked
+against the original vectors (which live on disk in the on_disk profile).
+
+Usage:
+    python scripts/bench_vector_storage.py --n 50000 --dim 768 --queries 200
+"""
+from __future__ import annotations
+
+import argparse
+import time
+
+import numpy as np
+
+
+def make_corpus(n: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    data = centers[labels] + 0.35 * rng.normal(size=(n, dim)).astype(np.float32)
+    return data / np.linalg.norm(data, axis=1, keepdims=True)
+
+
+def topk(scores: np.ndarray, k: int) -> np.ndarray:
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, idx, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(idx, order, axis=1)
+
+
+def quantize_int8(data: np.ndarray, quantile: float = 0.99):
+    lo = np.quantile(data, 1 - quantile, axis=0)
+    hi = np.quantile(data, quantile, axis=0)
+    scale = np.where(hi > lo, (hi - lo) / 255.0, 1.0).astype(np.float32)
+    codes = np.clip(np.rint((data - lo) / scale) - 128, -128, 127).astype(np.int8)
+    return codes, lo.astype(np.float32), scale
+
+
+def int8_scores(codes, lo, scale, queries) -> np.ndarray:
+    # Dequantize on the fly: (c + 128) * scale + lo
+    q_scaled = queries * scale
+    return (codes.astype(np.float32) + 128.0) @ q_scaled.T + (queries @ lo)[None, :]
+
+
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.int32)
+
+
+def binary_scores(bits: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    qbits = np.packbits(queries > 0, axis=1)
+    # Negated hamming distance via popcount of XOR, one query at a time to bound memory.
+    out = np.empty((len(queries), len(bits)), dtype=np.float32)
+    for i, q in enumerate(qbits):
+        out[i] = -_POPCOUNT[np.bitwise_xor(bits, q)].sum(axis=1)
+    return out
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def rescore(cands: np.ndarray, data: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    out = np.empty((len(queries), k), dtype=np.int64)
+    for i, (row, q) in enumerate(zip(cands, queries)):
+        exact = data[row] @ q
+        out[i] = row[np.argsort(-exact)[:k]]
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, default=20000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--clusters", type=int, default=64)
+    ap.add_argument("--queries", type=int, default=100)
+    ap.add_argument("--limit", type=int, default=10)
+    ap.add_argument("--oversampling", type=float, default=2.0)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    data = make_corpus(args.n, args.dim, args.clusters, rng)
+    queries = make_corpus(args.queries, args.dim, args.clusters, rng)
+    k = args.limit
+    cand_k = max(k, int(k * args.oversampling))
+
+    truth = topk(queries @ data.T, k)
+    float_bytes = data.nbytes
+
+    rows = []
+    t0 = time.perf_counter()
+    found = topk(queries @ data.T, k)
+    rows.append(("float", float_bytes, 0, recall(found, truth), None, time.perf_counter() - t0))
+
+    codes, lo, scale = quantize_int8(data)
+    t0 = time.perf_counter()
+    s = int8_scores(codes, lo, scale, queries).T
+    plain = recall(topk(s, k), truth)
+    rescored = recall(rescore(topk(s, cand_k), data, queries, k), truth)
+    rows.append(("int8", codes.nbytes + lo.nbytes + scale.nbytes, float_bytes, plain, rescored, time.perf_counter() - t0))
+
+    bits = np.packbits(data > 0, axis=1)
+    t0 = time.perf_counter()
+    s = binary_scores(bits, queries)
+    plain = recall(topk(s, k), truth)
+    rescored = recall(rescore(topk(s, cand_k), data, queries, k), truth)
+    rows.append(("binary", bits.nbytes, float_bytes, plain, rescored, time.perf_counter() - t0))
+
+    print(f"corpus={args.n} dim={args.dim} queries={args.queries} limit={k} oversampling={args.oversampling}")
+    print(f"{'profile':<8} {'RAM MiB':>9} {'disk MiB':>9} {'ratio':>6} {'recall':>7} {'rescored':>9} {'time s':>7}")
+    for name, ram, disk, r_plain, r_rescored, dt in rows:
+        print(
+            f"{name:<8} {ram / 2**20:>9.2f} {disk / 2**20:>9.2f} {float_bytes / ram:>5.1f}x "
+            f"{r_plain:>7.3f} {'-' if r_rescored is None else f'{r_rescored:.3f}':>9} {dt:>7.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""Admission control for expensive endpoints (a FastAPI dependency).
+
+Every guarded route belongs to a cost class with its own concurrency limit and
+a bounded wait queue:
+
+* heavy: clone / re-embed / GC work (`ingest_repo`, `reindex`, `gc`);
+* graph: whole-repo walks, graph reconstruction and ref-range diffs;
+* query: per-request lookups (`ask`, `search`, diff analysis, test selection).
+
+A request first spends `cost` tokens from its client's token bucket (429 when
+empty; see `client_id` for how clients are told apart), then takes a slot in its class; if none is free it waits in the
+queue for at most `admission_queue_timeout_s`. A full queue or an expired wait
+is answered immediately with 503. Both carry `Retry-After`, estimated from the
+class's recent service time and queue depth. Shedding early keeps latency of
+admitted calls (and of unguarded endpoints) flat under bursts.
+
+    @router.post("/graph/full", dependencies=[Depends(admission("graph"))])
+"""
+from __future__ import annotations
+import asyncio
+import ipaddress
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import AsyncIterator, Deque, Dict, Tuple
+
+from fastapi import HTTPException, Request
+
+from ..config import settings
+
+__all__ = ["AdmissionController", "AdmissionGate", "TokenBucket", "admission", "get_admission_controller"]
+
+
+@dataclass(frozen=True)
+class CostClass:
+    name: str
+    limit: int  # concurrent requests
+    queue: int  # requests allowed to wait for a slot
+    cost: float  # tokens taken from the client's bucket
+
+
+def _cost_classes() -> Dict[str, CostClass]:
+    return {
+        "heavy": CostClass("heavy", settings.admission_heavy_limit, settings.admission_heavy_queue, 10.0),
+        "graph": CostClass("graph", settings.admission_graph_limit, settings.admission_graph_queue, 3.0),
+        "query": CostClass("query", settings.admission_query_limit, settings.admission_query_queue, 1.0),
+    }
+
+
+class Rejected(Exception):
+    def __init__(self, status: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionGate:
+    """Concurrency limit with a bounded FIFO wait queue and a wait deadline."""
+
+    def __init__(self, cls: CostClass, timeout_s: float):
+        self.cls = cls
+        self.limit = max(1, cls.limit)
+        self.queue_size = max(0, cls.queue)
+        self.timeout_s = timeout_s
+        self.active = 0
+        self._waiting: Deque[asyncio.Future] = deque()
+        self._service_s = 1.0  # EWMA of slot hold time, seeds Retry-After
+        self.admitted = 0
+        self.rejected_full = 0
+        self.rejected_timeout = 0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for fut in self._waiting if not fut.done())
+
+    def retry_after(self) -> float:
+        return self._service_s * (self.queue_depth + 1) / self.limit
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        if self.active < self.limit and not self.queue_depth:
+            self.active += 1
+        else:
+            if self.queue_depth >= self.queue_size:
+                self.rejected_full += 1
+                raise Rejected(503, f"{self.cls.name} queue is full", self.retry_after())
+            fut = asyncio.get_running_loop().create_future()
+            self._waiting.append(fut)
+            try:
+                await asyncio.wait_for(fut, self.timeout_s)
+            except asyncio.TimeoutError:
+                self.rejected_timeout += 1
+                raise Rejected(503, f"No {self.cls.name} capacity within {self.timeout_s:g}s", self.retry_after())
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self._release()  # slot was handed to us just as we got cancelled
+                raise
+        self.admitted += 1
+        t0 = time.monotonic()
+        try:
+            yield
+        finally:
+            self._service_s = 0.8 * self._service_s + 0.2 * (time.monotonic() - t0)
+            self._release()
+
+    def _release(self) -> None:
+        while self._waiting:
+            fut = self._waiting.popleft()
+            if fut.done():
+                continue
+            fut.set_result(None)  # slot passes straight to the waiter
+            return
+        self.active -= 1
+
+    def metrics(self) -> dict:
+        return {
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "active": self.active,
+            "queued": self.queue_depth,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_service_s": round(self._service_s, 3),
+        }
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float):
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost: float, rate: float, burst: float) -> float:
+        """Spend `cost` tokens; returns 0 on success, else seconds until they are available."""
+        now = time.monotonic()
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / rate
+
+
+class AdmissionController:
+    def __init__(self, classes: Dict[str, CostClass], timeout_s: float, rate: float, burst: float, max_clients: int = 10000):
+        self.gates = {name: AdmissionGate(cls, timeout_s) for name, cls in classes.items()}
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.rate_limited: Dict[str, int] = {name: 0 for name in classes}
+
+    def _charge(self, client: str, cls: CostClass) -> None:
+        if self.rate <= 0:
+            return
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.burst)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        self._buckets.move_to_end(client)
+        # A class costing more than the burst could never pass; cap it.
+        wait = bucket.take(min(cls.cost, self.burst), self.rate, self.burst)
+        if wait:
+            self.rate_limited[cls.name] += 1
+            raise Rejected(429, "Rate limit exceeded", wait)
+
+    @asynccontextmanager
+    async def admit(self, cost_class: str, client: str) -> AsyncIterator[None]:
+        gate = self.gates[cost_class]
+        self._charge(client, gate.cls)
+        async with gate.slot():
+            yield
+
+    def metrics(self) -> dict:
+        return {
+            "classes": {
+                name: {**gate.metrics(), "rate_limited": self.rate_limited[name]} for name, gate in self.gates.items()
+            },
+            "clients": len(self._buckets),
+        }
+
+
+@lru_cache(maxsize=1)
+def _trusted_networks(proxies: Tuple[str, ...]) -> Tuple[ipaddress.IPv4Network | ipaddress.IPv6Network, ...]:
+    return tuple(ipaddress.ip_network(p, strict=False) for p in proxies)
+
+
+def _trusted(host: str) -> bool:
+    try:
+        addr = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(addr in net for net in _trusted_networks(tuple(settings.rate_limit_trusted_proxies)))
+
+
+def client_id(request: Request) -> str:
+    """Rate-limit key of a request: the peer address by default.
+
+    Headers are set by the client and are only honored when configured:
+    `X-Client-Id` with `rate_limit_trust_client_id` (an authenticating gateway
+    sets it), `X-Forwarded-For` when the peer is one of
+    `rate_limit_trusted_proxies`; the key is then the nearest hop that is not
+    a trusted proxy itself.
+    """
+    if settings.rate_limit_trust_client_id:
+        explicit = request.headers.get("x-client-id")
+        if explicit:
+            return explicit
+    host = request.client.host if request.client else "unknown"
+    forwarded = request.headers.get("x-forwarded-for")
+    if forwarded and _trusted(host):
+        hops = [h.strip() for h in forwarded.split(",") if h.strip()]
+        while hops and _trusted(hops[-1]):
+            hops.pop()
+        if hops:
+            return hops[-1]
+    return host
+
+
+_controller: AdmissionController | None = None
+
+
+def get_admission_controller() -> AdmissionController:
+    global _controller
+    if _controller is None:
+        _controller = AdmissionController(
+            _cost_classes(),
+            timeout_s=settings.admission_queue_timeout_s,
+            rate=settings.rate_limit_tokens_per_s,
+            burst=settings.rate_limit_burst,
+        )
+    return _controller
+
+
+def admission(cost_class: str):
+    """Route dependency admitting the request into `cost_class` (see module docstring)."""
+
+    async def dependency(request: Request) -> AsyncIterator[None]:
+        if not settings.admission_enabled:
+            yield
+            return
+        try:
+            async with get_admission_controller().admit(cost_class, client_id(request)):
+                yield
+        except Rejected as e:
+            raise HTTPException(
+                status_code=e.status, detail=e.detail, headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))},
+            )
+
+    return dependency
@@ -0,0 +1,135 @@
+"""ASGI middleware enforcing request deadlines and client-disconnect cancellation.
+
+The request body is buffered up front (up to `max_body_bytes`, larger bodies
+get 413) so the original `receive` channel can be watched for `http.disconnect`
+while the handler runs. When the client goes away or the deadline passes, the
+handler task is cancelled; work offloaded through `utils.concurrency` observes
+that cancellation and stops. Paths matching an `exempt` pattern have no
+deadline but are still cancelled on disconnect.
+"""
+from __future__ import annotations
+import asyncio
+import contextlib
+from fnmatch import fnmatchcase
+from typing import Iterable
+
+import orjson
+
+
+async def _send_error(send, status: int, detail: str) -> None:
+    body = orjson.dumps({"detail": detail})
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def _declared_length(scope) -> int | None:
+    for name, value in scope.get("headers", ()):
+        if name == b"content-length":
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+class RequestDeadlineMiddleware:
+    def __init__(self, app, timeout_s: float, max_body_bytes: int | None = None, exempt: Iterable[str] = ()):
+        self.app = app
+        self.timeout_s = timeout_s
+        self.max_body_bytes = max_body_bytes
+        self.exempt = tuple(exempt)
+
+    def _deadline(self, path: str) -> float | None:
+        if any(fnmatchcase(path, pattern) for pattern in self.exempt):
+            return None
+        return self.timeout_s
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.max_body_bytes
+        too_large = f"Request body exceeds {limit} bytes"
+        declared = _declared_length(scope)
+        if limit is not None and declared is not None and declared > limit:
+            await _send_error(send, 413, too_large)
+            return
+        buffered: list[dict] = []
+        size = 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            size += len(message.get("body", b""))
+            if limit is not None and size > limit:
+                await _send_error(send, 413, too_large)
+                return
+            buffered.append(message)
+            if not message.get("more_body", False):
+                break
+
+        disconnected = asyncio.Event()
+        replay = iter(buffered)
+
+        async def replay_receive():
+            try:
+                return next(replay)
+            except StopIteration:
+                await disconnected.wait()
+                return {"type": "http.disconnect"}
+
+        response_started = False
+        response_complete = False
+
+        async def tracking_send(message):
+            nonlocal response_started, response_complete
+            if message["type"] == "http.response.start":
+                response_started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+            await send(message)
+
+        async def watch_disconnect():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                    return
+
+        app_task = asyncio.create_task(self.app(scope, replay_receive, tracking_send))
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            done, _pending = await asyncio.wait(
+                {app_task, watcher}, timeout=self._deadline(scope["path"]), return_when=asyncio.FIRST_COMPLETED
+            )
+            if app_task in done:
+                app_task.result()
+                return
+            if response_complete:
+                # Only background tasks are left; they outlive both the client and the deadline.
+                await app_task
+                return
+            app_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await app_task
+            if watcher in done or response_started:
+                # Client is gone (nobody to answer) or headers already went out.
+                return
+            await _send_error(send, 504, f"Request exceeded {self.timeout_s:g}s deadline")
+        finally:
+            if not app_task.done():
+                app_task.cancel()
+            watcher.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await watcher
+
+
+__all__ = ["RequestDeadlineMiddleware"]
@@ -1,17 +1,136 @@
-from fastapi import APIRouter
+from pathlib import Path
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
 from pydantic import BaseModel
+from ..services.cochange import get_cochange_store, refresh_cochange
+from ..services.diff_analyzer import parse_unified_diff
+from ..services.ref_range import get_ref_range_store
+from ..services.repo_cloner import resolve_repo
+from ..services.test_impact import get_test_impact_store
+from ..utils.concurrency import run_cpu, run_io
+from .admission import admission
 
 router = APIRouter(prefix="/api", tags=["analyze"])
 
 class DiffRequest(BaseModel):
     diff_patch: str
+    repo_id: str | None = None  # ingest job_id; derived from repo_path when omitted
+    repo_path: str | None = None
+    limit: int = 20
+    min_confidence: float = 0.1
 
 class ImpactResponse(BaseModel):
     impacted: list
+    changed: list = []
+    edges: list = []
+    cochange: str = "unavailable"  # "ready" | "pending" (history still being mined) | "unavailable"
 
-@router.post("/analyze_diff", response_model=ImpactResponse)
-def analyze_diff(body: DiffRequest):
-    # TODO: implement real diff + graph expansion
-    return ImpactResponse(impacted=[{"symbol": "demo", "reason": "stub"}])
+@router.post("/analyze_diff", response_model=ImpactResponse, dependencies=[Depends(admission("query"))])
+async def analyze_diff(body: DiffRequest, background: BackgroundTasks):
+    files = await run_cpu(parse_unified_diff, body.diff_patch)
+    changed = [f.to_dict() for f in files]
+    impacted = [{"path": f.path, "reason": "changed", "score": 1.0} for f in files]
 
-__all__ = ["router"]
\ No newline at end of file
+    if not body.repo_id and not body.repo_path:
+        return ImpactResponse(impacted=impacted, changed=changed)
+    try:
+        repo_id, _path = resolve_repo(body.repo_id, body.repo_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Deleted and renamed files are still keyed by their old path in history.
+    sources = list(dict.fromkeys(p for f in files for p in (f.old_path, f.new_path) if p))
+    coupled, edges, status = await _cochange(
+        repo_id, body.repo_path, sources, body.limit, body.min_confidence, background
+    )
+    return ImpactResponse(impacted=impacted + coupled, changed=changed, edges=edges, cochange=status)
+
+async def _cochange(
+    repo_id: str, repo_path: str | Path | None, sources: list[str], limit: int, min_confidence: float,
+    background: BackgroundTasks,
+) -> tuple[list, list, str]:
+    """("changes-with" hits, their edges, cochange status) for the changed paths."""
+    # Precomputed at ingest; a repo ingested before co-change mining gets it queued here.
+    index = await run_io(get_cochange_store().get, repo_id)
+    if index is None:
+        status = "unavailable"
+        if repo_path and await run_io((Path(repo_path) / ".git").exists):
+            background.add_task(refresh_cochange, repo_id, Path(repo_path))
+            status = "pending"
+        return [], [], status
+
+    coupled = index.impacted(sources, limit=limit, min_confidence=min_confidence)
+    edges = [
+        {"source": src, "target": hit["path"], "label": "changes-with", "score": hit["score"]}
+        for hit in coupled for src in hit["via"]
+    ]
+    return [{**hit, "reason": "changes-with"} for hit in coupled], edges, "ready"
+
+class RangeRequest(BaseModel):
+    repo_id: str | None = None
+    repo_path: str | None = None
+    base: str  # branch, tag or sha
+    head: str = "HEAD"
+    merge_base: bool = False  # diff from the merge-base of base and head, as a pull request does
+    fetch: bool = True  # fetch-only update of the clone before resolving the refs
+    limit: int = 20
+    min_confidence: float = 0.1
+
+class RangeImpactResponse(ImpactResponse):
+    base: str
+    head: str
+    commits: int = 0
+    diffed_commits: int = 0  # commits not already in the per-commit diff cache
+    units: list = []  # graph units (module, function, class, method ids) the changed lines touch
+
+@router.post("/analyze_range", response_model=RangeImpactResponse, dependencies=[Depends(admission("graph"))])
+async def analyze_range(body: RangeRequest, background: BackgroundTasks):
+    """Impact of base..head computed from the clone: no patch upload, cached per commit pair."""
+    try:
+        repo_id, repo_path = resolve_repo(body.repo_id, body.repo_path)
+        rng = await run_io(
+            get_ref_range_store().analyze, repo_id, repo_path, body.base, body.head, body.merge_base, body.fetch
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    impacted = [{"path": f["path"], "reason": "changed", "score": 1.0} for f in rng.files]
+    sources = list(dict.fromkeys(p for f in rng.files for p in (f["old_path"], f["path"]) if p))
+    coupled, edges, status = await _cochange(
+        repo_id, repo_path, sources, body.limit, body.min_confidence, background
+    )
+    return RangeImpactResponse(
+        impacted=impacted + coupled, changed=rng.files, edges=edges, cochange=status,
+        base=rng.base, head=rng.head, commits=len(rng.commits), diffed_commits=rng.diffed, units=rng.units,
+    )
+
+class SelectTestsRequest(BaseModel):
+    repo_id: str | None = None
+    repo_path: str | None = None
+    diff_patch: str | None = None
+    changed_files: list[str] = []  # alternative to diff_patch: whole files count as changed
+
+@router.post("/select_tests", dependencies=[Depends(admission("query"))])
+async def select_tests(body: SelectTestsRequest):
+    """Tests that can reach the changed code, from the precomputed test -> code index."""
+    if not body.diff_patch and not body.changed_files:
+        raise HTTPException(status_code=400, detail="Provide diff_patch or changed_files")
+    try:
+        repo_id, repo_path = resolve_repo(body.repo_id, body.repo_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    index = await run_cpu(get_test_impact_store().ensure, repo_id, repo_path)
+    if index is None:
+        raise HTTPException(status_code=404, detail=f"No test index for repo {repo_id}; ingest it first")
+
+    changes = [(p, None, "modified") for p in body.changed_files]
+    if body.diff_patch:
+        for f in await run_cpu(parse_unified_diff, body.diff_patch):
+            # The index describes the pre-change tree: use old paths and old-side line ranges.
+            changes.append((f.old_path or f.path, f.old_changed or None, f.status))
+            if f.status == "renamed":
+                changes.append((f.path, None, "added"))
+    selection = await run_cpu(index.select, changes)
+    return {"repo_id": repo_id, "commit": index.commit, "test_rows": len(index.rows), **selection.to_dict()}
+
+__all__ = ["router"]
@@ -1,47 +1,88 @@
-from fastapi import APIRouter
+import re
+from pathlib import Path
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
+from ..config import settings
+from ..services.answer_cache import get_answer_cache, normalize_question
+from ..services.embedding_client import get_embedding_client
+from ..services.file_scanner import walk_code_files
+from ..services.garbage_collector import get_garbage_collector
+from ..services.repo_cloner import head_commit, resolve_repo
+from .admission import admission
+from ..utils.concurrency import run_cpu, run_io
+from ..utils.singleflight import AsyncSingleFlight
 
 router = APIRouter(prefix="/api", tags=["ask"])
 
 class AskRequest(BaseModel):
     question: str
     context_ids: list[str] | None = None
+    repo_id: str | None = None
     repo_path: str | None = None
 
 class AskResponse(BaseModel):
     answer: str
     used_ids: list[str]
+    cached: str | None = None  # "exact" | "similar" when served from the answer cache
 
-@router.post("/ask", response_model=AskResponse)
-def ask(body: AskRequest):
+_answers: AsyncSingleFlight[tuple, AskResponse] = AsyncSingleFlight()
+
+_FUNC_RE = re.compile(r"def\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\(")
+
+def _auth_like_functions(repo: Path) -> list[str]:
+    impacted: list[str] = []
+    if not repo.exists():
+        return impacted
+    for p in walk_code_files(repo, exts={".py"}):
+        try:
+            txt = p.read_text(encoding='utf-8', errors='ignore')
+        except Exception:
+            continue
+        if 'auth' in txt or 'authenticate' in txt or 'login' in txt or 'permission' in txt:
+            for m in _FUNC_RE.finditer(txt):
+                fn = m.group(1)
+                if fn not in impacted:
+                    impacted.append(fn)
+            if len(impacted) > 50:
+                break
+    return impacted
+
+def _indexed_commit(repo_id: str, repo_path: Path) -> str:
+    # The last ingested snapshot; a repo that was never ingested is answered from its checkout.
+    return get_garbage_collector().manifests.current(repo_id) or head_commit(repo_path) or ""
+
+async def _answer(body: AskRequest) -> AskResponse:
     # Heuristic: if asking about "auth" in a repo, list functions with auth-like names
     if body.repo_path and ("auth" in body.question.lower() or "authentication" in body.question.lower()):
-        import os, re
-        from pathlib import Path
-        repo = Path(body.repo_path)
-        if repo.exists():
-            impacted: list[str] = []
-            func_re = re.compile(r"def\s+([a-zA-Z_][a-zA-Z0-9_]*)\s*\(")
-            for root, _dirs, files in os.walk(repo):
-                for f in files:
-                    if f.endswith('.py'):
-                        p = Path(root) / f
-                        try:
-                            txt = p.read_text(encoding='utf-8', errors='ignore')
-                        except Exception:
-                            continue
-                        if 'auth' in txt or 'authenticate' in txt or 'login' in txt or 'permission' in txt:
-                            for m in func_re.finditer(txt):
-                                fn = m.group(1)
-                                if fn not in impacted:
-                                    impacted.append(fn)
-                            if len(impacted) > 50:
-                                break
-                if len(impacted) > 50:
-                    break
-            if impacted:
-                return AskResponse(answer=f"Potentially impacted functions: {', '.join(impacted[:50])}", used_ids=[])
+        impacted = await run_io(_auth_like_functions, Path(body.repo_path))
+        if impacted:
+            return AskResponse(answer=f"Potentially impacted functions: {', '.join(impacted[:50])}", used_ids=[])
     # Default stub
     return AskResponse(answer=f"Stub answer for: {body.question}", used_ids=body.context_ids or [])
 
-__all__ = ["router"]
\ No newline at end of file
+@router.post("/ask", response_model=AskResponse, dependencies=[Depends(admission("query"))])
+async def ask(body: AskRequest):
+    if not settings.ask_cache_enabled:
+        return await _answer(body)
+    repo_id, commit = "", ""
+    if body.repo_id or body.repo_path:
+        try:
+            repo_id, repo_path = resolve_repo(body.repo_id, body.repo_path)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        commit = await run_io(_indexed_commit, repo_id, repo_path)
+    cache = get_answer_cache()
+    key = (repo_id, commit, tuple(sorted(body.context_ids or ())), normalize_question(body.question))
+    hit = cache.get(key)
+    if hit is not None:
+        return AskResponse(answer=hit.answer, used_ids=hit.used_ids, cached="exact")
+    vector = await run_cpu(get_embedding_client().embed, key[3])
+    hit = cache.get_similar(key, vector)
+    if hit is not None:
+        return AskResponse(answer=hit.answer, used_ids=hit.used_ids, cached="similar")
+    # Identical questions arriving together share one answer.
+    resp = await _answers.do(key, _answer, body)
+    cache.put(key, vector, resp.answer, resp.used_ids)
+    return resp
+
+__all__ = ["router"]
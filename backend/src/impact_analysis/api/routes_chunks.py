@@ -1,30 +1,56 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import List
 from ..models.chunk import ChunkIn
 from ..services.embedding_client import get_embedding_client
-from ..services.qdrant_client import QdrantVectorStore
+from ..services.qdrant_client import get_vector_store
+from ..utils.concurrency import run_cpu
+from .admission import admission
 
 router = APIRouter(prefix="/api", tags=["chunks"])
 
 class ChunkBatchRequest(BaseModel):
     chunks: List[ChunkIn]
+    repo_id: str = "default"
+    commit: str | None = None
 
 class ChunkBatchResponse(BaseModel):
     stored: int
     collection: str
 
+class SearchRequest(BaseModel):
+    query: str
+    repo_id: str | None = None
+    language: str | None = None
+    path: str | None = None
+    limit: int | None = None
+
+class SearchResult(BaseModel):
+    id: str
+    score: float
+    payload: dict
+
+class SearchResponse(BaseModel):
+    results: List[SearchResult]
+
 @router.post("/ingest_chunk_batch", response_model=ChunkBatchResponse)
-def ingest_chunk_batch(body: ChunkBatchRequest):
+async def ingest_chunk_batch(body: ChunkBatchRequest):
     if not body.chunks:
         raise HTTPException(status_code=400, detail="No chunks provided")
     emb_client = get_embedding_client()
-    store = QdrantVectorStore()
-    vectors = []
-    for c in body.chunks:
-        vec = emb_client.embed(c.content)
-        vectors.append((c, vec))
-    store.upsert_chunks(vectors)
-    return ChunkBatchResponse(stored=len(vectors), collection=store.collection_name)
-
-__all__ = ["router"]
\ No newline at end of file
+    store = await get_vector_store()
+    chunks = [c.to_chunk() for c in body.chunks]
+    embeddings = await run_cpu(emb_client.embed_batch, [c.content for c in chunks])
+    vectors = list(zip(chunks, embeddings))
+    await store.upsert_chunks(vectors, repo_id=body.repo_id, commit=body.commit)
+    return ChunkBatchResponse(stored=len(vectors), collection=store.router.collection_for(body.repo_id))
+
+@router.post("/search", response_model=SearchResponse, dependencies=[Depends(admission("query"))])
+async def search_chunks(body: SearchRequest):
+    emb_client = get_embedding_client()
+    store = await get_vector_store()
+    vector = await run_cpu(emb_client.embed, body.query)
+    hits = await store.search(vector, repo_id=body.repo_id, limit=body.limit, language=body.language, path=body.path)
+    return SearchResponse(results=[SearchResult(id=h.id, score=h.score, payload=h.payload) for h in hits])
+
+__all__ = ["router"]
@@ -1,12 +1,22 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from pathlib import Path
-import os
+from ..services.cochange import get_cochange_store
+from ..services.file_scanner import walk_code_files, walk_files
+from ..services.graph_history import get_graph_history_store
+from ..services.graph_layout import LAYOUTS, get_graph_layout_store, with_positions
+from ..services.reachability import get_reachability_store
+from ..services.repo_cloner import resolve_repo
+from ..utils.concurrency import check_cancelled, run_cpu, run_io
+from ..utils.singleflight import AsyncSingleFlight
+from .admission import admission
 
 router = APIRouter(prefix="/api", tags=["graph"])
 
+_walks: AsyncSingleFlight[tuple, dict] = AsyncSingleFlight()
+
 @router.get("/graph/{node_id:path}")
-def get_graph(node_id: str):
+async def get_graph(node_id: str):
     # Create a sample graph structure for demonstration
     nodes = [node_id]
     edges = []
@@ -67,61 +77,43 @@ class ListNodesRequest(BaseModel):
     repo_path: str
 
 
+def _list_nodes_sync(repo_path: Path) -> list[str]:
+    # Very simple stub: return up to 200 code-like files as node ids
+    # node id: path relative to repo root
+    return [str(p.relative_to(repo_path)) for p in walk_code_files(repo_path, limit=200)]
+
+
 @router.post("/graph/list_nodes")
-def list_nodes(body: ListNodesRequest):
+async def list_nodes(body: ListNodesRequest):
     repo_path = Path(body.repo_path)
-    if not repo_path.exists():
+    if not await run_io(repo_path.exists):
         raise HTTPException(status_code=400, detail="repo_path not found")
 
-    # Very simple stub: return up to 200 code-like files as node ids
-    exts = {".py", ".ts", ".tsx", ".js", ".jsx", ".go", ".java", ".rb"}
-    nodes: list[str] = []
-    for root, _dirs, files in os.walk(repo_path):
-        for f in files:
-            p = Path(root) / f
-            if p.suffix in exts:
-                # node id: path relative to repo root
-                rel = str(p.relative_to(repo_path))
-                nodes.append(rel)
-                if len(nodes) >= 200:
-                    break
-        if len(nodes) >= 200:
-            break
-
+    nodes = await run_io(_list_nodes_sync, repo_path)
     return {"nodes": nodes}
 
 
 class FullGraphRequest(BaseModel):
     repo_path: str
+    include_cochange: bool = True
+    cochange_min_weight: float = 1.0
 
 
-@router.post("/graph/full")
-def full_graph(body: FullGraphRequest):
-    repo_path = Path(body.repo_path)
-    if not repo_path.exists():
-        raise HTTPException(status_code=400, detail="repo_path not found")
-
+def _full_graph_sync(repo_path: Path) -> dict:
     # Build a more meaningful graph: files with potential relationships
-    exts = {".py", ".ts", ".tsx", ".js", ".jsx", ".go", ".java", ".rb"}
     nodes = []
     edges = []
     
     # Collect all code files
     code_files = []
-    for root, _dirs, files in os.walk(repo_path):
-        for f in files:
-            p = Path(root) / f
-            if p.suffix in exts:
-                rel = str(p.relative_to(repo_path))
-                code_files.append(rel)
-                nodes.append({"id": rel, "label": f, "kind": "file"})
-                if len(nodes) >= 100:  # Limit for performance
-                    break
-        if len(nodes) >= 100:
-            break
+    for p in walk_code_files(repo_path, limit=100):  # Limit for performance
+        rel = str(p.relative_to(repo_path))
+        code_files.append(rel)
+        nodes.append({"id": rel, "label": p.name, "kind": "file"})
 
     # Create relationships based on file patterns and names
     for i, file1 in enumerate(code_files):
+        check_cancelled()
         for file2 in code_files[i+1:]:
             # Create edges based on naming patterns
             file1_name = Path(file1).stem
@@ -151,19 +143,34 @@ def full_graph(body: FullGraphRequest):
     return {"nodes": nodes, "edges": edges}
 
 
+@router.post("/graph/full", dependencies=[Depends(admission("graph"))])
+async def full_graph(body: FullGraphRequest):
+    repo_path = Path(body.repo_path)
+    if not await run_io(repo_path.exists):
+        raise HTTPException(status_code=400, detail="repo_path not found")
+
+    # Identical concurrent requests (dashboards opening the same repo) share one walk.
+    graph = await _walks.do(("full", str(repo_path.resolve())), run_io, _full_graph_sync, repo_path)
+    graph = {**graph, "edges": list(graph["edges"])}  # shared result: copy before extending
+    if body.include_cochange:
+        # Weighted history edges from the precomputed co-change index (see services.cochange).
+        try:
+            repo_id, _path = resolve_repo(None, body.repo_path)
+        except ValueError:
+            repo_id = None  # no index is ever stored under a folder name that is not a valid id
+        index = await run_io(get_cochange_store().get, repo_id) if repo_id else None
+        if index is not None:
+            graph["edges"].extend(index.edges_among((n["id"] for n in graph["nodes"]), body.cochange_min_weight))
+    return graph
+
+
 class RepoTreeRequest(BaseModel):
     repo_path: str
     max_nodes: int | None = 800
 
 
-@router.post("/graph/repo_tree")
-def repo_tree(body: RepoTreeRequest):
-    repo_path = Path(body.repo_path)
-    if not repo_path.exists():
-        raise HTTPException(status_code=400, detail="repo_path not found")
-
+def _repo_tree_sync(repo_path: Path, max_nodes: int) -> dict:
     # Build a directory tree graph: repo -> dirs -> files
-    max_nodes = body.max_nodes or 800
     nodes: dict[str, dict] = {}
     edges: list[dict] = []
 
@@ -175,8 +182,8 @@ def repo_tree(body: RepoTreeRequest):
     add_node(repo_id, repo_id, "repo")
 
     count = 1
-    for root, _dirs, files in os.walk(repo_path):
-        rel_root = Path(root).relative_to(repo_path)
+    for root, files in walk_files(repo_path):
+        rel_root = root.relative_to(repo_path)
         parent_id = repo_id if str(rel_root) == "." else str(rel_root).replace("\\", "/")
         if parent_id != repo_id:
             add_node(parent_id, parent_id, "dir")
@@ -185,7 +192,7 @@ def repo_tree(body: RepoTreeRequest):
                 edges.append({"source": repo_id, "target": parent_id, "label": "contains"})
 
         for f in files:
-            p = Path(root) / f
+            p = root / f
             file_id = str(p.relative_to(repo_path)).replace("\\", "/")
             add_node(file_id, file_id, "file")
             edges.append({"source": parent_id, "target": file_id, "label": "contains"})
@@ -197,4 +204,142 @@ def repo_tree(body: RepoTreeRequest):
 
     return {"nodes": list(nodes.values()), "edges": edges, "root": repo_id}
 
+
+@router.post("/graph/repo_tree", dependencies=[Depends(admission("graph"))])
+async def repo_tree(body: RepoTreeRequest):
+    repo_path = Path(body.repo_path)
+    if not await run_io(repo_path.exists):
+        raise HTTPException(status_code=400, detail="repo_path not found")
+
+    max_nodes = body.max_nodes or 800
+    return await _walks.do(("tree", str(repo_path.resolve()), max_nodes), run_io, _repo_tree_sync, repo_path, max_nodes)
+
+class ReachabilityRequest(BaseModel):
+    repo_id: str | None = None
+    repo_path: str | None = None
+
+
+class BlastRadiusRequest(ReachabilityRequest):
+    targets: list[str] = []  # unit ids ("path.py::Class.method") or file paths; empty = repo-wide top list
+    limit: int = 50
+    include_dependents: bool = False
+
+
+class DependsOnRequest(ReachabilityRequest):
+    pairs: list[tuple[str, str]]  # (a, b): does a transitively depend on b?
+
+
+def _repo(body: ReachabilityRequest) -> tuple[str, Path]:
+    try:
+        return resolve_repo(body.repo_id, body.repo_path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _reachability(body: ReachabilityRequest):
+    repo_id, repo_path = _repo(body)
+    index = await run_cpu(get_reachability_store().ensure, repo_id, repo_path)
+    if index is None:
+        raise HTTPException(status_code=404, detail=f"No code graph index for repo {repo_id}; ingest it first")
+    return index
+
+
+@router.post("/graph/blast_radius", dependencies=[Depends(admission("graph"))])
+async def blast_radius(body: BlastRadiusRequest):
+    """How much of the repo transitively depends on each target (precomputed, no traversal)."""
+    index = await _reachability(body)
+    if not body.targets:
+        top = index.top_blast_radius(body.limit)
+        return {"commit": index.commit, "top": [{"unit": u, "blast_radius": r} for u, r in top]}
+    results = []
+    for target in body.targets:
+        units = index.resolve(target)
+        if not units:
+            results.append({"target": target, "found": False})
+            continue
+        entry = {"target": target, "found": True, "units": len(units)}
+        if len(units) == 1:
+            entry["blast_radius"] = index.blast_radius(units[0])
+            entry["dependencies"] = index.dependency_count(units[0])
+            dependents = index.dependents(units) if body.include_dependents else None
+        else:
+            # A file's radius is the union over its units.
+            dependents = await run_cpu(index.dependents, units)
+            entry["blast_radius"] = len(dependents)
+        if body.include_dependents:
+            entry["dependents"] = dependents[: body.limit]
+        results.append(entry)
+    return {"commit": index.commit, "results": results}
+
+
+@router.post("/graph/depends_on", dependencies=[Depends(admission("query"))])
+async def depends_on(body: DependsOnRequest):
+    index = await _reachability(body)
+    return {
+        "commit": index.commit,
+        "results": [{"a": a, "b": b, "depends": index.depends_on(a, b)} for a, b in body.pairs],
+    }
+
+
+class GraphAtRefRequest(ReachabilityRequest):
+    ref: str = "HEAD"  # branch, tag or sha
+    max_nodes: int | None = 2000
+
+
+class GraphLayoutRequest(ReachabilityRequest):
+    ref: str = "HEAD"
+    layout: str = "force"  # "force" | "layered"
+    max_nodes: int | None = 20000
+
+
+class GraphDiffRequest(ReachabilityRequest):
+    base: str  # e.g. "v1.0"
+    head: str = "HEAD"
+    limit: int | None = 1000  # per list; counts are always complete
+
+
+async def _snapshot_at(repo_id: str, repo_path: Path, ref: str):
+    # A ref that was never ingested is built from `git archive` once and stored.
+    snap = await run_cpu(get_graph_history_store().at_ref, repo_id, repo_path, ref)
+    if snap is None:
+        raise HTTPException(status_code=404, detail=f"No graph for {ref!r} in repo {repo_id}")
+    return snap
+
+
+@router.post("/graph/snapshots")
+async def graph_snapshots(body: ReachabilityRequest):
+    repo_id, _path = _repo(body)
+    return {"repo_id": repo_id, "snapshots": await run_io(get_graph_history_store().snapshots, repo_id)}
+
+
+@router.post("/graph/at_ref", dependencies=[Depends(admission("graph"))])
+async def graph_at_ref(body: GraphAtRefRequest):
+    """The code dependency graph as of a ref, reconstructed from stored snapshots."""
+    repo_id, repo_path = _repo(body)
+    snap = await _snapshot_at(repo_id, repo_path, body.ref)
+    return {"ref": body.ref, **await run_cpu(snap.to_graph, body.max_nodes)}
+
+
+@router.post("/graph/layout", dependencies=[Depends(admission("graph"))])
+async def graph_layout(body: GraphLayoutRequest):
+    """The code graph as of a ref with server-computed positions (render with a `preset` layout)."""
+    if body.layout not in LAYOUTS:
+        raise HTTPException(status_code=400, detail=f"layout must be one of {', '.join(LAYOUTS)}")
+    repo_id, repo_path = _repo(body)
+    snap = await _snapshot_at(repo_id, repo_path, body.ref)
+    # Cached per commit and layout; a new commit is seeded from the repo's previous layout.
+    positions = await run_cpu(get_graph_layout_store().get, repo_id, snap, body.layout)
+    graph = await run_cpu(snap.to_graph, body.max_nodes)
+    return {"ref": body.ref, "layout": body.layout, **with_positions(graph, positions)}
+
+
+@router.post("/graph/diff", dependencies=[Depends(admission("graph"))])
+async def graph_diff(body: GraphDiffRequest):
+    """Structural changes between two refs: added/removed units and dependency edges."""
+    repo_id, repo_path = _repo(body)
+    base = await _snapshot_at(repo_id, repo_path, body.base)
+    head = await _snapshot_at(repo_id, repo_path, body.head)
+    diff = await run_cpu(base.diff, head)
+    return {"base_ref": body.base, "head_ref": body.head, **diff.to_dict(body.limit)}
+
 __all__ = ["router"]
\ No newline at end of file
@@ -0,0 +1,31 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from ..services.answer_cache import get_answer_cache
+from ..services.warmup import readiness
+from ..utils.fingerprint import get_fingerprint_cache
+from ..workers.ingestion_worker import get_batch_scheduler
+from .admission import get_admission_controller
+
+router = APIRouter(tags=["health"])
+
+@router.get("/livez")
+async def livez():
+    # Process is up and the event loop is responsive; says nothing about dependencies.
+    return {"status": "ok"}
+
+@router.get("/readyz")
+async def readyz():
+    report = readiness.report()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+@router.get("/metrics")
+async def metrics():
+    # Admission (active / queued / shed per cost class), ingestion queue depths, ask cache and file fingerprint cache hit rates.
+    return {
+        "admission": get_admission_controller().metrics(),
+        "ingestion": get_batch_scheduler().queue_depths(),
+        "ask_cache": get_answer_cache().metrics(),
+        "fingerprints": get_fingerprint_cache().metrics(),
+    }
+
+__all__ = ["router"]
@@ -1,6 +1,17 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from ..services.repo_cloner import clone_or_update_public_repo
+import uuid
+from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from pydantic import BaseModel, Field
+from ..config import settings
+from ..services.chunk_spool import check_snapshot
+from ..services.cochange import refresh_cochange
+from ..services.garbage_collector import get_garbage_collector
+from ..services.ingestion_orchestrator import IngestionOrchestrator
+from ..services.repo_cloner import check_repo_id, clone_or_update_public_repo
+from ..utils.concurrency import run_io
+from ..workers.ingestion_worker import get_batch_scheduler
+from ..workers.queue import Job, get_job_registry
+from .admission import admission
 
 router = APIRouter(prefix="/api", tags=["ingest"])
 
@@ -13,14 +24,9 @@ class IngestResponse(BaseModel):
     repo_path: str
     status: str
 
-@router.post("/ingest_repo", response_model=IngestResponse)
-def ingest_repo(body: IngestRequest):
-    # Reject token usage for now: public repos only.
-    if body.token:
-        raise HTTPException(status_code=400, detail="Private repos not supported in this build. Omit token.")
-    
-    # Clean and validate the repository URL
-    repo_url = body.repo_url.strip()
+def _normalize_repo_url(raw: str) -> str:
+    """Clean and validate a GitHub repository URL; returns the https .git clone URL."""
+    repo_url = raw.strip()
     
     # Remove @ prefix if present
     if repo_url.startswith('@'):
@@ -38,13 +44,105 @@ def ingest_repo(body: IngestRequest):
     # Ensure it ends with .git for proper cloning
     if not repo_url.endswith('.git'):
         repo_url += '.git'
+    return repo_url
+
+@router.post("/ingest_repo", response_model=IngestResponse, dependencies=[Depends(admission("heavy"))])
+async def ingest_repo(body: IngestRequest, background: BackgroundTasks):
+    # Reject token usage for now: public repos only.
+    if body.token:
+        raise HTTPException(status_code=400, detail="Private repos not supported in this build. Omit token.")
+    
+    repo_url = _normalize_repo_url(body.repo_url)
     
     try:
-        path = clone_or_update_public_repo(repo_url)
-        # TODO: enqueue background job for deeper processing (chunking, embedding)
+        path = await run_io(clone_or_update_public_repo, repo_url)
         job_id = path.name
+        get_job_registry().add(Job(
+            repo_url=repo_url, job_id=job_id, status="cloned", repo_id=path.name, repo_path=str(path)
+        ))
+        # Mine git history for co-change coupling after responding.
+        background.add_task(refresh_cochange, path.name, path)
         return IngestResponse(job_id=job_id, repo_path=str(path), status="cloned")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to clone repository: {str(e)}")
 
+class BatchRepo(BaseModel):
+    repo_url: str
+    priority: int = Field(5, ge=1, le=10)  # share of clone/parse/embed capacity, relative to other repos
+
+class BatchIngestRequest(BaseModel):
+    repos: List[BatchRepo]
+
+@router.post("/ingest_batch", status_code=202)
+async def ingest_batch(body: BatchIngestRequest):
+    """Queue many repos for clone -> parse -> embed; poll /jobs or /batches for progress."""
+    if not body.repos:
+        raise HTTPException(status_code=400, detail="No repositories given")
+    if len(body.repos) > settings.max_batch_repos:
+        raise HTTPException(status_code=400, detail=f"At most {settings.max_batch_repos} repositories per batch")
+    # Validate the whole batch before queueing any of it; duplicates collapse to one job.
+    entries: dict[str, int] = {}
+    for repo in body.repos:
+        url = _normalize_repo_url(repo.repo_url)
+        entries[url] = max(entries.get(url, 0), repo.priority)
+    batch_id = uuid.uuid4().hex[:12]
+    jobs = get_batch_scheduler().submit(entries.items(), batch_id)
+    return {"batch_id": batch_id, "jobs": [j.to_dict() for j in jobs]}
+
+@router.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = get_job_registry().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job {job_id}")
+    return job.to_dict()
+
+@router.get("/batches/{batch_id}")
+async def batch_status(batch_id: str):
+    jobs = get_job_registry().list(batch_id)
+    if not jobs:
+        raise HTTPException(status_code=404, detail=f"Unknown batch {batch_id}")
+    counts: dict[str, int] = {}
+    for job in jobs:
+        counts[job.status] = counts.get(job.status, 0) + 1
+    return {
+        "batch_id": batch_id,
+        "total": len(jobs),
+        "status_counts": counts,
+        "chunks_total": sum(j.chunks_total for j in jobs),
+        "chunks_done": sum(j.chunks_done for j in jobs),
+        "queues": get_batch_scheduler().queue_depths(),
+        "jobs": [j.to_dict() for j in sorted(jobs, key=lambda j: (-j.priority, j.created_at))],
+    }
+
+@router.post("/repos/{repo_id}/gc", dependencies=[Depends(admission("heavy"))])
+async def collect_repo_garbage(repo_id: str):
+    """Run stale chunk / node collection for one repo now."""
+    try:
+        check_repo_id(repo_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    stats = await get_garbage_collector().collect(repo_id)
+    if stats.snapshot is None:
+        raise HTTPException(status_code=404, detail=f"No ingested snapshot recorded for repo {repo_id}")
+    return stats.to_dict()
+
+class ReindexRequest(BaseModel):
+    snapshot: str | None = None  # defaults to the latest spooled snapshot; must be the repo's current one
+
+@router.post("/repos/{repo_id}/reindex", dependencies=[Depends(admission("heavy"))])
+async def reindex_repo(repo_id: str, body: ReindexRequest | None = None):
+    """Re-embed a repo from its chunk spool (no clone, no re-parse)."""
+    try:
+        check_repo_id(repo_id)
+        if body and body.snapshot:
+            check_snapshot(body.snapshot)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        return await IngestionOrchestrator().reindex_from_spool(repo_id, body.snapshot if body else None)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
 __all__ = ["router"]
\ No newline at end of file
@@ -11,6 +11,19 @@ class Settings(BaseSettings):
     
     qdrant_host: str = "qdrant:6333"
     qdrant_port: int = 6333
+    # "shared": one collection partitioned by repo_id; "per_repo": one collection per repo
+    qdrant_collection_mode: str = "shared"
+    # Vector storage profile: "float" (full vectors in RAM), "int8" (scalar
+    # quantization) or "binary" (1 bit/dim). Quantized vectors stay in RAM,
+    # originals optionally go to disk and are used to rescore top candidates.
+    vector_storage_profile: str = "float"
+    vector_on_disk: bool = False
+    vector_rescore: bool = True
+    vector_oversampling: float = 2.0
+    # Content-addressed chunks: identical content (forks, vendored and copied
+    # files) is embedded and stored once, in `<collection>_content`; repos
+    # only record occurrences. Switching it on needs a re-ingest / reindex.
+    chunk_dedup: bool = False
     
     # API keys
     embedding_api_key: Optional[str] = None
@@ -21,10 +34,17 @@ class Settings(BaseSettings):
     max_chunk_tokens: int = 1000
     embedding_model: str = "text-embedding-3-small"
     embedding_dimension: int = 1536
+    embedding_cache: bool = True
     
     # File processing
     supported_extensions: list = [".py", ".js", ".ts", ".tsx", ".jsx", ".java", ".go", ".rs", ".cpp", ".c", ".h", ".hpp"]
-    max_file_size_mb: int = 10
+    max_file_size_mb: int = 10  # larger files are skipped
+    # Files over one chunk are streamed into overlapping windows of max_chunk_tokens
+    chunk_overlap_tokens: int = 100
+    max_windows_per_file: int = 200
+    generated_max_windows: int = 4  # generated / minified files: only the head is indexed
+    fingerprint_cache_files: int = 200_000  # file digests kept by (inode, size, mtime) for change detection
+    parse_cache_files: int = 50_000  # graph-only parse results reused while a file is unchanged; 0 disables
     
     # RAG settings
     top_k_chunks: int = 8
@@ -33,7 +53,73 @@ class Settings(BaseSettings):
     
     # Worker settings
     max_workers: int = 4
+    io_workers: int = 16
+    parse_workers: int = 4  # processes for the multi-language parse pass; 0 parses in-process
     batch_size: int = 100
+
+    # Batch ingestion: global limits shared by all queued repos
+    max_concurrent_clones: int = 4
+    max_concurrent_embeds: int = 4  # embedding batches in flight
+    max_batch_repos: int = 1000
+    job_history: int = 5000  # finished jobs kept for status queries
+
+    # Request handling
+    request_timeout_s: float = 60.0
+    # Paths (fnmatch patterns) that run past the deadline: synchronous ingest,
+    # reindex and GC work for as long as the repo takes. Client disconnects
+    # still cancel them.
+    request_timeout_exempt: list = ["/api/ingest_repo", "/api/repos/*/reindex", "/api/repos/*/gc"]
+    request_max_body_bytes: int = 32 * 1024 * 1024  # larger bodies get 413
+    db_timeout_s: float = 10.0
+
+    # Admission control: concurrency limit / wait queue per cost class
+    # (heavy: ingest, reindex, gc; graph: whole-graph walks; query: ask, search, analysis)
+    admission_enabled: bool = True
+    admission_heavy_limit: int = 2
+    admission_heavy_queue: int = 8
+    admission_graph_limit: int = 4
+    admission_graph_queue: int = 16
+    admission_query_limit: int = 8
+    admission_query_queue: int = 32
+    admission_queue_timeout_s: float = 5.0  # longer waits are shed with 503
+    # Per-client token bucket keyed by the peer address; a request costs
+    # 1 (query), 3 (graph) or 10 (heavy) tokens. 0 disables it.
+    rate_limit_tokens_per_s: float = 10.0
+    rate_limit_burst: float = 60.0
+    # Peers (addresses or CIDRs) whose X-Forwarded-For is honored, e.g. ["10.0.0.0/8"]
+    rate_limit_trusted_proxies: list = []
+    # Key on X-Client-Id: only behind a gateway that authenticates clients and sets it
+    rate_limit_trust_client_id: bool = False
+
+    # Garbage collection of stale chunks / graph nodes
+    gc_after_ingest: bool = True
+    gc_interval_s: float = 0.0  # >0 enables the periodic sweep over all repos
+    gc_batch_size: int = 500
+    gc_batch_pause_s: float = 0.05  # pause between delete batches (rate limit)
+    gc_keep_snapshots: int = 3  # manifests kept per repo
+
+    # Git co-change coupling (mined from history at ingest, queried by impact analysis)
+    cochange_half_life_days: float = 180.0
+    cochange_max_commits: int = 20000  # history depth for the first, full mine
+    cochange_max_files_per_commit: int = 50  # larger commits are bulk changes, ignored for pairs
+    cochange_min_weight: float = 0.05  # pairs below this decayed weight are pruned
+
+    # Per-commit code graph snapshots (base + deltas)
+    graph_snapshot_base_interval: int = 20  # a full snapshot at least every N stored commits
+    graph_snapshot_keep: int = 200  # snapshots kept per repo; older base+delta chains are dropped
+
+    # /api/ask answer cache: exact by normalized question, approximate by question embedding
+    ask_cache_enabled: bool = True
+    ask_cache_size: int = 2048  # answers kept (LRU), across repos
+    ask_cache_ttl_s: float = 3600.0
+    ask_cache_similarity: float = 0.95  # cosine of question embeddings for an approximate hit
+
+    # Ref-range impact analysis (diffs computed from the local clone)
+    range_max_commits: int = 250  # longer ranges are diffed as one base..head pair
+
+    # Startup
+    warmup_on_startup: bool = True
+    warmup_retry_s: float = 5.0
     
     # Data paths
     data_dir: str = "/app/data"
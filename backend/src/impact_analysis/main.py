@@ -1,11 +1,53 @@
+import asyncio
+import contextlib
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from .config import settings
+from .api.middleware import RequestDeadlineMiddleware
+from .api.routes_health import router as health_router
 from .api.routes_ingest import router as ingest_router
 from .api.routes_chunks import router as chunks_router
 from .api.routes_analyze import router as analyze_router
 from .api.routes_ask import router as ask_router
 from .api.routes_graph import router as graph_router
+from .services.garbage_collector import get_garbage_collector
+from .services.neo4j_client import close_graph_driver
+from .services.qdrant_client import close_vector_store
+from .services.warmup import warm_up
+from .utils.concurrency import shutdown_executors
+from .workers.ingestion_worker import shutdown_batch_scheduler
 
-app = FastAPI(title="Impact Analysis Tool (Public Repos Only)")
+# Routers and services only import heavy clients (qdrant_client, neo4j, git,
+# numpy) on first use, so importing this module stays fast for cold starts.
+# Dependency warm-up runs in the background; /readyz flips once it completes.
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = []
+    if settings.warmup_on_startup:
+        tasks.append(asyncio.create_task(warm_up()))
+    if settings.gc_interval_s > 0:
+        tasks.append(asyncio.create_task(get_garbage_collector().run_periodic(settings.gc_interval_s)))
+    yield
+    for task in tasks:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    await shutdown_batch_scheduler()
+    await close_vector_store()
+    await close_graph_driver()
+    shutdown_executors()
+
+
+app = FastAPI(title="Impact Analysis Tool (Public Repos Only)", lifespan=lifespan)
+app.add_middleware(
+    RequestDeadlineMiddleware,
+    timeout_s=settings.request_timeout_s,
+    max_body_bytes=settings.request_max_body_bytes,
+    exempt=settings.request_timeout_exempt,
+)
+app.include_router(health_router)
 app.include_router(ingest_router)
 app.include_router(chunks_router)
 app.include_router(analyze_router)
@@ -15,4 +57,4 @@ app.include_router(graph_router)
 # Root health
 @app.get("/")
 async def root():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
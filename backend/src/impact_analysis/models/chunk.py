@@ -1,6 +1,9 @@
 from pydantic import BaseModel, Field
-from typing import Optional
-import hashlib
+from typing import Optional, Union
+import sys
+
+from ..utils.fingerprint import chunk_id
+from ..utils.hashing import stable_file_hash
 
 class ChunkIn(BaseModel):
     path: str
@@ -9,15 +12,102 @@ class ChunkIn(BaseModel):
     kind: str
     content: str
     summary: Optional[str] = None
+    start_line: Optional[int] = None
+    end_line: Optional[int] = None
 
     def hash(self) -> str:
-        h = hashlib.sha256()
-        h.update(self.path.encode())
-        h.update(self.symbol.encode())
-        h.update(self.content.encode())
-        return h.hexdigest()[:16]
+        return chunk_id(self.path, self.symbol, self.content)
+
+    def to_chunk(self) -> "Chunk":
+        return Chunk(
+            self.path, self.language, self.symbol, self.kind, self.content,
+            self.summary, self.start_line, self.end_line,
+        )
 
 class ChunkStored(ChunkIn):
     id: str = Field(description="Deterministic chunk id")
 
-__all__ = ["ChunkIn", "ChunkStored"]
\ No newline at end of file
+class Chunk:
+    """Chunk record of the ingest pipeline (parser -> spool -> stores).
+
+    Same fields and same `hash()` as ChunkIn, which stays the API model: a
+    repo has hundreds of thousands of chunks and validating a pydantic model
+    for each one costs more than chunking it. Path, language and kind are
+    interned, so every chunk of a file (or language) shares one string, also
+    after unpickling from the parse workers. `content` may be given as the
+    file's utf-8 bytes, typically a zero-copy memoryview slice of the source:
+    it is then hashed and spooled without an encode and decoded only when
+    read as text. The chunk id and the content hash are computed once.
+    """
+    __slots__ = (
+        "path", "language", "symbol", "kind", "summary", "start_line", "end_line",
+        "_text", "_data", "_id", "_content_hash",
+    )
+
+    def __init__(
+        self,
+        path: str,
+        language: str,
+        symbol: str,
+        kind: str,
+        content: Union[str, bytes, memoryview],
+        summary: Optional[str] = None,
+        start_line: Optional[int] = None,
+        end_line: Optional[int] = None,
+    ):
+        self.path = sys.intern(path)
+        self.language = sys.intern(language)
+        self.symbol = symbol
+        self.kind = sys.intern(kind)
+        self.summary = summary
+        self.start_line = start_line
+        self.end_line = end_line
+        if isinstance(content, str):
+            self._text, self._data = content, None
+        else:
+            self._text, self._data = None, content
+        self._id: Optional[str] = None
+        self._content_hash: Optional[str] = None
+
+    @property
+    def content(self) -> str:
+        if self._text is not None:
+            return self._text
+        return str(self._data, "utf-8")
+
+    @property
+    def content_bytes(self) -> Union[bytes, memoryview]:
+        """utf-8 content; bytes-like, not necessarily `bytes`."""
+        if self._data is not None:
+            return self._data
+        return self._text.encode("utf-8", errors="replace")
+
+    def hash(self) -> str:
+        if self._id is None:
+            self._id = chunk_id(self.path, self.symbol, self.content_bytes)
+        return self._id
+
+    @property
+    def content_hash(self) -> str:
+        """`stable_file_hash` of the content (the dedup key of the vector store)."""
+        if self._content_hash is None:
+            self._content_hash = stable_file_hash(self.content_bytes)
+        return self._content_hash
+
+    def __getstate__(self):
+        # memoryviews do not pickle; the id is computed here, in the parse worker.
+        data = bytes(self._data) if self._data is not None else None
+        return (
+            self.path, self.language, self.symbol, self.kind, self.summary, self.start_line, self.end_line,
+            self._text, data, self.hash(), self._content_hash,
+        )
+
+    def __setstate__(self, state) -> None:
+        (path, language, self.symbol, kind, self.summary, self.start_line, self.end_line,
+         self._text, self._data, self._id, self._content_hash) = state
+        self.path, self.language, self.kind = sys.intern(path), sys.intern(language), sys.intern(kind)
+
+    def __repr__(self) -> str:
+        return f"Chunk({self.path!r}, {self.symbol!r}, {self.kind!r}, lines {self.start_line}-{self.end_line})"
+
+__all__ = ["Chunk", "ChunkIn", "ChunkStored"]
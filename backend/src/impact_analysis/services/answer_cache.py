@@ -0,0 +1,157 @@
+"""Two-level cache of /api/ask answers.
+
+Many users ask the same few questions about a repo ("where is auth
+handled?"), and each one would repeat retrieval and generation. Answers are
+cached per (repo, indexed commit, context ids):
+
+* exact: keyed by the normalized question (case, whitespace and trailing
+  punctuation folded), a dict lookup;
+* approximate: the question embedding (services.embedding_client) against
+  the cached questions of the same repo, commit and context, a hit when the
+  cosine similarity reaches `ask_cache_similarity`.
+
+Entries share one LRU of `ask_cache_size` with a TTL of `ask_cache_ttl_s`.
+A repo's entries are dropped as soon as a request sees a different indexed
+commit for it (a new ingest), so answers never outlive the code they were
+built from. Each entry keeps the `used_ids` of its answer.
+"""
+from __future__ import annotations
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, List, Sequence, Tuple
+
+from ..config import settings
+
+if TYPE_CHECKING:
+    import numpy as np
+
+__all__ = ["AnswerCache", "CachedAnswer", "get_answer_cache", "normalize_question"]
+
+_SPACE = re.compile(r"\s+")
+
+# (repo_id, commit, context ids, normalized question); repo_id and commit are "" without a repo
+Key = Tuple[str, str, Tuple[str, ...], str]
+
+
+def normalize_question(question: str) -> str:
+    text = unicodedata.normalize("NFKC", question).casefold()
+    return _SPACE.sub(" ", text).strip().rstrip("?!.").rstrip()
+
+
+@dataclass
+class CachedAnswer:
+    answer: str
+    used_ids: List[str]
+    question: str  # normalized question the answer was built for
+    created: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class _Bucket:
+    """Cached questions of one (repo, commit, context) with their unit embeddings, for similarity lookups."""
+    keys: List[Key] = field(default_factory=list)
+    vectors: List["np.ndarray"] = field(default_factory=list)
+    matrix: "np.ndarray | None" = None  # stacked `vectors`, rebuilt after changes
+
+
+class AnswerCache:
+    def __init__(self, size: int = 2048, ttl_s: float = 3600.0, similarity: float = 0.95):
+        self.size = size
+        self.ttl_s = ttl_s
+        self.similarity = similarity
+        self._entries: "OrderedDict[Key, CachedAnswer]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, str, Tuple[str, ...]], _Bucket] = {}
+        self._commits: Dict[str, str] = {}  # repo_id -> commit its entries belong to
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = defaultdict(int)
+
+    def _check_commit(self, repo_id: str, commit: str) -> None:
+        """Drop a repo's entries when its indexed commit changed. Caller holds the lock."""
+        known = self._commits.get(repo_id)
+        if known == commit:
+            return
+        if known is not None:
+            for key in [k for k in self._entries if k[0] == repo_id]:
+                self._drop(key)
+            self.stats["invalidations"] += 1
+        self._commits[repo_id] = commit
+
+    def _drop(self, key: Key) -> None:
+        self._entries.pop(key, None)
+        bucket = self._buckets.get(key[:3])
+        if bucket is not None and key in bucket.keys:
+            i = bucket.keys.index(key)
+            del bucket.keys[i], bucket.vectors[i]
+            bucket.matrix = None
+            if not bucket.keys:
+                del self._buckets[key[:3]]
+
+    def _fresh(self, key: Key) -> CachedAnswer | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.created > self.ttl_s:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key: Key) -> CachedAnswer | None:
+        """Exact lookup."""
+        with self._lock:
+            self._check_commit(key[0], key[1])
+            entry = self._fresh(key)
+            self.stats["exact_hits" if entry else "exact_misses"] += 1
+            return entry
+
+    def get_similar(self, key: Key, vector: Sequence[float]) -> CachedAnswer | None:
+        """The cached answer of the most similar question in the same repo, commit and context, if close enough."""
+        import numpy as np
+        q = np.asarray(vector, np.float32)
+        q /= max(float(np.linalg.norm(q)), 1e-12)
+        with self._lock:
+            self._check_commit(key[0], key[1])
+            bucket = self._buckets.get(key[:3])
+            entry = None
+            if bucket is not None:
+                if bucket.matrix is None:
+                    bucket.matrix = np.stack(bucket.vectors)
+                scores = bucket.matrix @ q
+                best = int(np.argmax(scores))
+                if scores[best] >= self.similarity:
+                    entry = self._fresh(bucket.keys[best])
+            self.stats["similar_hits" if entry else "similar_misses"] += 1
+            return entry
+
+    def put(self, key: Key, vector: Sequence[float] | None, answer: str, used_ids: List[str]) -> None:
+        import numpy as np
+        with self._lock:
+            self._check_commit(key[0], key[1])
+            self._drop(key)
+            self._entries[key] = CachedAnswer(answer, list(used_ids), key[3])
+            if vector is not None:
+                v = np.asarray(vector, np.float32)
+                bucket = self._buckets.setdefault(key[:3], _Bucket())
+                bucket.keys.append(key)
+                bucket.vectors.append(v / max(float(np.linalg.norm(v)), 1e-12))
+                bucket.matrix = None
+            while len(self._entries) > self.size:
+                self._drop(next(iter(self._entries)))
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "repos": len(self._commits), **self.stats}
+
+
+_cache: AnswerCache | None = None
+
+
+def get_answer_cache() -> AnswerCache:
+    global _cache
+    if _cache is None:
+        _cache = AnswerCache(settings.ask_cache_size, settings.ask_cache_ttl_s, settings.ask_cache_similarity)
+    return _cache
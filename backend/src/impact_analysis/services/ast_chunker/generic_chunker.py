@@ -0,0 +1,194 @@
+"""Language-agnostic chunking with bounded memory.
+
+Files are classified from a small prefix (binary sniff, generated/minified
+markers) and their size, without reading them whole:
+
+* over `max_file_size_mb`, or binary: skipped;
+* fits in one chunk: a single "file" chunk;
+* anything larger: streamed through `mmap` into overlapping windows of at most
+  `max_chunk_tokens` (estimated), cut at line boundaries. A single line longer
+  than a window (minified code) is cut into overlapping slices. At most
+  `max_windows_per_file` windows are produced, and only `generated_max_windows`
+  for generated or minified files, whose tail rarely adds anything searchable.
+
+Only one window is decoded at a time, so memory stays proportional to the
+window size, not the file size.
+"""
+from __future__ import annotations
+import logging
+import mmap
+import re
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Deque, Iterator, Tuple
+
+from ...config import settings
+from ...models.chunk import Chunk
+from ...utils.concurrency import check_cancelled
+from ...utils.language_detect import looks_like_text, read_prefix
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["ChunkPolicy", "chunk_file", "classify_file", "iter_windows"]
+
+_CHARS_PER_TOKEN = 4  # same heuristic as utils.token_utils.estimate_tokens
+
+_SNIFF_BYTES = 16384
+
+_GENERATED_SUFFIXES = (
+    ".min.js", ".min.css", ".bundle.js", "_pb2.py", "_pb2_grpc.py", ".pb.go", ".g.dart", ".designer.cs",
+)
+_GENERATED_MARKERS = re.compile(
+    rb"@generated|do not edit|code generated by|auto-?generated|generated by the protocol buffer compiler",
+    re.IGNORECASE,
+)
+# A line this long in the prefix means minified / machine-written output.
+_MINIFIED_LINE_BYTES = 1000
+
+Window = Tuple[int, int, str]  # (start_line, end_line, text)
+
+
+@dataclass(frozen=True)
+class ChunkPolicy:
+    max_file_bytes: int
+    max_tokens: int
+    overlap_tokens: int
+    max_windows: int
+    generated_max_windows: int
+
+    @classmethod
+    def from_settings(cls) -> "ChunkPolicy":
+        return cls(
+            max_file_bytes=settings.max_file_size_mb * 1024 * 1024,
+            max_tokens=settings.max_chunk_tokens,
+            overlap_tokens=min(settings.chunk_overlap_tokens, settings.max_chunk_tokens // 2),
+            max_windows=settings.max_windows_per_file,
+            generated_max_windows=settings.generated_max_windows,
+        )
+
+
+def _is_generated(name: str, prefix: bytes) -> bool:
+    if name.lower().endswith(_GENERATED_SUFFIXES):
+        return True
+    if _GENERATED_MARKERS.search(prefix[:2048]):
+        return True
+    longest = max((len(line) for line in prefix.split(b"\n")), default=0)
+    return longest >= _MINIFIED_LINE_BYTES
+
+
+def classify_file(path: Path, size: int, policy: ChunkPolicy) -> Tuple[str, str]:
+    """(action, reason) with action one of "skip", "file", "windows"."""
+    if size > policy.max_file_bytes:
+        return "skip", f"larger than {policy.max_file_bytes // (1024 * 1024)} MB"
+    try:
+        prefix = read_prefix(path, _SNIFF_BYTES)
+    except OSError as e:
+        return "skip", str(e)
+    if not looks_like_text(prefix):
+        return "skip", "binary"
+    if size <= policy.max_tokens * _CHARS_PER_TOKEN:
+        return "file", "small"
+    if _is_generated(path.name, prefix):
+        return "windows", "generated"
+    return "windows", "large"
+
+
+def _estimate(raw: bytes) -> int:
+    return max(len(raw) // _CHARS_PER_TOKEN, len(raw.split()))
+
+
+def _utf8_start(buf, pos: int, end: int) -> int:
+    # Never start a slice in the middle of a multi-byte character.
+    while pos < end and (buf[pos] & 0xC0) == 0x80:
+        pos += 1
+    return pos
+
+
+def _slices(buf, start: int, end: int, budget: int, overlap: int) -> Iterator[Tuple[int, int]]:
+    pos = start
+    while pos < end:
+        stop = _utf8_start(buf, min(pos + budget, end), end)
+        yield pos, stop
+        if stop >= end:
+            return
+        pos = _utf8_start(buf, max(pos + 1, stop - overlap), end)
+
+
+def iter_windows(path: Path, max_tokens: int, overlap_tokens: int = 0) -> Iterator[Window]:
+    """Overlapping, token-bounded windows of a text file, cut at line boundaries."""
+    budget = max_tokens * _CHARS_PER_TOKEN
+    overlap_bytes = overlap_tokens * _CHARS_PER_TOKEN
+    with path.open("rb") as fh:
+        try:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return
+        with mm:
+            window: Deque[Tuple[int, int, int, int]] = deque()  # (line, start, end, tokens)
+            total = 0
+
+            def emit() -> Window:
+                return window[0][0], window[-1][0], mm[window[0][1]:window[-1][2]].decode("utf-8", "replace")
+
+            pos, size, line = 0, len(mm), 0
+            while pos < size:
+                check_cancelled()
+                nl = mm.find(b"\n", pos)
+                end = size if nl < 0 else nl + 1
+                line += 1
+                start, pos = pos, end
+                if end - start > budget:
+                    # One overlong line: flush, then slice it on its own.
+                    if window:
+                        yield emit()
+                        window.clear()
+                        total = 0
+                    for a, b in _slices(mm, start, end, budget, overlap_bytes):
+                        yield line, line, mm[a:b].decode("utf-8", "replace")
+                    continue
+                tokens = _estimate(mm[start:end])
+                if window and total + tokens > max_tokens:
+                    yield emit()
+                    # Keep a tail of whole lines as overlap, but always make room for this line.
+                    while window and (total > overlap_tokens or total + tokens > max_tokens):
+                        total -= window.popleft()[3]
+                window.append((line, start, end, tokens))
+                total += tokens
+            if window:
+                yield emit()
+
+
+def chunk_file(path: Path, rel_path: str, language: str, policy: ChunkPolicy | None = None) -> Iterator[Chunk]:
+    """Chunks for one file according to the size / generated-file policy."""
+    policy = policy or ChunkPolicy.from_settings()
+    try:
+        size = path.stat().st_size
+    except OSError:
+        return
+    action, reason = classify_file(path, size, policy)
+    if action == "skip":
+        logger.debug("skipping %s: %s", rel_path, reason)
+        return
+    if action == "file":
+        raw = path.read_bytes()
+        try:
+            text = raw.decode("utf-8")
+            content: str | bytes = raw  # kept as bytes: hashed and spooled without an encode
+        except UnicodeDecodeError:
+            content = text = raw.decode("utf-8", "replace")
+        if "\r" in text:  # same text as a text-mode read (universal newlines)
+            content = text = text.replace("\r\n", "\n").replace("\r", "\n")
+        if text.strip():
+            yield Chunk(rel_path, language, path.stem, "file", content, start_line=1, end_line=text.count("\n") + 1)
+        return
+    limit = policy.generated_max_windows if reason == "generated" else policy.max_windows
+    n = 0
+    for start, end, text in iter_windows(path, policy.max_tokens, policy.overlap_tokens):
+        if not text.strip():
+            continue
+        if n >= limit:
+            logger.debug("%s (%s, %d bytes): stopped after %d windows", rel_path, reason, size, limit)
+            return
+        yield Chunk(rel_path, language, f"{path.stem}#{n}", "window", text, start_line=start, end_line=end)
+        n += 1
@@ -0,0 +1,254 @@
+"""Built-in language plugins (see registry). Queries target the grammar packages in requirements.txt."""
+from __future__ import annotations
+
+from .registry import LanguagePlugin, register_language
+
+_JS_SYMBOLS = """
+(function_declaration name: (identifier) @name) @function
+(generator_function_declaration name: (identifier) @name) @function
+(class_declaration name: (_) @name) @class
+(method_definition name: (property_identifier) @name) @function
+(lexical_declaration (variable_declarator name: (identifier) @name value: [(arrow_function) (function_expression)])) @function
+"""
+_JS_IMPORTS = """
+(import_statement source: (string) @import)
+(export_statement source: (string) @import)
+(call_expression function: (identifier) @_fn arguments: (arguments . (string) @import) (#eq? @_fn "require"))
+"""
+_TS_SYMBOLS = _JS_SYMBOLS + """
+(abstract_class_declaration name: (type_identifier) @name) @class
+(interface_declaration name: (type_identifier) @name) @class
+(enum_declaration name: (identifier) @name) @class
+"""
+
+_JS_REGEX = (
+    ("class", r"\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?(?:class|interface|enum)\s+(?P<name>[A-Za-z_$][\w$]*)"),
+    ("function", r"\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*(?P<name>[A-Za-z_$][\w$]*)"),
+    ("function", r"\s*(?:export\s+)?(?:const|let|var)\s+(?P<name>[A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?(?:function|\([^)]*\)\s*=>|[\w$]+\s*=>)"),
+)
+_JS_IMPORT_REGEX = (
+    r"\s*import\s.*?from\s+['\"]([^'\"]+)['\"]",
+    r"\s*import\s+['\"]([^'\"]+)['\"]",
+    r".*\brequire\(\s*['\"]([^'\"]+)['\"]\s*\)",
+)
+
+_C_FAMILY_REGEX = (
+    ("namespace", r"\s*namespace\s+(?P<name>\w+)\s*\{"),
+    ("class", r"\s*(?:template\s*<[^>]*>\s*)?(?:class|struct)\s+(?P<name>\w+)[^;]*$"),
+    ("function", r"[\w:<>*&\s]+?\b(?!(?:if|for|while|switch|return|catch|else|sizeof|do)\b)"
+                 r"(?P<name>[A-Za-z_][\w:]*)\s*\([^;]*$"),
+)
+
+_BUILTIN = (
+    LanguagePlugin(
+        name="python",
+        extensions=(".py", ".pyi"),
+        aliases=("python-stub",),
+        grammar="tree_sitter_python",
+        symbol_query="""
+(function_definition name: (identifier) @name) @function
+(class_definition name: (identifier) @name) @class
+""",
+        import_query="""
+(import_statement name: [(dotted_name) (aliased_import name: (dotted_name))] @import)
+(import_from_statement module_name: (_) @import)
+""",
+        symbol_patterns=(
+            ("class", r"\s*class\s+(?P<name>\w+)"),
+            ("function", r"\s*(?:async\s+)?def\s+(?P<name>\w+)"),
+        ),
+        import_patterns=(r"\s*from\s+([.\w]+)\s+import", r"\s*import\s+([.\w]+)"),
+        block="indent",
+        separators=(".",),
+    ),
+    LanguagePlugin(
+        name="javascript",
+        extensions=(".js", ".jsx", ".mjs", ".cjs"),
+        aliases=("javascript-react",),
+        grammar="tree_sitter_javascript",
+        symbol_query=_JS_SYMBOLS,
+        import_query=_JS_IMPORTS,
+        symbol_patterns=_JS_REGEX,
+        import_patterns=_JS_IMPORT_REGEX,
+    ),
+    LanguagePlugin(
+        name="typescript",
+        extensions=(".ts", ".mts", ".cts"),
+        grammar="tree_sitter_typescript",
+        grammar_fn="language_typescript",
+        symbol_query=_TS_SYMBOLS,
+        import_query=_JS_IMPORTS,
+        symbol_patterns=_JS_REGEX,
+        import_patterns=_JS_IMPORT_REGEX,
+    ),
+    LanguagePlugin(
+        name="tsx",
+        extensions=(".tsx",),
+        aliases=("typescript-react",),
+        grammar="tree_sitter_typescript",
+        grammar_fn="language_tsx",
+        symbol_query=_TS_SYMBOLS,
+        import_query=_JS_IMPORTS,
+        symbol_patterns=_JS_REGEX,
+        import_patterns=_JS_IMPORT_REGEX,
+    ),
+    LanguagePlugin(
+        name="go",
+        extensions=(".go",),
+        grammar="tree_sitter_go",
+        symbol_query="""
+(function_declaration name: (identifier) @name) @function
+(method_declaration
+  receiver: (parameter_list (parameter_declaration type: [
+    (type_identifier) @owner
+    (pointer_type (type_identifier) @owner)
+    (generic_type type: (type_identifier) @owner)
+    (pointer_type (generic_type type: (type_identifier) @owner))]))
+  name: (field_identifier) @name) @function
+(type_declaration (type_spec name: (type_identifier) @name)) @class
+""",
+        import_query="(import_spec path: (_) @import)",
+        symbol_patterns=(
+            ("function", r"func\s+\(\s*\w*\s*\*?(?P<owner>\w+)[^)]*\)\s*(?P<name>\w+)"),
+            ("function", r"func\s+(?P<name>\w+)"),
+            ("class", r"type\s+(?P<name>\w+)\s+(?:struct|interface)"),
+        ),
+        import_patterns=(r"\s*import\s+(?:\w+\s+)?\"([^\"]+)\"", r"\s+(?:[\w.]+\s+)?\"([^\"]+)\"\s*$"),
+        package_scoped=True,
+    ),
+    LanguagePlugin(
+        name="java",
+        extensions=(".java",),
+        grammar="tree_sitter_java",
+        symbol_query="""
+(class_declaration name: (identifier) @name) @class
+(interface_declaration name: (identifier) @name) @class
+(enum_declaration name: (identifier) @name) @class
+(record_declaration name: (identifier) @name) @class
+(annotation_type_declaration name: (identifier) @name) @class
+(method_declaration name: (identifier) @name) @function
+(constructor_declaration name: (identifier) @name) @function
+""",
+        import_query="(import_declaration [(scoped_identifier) (identifier)] @import)",
+        symbol_patterns=(
+            ("class", r"\s*(?:(?:public|protected|private|abstract|final|static|sealed)\s+)*"
+                      r"(?:class|interface|enum|record|@interface)\s+(?P<name>\w+)"),
+            ("function", r"\s*(?:(?:public|protected|private|abstract|final|static|synchronized|native)\s+)*"
+                         r"(?:<[^>]+>\s+)?(?!(?:return|new|else|throw)\b)[\w<>\[\],.?\s]+\s+(?P<name>\w+)\s*\([^;]*$"),
+        ),
+        import_patterns=(r"\s*import\s+(?:static\s+)?([\w.]+)",),
+        separators=(".",),
+        package_scoped=True,
+    ),
+    LanguagePlugin(
+        name="rust",
+        extensions=(".rs",),
+        grammar="tree_sitter_rust",
+        symbol_query="""
+(function_item name: (identifier) @name) @function
+(function_signature_item name: (identifier) @name) @function
+(struct_item name: (type_identifier) @name) @class
+(enum_item name: (type_identifier) @name) @class
+(trait_item name: (type_identifier) @name) @class
+(union_item name: (type_identifier) @name) @class
+(impl_item type: [(type_identifier) @name (generic_type type: (type_identifier) @name)]) @scope
+(mod_item name: (identifier) @name body: (_)) @namespace
+""",
+        import_query="""
+(use_declaration argument: (_) @import)
+(mod_item name: (identifier) @import !body)
+""",
+        symbol_patterns=(
+            ("class", r"\s*(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|trait|union)\s+(?P<name>\w+)"),
+            ("function", r"\s*(?:pub(?:\([^)]*\))?\s+)?(?:const\s+)?(?:async\s+)?(?:unsafe\s+)?fn\s+(?P<name>\w+)"),
+        ),
+        import_patterns=(r"\s*(?:pub\s+)?use\s+([\w:]+)", r"\s*(?:pub\s+)?mod\s+(\w+)\s*;"),
+        separators=("::",),
+    ),
+    LanguagePlugin(
+        name="cpp",
+        extensions=(".cpp", ".cc", ".cxx", ".c++", ".hpp", ".hh", ".hxx", ".h", ".c"),
+        # No C grammar is shipped; the C++ one parses C well enough for symbols and includes.
+        aliases=("cpp-header", "c"),
+        grammar="tree_sitter_cpp",
+        symbol_query="""
+(function_definition declarator: (function_declarator declarator: [
+  (identifier) (field_identifier) (qualified_identifier) (destructor_name) (operator_name)] @name)) @function
+(function_definition declarator: (_ (function_declarator declarator: [
+  (identifier) (field_identifier) (qualified_identifier)] @name))) @function
+(class_specifier name: (type_identifier) @name body: (_)) @class
+(struct_specifier name: (type_identifier) @name body: (_)) @class
+(enum_specifier name: (type_identifier) @name body: (_)) @class
+(namespace_definition name: (_) @name) @namespace
+""",
+        import_query="(preproc_include path: (_) @import)",
+        symbol_patterns=_C_FAMILY_REGEX,
+        import_patterns=(r"\s*#\s*include\s*[<\"]([^>\"]+)[>\"]",),
+    ),
+    # Regex-only languages (no grammar shipped).
+    LanguagePlugin(
+        name="kotlin",
+        extensions=(".kt", ".kts"),
+        symbol_patterns=(
+            ("class", r"\s*(?:[a-z]+\s+)*(?:class|interface|object)\s+(?P<name>\w+)"),
+            ("function", r"\s*(?:[a-z]+\s+)*fun\s+(?:<[^>]+>\s*)?(?:[\w.]+\.)?(?P<name>\w+)\s*\("),
+        ),
+        import_patterns=(r"\s*import\s+([\w.]+)",),
+        separators=(".",),
+        package_scoped=True,
+    ),
+    LanguagePlugin(
+        name="scala",
+        extensions=(".scala", ".sc"),
+        symbol_patterns=(
+            ("class", r"\s*(?:[a-z]+\s+)*(?:class|trait|object)\s+(?P<name>\w+)"),
+            ("function", r"\s*(?:[a-z]+\s+)*def\s+(?P<name>\w+)"),
+        ),
+        import_patterns=(r"\s*import\s+([\w.]+)",),
+        separators=(".",),
+        package_scoped=True,
+    ),
+    LanguagePlugin(
+        name="csharp",
+        extensions=(".cs",),
+        symbol_patterns=(
+            ("namespace", r"\s*namespace\s+(?P<name>[\w.]+)\s*\{?\s*$"),
+            ("class", r"\s*(?:\[[^\]]*\]\s*)*(?:(?:public|internal|protected|private|abstract|sealed|static|partial)\s+)*"
+                      r"(?:class|interface|struct|enum|record)\s+(?P<name>\w+)"),
+            ("function", r"\s*(?:(?:public|internal|protected|private|static|virtual|override|abstract|async|sealed)\s+)+"
+                         r"(?!(?:return|new|else|throw|await)\b)[\w<>\[\],.?\s]+\s+(?P<name>\w+)\s*\([^;]*$"),
+        ),
+        import_patterns=(r"\s*using\s+(?:static\s+)?([\w.]+)\s*;",),
+        separators=(".",),
+        package_scoped=True,
+    ),
+    LanguagePlugin(
+        name="ruby",
+        extensions=(".rb", ".rake"),
+        symbol_patterns=(
+            ("class", r"\s*(?:class|module)\s+(?:[\w:]+::)?(?P<name>\w+)"),
+            ("function", r"\s*def\s+(?:self\.)?(?P<name>[\w?!=]+)"),
+        ),
+        import_patterns=(r"\s*require(?:_relative)?\s*\(?\s*['\"]([^'\"]+)['\"]",),
+        block="end",
+    ),
+    LanguagePlugin(
+        name="php",
+        extensions=(".php",),
+        symbol_patterns=(
+            ("class", r"\s*(?:(?:abstract|final|readonly)\s+)*(?:class|interface|trait|enum)\s+(?P<name>\w+)"),
+            ("function", r"\s*(?:(?:public|protected|private|static|abstract|final)\s+)*function\s+&?(?P<name>\w+)"),
+        ),
+        import_patterns=(r"\s*use\s+([\w\\]+)", r"\s*(?:require|include)(?:_once)?\s*\(?\s*['\"]([^'\"]+)['\"]"),
+        separators=("\\", "/"),
+    ),
+    LanguagePlugin(
+        name="bash",
+        extensions=(".sh", ".bash", ".zsh"),
+        symbol_patterns=(("function", r"\s*(?:function\s+)?(?P<name>[\w-]+)\s*\(\s*\)\s*\{?"),),
+        import_patterns=(r"\s*(?:source|\.)\s+['\"]?([^'\"\s;]+)",),
+    ),
+)
+
+for _plugin in _BUILTIN:
+    register_language(_plugin)
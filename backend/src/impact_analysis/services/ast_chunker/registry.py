@@ -0,0 +1,305 @@
+"""Language plugins: source -> symbols and imports, for every language we index.
+
+A `LanguagePlugin` names a tree-sitter grammar (the `tree_sitter_<lang>`
+package) plus two queries over it:
+
+* symbols: `@function` / `@class` definitions with a `@name` capture,
+  `@scope` / `@namespace` for containers that only qualify names (Rust
+  `impl` blocks, whose functions are methods; C++ namespaces, whose are not)
+  and an optional `@owner` (Go method receivers);
+* imports: `@import` on the imported module / path / header.
+
+and a regex fallback used when the grammar is not installed or fails to load.
+Languages without any grammar (Kotlin, Ruby, C#, ...) are regex-only. Functions
+nested in a class (or scope) become methods qualified by it: `Class.method`.
+
+Grammars and compiled queries are loaded on first use and cached for the
+process; parsers are not thread-safe and are cached per thread. Plugins for
+other languages can be added with `register_language`.
+"""
+from __future__ import annotations
+import importlib
+import logging
+import re
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from ...utils.language_detect import detect_language
+
+logger = logging.getLogger(__name__)
+
+__all__ = [
+    "LanguagePlugin", "Symbol", "extract_symbols", "language_for", "plugin_for", "register_language",
+    "registered_extensions",
+]
+
+
+@dataclass(frozen=True)
+class LanguagePlugin:
+    name: str
+    extensions: Tuple[str, ...]
+    aliases: Tuple[str, ...] = ()  # other `detect_language` ids parsed by this plugin
+    grammar: Optional[str] = None  # module exposing the grammar, e.g. "tree_sitter_go"
+    grammar_fn: str = "language"
+    symbol_query: str = ""
+    import_query: str = ""
+    # Regex fallback: (kind, pattern with a `name` and optional `owner` group), matched per line.
+    symbol_patterns: Tuple[Tuple[str, str], ...] = ()
+    import_patterns: Tuple[str, ...] = ()  # first group is the import
+    block: str = "brace"  # how a regex match's body ends: "brace", "indent" or "end"
+    separators: Tuple[str, ...] = ("/",)  # splitting import paths into parts
+    package_scoped: bool = False  # files of one directory see each other without imports
+
+
+@dataclass
+class Symbol:
+    name: str
+    qualname: str  # "Class.method" for nested definitions
+    kind: str  # function | class | method
+    start_line: int
+    end_line: int
+    parent: int | None = None  # index of the owning class / enclosing symbol
+    children: List[int] = field(default_factory=list)  # symbols nested inside its lines
+
+
+# (start position, -end position, kind, name, start line, end line, owner); positions
+# order and nest definitions (byte offsets from tree-sitter, lines from regexes).
+_Raw = Tuple[int, int, str, str, int, int, Optional[str]]
+
+_plugins: Dict[str, LanguagePlugin] = {}
+_by_extension: Dict[str, LanguagePlugin] = {}
+
+
+def register_language(plugin: LanguagePlugin) -> None:
+    """Add (or replace) a plugin; its name and aliases are matched against `detect_language`."""
+    for key in (plugin.name, *plugin.aliases):
+        _plugins[key] = plugin
+    for ext in plugin.extensions:
+        _by_extension[ext] = plugin
+
+
+def plugin_for(language: str | None) -> LanguagePlugin | None:
+    return _plugins.get(language) if language else None
+
+
+def language_for(path: Path) -> str | None:
+    """Language id of a file we can parse (`detect_language` id when it has a plugin), else None."""
+    plugin = _by_extension.get(path.suffix.lower())
+    if plugin is None and path.suffix:
+        return None  # only extension-less scripts are sniffed for a shebang
+    detected = detect_language(path)
+    if plugin_for(detected) is not None:
+        return detected
+    return plugin.name if plugin else None
+
+
+def registered_extensions() -> frozenset[str]:
+    return frozenset(_by_extension)
+
+
+# --- tree-sitter -----------------------------------------------------------------
+
+@dataclass
+class _Grammar:
+    language: Any
+    symbols: Any | None
+    imports: Any | None
+
+
+_grammars: Dict[str, _Grammar | None] = {}
+_grammars_lock = threading.Lock()
+_local = threading.local()
+
+
+def _grammar(plugin: LanguagePlugin) -> _Grammar | None:
+    """Compiled grammar and queries, loaded once per process; None if unavailable."""
+    if plugin.name in _grammars:
+        return _grammars[plugin.name]
+    with _grammars_lock:
+        if plugin.name not in _grammars:
+            loaded = None
+            try:
+                import tree_sitter as ts
+                if not hasattr(ts, "QueryCursor"):  # tree-sitter < 0.25
+                    raise ImportError(f"tree-sitter {getattr(ts, '__version__', '?')} is older than 0.25")
+                language = ts.Language(getattr(importlib.import_module(plugin.grammar), plugin.grammar_fn)())
+                loaded = _Grammar(
+                    language,
+                    ts.Query(language, plugin.symbol_query) if plugin.symbol_query else None,
+                    ts.Query(language, plugin.import_query) if plugin.import_query else None,
+                )
+            except Exception as e:  # missing package, ABI mismatch, bad query
+                logger.info("tree-sitter grammar for %s unavailable (%s); using regex fallback", plugin.name, e)
+            _grammars[plugin.name] = loaded
+    return _grammars[plugin.name]
+
+
+def _parser(plugin: LanguagePlugin, grammar: _Grammar):
+    parsers = getattr(_local, "parsers", None)
+    if parsers is None:
+        parsers = _local.parsers = {}
+    parser = parsers.get(plugin.name)
+    if parser is None:
+        import tree_sitter as ts
+        parser = parsers[plugin.name] = ts.Parser(grammar.language)
+    return parser
+
+
+def _captures(query, node) -> List[Dict[str, list]]:
+    import tree_sitter as ts
+    return [caps for _i, caps in ts.QueryCursor(query).matches(node)]
+
+
+def _tree_sitter_symbols(plugin: LanguagePlugin, grammar: _Grammar, source: bytes):
+    tree = _parser(plugin, grammar).parse(source)
+    raw: List[_Raw] = []
+    if grammar.symbols is not None:
+        for caps in _captures(grammar.symbols, tree.root_node):
+            names = caps.get("name")
+            kind = next((k for k in ("function", "class", "scope", "namespace") if k in caps), None)
+            if not names or kind is None:
+                continue
+            node = caps[kind][0]
+            owner = caps.get("owner")
+            raw.append((
+                node.start_byte, -node.end_byte, kind, names[0].text.decode("utf-8", "replace"),
+                node.start_point[0] + 1, node.end_point[0] + 1, owner[0].text.decode("utf-8", "replace") if owner else None,
+            ))
+    imports: List[str] = []
+    if grammar.imports is not None:
+        for caps in _captures(grammar.imports, tree.root_node):
+            for node in caps.get("import", ()):
+                imports.append(node.text.decode("utf-8", "replace"))
+    return raw, imports
+
+
+# --- regex fallback ----------------------------------------------------------------
+
+_compiled_patterns: Dict[str, Tuple[List[Tuple[str, re.Pattern]], List[re.Pattern]]] = {}
+
+
+def _patterns(plugin: LanguagePlugin):
+    compiled = _compiled_patterns.get(plugin.name)
+    if compiled is None:
+        compiled = _compiled_patterns[plugin.name] = (
+            [(kind, re.compile(p)) for kind, p in plugin.symbol_patterns],
+            [re.compile(p) for p in plugin.import_patterns],
+        )
+    return compiled
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip())
+
+
+def _block_end(lines: List[str], i: int, style: str) -> int:
+    """0-based index of the last line of the block opened at line `i`."""
+    if style == "brace":
+        depth, opened = 0, False
+        for j in range(i, len(lines)):
+            line = lines[j]
+            depth += line.count("{") - line.count("}")
+            opened = opened or "{" in line
+            if opened and depth <= 0:
+                return j
+            if not opened and j > i and line.rstrip().endswith(";"):
+                return j  # declaration without a body
+        return len(lines) - 1
+    base = _indent(lines[i])
+    last = i
+    for j in range(i + 1, len(lines)):
+        stripped = lines[j].strip()
+        if not stripped:
+            continue
+        if _indent(lines[j]) <= base:
+            return j if style == "end" and stripped.startswith(("end", "}")) else last
+        last = j
+    return last
+
+
+def _regex_symbols(plugin: LanguagePlugin, text: str):
+    symbol_res, import_res = _patterns(plugin)
+    lines = text.splitlines()
+    raw: List[_Raw] = []
+    imports: List[str] = []
+    for i, line in enumerate(lines):
+        for kind, pattern in symbol_res:
+            m = pattern.match(line)
+            if m:
+                end = _block_end(lines, i, plugin.block) + 1
+                raw.append((i + 1, -end, kind, m.group("name"), i + 1, end, m.groupdict().get("owner")))
+                break
+        for pattern in import_res:
+            m = pattern.match(line)
+            if m:
+                imports.append(m.group(1))
+    return raw, imports
+
+
+# --- symbols -----------------------------------------------------------------------
+
+_IMPORT_NOISE = re.compile(r"\s+as\s+\w+$|[\"'`<>;]")
+
+
+def _clean_import(spec: str) -> str:
+    spec = _IMPORT_NOISE.sub("", spec.strip())
+    spec = spec.split("{", 1)[0].rstrip(":.*")  # Rust `a::b::{c, d}` -> a::b, Java `a.b.*` -> a.b
+    return spec.strip()
+
+
+def _nest(raw: List[_Raw]) -> List[Symbol]:
+    """Order by position and qualify nested definitions by their container."""
+    symbols: List[Symbol] = []
+    scopes: List[Tuple[int, str, int | None, bool]] = []  # (end position, qualifier, symbol index, is a type)
+    seen: Dict[str, int] = {}
+    for pos, neg_end, kind, name, start, end, owner in sorted(set(raw)):
+        if "::" in name and kind != "namespace":  # C++ out-of-class definition `A::f`
+            qualifier, name = name.rsplit("::", 1)
+            owner = owner or qualifier.replace("::", ".")
+        while scopes and scopes[-1][0] <= pos:
+            scopes.pop()
+        prefix, parent, in_type = scopes[-1][1:] if scopes else ("", None, False)
+        qual = f"{owner}.{name}" if owner else (f"{prefix}.{name}" if prefix else name)
+        if kind in ("scope", "namespace"):
+            scopes.append((-neg_end, qual, parent, kind == "scope"))
+            continue
+        if qual in seen:  # overloads, `#ifdef` variants: one unit
+            sym = symbols[seen[qual]]
+            sym.end_line = max(sym.end_line, end)
+            continue
+        if kind == "function" and (owner or in_type):
+            kind = "method"
+        seen[qual] = len(symbols)
+        symbols.append(Symbol(name, qual, kind, start, end, parent))
+        if parent is not None:
+            symbols[parent].children.append(len(symbols) - 1)
+        scopes.append((-neg_end, qual, len(symbols) - 1, kind == "class"))
+    # Methods declared outside their type (Go receivers, Rust impls, C++ `A::f`) still belong to it.
+    for sym in symbols:
+        if sym.parent is None and "." in sym.qualname:
+            owner = seen.get(sym.qualname.rsplit(".", 1)[0])
+            if owner is not None and symbols[owner].kind == "class":
+                sym.parent = owner
+    return symbols
+
+
+def extract_symbols(plugin: LanguagePlugin, source: bytes) -> Tuple[List[Symbol], List[str], str]:
+    """(symbols, imports, parser used: "tree-sitter" or "regex")."""
+    grammar = _grammar(plugin) if plugin.grammar else None
+    raw = None
+    if grammar is not None:
+        try:
+            raw, imports = _tree_sitter_symbols(plugin, grammar, source)
+            how = "tree-sitter"
+        except Exception as e:  # binding / query mismatch: the file still gets regex symbols
+            logger.warning("tree-sitter failed for %s (%s); using regex fallback", plugin.name, e)
+    if raw is None:
+        raw, imports = _regex_symbols(plugin, source.decode("utf-8", "replace"))
+        how = "regex"
+    cleaned = [c for c in dict.fromkeys(_clean_import(i) for i in imports) if c]
+    return _nest(raw), cleaned, how
+
+
+from . import languages  # noqa: E402,F401  (registers the built-in plugins)
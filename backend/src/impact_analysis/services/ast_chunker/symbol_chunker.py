@@ -0,0 +1,130 @@
+"""Splitting parsed source files at symbol boundaries.
+
+Used for files larger than one chunk whose symbols are known (see registry):
+instead of blind line windows, each definition that fits `max_tokens` becomes
+one chunk (`symbol` = its qualified name, `kind` = function/class/method). A
+definition that does not fit is split into its nested definitions plus one
+chunk for the lines between them (class header, fields); one without nested
+definitions is cut into overlapping line windows (`Name#0`, `Name#1`, ...).
+Lines outside any top-level definition (imports, module-level statements)
+form "module" chunks.
+
+Given the file's bytes (valid utf-8), a chunk of consecutive whole lines keeps
+a memoryview slice of them as its content instead of a new string.
+"""
+from __future__ import annotations
+from collections import deque
+from itertools import accumulate
+from pathlib import PurePosixPath
+from typing import Deque, Iterator, List, Sequence, Tuple
+
+from ...models.chunk import Chunk
+from ...utils.token_utils import estimate_tokens
+from .generic_chunker import ChunkPolicy
+from .registry import Symbol
+
+__all__ = ["chunk_symbols"]
+
+_CHARS_PER_TOKEN = 4
+
+Line = Tuple[int, str]  # (1-based line number, text with newline)
+
+
+def _line_windows(lines: Sequence[Line], max_tokens: int, overlap_tokens: int) -> Iterator[Tuple[int, int, str]]:
+    """Overlapping windows of whole lines, as in generic_chunker.iter_windows."""
+    budget = max_tokens * _CHARS_PER_TOKEN
+    window: Deque[Tuple[int, str, int]] = deque()
+    total = 0
+
+    def emit() -> Tuple[int, int, str]:
+        return window[0][0], window[-1][0], "".join(text for _n, text, _t in window)
+
+    for number, text in lines:
+        if len(text) > budget:
+            if window:
+                yield emit()
+                window.clear()
+                total = 0
+            step = max(1, budget - overlap_tokens * _CHARS_PER_TOKEN)
+            for i in range(0, len(text), step):
+                yield number, number, text[i:i + budget]
+                if i + budget >= len(text):
+                    break
+            continue
+        tokens = estimate_tokens(text)
+        if window and total + tokens > max_tokens:
+            yield emit()
+            while window and (total > overlap_tokens or total + tokens > max_tokens):
+                total -= window.popleft()[2]
+        window.append((number, text, tokens))
+        total += tokens
+    if window:
+        yield emit()
+
+
+def chunk_symbols(
+    rel_path: str,
+    language: str,
+    text: str,
+    symbols: List[Symbol],
+    policy: ChunkPolicy,
+    source: bytes | None = None,
+) -> Iterator[Chunk]:
+    """Chunks of one file, cut along its symbols; at most `policy.max_windows`.
+
+    `source`, if given, must be the utf-8 encoding of `text`.
+    """
+    lines = text.splitlines(keepends=True)
+    stem = PurePosixPath(rel_path).stem
+    out: List[Chunk] = []
+    chars = bounds = None  # offsets of each line start, in `text` and in `source`
+    if source is not None:
+        chars = list(accumulate(map(len, lines), initial=0))
+        bounds = chars if source.isascii() else list(accumulate((len(t.encode()) for t in lines), initial=0))
+        view = memoryview(source)
+
+    def add(symbol: str, kind: str, start: int, end: int, content: str) -> None:
+        if content.strip() and len(out) < policy.max_windows:
+            data: str | memoryview = content
+            # As long as all of lines start..end: exactly those lines, contiguous in `source`.
+            if chars is not None and end <= len(lines) and len(content) == chars[end] - chars[start - 1]:
+                data = view[bounds[start - 1]:bounds[end]]
+            out.append(Chunk(rel_path, language, symbol, kind, data, start_line=start, end_line=end))
+
+    def gaps(start: int, end: int, nested: List[int]) -> List[Line]:
+        """Lines start..end (1-based, inclusive) not covered by the nested symbols."""
+        covered = set()
+        for i in nested:
+            covered.update(range(symbols[i].start_line, symbols[i].end_line + 1))
+        return [(n, lines[n - 1]) for n in range(start, min(end, len(lines)) + 1) if n not in covered]
+
+    def windows(symbol: str, kind: str, part: List[Line]) -> None:
+        content = "".join(t for _n, t in part)
+        if not content.strip():
+            return
+        if estimate_tokens(content) <= policy.max_tokens:
+            add(symbol, kind, part[0][0], part[-1][0], content)
+            return
+        for n, (start, end, chunk) in enumerate(_line_windows(part, policy.max_tokens, policy.overlap_tokens)):
+            add(f"{symbol}#{n}", kind, start, end, chunk)
+
+    def emit(i: int) -> None:
+        sym = symbols[i]
+        body = lines[sym.start_line - 1:sym.end_line]
+        content = "".join(body)
+        if estimate_tokens(content) <= policy.max_tokens:
+            add(sym.qualname, sym.kind, sym.start_line, sym.end_line, content)
+            return
+        if not sym.children:
+            windows(sym.qualname, sym.kind, [(sym.start_line + k, t) for k, t in enumerate(body)])
+            return
+        windows(sym.qualname, sym.kind, gaps(sym.start_line, sym.end_line, sym.children))
+        for child in sym.children:
+            emit(child)
+
+    nested = {c for s in symbols for c in s.children}
+    top = [i for i in range(len(symbols)) if i not in nested]
+    windows(stem, "module", gaps(1, len(lines), top))
+    for i in top:
+        emit(i)
+    yield from out
@@ -0,0 +1,320 @@
+"""Columnar, memory-mappable spool of parsed chunks under `settings.chunks_dir`.
+
+One directory per repo snapshot holds the chunks exactly as the parser emitted
+them, so re-embedding (model change), rebuilding a collection or re-running the
+graph builder is a sequential read instead of a full clone + re-parse:
+
+    <chunks_dir>/<repo_id>/<snapshot>/
+        meta.json              count, dictionaries for low-cardinality columns
+        chunk_id.npy           S16   chunk id (Chunk.hash())
+        content_hash.npy       u8[n, 32] content dedup key (utils.hashing.stable_file_hash)
+        path.npy, language.npy, kind.npy   int32 dictionary codes
+        start_line.npy, end_line.npy       int32 (0 = unknown)
+        symbol_offsets.npy + symbol.bin    int64 offsets into utf-8 blob
+        content_offsets.npy    int64 offsets into the *uncompressed* content stream
+        content_blocks.npy     int64 offsets of each compressed block in content.bin
+        content.bin            zlib-compressed fixed-size blocks of utf-8 content
+
+Numeric columns are plain .npy files opened with `mmap_mode="r"`; content is
+compressed per block, so a sequential scan decompresses every block once and a
+random read decompresses only the blocks it spans. A snapshot directory is
+written under a temp name and renamed into place, so readers never see a
+partial spool.
+"""
+from __future__ import annotations
+import json
+import mmap
+import os
+import re
+import shutil
+import zlib
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+from ..config import settings
+from ..models.chunk import Chunk
+from ..utils.concurrency import check_cancelled
+from ..utils.hashing import stable_file_hash
+from .repo_cloner import check_repo_id
+
+__all__ = [
+    "SpoolRecord", "SpoolBatch", "ChunkSpoolWriter", "ChunkSpool", "check_snapshot", "write_spool", "latest_snapshot",
+]
+
+_FORMAT_VERSION = 2  # 1: content_hash was a plain sha256 of the content, not the dedup key
+_BLOCK_BYTES = 1 << 20  # uncompressed bytes per compressed content block
+_SNAPSHOT = re.compile(r"^[A-Za-z0-9_-]{1,128}$")  # commit shas and "wt-<digest>"
+
+
+class SpoolRecord(NamedTuple):
+    chunk_id: str
+    path: str
+    language: str
+    symbol: str
+    kind: str
+    start_line: int
+    end_line: int
+    content: str
+    summary: Optional[str] = None
+    content_hash: str = ""  # same as Chunk.content_hash
+
+    def hash(self) -> str:
+        # Same contract as Chunk.hash(): stores key points/nodes by it.
+        return self.chunk_id
+
+
+class SpoolBatch(NamedTuple):
+    """A slice of the spool as columns; string columns are already decoded."""
+    chunk_id: List[str]
+    path: List[str]
+    language: List[str]
+    symbol: List[str]
+    kind: List[str]
+    start_line: "object"  # np.ndarray view into the mmap
+    end_line: "object"
+    content: List[str]
+    content_hash: List[str]
+
+    def records(self) -> Iterator[SpoolRecord]:
+        for i in range(len(self.chunk_id)):
+            yield SpoolRecord(
+                self.chunk_id[i], self.path[i], self.language[i], self.symbol[i], self.kind[i],
+                int(self.start_line[i]), int(self.end_line[i]), self.content[i], content_hash=self.content_hash[i],
+            )
+
+
+def check_snapshot(snapshot: str) -> str:
+    """`snapshot` itself if it is safe as a folder name; ValueError otherwise."""
+    if not _SNAPSHOT.match(snapshot):
+        raise ValueError(f"Invalid snapshot {snapshot!r}: use letters, digits, '_' and '-'")
+    return snapshot
+
+
+def _snapshot_dir(repo_id: str, snapshot: str) -> Path:
+    return Path(settings.chunks_dir) / check_repo_id(repo_id) / check_snapshot(snapshot)
+
+
+def latest_snapshot(repo_id: str) -> str | None:
+    p = Path(settings.chunks_dir) / check_repo_id(repo_id) / "LATEST"
+    return p.read_text().strip() if p.exists() else None
+
+
+class ChunkSpoolWriter:
+    def __init__(self, repo_id: str, snapshot: str):
+        self.repo_id = repo_id
+        self.snapshot = snapshot
+        self.final_dir = _snapshot_dir(repo_id, snapshot)
+        self.tmp_dir = self.final_dir.with_name(f".{snapshot}.tmp-{os.getpid()}")
+        if self.tmp_dir.exists():
+            shutil.rmtree(self.tmp_dir)
+        self.tmp_dir.mkdir(parents=True)
+        self._dicts: dict[str, dict[str, int]] = {"path": {}, "language": {}, "kind": {}}
+        self._codes: dict[str, list[int]] = {"path": [], "language": [], "kind": []}
+        self._chunk_ids: list[bytes] = []
+        self._content_hashes: list[bytes] = []
+        self._start: list[int] = []
+        self._end: list[int] = []
+        self._symbol_offsets = [0]
+        self._symbols = open(self.tmp_dir / "symbol.bin", "wb")
+        self._content = open(self.tmp_dir / "content.bin", "wb")
+        self._content_offsets = [0]
+        self._block_offsets = [0]
+        self._pending = bytearray()
+
+    def _code(self, column: str, value: str) -> int:
+        d = self._dicts[column]
+        code = d.get(value)
+        if code is None:
+            code = d[value] = len(d)
+        return code
+
+    def _flush_blocks(self, final: bool = False) -> None:
+        while len(self._pending) >= _BLOCK_BYTES or (final and self._pending):
+            block = bytes(self._pending[:_BLOCK_BYTES])
+            del self._pending[:_BLOCK_BYTES]
+            self._content.write(zlib.compress(block, 6))
+            self._block_offsets.append(self._content.tell())
+
+    def add(self, chunk) -> None:
+        """Append one chunk (Chunk, SpoolRecord or anything with the same fields)."""
+        if isinstance(chunk, Chunk):
+            content = chunk.content_bytes
+        else:
+            content = chunk.content.encode("utf-8", errors="replace")
+        symbol = chunk.symbol.encode("utf-8", errors="replace")
+        self._chunk_ids.append(chunk.hash().encode("ascii"))
+        self._content_hashes.append(bytes.fromhex(getattr(chunk, "content_hash", "") or stable_file_hash(content)))
+        self._codes["path"].append(self._code("path", chunk.path))
+        self._codes["language"].append(self._code("language", chunk.language))
+        self._codes["kind"].append(self._code("kind", chunk.kind))
+        self._start.append(chunk.start_line or 0)
+        self._end.append(chunk.end_line or 0)
+        self._symbols.write(symbol)
+        self._symbol_offsets.append(self._symbol_offsets[-1] + len(symbol))
+        self._pending += content
+        self._content_offsets.append(self._content_offsets[-1] + len(content))
+        self._flush_blocks()
+
+    def add_many(self, chunks: Iterable) -> None:
+        for c in chunks:
+            self.add(c)
+
+    def close(self) -> Path:
+        import numpy as np
+        self._flush_blocks(final=True)
+        self._symbols.close()
+        self._content.close()
+        n = len(self._chunk_ids)
+        d = self.tmp_dir
+        np.save(d / "chunk_id.npy", np.array(self._chunk_ids, dtype="S16"))
+        np.save(d / "content_hash.npy", np.frombuffer(b"".join(self._content_hashes), dtype=np.uint8).reshape(n, 32))
+        for column, codes in self._codes.items():
+            np.save(d / f"{column}.npy", np.array(codes, dtype=np.int32))
+        np.save(d / "start_line.npy", np.array(self._start, dtype=np.int32))
+        np.save(d / "end_line.npy", np.array(self._end, dtype=np.int32))
+        np.save(d / "symbol_offsets.npy", np.array(self._symbol_offsets, dtype=np.int64))
+        np.save(d / "content_offsets.npy", np.array(self._content_offsets, dtype=np.int64))
+        np.save(d / "content_blocks.npy", np.array(self._block_offsets, dtype=np.int64))
+        meta = {
+            "version": _FORMAT_VERSION,
+            "repo_id": self.repo_id,
+            "snapshot": self.snapshot,
+            "count": n,
+            "block_bytes": _BLOCK_BYTES,
+            "codec": "zlib",
+            "dictionaries": {col: list(vals) for col, vals in self._dicts.items()},
+        }
+        (d / "meta.json").write_text(json.dumps(meta))
+        if self.final_dir.exists():
+            shutil.rmtree(self.final_dir)
+        os.replace(d, self.final_dir)
+        latest = self.final_dir.parent / "LATEST"
+        latest.with_suffix(".tmp").write_text(self.snapshot)
+        os.replace(latest.with_suffix(".tmp"), latest)
+        self._prune(settings.gc_keep_snapshots)
+        return self.final_dir
+
+    def _prune(self, keep: int) -> None:
+        """Keep the newest `keep` snapshots of the repo (same retention as GC manifests)."""
+        snaps = [p for p in self.final_dir.parent.iterdir() if p.is_dir() and not p.name.startswith(".")]
+        snaps.sort(key=lambda p: p.stat().st_mtime, reverse=True)
+        for old in snaps[max(1, keep):]:
+            if old != self.final_dir:
+                shutil.rmtree(old, ignore_errors=True)
+
+    def abort(self) -> None:
+        self._symbols.close()
+        self._content.close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def write_spool(repo_id: str, snapshot: str, chunks: Iterable) -> Path:
+    writer = ChunkSpoolWriter(repo_id, snapshot)
+    try:
+        for c in chunks:
+            check_cancelled()
+            writer.add(c)
+        return writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+
+
+class ChunkSpool:
+    """Read side of a spool snapshot. Columns are memory-mapped, not loaded."""
+
+    def __init__(self, directory: Path):
+        import numpy as np
+        self.dir = directory
+        self.meta = json.loads((directory / "meta.json").read_text())
+        if self.meta["version"] not in (1, _FORMAT_VERSION):
+            raise ValueError(f"Unsupported chunk spool version {self.meta['version']} in {directory}")
+        load = lambda name: np.load(directory / f"{name}.npy", mmap_mode="r")  # noqa: E731
+        self.chunk_id = load("chunk_id")
+        self.content_hash = load("content_hash")
+        self.path_codes = load("path")
+        self.language_codes = load("language")
+        self.kind_codes = load("kind")
+        self.start_line = load("start_line")
+        self.end_line = load("end_line")
+        self._symbol_offsets = load("symbol_offsets")
+        self._content_offsets = load("content_offsets")
+        self._block_offsets = load("content_blocks")
+        self._block_bytes = self.meta["block_bytes"]
+        self._dicts = self.meta["dictionaries"]
+        self._symbol_blob = self._map(directory / "symbol.bin")
+        self._content_blob = self._map(directory / "content.bin")
+
+    @staticmethod
+    def _map(path: Path):
+        if path.stat().st_size == 0:
+            return b""
+        with open(path, "rb") as fh:
+            return mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    @classmethod
+    def open(cls, repo_id: str, snapshot: str | None = None) -> "ChunkSpool":
+        snapshot = snapshot or latest_snapshot(repo_id)
+        if snapshot is None:
+            raise FileNotFoundError(f"No chunk spool for repo {repo_id}")
+        directory = _snapshot_dir(repo_id, snapshot)
+        if not (directory / "meta.json").exists():
+            raise FileNotFoundError(f"No chunk spool for repo {repo_id} at {snapshot}")
+        return cls(directory)
+
+    def __len__(self) -> int:
+        return self.meta["count"]
+
+    def _symbols(self, lo: int, hi: int) -> List[str]:
+        offs = self._symbol_offsets[lo:hi + 1]
+        blob = self._symbol_blob
+        return [bytes(blob[offs[i]:offs[i + 1]]).decode("utf-8") for i in range(hi - lo)]
+
+    def _content_range(self, lo: int, hi: int) -> bytes:
+        """Uncompressed content bytes of chunks [lo, hi)."""
+        start, end = int(self._content_offsets[lo]), int(self._content_offsets[hi])
+        if start == end:
+            return b""
+        first, last = start // self._block_bytes, (end - 1) // self._block_bytes
+        out = bytearray()
+        for b in range(first, last + 1):
+            out += zlib.decompress(self._content_blob[self._block_offsets[b]:self._block_offsets[b + 1]])
+        base = first * self._block_bytes
+        return bytes(out[start - base:end - base])
+
+    def batch(self, lo: int, hi: int) -> SpoolBatch:
+        """Chunks [lo, hi) as columns; decodes only the content blocks they span."""
+        paths, langs, kinds = self._dicts["path"], self._dicts["language"], self._dicts["kind"]
+        raw = self._content_range(lo, hi)
+        offs = self._content_offsets[lo:hi + 1] - self._content_offsets[lo]
+        content = [raw[offs[i]:offs[i + 1]].decode("utf-8") for i in range(hi - lo)]
+        if self.meta["version"] == 1:
+            content_hash = [stable_file_hash(c) for c in content]
+        else:
+            content_hash = [h.tobytes().hex() for h in self.content_hash[lo:hi]]
+        return SpoolBatch(
+            chunk_id=[c.decode("ascii") for c in self.chunk_id[lo:hi]],
+            path=[paths[c] for c in self.path_codes[lo:hi]],
+            language=[langs[c] for c in self.language_codes[lo:hi]],
+            symbol=self._symbols(lo, hi),
+            kind=[kinds[c] for c in self.kind_codes[lo:hi]],
+            start_line=self.start_line[lo:hi],
+            end_line=self.end_line[lo:hi],
+            content=content,
+            content_hash=content_hash,
+        )
+
+    def iter_batches(self, batch_size: int | None = None) -> Iterator[SpoolBatch]:
+        """Sequential scan in column batches."""
+        batch_size = batch_size or settings.batch_size
+        n = len(self)
+        for lo in range(0, n, batch_size):
+            check_cancelled()
+            yield self.batch(lo, min(n, lo + batch_size))
+
+    def iter_records(self, batch_size: int | None = None) -> Iterator[SpoolRecord]:
+        for batch in self.iter_batches(batch_size):
+            yield from batch.records()
+
+    def record(self, index: int) -> SpoolRecord:
+        return next(self.batch(index, index + 1).records())
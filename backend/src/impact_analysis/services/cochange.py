@@ -0,0 +1,333 @@
+"""Git co-change coupling: which files historically change together.
+
+`git log` of a repo is mined once into a sparse, symmetric file x file matrix
+(CSR arrays: indptr / indices / data) of time-decayed co-change weights, plus
+each file's own decayed change weight. Weights are kept relative to the newest
+processed commit, so an incremental update from the last processed commit just
+rescales the existing matrix by the elapsed decay and adds the new commits.
+
+Stored per repo at `<cache_dir>/cochange/<repo_id>.npz`; queries never touch git.
+"""
+from __future__ import annotations
+import json
+import logging
+import math
+import os
+import subprocess
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator, List
+
+from ..config import settings
+from ..utils.concurrency import check_cancelled, run_io
+from .repo_cloner import check_repo_id
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["CoChangeIndex", "CoChangeStore", "mine_history", "get_cochange_store", "refresh_cochange"]
+
+_COMMIT_MARK = "\x1e"
+_DAY_S = 86400.0
+
+
+def _git(repo_path: Path, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        ["git", "-C", str(repo_path), *args], capture_output=True, text=True, check=False
+    )
+
+
+def mine_history(
+    repo_path: Path, since: str | None = None, max_commits: int | None = None
+) -> Iterator[tuple[int, List[str]]]:
+    """Yield (commit_time, changed_paths) for non-merge commits in since..HEAD, newest first."""
+    rev = f"{since}..HEAD" if since else "HEAD"
+    cmd = [
+        "git", "-C", str(repo_path), "-c", "core.quotepath=off", "log", rev,
+        "--no-merges", "--no-renames", "--name-only", f"--format={_COMMIT_MARK}%ct",
+    ]
+    if max_commits:
+        cmd.append(f"--max-count={max_commits}")
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True, encoding="utf-8", errors="replace")
+    ts: int | None = None
+    paths: List[str] = []
+    try:
+        for line in proc.stdout:  # type: ignore[union-attr]
+            line = line.rstrip("\n")
+            if line.startswith(_COMMIT_MARK):
+                if ts is not None:
+                    yield ts, paths
+                check_cancelled()
+                ts, paths = int(line[1:]), []
+            elif line:
+                paths.append(line)
+        if ts is not None:
+            yield ts, paths
+    finally:
+        proc.stdout.close()  # type: ignore[union-attr]
+        proc.wait()
+
+
+@dataclass
+class CoChangeIndex:
+    files: List[str]
+    indptr: np.ndarray  # int64, len(files) + 1
+    indices: np.ndarray  # int32 column ids, sorted within each row
+    data: np.ndarray  # float32 decayed co-change weight
+    file_weight: np.ndarray  # float32 decayed change weight per file
+    last_commit: str | None
+    ref_time: int  # commit time the weights are decayed to
+    half_life_days: float
+    commits: int
+
+    def __post_init__(self):
+        self._index = {f: i for i, f in enumerate(self.files)}
+
+    @classmethod
+    def empty(cls, half_life_days: float) -> "CoChangeIndex":
+        import numpy as np
+        return cls([], np.zeros(1, np.int64), np.zeros(0, np.int32), np.zeros(0, np.float32),
+                   np.zeros(0, np.float32), None, 0, half_life_days, 0)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._index
+
+    def neighbours(self, path: str) -> list[tuple[str, float, float]]:
+        """(other_path, weight, confidence) for files that changed with `path`.
+
+        Confidence is weight / path's own change weight: the decayed fraction of
+        `path`'s commits that also touched `other_path`.
+        """
+        i = self._index.get(path)
+        if i is None:
+            return []
+        lo, hi = self.indptr[i], self.indptr[i + 1]
+        own = float(self.file_weight[i]) or 1.0
+        return [
+            (self.files[j], float(w), min(1.0, float(w) / own))
+            for j, w in zip(self.indices[lo:hi].tolist(), self.data[lo:hi].tolist())
+        ]
+
+    def impacted(self, paths: Iterable[str], limit: int = 20, min_confidence: float = 0.0) -> list[dict]:
+        """Files likely to change alongside `paths`, best first.
+
+        Per-source confidences are combined noisy-or style, so a file coupled to
+        several of the changed files ranks above one coupled to a single file.
+        """
+        paths = list(dict.fromkeys(paths))
+        changed = set(paths)
+        miss: dict[str, float] = defaultdict(lambda: 1.0)
+        weight: dict[str, float] = defaultdict(float)
+        via: dict[str, list[str]] = defaultdict(list)
+        for src in paths:
+            for other, w, conf in self.neighbours(src):
+                if other in changed or conf < min_confidence:
+                    continue
+                miss[other] *= 1.0 - conf
+                weight[other] += w
+                via[other].append(src)
+        ranked = sorted(miss, key=lambda p: (miss[p], -weight[p]))[:limit]
+        return [
+            {"path": p, "score": round(1.0 - miss[p], 4), "weight": round(weight[p], 4), "via": via[p]}
+            for p in ranked
+        ]
+
+    def edges_among(self, paths: Iterable[str], min_weight: float = 0.0) -> list[dict]:
+        """Undirected "changes-with" edges between the given files (each pair once)."""
+        present = {p for p in paths if p in self._index}
+        edges = []
+        for src in sorted(present):
+            for other, w, conf in self.neighbours(src):
+                if other in present and src < other and w >= min_weight:
+                    edges.append({
+                        "source": src, "target": other, "label": "changes-with",
+                        "weight": round(w, 4), "confidence": round(conf, 4),
+                    })
+        return edges
+
+    # --- persistence -------------------------------------------------------
+
+    def save(self, path: Path) -> None:
+        import numpy as np
+        path.parent.mkdir(parents=True, exist_ok=True)
+        meta = {
+            "last_commit": self.last_commit, "ref_time": self.ref_time,
+            "half_life_days": self.half_life_days, "commits": self.commits,
+        }
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez(
+            tmp, files=np.array(self.files, dtype=str), indptr=self.indptr, indices=self.indices,
+            data=self.data, file_weight=self.file_weight, meta=np.array(json.dumps(meta)),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "CoChangeIndex":
+        import numpy as np
+        with np.load(path) as z:
+            meta = json.loads(str(z["meta"]))
+            return cls(
+                z["files"].tolist(), z["indptr"], z["indices"], z["data"], z["file_weight"],
+                meta["last_commit"], meta["ref_time"], meta["half_life_days"], meta["commits"],
+            )
+
+    # --- building ------------------------------------------------------------
+
+    def merged(
+        self,
+        history: Iterable[tuple[int, List[str]]],
+        head: str,
+        max_files_per_commit: int,
+        min_weight: float,
+    ) -> "CoChangeIndex":
+        """A new index with `history` (newer commits) folded into this one."""
+        import numpy as np
+        files = list(self.files)
+        index = dict(self._index)
+        rows: list = []
+        cols: list = []
+        vals: list = []
+        touched: list = []
+        touched_w: list = []
+        commits = list(history)
+        ref_time = max([self.ref_time] + [ts for ts, _ in commits])
+        decay_per_s = math.log(2) / (self.half_life_days * _DAY_S)
+        for ts, paths in commits:
+            ids = []
+            for p in dict.fromkeys(paths):
+                if p not in index:
+                    index[p] = len(files)
+                    files.append(p)
+                ids.append(index[p])
+            w = math.exp(-decay_per_s * (ref_time - ts))
+            touched.extend(ids)
+            touched_w.extend([w] * len(ids))
+            # Bulk commits (reformatting, vendoring, license headers) couple
+            # everything with everything and drown the real signal.
+            if not 2 <= len(ids) <= max_files_per_commit:
+                continue
+            arr = np.asarray(ids, np.int64)
+            iu, ju = np.triu_indices(len(arr), 1)
+            rows.append(arr[iu])
+            cols.append(arr[ju])
+            vals.append(np.full(len(iu), w, np.float64))
+
+        n = len(files)
+        scale = math.exp(-decay_per_s * (ref_time - self.ref_time)) if self.commits else 1.0
+        old_rows = np.repeat(np.arange(len(self.files), dtype=np.int64), np.diff(self.indptr))
+        if rows:
+            r, c, v = np.concatenate(rows), np.concatenate(cols), np.concatenate(vals)
+            new_rows, new_cols, new_vals = np.concatenate([r, c]), np.concatenate([c, r]), np.concatenate([v, v])
+        else:
+            new_rows = new_cols = np.zeros(0, np.int64)
+            new_vals = np.zeros(0, np.float64)
+        all_rows = np.concatenate([old_rows, new_rows])
+        all_cols = np.concatenate([self.indices.astype(np.int64), new_cols])
+        all_vals = np.concatenate([self.data.astype(np.float64) * scale, new_vals])
+        keys, inverse = np.unique(all_rows * n + all_cols, return_inverse=True)
+        summed = np.bincount(inverse, weights=all_vals, minlength=len(keys))
+        keep = summed >= min_weight
+        keys, summed = keys[keep], summed[keep]
+        out_rows = keys // max(n, 1)
+        indptr = np.zeros(n + 1, np.int64)
+        np.cumsum(np.bincount(out_rows, minlength=n), out=indptr[1:])
+
+        file_weight = np.zeros(n, np.float64)
+        file_weight[: len(self.files)] = self.file_weight * scale
+        if touched:
+            np.add.at(file_weight, np.asarray(touched, np.int64), np.asarray(touched_w))
+        return CoChangeIndex(
+            files, indptr, (keys % max(n, 1)).astype(np.int32), summed.astype(np.float32),
+            file_weight.astype(np.float32), head, ref_time, self.half_life_days, self.commits + len(commits),
+        )
+
+
+class CoChangeStore:
+    """Loads, caches and incrementally refreshes per-repo co-change indexes."""
+
+    def __init__(self, root: Path, cache_size: int = 32):
+        self.root = root
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, tuple[float, CoChangeIndex]]" = OrderedDict()
+        self._locks: dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+
+    def path_for(self, repo_id: str) -> Path:
+        return self.root / f"{check_repo_id(repo_id)}.npz"
+
+    def get(self, repo_id: str) -> CoChangeIndex | None:
+        """The stored index for a repo, or None if it was never mined."""
+        p = self.path_for(repo_id)
+        try:
+            mtime = p.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        with self._guard:
+            hit = self._cache.get(repo_id)
+            if hit and hit[0] == mtime:
+                self._cache.move_to_end(repo_id)
+                return hit[1]
+        idx = CoChangeIndex.load(p)
+        with self._guard:
+            self._cache[repo_id] = (mtime, idx)
+            self._cache.move_to_end(repo_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return idx
+
+    def update(self, repo_id: str, repo_path: Path) -> CoChangeIndex | None:
+        """Fold commits since the last processed one into the index (full mine on first run).
+
+        Falls back to a rebuild when the last processed commit is no longer an
+        ancestor of HEAD (force-push, re-clone of a rewritten history).
+        """
+        with self._guard:
+            lock = self._locks[repo_id]
+        with lock:
+            res = _git(repo_path, "rev-parse", "HEAD")
+            if res.returncode != 0:
+                return None  # not a git checkout
+            head = res.stdout.strip()
+            current = self.get(repo_id)
+            if current is not None and current.last_commit == head:
+                return current
+            if current is not None and current.half_life_days == settings.cochange_half_life_days and (
+                current.last_commit
+                and _git(repo_path, "merge-base", "--is-ancestor", current.last_commit, head).returncode == 0
+            ):
+                base, since = current, current.last_commit
+            else:
+                base, since = CoChangeIndex.empty(settings.cochange_half_life_days), None
+            t0 = time.monotonic()
+            history = mine_history(repo_path, since, settings.cochange_max_commits if since is None else None)
+            idx = base.merged(history, head, settings.cochange_max_files_per_commit, settings.cochange_min_weight)
+            idx.save(self.path_for(repo_id))
+            logger.info(
+                "cochange %s: +%d commits (%s), %d files, %d pairs in %.2fs",
+                repo_id, idx.commits - base.commits, "incremental" if since else "full",
+                len(idx.files), len(idx.data) // 2, time.monotonic() - t0,
+            )
+            return self.get(repo_id)
+
+
+_store: CoChangeStore | None = None
+
+
+def get_cochange_store() -> CoChangeStore:
+    global _store
+    if _store is None:
+        _store = CoChangeStore(Path(settings.cache_dir) / "cochange")
+    return _store
+
+
+async def refresh_cochange(repo_id: str, repo_path: Path) -> None:
+    """Background-task entry point: update the index, log instead of raising."""
+    try:
+        await run_io(get_cochange_store().update, repo_id, repo_path)
+    except Exception:
+        logger.exception("cochange update failed for repo %s", repo_id)
@@ -0,0 +1,126 @@
+"""Unified diff parsing (output of `git diff` / `git format-patch`)."""
+from __future__ import annotations
+import re
+from dataclasses import dataclass, field
+from typing import List
+
+__all__ = ["FileDiff", "parse_unified_diff"]
+
+_DIFF_GIT = re.compile(r"^diff --git a/(.+?) b/(.+)$")
+_HUNK = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+@dataclass
+class FileDiff:
+    old_path: str | None
+    new_path: str | None
+    added: int = 0
+    removed: int = 0
+    # (old_start, old_len, new_start, new_len) per hunk
+    hunks: List[tuple[int, int, int, int]] = field(default_factory=list)
+    # Pre-change lines actually touched (removed, or where lines were inserted), as inclusive ranges
+    old_changed: List[tuple[int, int]] = field(default_factory=list)
+
+    def _touch_old(self, line: int) -> None:
+        if self.old_changed and self.old_changed[-1][1] >= line - 1:
+            start, end = self.old_changed[-1]
+            self.old_changed[-1] = (start, max(end, line))
+        else:
+            self.old_changed.append((line, line))
+
+    @property
+    def path(self) -> str:
+        return self.new_path or self.old_path or ""
+
+    @property
+    def status(self) -> str:
+        if self.old_path is None:
+            return "added"
+        if self.new_path is None:
+            return "deleted"
+        if self.old_path != self.new_path:
+            return "renamed"
+        return "modified"
+
+    def to_dict(self) -> dict:
+        return {
+            "path": self.path,
+            "old_path": self.old_path,
+            "status": self.status,
+            "added": self.added,
+            "removed": self.removed,
+            "hunks": [list(h) for h in self.hunks],
+        }
+
+
+def _strip_prefix(raw: str) -> str | None:
+    raw = raw.split("\t", 1)[0].strip()
+    if raw == "/dev/null":
+        return None
+    if raw.startswith(("a/", "b/")):
+        return raw[2:]
+    return raw
+
+
+def parse_unified_diff(text: str) -> List[FileDiff]:
+    """Split a unified diff into per-file entries with hunk ranges and line counts.
+
+    Hunk bodies are consumed by their declared lengths, so removed lines that
+    happen to start with `--- ` are not mistaken for file headers.
+    """
+    files: List[FileDiff] = []
+    cur: FileDiff | None = None
+    git_header = False  # inside a `diff --git` header, before its `+++` line
+    old_left = new_left = 0
+    old_no = 0  # pre-change line number of the next hunk line
+    for line in text.splitlines():
+        if cur is not None and (old_left > 0 or new_left > 0):
+            if line.startswith("+"):
+                cur.added += 1
+                new_left -= 1
+                cur._touch_old(max(old_no - 1, 1))  # inserted after the previous old line
+            elif line.startswith("-"):
+                cur.removed += 1
+                old_left -= 1
+                cur._touch_old(old_no)
+                old_no += 1
+            elif not line.startswith("\\"):  # "\ No newline at end of file"
+                old_left -= 1
+                new_left -= 1
+                old_no += 1
+            continue
+        m = _DIFF_GIT.match(line)
+        if m:
+            cur = FileDiff(m.group(1), m.group(2))
+            files.append(cur)
+            git_header = True
+        elif line.startswith("--- "):
+            old = _strip_prefix(line[4:])
+            if git_header and cur is not None:
+                cur.old_path = old
+            else:
+                # Plain `diff -u` output has no `diff --git` header.
+                cur = FileDiff(old, old)
+                files.append(cur)
+        elif line.startswith("+++ ") and cur is not None:
+            cur.new_path = _strip_prefix(line[4:])
+            git_header = False
+        elif cur is None:
+            continue
+        elif line.startswith("rename from "):
+            cur.old_path = line[len("rename from "):]
+        elif line.startswith("rename to "):
+            cur.new_path = line[len("rename to "):]
+        elif line.startswith("new file mode"):
+            cur.old_path = None
+        elif line.startswith("deleted file mode"):
+            cur.new_path = None
+        elif line.startswith("@@"):
+            h = _HUNK.match(line)
+            if h:
+                hunk = (int(h.group(1)), int(h.group(2) or 1), int(h.group(3)), int(h.group(4) or 1))
+                cur.hunks.append(hunk)
+                old_left, new_left = hunk[1], hunk[3]
+                old_no = hunk[0] if hunk[1] else hunk[0] + 1
+                git_header = False
+    return files
@@ -0,0 +1,153 @@
+"""Local content-addressed embedding cache with a compact on-disk layout.
+
+Vectors are stored in append-only segment files under `settings.cache_dir`:
+
+    embeddings/<model>-<dim>-<codec>/keys.bin     16-byte content digests
+    embeddings/<model>-<dim>-<codec>/vectors.bin  one fixed-size row per key
+    embeddings/<model>-<dim>-<codec>/scales.bin   float32 per row (int8 codec only)
+
+Rows are float32 whenever the vector Qdrant stores is used as is: the
+`float` profile, and the quantized profiles with `vector_rescore`, where the
+stored vector is the original that top candidates are rescored against. A
+hit must then return exactly the vector a miss would, or the same content
+gets different originals depending on cache state. Only a quantized profile
+without rescoring caches symmetric per-vector int8 rows (4x smaller): it is
+lossy, but Qdrant only searches its own quantized copy there.
+Rows are read through `np.memmap`, so a large cache costs page cache, not heap.
+"""
+from __future__ import annotations
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Sequence
+
+from ..config import settings
+
+__all__ = ["EmbeddingCache", "content_key", "get_embedding_cache"]
+
+_KEY_BYTES = 16
+
+
+def content_key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8", errors="replace"), digest_size=_KEY_BYTES).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, root: Path, dim: int, codec: str):
+        if codec not in ("float32", "int8"):
+            raise ValueError(f"Unknown embedding cache codec: {codec}")
+        self.root = root
+        self.dim = dim
+        self.codec = codec
+        self._row_bytes = dim * (4 if codec == "float32" else 1)
+        self._lock = threading.Lock()
+        self._index: Dict[bytes, int] = {}
+        self._vectors = None  # np.memmap over vectors.bin, remapped after appends
+        self._scales = None
+        self._mapped_rows = 0
+        self._load()
+
+    @property
+    def _keys_path(self) -> Path:
+        return self.root / "keys.bin"
+
+    @property
+    def _vectors_path(self) -> Path:
+        return self.root / "vectors.bin"
+
+    @property
+    def _scales_path(self) -> Path:
+        return self.root / "scales.bin"
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def _load(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        if not self._keys_path.exists():
+            return
+        raw = self._keys_path.read_bytes()
+        # A crash mid-append can leave the files with different row counts.
+        rows = min(
+            len(raw) // _KEY_BYTES,
+            self._vectors_path.stat().st_size // self._row_bytes if self._vectors_path.exists() else 0,
+        )
+        if self.codec == "int8":
+            rows = min(rows, self._scales_path.stat().st_size // 4 if self._scales_path.exists() else 0)
+        # Drop any torn tail so later appends stay row-aligned across the files.
+        os.truncate(self._keys_path, rows * _KEY_BYTES)
+        if self._vectors_path.exists():
+            os.truncate(self._vectors_path, rows * self._row_bytes)
+        if self.codec == "int8" and self._scales_path.exists():
+            os.truncate(self._scales_path, rows * 4)
+        for i in range(rows):
+            self._index[raw[i * _KEY_BYTES:(i + 1) * _KEY_BYTES]] = i
+
+    def _remap(self) -> None:
+        import numpy as np
+        rows = len(self._index)
+        if rows == self._mapped_rows:
+            return
+        dtype = np.float32 if self.codec == "float32" else np.int8
+        self._vectors = np.memmap(self._vectors_path, dtype=dtype, mode="r", shape=(rows, self.dim))
+        if self.codec == "int8":
+            self._scales = np.memmap(self._scales_path, dtype=np.float32, mode="r", shape=(rows,))
+        self._mapped_rows = rows
+
+    def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, List[float]]:
+        with self._lock:
+            rows = {k: self._index[k] for k in keys if k in self._index}
+            if not rows:
+                return {}
+            self._remap()
+            out: Dict[bytes, List[float]] = {}
+            for k, i in rows.items():
+                if self.codec == "float32":
+                    out[k] = self._vectors[i].tolist()
+                else:
+                    out[k] = (self._vectors[i].astype("float32") * self._scales[i]).tolist()
+            return out
+
+    def put_many(self, items: Iterable[tuple[bytes, Sequence[float]]]) -> None:
+        import numpy as np
+        with self._lock:
+            new = list({k: v for k, v in items if k not in self._index}.items())
+            if not new:
+                return
+            mat = np.asarray([v for _k, v in new], dtype=np.float32).reshape(len(new), self.dim)
+            if self.codec == "float32":
+                payload, scales = mat.tobytes(), None
+            else:
+                absmax = np.abs(mat).max(axis=1)
+                scale = np.where(absmax > 0, absmax / 127.0, 1.0).astype(np.float32)
+                codes = np.clip(np.rint(mat / scale[:, None]), -127, 127).astype(np.int8)
+                payload, scales = codes.tobytes(), scale.tobytes()
+            # Append vectors before keys so a crash never indexes a missing row.
+            with open(self._vectors_path, "ab") as fh:
+                fh.write(payload)
+            if scales is not None:
+                with open(self._scales_path, "ab") as fh:
+                    fh.write(scales)
+            with open(self._keys_path, "ab") as fh:
+                fh.write(b"".join(k for k, _v in new))
+            base = len(self._index)
+            for offset, (k, _v) in enumerate(new):
+                self._index[k] = base + offset
+
+
+_cache: EmbeddingCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache(dim: int) -> EmbeddingCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                lossy_ok = settings.vector_storage_profile != "float" and not settings.vector_rescore
+                codec = "int8" if lossy_ok else "float32"
+                model = settings.embedding_model.replace(os.sep, "_")
+                root = Path(settings.cache_dir) / "embeddings" / f"{model}-{dim}-{codec}"
+                _cache = EmbeddingCache(root, dim, codec)
+    return _cache
@@ -1,8 +1,10 @@
 from __future__ import annotations
 import os
 import hashlib
-import numpy as np
-from typing import List
+from typing import Dict, List
+from ..config import settings
+from ..utils.singleflight import SingleFlight
+from .embedding_cache import content_key, get_embedding_cache
 
 _EMBED_DIM = 64  # small demo dimension
 
@@ -17,10 +19,33 @@ class SimpleEmbeddingClient:
         # pad / repeat to dimension
         vec = (nums * ((_EMBED_DIM // len(nums)) + 1))[:_EMBED_DIM]
         # normalize
+        import numpy as np
         arr = np.array(vec, dtype=float)
         arr = arr / (arr.max() or 1)
         return arr.tolist()
 
+    def embed_batch(self, texts: List[str]) -> List[List[float]]:
+        cache = get_embedding_cache(_EMBED_DIM) if settings.embedding_cache else None
+        keys = [content_key(t) for t in texts]
+        by_key = dict(zip(keys, texts))
+        found = cache.get_many(keys) if cache else {}
+        missing = [k for k in by_key if k not in found]
+        if missing:
+            # Content another batch is embedding right now is waited for, not redone.
+            found.update(_in_flight.do_many(missing, lambda ks: self._embed_missing(ks, by_key, cache)))
+        return [found[k] for k in keys]
+
+    def _embed_missing(self, keys: List[bytes], texts: Dict[bytes, str], cache) -> Dict[bytes, List[float]]:
+        # Another caller may have stored some of these since our cache read.
+        out = cache.get_many(keys) if cache else {}
+        fresh = {k: self.embed(texts[k]) for k in keys if k not in out}
+        if cache is not None and fresh:
+            cache.put_many(fresh.items())
+        out.update(fresh)
+        return out
+
+_in_flight: SingleFlight[bytes, List[float]] = SingleFlight()
+
 _client: SimpleEmbeddingClient | None = None
 
 def get_embedding_client() -> SimpleEmbeddingClient:
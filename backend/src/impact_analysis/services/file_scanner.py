@@ -0,0 +1,57 @@
+from __future__ import annotations
+import os
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from ..utils.concurrency import check_cancelled
+from ..utils.fingerprint import fast_digest, get_fingerprint_cache
+
+__all__ = ["CODE_EXTENSIONS", "VENDOR_DIRS", "tree_fingerprint", "walk_files", "walk_code_files"]
+
+# Extensions surfaced as graph nodes by the graph endpoints.
+CODE_EXTENSIONS = frozenset({".py", ".ts", ".tsx", ".js", ".jsx", ".go", ".java", ".rb"})
+
+# VCS metadata, virtualenvs, dependency and build output: never the repo's own code.
+VENDOR_DIRS = frozenset({
+    ".git", ".hg", ".svn", "node_modules", ".venv", "venv", "__pycache__", ".tox", ".mypy_cache",
+    ".pytest_cache", "build", "dist", "site-packages",
+})
+
+
+def walk_files(repo_path: Path, skip_dirs: Iterable[str] = ()) -> Iterator[tuple[Path, list[str]]]:
+    """os.walk wrapper yielding (dir, files) with a cancellation point per directory.
+
+    Directories named in `skip_dirs` are pruned, not descended into.
+    """
+    skip = frozenset(skip_dirs)
+    for root, dirs, files in os.walk(repo_path):
+        check_cancelled()
+        if skip:
+            dirs[:] = [d for d in dirs if d not in skip]
+        yield Path(root), files
+
+
+def walk_code_files(repo_path: Path, exts: Iterable[str] = CODE_EXTENSIONS, limit: int | None = None) -> Iterator[Path]:
+    """Yield code files under repo_path (absolute paths), stopping after `limit`."""
+    exts = frozenset(exts)
+    count = 0
+    for root, files in walk_files(repo_path):
+        for f in files:
+            p = root / f
+            if p.suffix in exts:
+                yield p
+                count += 1
+                if limit is not None and count >= limit:
+                    return
+
+
+def tree_fingerprint(repo_path: Path) -> str:
+    """Content key of a tree without a commit: "wt-" + digest of every (path, file digest), vendored dirs skipped.
+
+    File digests come from the stat-validated fingerprint cache, so an
+    unchanged tree costs a walk and one stat per file.
+    """
+    paths = [root / name for root, files in walk_files(repo_path, skip_dirs=VENDOR_DIRS) for name in files]
+    digests = get_fingerprint_cache().fingerprints(paths)
+    listing = "\n".join(sorted(f"{p.relative_to(repo_path).as_posix()}\0{d}" for p, d in digests.items()))
+    return "wt-" + fast_digest(listing)
@@ -0,0 +1,229 @@
+"""Garbage collection of stale chunks (Qdrant points) and Code/File nodes (Neo4j).
+
+Chunk ids are content-derived, so an edited or deleted file leaves its old
+points and nodes behind unless something removes them. Every ingest records a
+snapshot manifest (the chunk ids of that repo snapshot) under
+`<cache_dir>/manifests/<repo_id>/`; GC deletes ids that appear in older,
+not-yet-collected snapshots but not in the current one, then sweeps anything
+of the repo that was not stamped with the current snapshot, including points
+and nodes carrying no snapshot stamp at all (data ingested before manifests
+existed). Deletes run in rate-limited batches.
+"""
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import AsyncIterator, Iterable
+
+from ..config import settings
+from ..utils.batching import batch_fixed
+from ..utils.concurrency import run_io
+from .chunk_spool import check_snapshot
+from .repo_cloner import check_repo_id
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["SnapshotManifests", "GarbageCollector", "GCStats", "get_garbage_collector"]
+
+
+def _valid_repo_id(name: str) -> bool:
+    try:
+        check_repo_id(name)
+    except ValueError:
+        return False
+    return True
+
+
+class SnapshotManifests:
+    """Chunk ids per repo snapshot, stored as one sorted id file per snapshot.
+
+    `index.json` keeps the ordered snapshot list and the last snapshot GC has
+    collected up to, so each old snapshot is diffed against the live one once.
+    """
+
+    def __init__(self, root: Path, keep: int):
+        self.root = root
+        self.keep = max(1, keep)
+
+    def _repo_dir(self, repo_id: str) -> Path:
+        return self.root / check_repo_id(repo_id)
+
+    def _load_index(self, repo_id: str) -> dict:
+        p = self._repo_dir(repo_id) / "index.json"
+        if not p.exists():
+            return {"snapshots": [], "collected": None}
+        return json.loads(p.read_text())
+
+    def _save_index(self, repo_id: str, index: dict) -> None:
+        d = self._repo_dir(repo_id)
+        tmp = d / "index.json.tmp"
+        tmp.write_text(json.dumps(index))
+        os.replace(tmp, d / "index.json")
+
+    def record(self, repo_id: str, snapshot: str, chunk_ids: Iterable[str]) -> None:
+        d = self._repo_dir(repo_id)
+        d.mkdir(parents=True, exist_ok=True)
+        tmp = d / f"{check_snapshot(snapshot)}.ids.tmp"
+        tmp.write_text("\n".join(sorted(set(chunk_ids))))
+        os.replace(tmp, d / f"{snapshot}.ids")
+        index = self._load_index(repo_id)
+        snaps = [s for s in index["snapshots"] if s != snapshot] + [snapshot]
+        index["snapshots"] = snaps
+        self._save_index(repo_id, index)
+
+    def repos(self) -> list[str]:
+        if not self.root.exists():
+            return []
+        names = [p.name for p in self.root.iterdir() if (p / "index.json").exists()]
+        return sorted(n for n in names if _valid_repo_id(n))
+
+    def current(self, repo_id: str) -> str | None:
+        snaps = self._load_index(repo_id)["snapshots"]
+        return snaps[-1] if snaps else None
+
+    def uncollected(self, repo_id: str) -> list[str]:
+        """Snapshots older than the current one that GC has not diffed yet.
+
+        The last collected snapshot was live when GC ran, so it is diffed again
+        once a newer snapshot replaces it; everything before it is done.
+        """
+        index = self._load_index(repo_id)
+        if not index["snapshots"] or index["collected"] == index["snapshots"][-1]:
+            return []
+        snaps = index["snapshots"][:-1]
+        if index["collected"] in snaps:
+            snaps = snaps[snaps.index(index["collected"]):]
+        return snaps
+
+    def chunk_ids(self, repo_id: str, snapshot: str) -> set[str]:
+        p = self._repo_dir(repo_id) / f"{snapshot}.ids"
+        if not p.exists():
+            return set()
+        return {line for line in p.read_text().splitlines() if line}
+
+    def mark_collected(self, repo_id: str, snapshot: str) -> None:
+        index = self._load_index(repo_id)
+        index["collected"] = snapshot
+        # Keep only the newest `keep` manifests; older ones were already collected.
+        dropped = index["snapshots"][:-self.keep]
+        index["snapshots"] = index["snapshots"][-self.keep:]
+        if index["collected"] not in index["snapshots"]:
+            index["collected"] = index["snapshots"][-1] if index["snapshots"] else None
+        self._save_index(repo_id, index)
+        for snap in dropped:
+            (self._repo_dir(repo_id) / f"{snap}.ids").unlink(missing_ok=True)
+
+
+@dataclass
+class GCStats:
+    repo_id: str
+    snapshot: str | None
+    orphaned_chunks: int = 0
+    nodes_deleted: int = 0
+    files_deleted: int = 0
+    duration_s: float = 0.0
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class GarbageCollector:
+    def __init__(self, manifests: SnapshotManifests):
+        self.manifests = manifests
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._users: dict[str, int] = {}  # holders and waiters per lock; idle locks are dropped
+
+    @asynccontextmanager
+    async def repo_lock(self, repo_id: str) -> AsyncIterator[None]:
+        """Held by ingest while writing a snapshot and by GC while collecting it.
+
+        Without it, a sweep for snapshot N could delete points that a concurrent
+        ingest of snapshot N+1 has just written.
+        """
+        lock = self._locks.get(repo_id)
+        if lock is None:
+            lock = self._locks[repo_id] = asyncio.Lock()
+        self._users[repo_id] = self._users.get(repo_id, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._users[repo_id] -= 1
+            if not self._users[repo_id]:
+                del self._locks[repo_id], self._users[repo_id]
+
+    async def record_snapshot(self, repo_id: str, snapshot: str, chunk_ids: Iterable[str]) -> None:
+        await run_io(self.manifests.record, repo_id, snapshot, list(chunk_ids))
+
+    async def collect(self, repo_id: str, *, locked: bool = False) -> GCStats:
+        if not locked:
+            async with self.repo_lock(repo_id):
+                return await self.collect(repo_id, locked=True)
+
+        from .neo4j_client import get_graph_driver
+        from .qdrant_client import get_vector_store
+
+        t0 = time.monotonic()
+        current = await run_io(self.manifests.current, repo_id)
+        stats = GCStats(repo_id=repo_id, snapshot=current)
+        if current is None:
+            return stats
+        store = await get_vector_store()
+        graph = await get_graph_driver()
+        batch, pause = settings.gc_batch_size, settings.gc_batch_pause_s
+
+        def _orphans() -> list[str]:
+            live = self.manifests.chunk_ids(repo_id, current)
+            stale: set[str] = set()
+            for snap in self.manifests.uncollected(repo_id):
+                stale |= self.manifests.chunk_ids(repo_id, snap)
+            return sorted(stale - live)
+
+        orphans = await run_io(_orphans)
+        stats.orphaned_chunks = len(orphans)
+        for ids in batch_fixed(orphans, batch):
+            await store.delete_chunks(repo_id, list(ids))
+            stats.nodes_deleted += await graph.delete_code_nodes(repo_id, list(ids))
+            await asyncio.sleep(pause)
+
+        # Sweep whatever the manifests never saw (pre-manifest data, crashed ingests).
+        await store.delete_stale(repo_id, current)
+        while deleted := await graph.delete_stale_code_nodes(repo_id, current, batch):
+            stats.nodes_deleted += deleted
+            await asyncio.sleep(pause)
+        while deleted := await graph.delete_empty_files(repo_id, batch):
+            stats.files_deleted += deleted
+            await asyncio.sleep(pause)
+
+        await run_io(self.manifests.mark_collected, repo_id, current)
+        stats.duration_s = round(time.monotonic() - t0, 3)
+        logger.info("gc %s", stats.to_dict())
+        return stats
+
+    async def run_periodic(self, interval_s: float) -> None:
+        """Collect every known repo, then sleep; runs until cancelled."""
+        while True:
+            for repo_id in await run_io(self.manifests.repos):
+                try:
+                    await self.collect(repo_id)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("gc failed for repo %s", repo_id)
+            await asyncio.sleep(interval_s)
+
+
+_gc: GarbageCollector | None = None
+
+
+def get_garbage_collector() -> GarbageCollector:
+    global _gc
+    if _gc is None:
+        root = Path(settings.cache_dir) / "manifests"
+        _gc = GarbageCollector(SnapshotManifests(root, settings.gc_keep_snapshots))
+    return _gc
@@ -0,0 +1,418 @@
+"""Static dependency graph of a Python repository, built with the stdlib `ast`.
+
+Nodes are code units: one per module (its top-level statements) and one per
+function, class and method. An edge A -> B means "A depends on B", i.e. a
+change to B can change A's behaviour. Edges come from imports and from the
+names and dotted attribute chains a unit references, resolved through the
+module's own definitions and its import table. References that cannot be
+resolved statically (builtins, locals, dynamic dispatch) are dropped; to stay
+on the safe side instead:
+
+* every unit depends on its module, and methods on their class;
+* referencing a class from outside depends on all of its methods;
+* test modules depend on the `conftest.py` files above them, conftest modules
+  on all their fixtures, and test functions on fixtures named by parameters.
+
+`build_code_graph` adds the units of every other parsed language to the same
+graph (services.symbol_graph).
+"""
+from __future__ import annotations
+import ast
+import logging
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, Dict, Iterable, List, Sequence, Set, Tuple
+
+from ..utils.concurrency import check_cancelled
+from ..utils.singleflight import SingleFlight
+from .file_scanner import VENDOR_DIRS, walk_files
+
+if TYPE_CHECKING:
+    from .repo_parser import ParsedFile
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["CodeUnit", "DependencyGraph", "build_code_graph", "build_python_graph", "is_test_path"]
+
+
+@dataclass
+class CodeUnit:
+    id: str  # "pkg/mod.py" for modules, "pkg/mod.py::Class.method" otherwise
+    path: str
+    qualname: str  # "" for the module unit
+    kind: str  # module | function | class | method
+    start_line: int
+    end_line: int
+    is_test: bool = False
+
+
+@dataclass
+class DependencyGraph:
+    units: List[CodeUnit] = field(default_factory=list)
+    deps: List[Set[int]] = field(default_factory=list)
+    file_units: Dict[str, List[int]] = field(default_factory=dict)  # path -> unit indexes, module first
+
+    def add(self, unit: CodeUnit) -> int:
+        self.units.append(unit)
+        self.deps.append(set())
+        self.file_units.setdefault(unit.path, []).append(len(self.units) - 1)
+        return len(self.units) - 1
+
+    def module_of(self, path: str) -> int | None:
+        ids = self.file_units.get(path)
+        return ids[0] if ids else None
+
+    def edge_count(self) -> int:
+        return sum(len(d) for d in self.deps)
+
+    def edges(self) -> Iterable[Tuple[int, int]]:
+        for src, targets in enumerate(self.deps):
+            for dst in targets:
+                yield src, dst
+
+
+_JS_SUFFIXES = frozenset({".js", ".jsx", ".mjs", ".cjs", ".ts", ".tsx"})
+_JVM_SUFFIXES = frozenset({".java", ".kt", ".scala"})
+
+
+def is_test_path(path: str) -> bool:
+    """Whether `path` is a test file by its language's convention.
+
+    Python: `test_*.py`, `*_test.py` or under `tests/`/`test/`; Go: `*_test.go`;
+    Java, Kotlin, Scala: `*Test`, `*Tests`, `*IT` or under `test/` (`src/test/...`);
+    Rust: under `tests/` (integration tests; in-file `#[cfg(test)]` modules are
+    found per symbol, see services.symbol_graph); JS/TS: `*.test.*`, `*.spec.*`
+    or under `__tests__/`.
+    """
+    p = PurePosixPath(path)
+    dirs = p.parts[:-1]
+    if p.suffix == ".py":
+        return p.name.startswith("test_") or p.name.endswith("_test.py") or any(d in ("tests", "test") for d in dirs)
+    if p.suffix == ".go":
+        return p.name.endswith("_test.go")
+    if p.suffix in _JVM_SUFFIXES:
+        return p.stem.endswith(("Test", "Tests", "IT")) or any(d in ("tests", "test") for d in dirs)
+    if p.suffix == ".rs":
+        return "tests" in dirs
+    if p.suffix in _JS_SUFFIXES:
+        return p.stem.endswith((".test", ".spec")) or any(d in ("__tests__", "tests", "test") for d in dirs)
+    return False
+
+
+# --- per-module collection ---------------------------------------------------
+
+Chain = Tuple[str, ...]
+
+
+@dataclass
+class _Module:
+    path: str
+    dotted: str
+    package: str  # package relative imports resolve against
+    units: Dict[str, int] = field(default_factory=dict)  # qualname -> unit index ("" = module)
+    methods: Dict[str, List[int]] = field(default_factory=dict)  # class qualname -> method units
+    imports: Dict[str, Tuple[str, str | None]] = field(default_factory=dict)  # alias -> (module, attr)
+    refs: List[Tuple[int, Set[Chain], str | None]] = field(default_factory=list)  # (unit, chains, class ctx)
+    top_imports: List[Tuple[str, str | None]] = field(default_factory=list)  # executed at import time
+
+
+def _dotted_for(path: str) -> Tuple[str, str]:
+    parts = list(PurePosixPath(path).with_suffix("").parts)
+    if parts[-1] == "__init__":
+        parts.pop()
+        return ".".join(parts), ".".join(parts)
+    return ".".join(parts), ".".join(parts[:-1])
+
+
+def _chain(node: ast.AST) -> Chain | None:
+    parts: List[str] = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if isinstance(node, ast.Name):
+        parts.append(node.id)
+        return tuple(reversed(parts))
+    return None
+
+
+def _references(nodes: Iterable[ast.AST], with_params: bool = False) -> Set[Chain]:
+    chains: Set[Chain] = set()
+    for root in nodes:
+        for node in ast.walk(root):
+            if isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Load):
+                c = _chain(node)
+                if c:
+                    chains.add(c)
+            elif isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load):
+                chains.add((node.id,))
+            elif with_params and isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                # pytest injects fixtures by parameter name
+                chains.update((a.arg,) for a in node.args.args + node.args.kwonlyargs)
+    return chains
+
+
+def _is_main_guard(node: ast.AST) -> bool:
+    """`if __name__ == "__main__":` only runs as a script, never on import."""
+    t = node.test if isinstance(node, ast.If) else None
+    return (
+        isinstance(t, ast.Compare) and isinstance(t.left, ast.Name) and t.left.id == "__name__"
+        and len(t.comparators) == 1 and isinstance(t.comparators[0], ast.Constant)
+        and t.comparators[0].value == "__main__"
+    )
+
+
+def _end(node: ast.AST) -> int:
+    return getattr(node, "end_lineno", None) or node.lineno
+
+
+def _collect(graph: DependencyGraph, path: str, tree: ast.Module, n_lines: int) -> _Module:
+    dotted, package = _dotted_for(path)
+    mod = _Module(path, dotted, package)
+    in_tests = is_test_path(path)
+    fixtures = in_tests or PurePosixPath(path).name == "conftest.py"
+    mod.units[""] = graph.add(CodeUnit(path, path, "", "module", 1, max(n_lines, 1)))
+
+    top_level = {id(n) for n in tree.body}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for a in node.names:
+                if a.asname:
+                    mod.imports[a.asname] = (a.name, None)
+                else:
+                    # `import a.b.c` binds `a`; chains like a.b.c.f resolve through it
+                    head = a.name.split(".")[0]
+                    mod.imports[head] = (head, None)
+                if id(node) in top_level:
+                    mod.top_imports.append((a.name, None))
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                pkg = package.split(".") if package else []
+                pkg = pkg[: len(pkg) - (node.level - 1)] if node.level > 1 else pkg
+                base = ".".join(p for p in (*pkg, base) if p)
+            for a in node.names:
+                if a.name != "*":
+                    mod.imports[a.asname or a.name] = (base, a.name)
+                if id(node) in top_level:
+                    mod.top_imports.append((base, None if a.name == "*" else a.name))
+
+    module_level: List[ast.AST] = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            uid = graph.add(CodeUnit(
+                f"{path}::{node.name}", path, node.name, "function", node.lineno, _end(node),
+                is_test=in_tests and node.name.startswith("test"),
+            ))
+            mod.units[node.name] = uid
+            mod.refs.append((uid, _references([node], with_params=fixtures), None))
+        elif isinstance(node, ast.ClassDef):
+            cid = graph.add(CodeUnit(f"{path}::{node.name}", path, node.name, "class", node.lineno, _end(node)))
+            mod.units[node.name] = cid
+            mod.methods[node.name] = []
+            header: List[ast.AST] = [*node.bases, *node.keywords, *node.decorator_list]
+            for item in node.body:
+                if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    qual = f"{node.name}.{item.name}"
+                    mid = graph.add(CodeUnit(
+                        f"{path}::{qual}", path, qual, "method", item.lineno, _end(item),
+                        is_test=in_tests and item.name.startswith("test"),
+                    ))
+                    mod.units[qual] = mid
+                    mod.methods[node.name].append(mid)
+                    mod.refs.append((mid, _references([item], with_params=fixtures), node.name))
+                    graph.deps[mid].add(cid)
+                else:
+                    header.append(item)
+            mod.refs.append((cid, _references(header), node.name))
+        elif not _is_main_guard(node):
+            module_level.append(node)
+    mod.refs.append((mod.units[""], _references(module_level), None))
+    for uid in mod.units.values():
+        if uid != mod.units[""]:
+            graph.deps[uid].add(mod.units[""])
+    return mod
+
+
+# --- resolution ----------------------------------------------------------------
+
+class _Resolver:
+    def __init__(self, graph: DependencyGraph, modules: Dict[str, _Module]):
+        self.graph = graph
+        self.modules = modules
+        # Every dotted suffix of every module ("a.b.c", "b.c", "c"): imports are
+        # written relative to whatever source root the project uses (src/, .).
+        self.by_suffix: Dict[str, List[str]] = {}
+        for path, m in modules.items():
+            parts = m.dotted.split(".") if m.dotted else []
+            for i in range(len(parts)):
+                self.by_suffix.setdefault(".".join(parts[i:]), []).append(path)
+
+    def find_module(self, name: str, importer: str) -> _Module | None:
+        cands = self.by_suffix.get(name)
+        if not cands:
+            return None
+        if len(cands) == 1:
+            return self.modules[cands[0]]
+        imp = PurePosixPath(importer).parts
+
+        def closeness(path: str) -> tuple[int, int]:
+            parts = PurePosixPath(path).parts
+            common = 0
+            for a, b in zip(parts, imp):
+                if a != b:
+                    break
+                common += 1
+            return (-common, len(parts))
+
+        return self.modules[min(cands, key=closeness)]
+
+    def symbol(self, mod: _Module, names: Chain, depth: int = 0) -> List[int]:
+        """Units for `names` looked up inside `mod` (top-level symbol, then method)."""
+        if not names:
+            return [mod.units[""]]
+        head = names[0]
+        if head in mod.units:
+            uid = mod.units[head]
+            if head in mod.methods:
+                if len(names) > 1 and f"{head}.{names[1]}" in mod.units:
+                    return [mod.units[f"{head}.{names[1]}"]]
+                return [uid, *mod.methods[head]]
+            return [uid]
+        sub = self.find_module(f"{mod.dotted}.{head}" if mod.dotted else head, mod.path)
+        if sub is not None:
+            return self.symbol(sub, names[1:], depth)
+        if head in mod.imports and depth < 4:
+            # re-exported name (e.g. from a package __init__)
+            return self.imported(mod, head, names[1:], depth + 1)
+        return [mod.units[""]]
+
+    def imported(self, mod: _Module, alias: str, rest: Chain, depth: int = 0) -> List[int]:
+        target, attr = mod.imports[alias]
+        if attr is not None:
+            sub = self.find_module(f"{target}.{attr}" if target else attr, mod.path)
+            if sub is not None:
+                return self.symbol(sub, rest, depth)
+            src = self.find_module(target, mod.path) if target else None
+            return self.symbol(src, (attr, *rest), depth) if src is not None else []
+        # `import a.b` / `import a.b as x`: the longest chain prefix naming a module wins
+        for i in range(len(rest), -1, -1):
+            sub = self.find_module(".".join((target, *rest[:i])), mod.path)
+            if sub is not None:
+                return self.symbol(sub, rest[i:], depth)
+        return []
+
+    def imported_module(self, mod: _Module, target: str, attr: str | None) -> int | None:
+        """Module unit executed by an import statement (the submodule for `from pkg import mod`)."""
+        found = None
+        if attr is not None:
+            found = self.find_module(f"{target}.{attr}" if target else attr, mod.path)
+        if found is None and target:
+            found = self.find_module(target, mod.path)
+        return found.units[""] if found is not None else None
+
+    def resolve(self, mod: _Module, chain: Chain, cls: str | None, fallback: List[_Module]) -> List[int]:
+        head = chain[0]
+        if cls and head in ("self", "cls") and len(chain) > 1:
+            qual = f"{cls}.{chain[1]}"
+            return [mod.units[qual]] if qual in mod.units else []
+        if head in mod.units and head != "":
+            return self.symbol(mod, chain)
+        if head in mod.imports:
+            return self.imported(mod, head, chain[1:])
+        for other in fallback:  # conftest fixtures visible to this module
+            if head in other.units:
+                return self.symbol(other, chain)
+        return []
+
+
+def _conftests_for(path: str, modules: Dict[str, _Module]) -> List[_Module]:
+    out = []
+    for parent in PurePosixPath(path).parents:
+        p = str(parent / "conftest.py") if str(parent) != "." else "conftest.py"
+        if p in modules and p != path:
+            out.append(modules[p])
+    return out
+
+
+_builds: SingleFlight[Tuple[str, int], DependencyGraph] = SingleFlight()
+_code_builds: SingleFlight[str, DependencyGraph] = SingleFlight()
+
+
+def build_python_graph(repo_path: Path, max_file_bytes: int = 2_000_000) -> DependencyGraph:
+    """Parse every .py file under repo_path (vendored dirs skipped) into a DependencyGraph.
+
+    Concurrent builds of the same tree share one parse; the result is shared
+    too, so callers must treat it as read-only.
+    """
+    key = (str(Path(repo_path).resolve()), max_file_bytes)
+    return _builds.do(key, _build_python_graph, Path(repo_path), max_file_bytes)
+
+
+def build_code_graph(repo_path: Path, files: "Sequence[ParsedFile] | None" = None) -> DependencyGraph:
+    """The Python graph plus units for every other parsed language (services.symbol_graph).
+
+    `files` is the repo's parse pass (services.repo_parser) when the caller
+    already has it; otherwise the non-Python sources are parsed here.
+    Concurrent builds of the same tree without `files` share one result.
+    """
+    if files is not None:
+        return _build_code_graph(Path(repo_path), files)
+    return _code_builds.do(str(Path(repo_path).resolve()), _build_code_graph, Path(repo_path), None)
+
+
+def _build_code_graph(repo_path: Path, files: "Sequence[ParsedFile] | None") -> DependencyGraph:
+    from .repo_parser import MAX_PARSE_BYTES, parse_repo
+    from .symbol_graph import add_parsed_files
+
+    graph = _build_python_graph(repo_path, MAX_PARSE_BYTES)
+    if files is None:
+        files = parse_repo(repo_path, with_chunks=False, skip_languages=("python",))
+    add_parsed_files(graph, [f for f in files if not f.path.endswith((".py", ".pyi"))], repo_path)
+    return graph
+
+
+def _build_python_graph(repo_path: Path, max_file_bytes: int) -> DependencyGraph:
+    graph = DependencyGraph()
+    modules: Dict[str, _Module] = {}
+    for root, files in walk_files(repo_path, skip_dirs=VENDOR_DIRS):
+        for name in files:
+            if not name.endswith(".py"):
+                continue
+            p = root / name
+            try:
+                if p.stat().st_size > max_file_bytes:
+                    continue
+                source = p.read_text(encoding="utf-8", errors="replace")
+                tree = ast.parse(source, filename=str(p))
+            except (OSError, SyntaxError, ValueError) as e:
+                logger.debug("skipping %s: %s", p, e)
+                continue
+            rel = p.relative_to(repo_path).as_posix()
+            modules[rel] = _collect(graph, rel, tree, source.count("\n") + 1)
+
+    resolver = _Resolver(graph, modules)
+    for path, mod in modules.items():
+        check_cancelled()
+        conftests = _conftests_for(path, modules)
+        fixtures = is_test_path(path) or PurePosixPath(path).name == "conftest.py"
+        for uid, chains, cls in mod.refs:
+            for chain in chains:
+                for target in resolver.resolve(mod, chain, cls, conftests if fixtures else []):
+                    if target != uid:
+                        graph.deps[uid].add(target)
+        module_uid = mod.units[""]
+        for target, attr in mod.top_imports:
+            dep = resolver.imported_module(mod, target, attr)
+            if dep is not None and dep != module_uid:
+                graph.deps[module_uid].add(dep)
+        graph.deps[module_uid].update(c.units[""] for c in conftests)
+        if PurePosixPath(path).name == "conftest.py":
+            graph.deps[module_uid].update(u for q, u in mod.units.items() if q and "." not in q)
+        if is_test_path(path):
+            # setUp / helpers of a test class run with each of its tests
+            for methods in mod.methods.values():
+                helpers = [m for m in methods if not graph.units[m].is_test]
+                for m in methods:
+                    if graph.units[m].is_test:
+                        graph.deps[m].update(helpers)
+    return graph
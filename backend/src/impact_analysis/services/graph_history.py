@@ -0,0 +1,393 @@
+"""Versioned code graphs: one snapshot per ingested commit, stored as deltas.
+
+Every ingest records the repo's dependency graph (services.graph_builder) for
+its commit. Most snapshots are stored as a delta against the previously stored
+one (added/removed nodes and edges); every `graph_snapshot_base_interval`
+snapshots, or when a delta would be larger than `_MAX_DELTA_RATIO` of the full
+graph, a full base snapshot is written instead, which bounds how many deltas a
+read has to replay. Retention drops whole chains (a base and its deltas),
+oldest first, while at least `graph_snapshot_keep` snapshots remain.
+
+Layout per repo under `<cache_dir>/graph_history/<repo_id>/`:
+
+* `manifest.json`: commit -> {parent, depth, nodes, edges, created}, where
+  `parent` is null for a base snapshot and `depth` counts deltas since it;
+* `<commit>.npz`: node ids and kinds plus edges as int32 index pairs, for
+  bases over the snapshot's own nodes, for deltas over a local name table.
+
+A ref that was never ingested is built once from `git archive` of that commit
+and then stored like any other snapshot.
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import tarfile
+import tempfile
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Set, Tuple
+
+from ..config import settings
+from ..utils.concurrency import check_cancelled
+from .ast_chunker.registry import registered_extensions
+from .graph_builder import DependencyGraph, build_code_graph
+from .repo_cloner import check_repo_id, resolve_ref
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["GraphDiff", "GraphHistoryStore", "GraphSnapshot", "get_graph_history_store"]
+
+_KINDS = ("module", "function", "class", "method")
+
+# A delta bigger than this share of the full graph is stored as a new base.
+_MAX_DELTA_RATIO = 0.5
+
+Edge = Tuple[str, str]
+
+
+@dataclass
+class GraphSnapshot:
+    commit: str
+    nodes: Dict[str, str] = field(default_factory=dict)  # unit id -> kind
+    edges: Set[Edge] = field(default_factory=set)  # (a, b): a depends on b
+
+    @classmethod
+    def from_graph(cls, graph: DependencyGraph, commit: str) -> "GraphSnapshot":
+        ids = [u.id for u in graph.units]
+        return cls(
+            commit=commit,
+            nodes={u.id: u.kind for u in graph.units},
+            edges={(ids[a], ids[b]) for a, b in graph.edges()},
+        )
+
+    def diff(self, newer: "GraphSnapshot") -> "GraphDiff":
+        # A unit whose kind changed (function -> class) is removed and added again.
+        retyped = {n for n in self.nodes.keys() & newer.nodes.keys() if self.nodes[n] != newer.nodes[n]}
+        return GraphDiff(
+            base=self.commit,
+            head=newer.commit,
+            added_nodes=sorted((newer.nodes.keys() - self.nodes.keys()) | retyped),
+            removed_nodes=sorted((self.nodes.keys() - newer.nodes.keys()) | retyped),
+            added_edges=sorted(newer.edges - self.edges),
+            removed_edges=sorted(self.edges - newer.edges),
+            kinds={**self.nodes, **newer.nodes},
+        )
+
+    def apply(self, delta: "GraphDiff") -> "GraphSnapshot":
+        removed = set(delta.removed_nodes)
+        nodes = {k: v for k, v in self.nodes.items() if k not in removed}
+        nodes.update((n, delta.kinds[n]) for n in delta.added_nodes)
+        edges = (self.edges - set(delta.removed_edges)) | set(delta.added_edges)
+        return GraphSnapshot(delta.head, nodes, edges)
+
+    def to_graph(self, max_nodes: int | None = None) -> dict:
+        """Nodes/edges in the shape the other graph endpoints return."""
+        ids = sorted(self.nodes)
+        truncated = max_nodes is not None and len(ids) > max_nodes
+        if truncated:
+            ids = ids[:max_nodes]
+        keep = set(ids)
+        return {
+            "commit": self.commit,
+            "nodes": [{"id": i, "label": i.rsplit("::", 1)[-1], "kind": self.nodes[i]} for i in ids],
+            "edges": [
+                {"source": a, "target": b, "label": "depends"}
+                for a, b in sorted(self.edges) if a in keep and b in keep
+            ],
+            "truncated": truncated,
+        }
+
+
+@dataclass
+class GraphDiff:
+    base: str
+    head: str
+    added_nodes: List[str]
+    removed_nodes: List[str]
+    added_edges: List[Edge]
+    removed_edges: List[Edge]
+    kinds: Dict[str, str]  # kind of every node mentioned above
+
+    @property
+    def size(self) -> int:
+        return len(self.added_nodes) + len(self.removed_nodes) + len(self.added_edges) + len(self.removed_edges)
+
+    def to_dict(self, limit: int | None = None) -> dict:
+        def cap(items: list) -> list:
+            return items[:limit] if limit is not None else items
+
+        return {
+            "base": self.base,
+            "head": self.head,
+            "counts": {
+                "added_nodes": len(self.added_nodes),
+                "removed_nodes": len(self.removed_nodes),
+                "added_edges": len(self.added_edges),
+                "removed_edges": len(self.removed_edges),
+            },
+            "added_nodes": [{"id": n, "kind": self.kinds[n]} for n in cap(self.added_nodes)],
+            "removed_nodes": [{"id": n, "kind": self.kinds[n]} for n in cap(self.removed_nodes)],
+            "added_edges": [{"source": a, "target": b} for a, b in cap(self.added_edges)],
+            "removed_edges": [{"source": a, "target": b} for a, b in cap(self.removed_edges)],
+        }
+
+
+# --- on-disk encoding ----------------------------------------------------------
+
+
+def _save_npz(path: Path, **arrays) -> None:
+    import numpy as np
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npz")
+    np.savez_compressed(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+def _edge_arrays(edges: List[Edge], index: Dict[str, int]):
+    import numpy as np
+    pairs = np.array([(index[a], index[b]) for a, b in edges], np.int32).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def _write_base(path: Path, snap: GraphSnapshot) -> None:
+    import numpy as np
+    ids = sorted(snap.nodes)
+    index = {n: i for i, n in enumerate(ids)}
+    src, dst = _edge_arrays(sorted(snap.edges), index)
+    _save_npz(
+        path, nodes=np.array(ids, dtype=str),
+        kinds=np.array([_KINDS.index(snap.nodes[n]) for n in ids], np.int8), src=src, dst=dst,
+    )
+
+
+def _read_base(path: Path, commit: str) -> GraphSnapshot:
+    import numpy as np
+    with np.load(path) as z:
+        ids = z["nodes"].tolist()
+        kinds = z["kinds"].tolist()
+        src, dst = z["src"].tolist(), z["dst"].tolist()
+    return GraphSnapshot(
+        commit, {n: _KINDS[k] for n, k in zip(ids, kinds)}, {(ids[a], ids[b]) for a, b in zip(src, dst)},
+    )
+
+
+def _write_delta(path: Path, delta: GraphDiff) -> None:
+    import numpy as np
+    names = sorted(
+        set(delta.added_nodes) | set(delta.removed_nodes)
+        | {n for e in delta.added_edges + delta.removed_edges for n in e}
+    )
+    index = {n: i for i, n in enumerate(names)}
+    add_src, add_dst = _edge_arrays(delta.added_edges, index)
+    del_src, del_dst = _edge_arrays(delta.removed_edges, index)
+    _save_npz(
+        path, names=np.array(names, dtype=str),
+        add_nodes=np.array([index[n] for n in delta.added_nodes], np.int32),
+        add_kinds=np.array([_KINDS.index(delta.kinds[n]) for n in delta.added_nodes], np.int8),
+        del_nodes=np.array([index[n] for n in delta.removed_nodes], np.int32),
+        add_src=add_src, add_dst=add_dst, del_src=del_src, del_dst=del_dst,
+    )
+
+
+def _read_delta(path: Path, base: str, head: str) -> GraphDiff:
+    import numpy as np
+    with np.load(path) as z:
+        names = z["names"].tolist()
+        added = [names[i] for i in z["add_nodes"].tolist()]
+        kinds = {n: _KINDS[k] for n, k in zip(added, z["add_kinds"].tolist())}
+        return GraphDiff(
+            base=base,
+            head=head,
+            added_nodes=added,
+            removed_nodes=[names[i] for i in z["del_nodes"].tolist()],
+            added_edges=[(names[a], names[b]) for a, b in zip(z["add_src"].tolist(), z["add_dst"].tolist())],
+            removed_edges=[(names[a], names[b]) for a, b in zip(z["del_src"].tolist(), z["del_dst"].tolist())],
+            kinds=kinds,
+        )
+
+
+def _graph_at_commit(repo_path: Path, commit: str) -> DependencyGraph:
+    """Build the dependency graph of a historical commit from its source files only."""
+    from git import Repo  # type: ignore
+    with tempfile.TemporaryDirectory(prefix="graph-") as tmp:
+        archive = Path(tmp) / "tree.tar"
+        with archive.open("wb") as fh:
+            Repo(repo_path).archive(fh, treeish=commit, format="tar")
+        root = Path(tmp) / "tree"
+        with tarfile.open(archive) as tar:
+            exts = registered_extensions()
+            members = []
+            for m in tar.getmembers():
+                name = PurePosixPath(m.name)
+                if name.is_absolute() or ".." in name.parts:
+                    continue
+                if m.isfile() and (name.suffix.lower() in exts or name.name == "go.mod"):
+                    members.append(m)
+            if hasattr(tarfile, "data_filter"):  # 3.11.4+
+                tar.extractall(root, members=members, filter="data")
+            else:
+                tar.extractall(root, members=members)
+        check_cancelled()
+        return build_code_graph(root)
+
+
+class GraphHistoryStore:
+    """Records per-commit graph snapshots and reconstructs them for reads."""
+
+    def __init__(self, root: Path, base_interval: int = 20, keep: int = 200, cache_size: int = 8):
+        self.root = root
+        self.base_interval = max(1, base_interval)
+        self.keep = max(1, keep)
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str], GraphSnapshot]" = OrderedDict()
+        self._locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+
+    def _dir(self, repo_id: str) -> Path:
+        return self.root / check_repo_id(repo_id)
+
+    def manifest(self, repo_id: str) -> Dict[str, dict]:
+        try:
+            return json.loads((self._dir(repo_id) / "manifest.json").read_text())
+        except FileNotFoundError:
+            return {}
+
+    def _write_manifest(self, repo_id: str, manifest: Dict[str, dict]) -> None:
+        path = self._dir(repo_id) / "manifest.json"
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(manifest, indent=1))
+        os.replace(tmp, path)
+
+    def snapshots(self, repo_id: str) -> List[dict]:
+        """Stored snapshots, oldest first."""
+        entries = [{"commit": c, **e} for c, e in self.manifest(repo_id).items()]
+        return sorted(entries, key=lambda e: e["created"])
+
+    def _remember(self, repo_id: str, snap: GraphSnapshot) -> None:
+        with self._guard:
+            self._cache[(repo_id, snap.commit)] = snap
+            self._cache.move_to_end((repo_id, snap.commit))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def get(self, repo_id: str, commit: str) -> GraphSnapshot | None:
+        with self._guard:
+            hit = self._cache.get((repo_id, commit))
+            if hit is not None:
+                self._cache.move_to_end((repo_id, commit))
+                return hit
+        manifest = self.manifest(repo_id)
+        if commit not in manifest:
+            return None
+        # Walk back to the nearest base (or a cached snapshot), then replay deltas forward.
+        chain: List[str] = []
+        cur: str | None = commit
+        snap = None
+        while cur is not None:
+            with self._guard:
+                snap = self._cache.get((repo_id, cur))
+            if snap is not None:
+                break
+            chain.append(cur)
+            cur = manifest[cur]["parent"]
+        for c in reversed(chain):
+            check_cancelled()
+            path = self._dir(repo_id) / f"{c}.npz"
+            parent = manifest[c]["parent"]
+            snap = _read_base(path, c) if parent is None else snap.apply(_read_delta(path, parent, c))
+        self._remember(repo_id, snap)
+        return snap
+
+    def record(self, repo_id: str, commit: str, graph: DependencyGraph) -> dict:
+        """Store the graph of `commit` (no-op if already stored) and return its manifest entry."""
+        with self._guard:
+            lock = self._locks[repo_id]
+        with lock:
+            manifest = self.manifest(repo_id)
+            if commit in manifest:
+                return manifest[commit]
+            t0 = time.monotonic()
+            snap = GraphSnapshot.from_graph(graph, commit)
+            latest = max(manifest, key=lambda c: manifest[c]["created"], default=None)
+            delta = None
+            if latest is not None and manifest[latest]["depth"] + 1 < self.base_interval:
+                delta = self.get(repo_id, latest).diff(snap)
+                if delta.size > _MAX_DELTA_RATIO * (len(snap.nodes) + len(snap.edges)):
+                    delta = None
+            path = self._dir(repo_id) / f"{commit}.npz"
+            if delta is None:
+                _write_base(path, snap)
+                entry = {"parent": None, "depth": 0}
+            else:
+                _write_delta(path, delta)
+                entry = {"parent": latest, "depth": manifest[latest]["depth"] + 1}
+            entry.update(nodes=len(snap.nodes), edges=len(snap.edges), created=time.time())
+            manifest[commit] = entry
+            dropped = self._prune(manifest)
+            self._write_manifest(repo_id, manifest)
+            for c in dropped:
+                (self._dir(repo_id) / f"{c}.npz").unlink(missing_ok=True)
+            with self._guard:
+                for c in dropped:
+                    self._cache.pop((repo_id, c), None)
+            self._remember(repo_id, snap)
+            logger.info(
+                "graph snapshot %s@%s: %s, %d bytes in %.2fs", repo_id, commit[:12],
+                "base" if delta is None else f"delta of {delta.size}", path.stat().st_size, time.monotonic() - t0,
+            )
+            return entry
+
+    def _prune(self, manifest: Dict[str, dict]) -> List[str]:
+        """Drop the oldest base+delta chains from `manifest` while `keep` snapshots remain."""
+        order = sorted(manifest, key=lambda c: manifest[c]["created"])
+        chains: List[List[str]] = []
+        for c in order:
+            if manifest[c]["parent"] is None or not chains:
+                chains.append([])
+            chains[-1].append(c)
+        dropped: List[str] = []
+        remaining = len(order)
+        for chain in chains[:-1]:
+            if remaining - len(chain) < self.keep:
+                break
+            for c in chain:
+                del manifest[c]
+            dropped.extend(chain)
+            remaining -= len(chain)
+        return dropped
+
+    def at_ref(self, repo_id: str, repo_path: Path | None, ref: str, build_missing: bool = True) -> GraphSnapshot | None:
+        """Snapshot for a branch, tag or sha; builds and stores it if the commit was never ingested."""
+        manifest = self.manifest(repo_id)
+        commit = ref if ref in manifest else None
+        if commit is None and repo_path is not None and repo_path.exists():
+            commit = resolve_ref(repo_path, ref)
+        if commit is None:
+            # Without a clone, abbreviated shas can still match stored snapshots.
+            matches = [c for c in manifest if len(ref) >= 7 and c.startswith(ref)]
+            commit = matches[0] if len(matches) == 1 else None
+        if commit is None:
+            return None
+        snap = self.get(repo_id, commit)
+        if snap is None and build_missing and repo_path is not None and repo_path.exists():
+            self.record(repo_id, commit, _graph_at_commit(repo_path, commit))
+            snap = self.get(repo_id, commit)
+        return snap
+
+
+_store: GraphHistoryStore | None = None
+
+
+def get_graph_history_store() -> GraphHistoryStore:
+    global _store
+    if _store is None:
+        _store = GraphHistoryStore(
+            Path(settings.cache_dir) / "graph_history",
+            settings.graph_snapshot_base_interval,
+            settings.graph_snapshot_keep,
+        )
+    return _store
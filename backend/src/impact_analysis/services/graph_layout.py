@@ -0,0 +1,394 @@
+"""Server-side layouts of the code dependency graph, cached per commit.
+
+Browser force layouts (fcose, cola) stall for tens of seconds beyond a few
+thousand nodes; this service computes positions once, on the server, for a
+commit's graph snapshot (services.graph_history) and returns them with the
+nodes, ready for a `preset` layout on the client.
+
+Layouts:
+
+* `force`: Fruchterman-Reingold, vectorised with NumPy over edge index
+  arrays. Repulsion is exact (blocked all-pairs) up to `_EXACT_LIMIT` nodes;
+  above, it goes through the centroids of the occupied cells of a grid (a
+  one-level Barnes-Hut): the far field of non-adjacent cells is evaluated
+  once per cell, adjacent cells and the rest of the own cell per node. Large
+  graphs are laid out multilevel: they are coarsened by contracting every
+  node into the basin of its highest-priority neighbour until small, the
+  coarsest graph is laid out from scratch and each finer level starts from
+  the positions of its clusters and only needs a short, cool refinement.
+* `layered`: dependencies below their dependents; strongly connected
+  components share a layer (longest path over the condensation, see
+  services.reachability.tarjan_scc) and nodes are ordered in their layer by
+  the mean position of their dependencies.
+
+Positions are stored per repo at `<cache_dir>/layouts/<repo_id>/<commit>-<layout>.npz`.
+When a commit has no layout yet but an earlier one of the same repo does and
+only a few nodes changed (`_INCREMENTAL_RATIO`), the force layout is seeded
+from it: kept nodes stay where they were, new nodes start at the mean of
+their placed neighbours, and a short refinement that moves (and computes
+forces for) only the new nodes and their neighbours settles them, so the
+update costs little more than the changed part of the graph.
+"""
+from __future__ import annotations
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from ..config import settings
+from ..utils.concurrency import check_cancelled
+from ..utils.singleflight import SingleFlight
+from .graph_history import GraphSnapshot
+from .repo_cloner import check_repo_id
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["LAYOUTS", "GraphLayoutStore", "compute_layout", "get_graph_layout_store", "with_positions"]
+
+LAYOUTS = ("force", "layered")
+
+_EXACT_LIMIT = 1500  # nodes; above, repulsion goes through a grid
+_GRID = 32  # cells per side of the repulsion grid
+_BLOCK = 512  # rows per block of pairwise repulsion
+_COARSEST = 200  # coarsening stops at this many nodes ...
+_MIN_SHRINK = 0.8  # ... or when a level keeps more than this share of nodes
+_GRAVITY = 1.0  # linear pull towards the origin; keeps components together (radius ~ sqrt(n))
+_INCREMENTAL_RATIO = 0.2  # seed from the previous layout when added + removed nodes are below this share
+_INCREMENTAL_ITERS = 15  # refinement steps of a seeded layout, over new nodes and their neighbours only
+_NEIGHBOUR_MOBILITY = 0.3  # step scale of kept nodes next to new ones
+_SPACING = 80.0  # output units (pixels) per ideal edge length
+
+
+def _edge_index(ids: List[str], edges) -> "np.ndarray":
+    """Undirected, deduplicated (m, 2) index pairs without self loops."""
+    import numpy as np
+    index = {n: i for i, n in enumerate(ids)}
+    pairs = np.array([(index[a], index[b]) for a, b in edges if a in index and b in index], np.int64).reshape(-1, 2)
+    pairs = pairs[pairs[:, 0] != pairs[:, 1]]
+    pairs.sort(axis=1)
+    return np.unique(pairs, axis=0)
+
+
+def _repulsion_exact(pos: "np.ndarray", rows: "np.ndarray | None" = None) -> "np.ndarray":
+    """Repulsion on `rows` (all nodes by default) from every node."""
+    import numpy as np
+    rows = np.arange(len(pos)) if rows is None else rows
+    out = np.zeros((len(rows), 2), pos.dtype)
+    for s in range(0, len(rows), _BLOCK):
+        d = pos[rows[s:s + _BLOCK], None, :] - pos[None, :, :]
+        d2 = np.maximum(np.einsum("ijk,ijk->ij", d, d), 1e-6)
+        out[s:s + _BLOCK] = np.einsum("ij,ijk->ik", 1.0 / d2, d)  # k^2 / dist along the unit vector, k = 1
+    return out
+
+
+def _repulsion_grid(pos: "np.ndarray", rows: "np.ndarray | None" = None) -> "np.ndarray":
+    """Repulsion through a grid: cells two or more apart act on a node through the cell
+    centroids, evaluated once per cell; the 8 adjacent cells through their centroids,
+    evaluated per node; the rest of the own cell as one point at its centroid."""
+    import numpy as np
+    rows = np.arange(len(pos)) if rows is None else rows
+    # Grid over the central 98%: a few far outliers (border cells) must not squeeze the rest into one cell.
+    lo, hi = np.percentile(pos, [1, 99], axis=0)
+    span = max(float((hi - lo).max()), 1e-9)
+    cells = np.clip(((pos - lo) / span * _GRID).astype(np.int64), 0, _GRID - 1)
+    cid = cells[:, 0] * _GRID + cells[:, 1]
+    mass = np.bincount(cid, minlength=_GRID * _GRID).astype(pos.dtype)
+    sums = np.stack([np.bincount(cid, pos[:, k], _GRID * _GRID) for k in range(2)], axis=1)
+    centroids = sums / np.maximum(mass, 1.0)[:, None]
+
+    # Far field, per occupied cell.
+    occupied = np.flatnonzero(mass)
+    oc = np.stack([occupied // _GRID, occupied % _GRID], axis=1)
+    far = np.zeros((_GRID * _GRID, 2), pos.dtype)
+    for s in range(0, len(occupied), _BLOCK):
+        part = occupied[s:s + _BLOCK]
+        d = centroids[part, None, :] - centroids[None, occupied, :]
+        w = mass[None, occupied] / np.maximum(np.einsum("ijk,ijk->ij", d, d), 1e-6)
+        w[np.abs(oc[s:s + _BLOCK, None, :] - oc[None, :, :]).max(axis=2) <= 1] = 0.0
+        far[part] = np.einsum("ij,ijk->ik", w, d)
+
+    pos, cells, cid = pos[rows], cells[rows], cid[rows]
+    out = far[cid].copy()
+    # Near field: the adjacent cells, per node.
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            if dx == dy == 0:
+                continue
+            x, y = cells[:, 0] + dx, cells[:, 1] + dy
+            ok = (x >= 0) & (x < _GRID) & (y >= 0) & (y < _GRID)
+            nb = np.where(ok, x * _GRID + y, 0)
+            d = pos - centroids[nb]
+            w = np.where(ok, mass[nb], 0.0) / np.maximum(np.einsum("ij,ij->i", d, d), 1e-6)
+            out += w[:, None] * d
+    # Own cell: the other members, as one point at their centroid.
+    rest = mass[cid] - 1
+    has = rest > 0
+    others = (sums[cid[has]] - pos[has]) / rest[has, None]
+    d = pos[has] - others
+    out[has] += (rest[has] / np.maximum(np.einsum("ij,ij->i", d, d), 1e-6))[:, None] * d
+    return out
+
+
+def _refine(
+    pos: "np.ndarray", edges: "np.ndarray", iters: int, t0: float,
+    mobility: "np.ndarray | None" = None, active: "np.ndarray | None" = None,
+):
+    """Fruchterman-Reingold steps with linear cooling, in place.
+
+    `mobility` scales each node's step; with `active` (node indexes) only
+    those nodes move and only their forces are computed, the rest stay fixed.
+    """
+    import numpy as np
+    n = len(pos)
+    repulsion = _repulsion_exact if n <= _EXACT_LIMIT else _repulsion_grid
+    rows = np.arange(n) if active is None else active
+    if active is not None:
+        moving = np.zeros(n, bool)
+        moving[active] = True
+        edges = edges[moving[edges[:, 0]] | moving[edges[:, 1]]]
+    if mobility is not None:
+        mobility = mobility[rows]
+    a, b = edges[:, 0], edges[:, 1]
+    for it in range(iters):
+        check_cancelled()
+        disp = repulsion(pos, rows)
+        d = pos[a] - pos[b]
+        f = np.sqrt(np.einsum("ij,ij->i", d, d))[:, None] * d  # dist^2 / k along the unit vector
+        for k in range(2):
+            disp[:, k] -= np.bincount(a, f[:, k], n)[rows]
+            disp[:, k] += np.bincount(b, f[:, k], n)[rows]
+        disp -= _GRAVITY * pos[rows]
+        length = np.maximum(np.sqrt(np.einsum("ij,ij->i", disp, disp)), 1e-9)
+        t = t0 * (1.0 - it / iters) + 0.01
+        step = np.minimum(length, t if mobility is None else t * mobility)
+        pos[rows] += disp * (step / length)[:, None]
+    return pos
+
+
+def _coarsen(n: int, edges: "np.ndarray", rng) -> Tuple["np.ndarray", int]:
+    """Cluster label per node: the basin of the local priority maximum reached by following best neighbours."""
+    import numpy as np
+    degree = np.bincount(edges.ravel(), minlength=n)
+    key = degree.astype(np.int64) * n + rng.permutation(n)  # ties broken randomly, so paths contract too
+    best = key.copy()
+    np.maximum.at(best, edges[:, 0], key[edges[:, 1]])
+    np.maximum.at(best, edges[:, 1], key[edges[:, 0]])
+    by_key = np.argsort(key)
+    pick = by_key[np.searchsorted(key[by_key], best)]
+    while True:  # pointer jumping to the basin's root
+        nxt = pick[pick]
+        if np.array_equal(nxt, pick):
+            break
+        pick = nxt
+    roots, labels = np.unique(pick, return_inverse=True)
+    return labels, len(roots)
+
+
+def _force(n: int, edges: "np.ndarray", seed: int = 0) -> "np.ndarray":
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    levels: List[Tuple["np.ndarray", "np.ndarray", int]] = []  # (labels, edges, n) of each finer level
+    while n > _COARSEST:
+        labels, m = _coarsen(n, edges, rng)
+        if m > _MIN_SHRINK * n:
+            break
+        levels.append((labels, edges, n))
+        coarse = labels[edges]
+        coarse = coarse[coarse[:, 0] != coarse[:, 1]]
+        coarse.sort(axis=1)
+        edges, n = np.unique(coarse, axis=0).reshape(-1, 2), m
+    radius = np.sqrt(n)
+    pos = rng.uniform(-radius, radius, (n, 2))
+    _refine(pos, edges, 150, radius / 4)
+    for labels, edges, fine in reversed(levels):
+        pos = pos[labels] * np.sqrt(fine / n) + rng.normal(0.0, 0.2, (fine, 2))
+        n = fine
+        _refine(pos, edges, 40, 1.0)
+    return pos
+
+
+def _layered(ids: List[str], edges) -> "np.ndarray":
+    """Longest-path layers over the condensation (dependencies at y = 0), barycentric order within layers."""
+    import numpy as np
+    from .reachability import tarjan_scc
+    n = len(ids)
+    index = {u: i for i, u in enumerate(ids)}
+    out: List[List[int]] = [[] for _ in range(n)]
+    for a, b in edges:
+        if a in index and b in index and a != b:
+            out[index[a]].append(index[b])
+    indptr = np.cumsum([0] + [len(o) for o in out]).tolist()
+    indices = [v for o in out for v in o]
+    comp, members = tarjan_scc(n, indptr, indices)
+    layer_of = [0] * len(members)
+    for c, nodes in enumerate(members):  # dependencies complete first
+        layer_of[c] = max((layer_of[comp[v]] + 1 for u in nodes for v in out[u] if comp[v] != c), default=0)
+    layers: Dict[int, List[int]] = {}
+    for u in range(n):
+        layers.setdefault(layer_of[comp[u]], []).append(u)
+    pos = np.zeros((n, 2))
+    width = max(8, int(np.ceil(2 * np.sqrt(n))))  # wider layers wrap into several rows
+    row = 0.0
+    for y in sorted(layers):
+        check_cancelled()
+        nodes = layers[y]
+        bary = []
+        for u in nodes:
+            below = [pos[v, 0] for v in out[u] if layer_of[comp[v]] < y]
+            bary.append(sum(below) / len(below) if below else 0.0)
+        ranked = sorted(range(len(nodes)), key=lambda i: (bary[i], ids[nodes[i]]))
+        cols = min(len(nodes), width)
+        for x, i in enumerate(ranked):
+            pos[nodes[i]] = (x % width - (cols - 1) / 2, -(row + x // width))
+        row += -(-len(nodes) // width) + 1  # one empty row between layers
+    return pos
+
+
+def _seeded(ids: List[str], edges: "np.ndarray", previous: Dict[str, Tuple[float, float]], seed: int = 0):
+    """Force layout refined from the previous positions of kept nodes; None when too much changed."""
+    import numpy as np
+    n = len(ids)
+    kept = np.array([u in previous for u in ids])
+    placed = kept.copy()
+    changed = int(n - placed.sum()) + len(previous.keys() - set(ids))
+    if not placed.any() or changed > _INCREMENTAL_RATIO * max(n, 1):
+        return None
+    rng = np.random.default_rng(seed)
+    pos = np.zeros((n, 2))
+    pos[placed] = [previous[u] for u in np.asarray(ids, dtype=object)[placed]]
+    # New nodes start at the mean of their placed neighbours, a few hops deep.
+    for _ in range(3):
+        todo = ~placed
+        if not todo.any():
+            break
+        a, b = edges[:, 0], edges[:, 1]
+        sums = np.zeros((n, 2))
+        counts = np.zeros(n)
+        for src, dst in ((a, b), (b, a)):
+            ok = placed[src] & todo[dst]
+            np.add.at(sums, dst[ok], pos[src[ok]])
+            np.add.at(counts, dst[ok], 1)
+        now = counts > 0
+        pos[now] = sums[now] / counts[now, None] + rng.normal(0.0, 0.5, (int(now.sum()), 2))
+        placed = placed | now
+    rest = ~placed
+    pos[rest] = rng.normal(0.0, np.sqrt(n) / 2, (int(rest.sum()), 2))
+    if kept.all():
+        return pos  # only removals: the kept nodes stay where they were
+    # Only new nodes and their neighbours are relaxed; everything else is fixed.
+    new = ~kept
+    near = new.copy()
+    near[edges[new[edges[:, 0]], 1]] = True
+    near[edges[new[edges[:, 1]], 0]] = True
+    mobility = np.where(kept, _NEIGHBOUR_MOBILITY, 1.0)
+    return _refine(pos, edges, _INCREMENTAL_ITERS, 1.0, mobility, np.flatnonzero(near))
+
+
+def compute_layout(
+    snap: GraphSnapshot, layout: str = "force", previous: Dict[str, Tuple[float, float]] | None = None,
+) -> Dict[str, Tuple[float, float]]:
+    """Positions (layout units, ideal edge length 1) of every node of `snap`."""
+    import numpy as np
+    ids = sorted(snap.nodes)
+    if not ids:
+        return {}
+    if layout == "layered":
+        pos = _layered(ids, snap.edges)
+    else:
+        edges = _edge_index(ids, snap.edges)
+        pos = _seeded(ids, edges, previous) if previous else None
+        if pos is None:
+            pos = _force(len(ids), edges)
+        pos = pos - pos.mean(axis=0)
+    return {u: (float(x), float(y)) for u, (x, y) in zip(ids, np.asarray(pos))}
+
+
+def _save(path: Path, positions: Dict[str, Tuple[float, float]]) -> None:
+    import numpy as np
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp.npz")
+    ids = list(positions)
+    np.savez_compressed(
+        tmp, nodes=np.array(ids, dtype=str), pos=np.array([positions[u] for u in ids], np.float32).reshape(-1, 2),
+    )
+    os.replace(tmp, path)
+
+
+def _load(path: Path) -> Dict[str, Tuple[float, float]]:
+    import numpy as np
+    with np.load(path) as z:
+        return {u: (float(x), float(y)) for u, (x, y) in zip(z["nodes"].tolist(), z["pos"].tolist())}
+
+
+class GraphLayoutStore:
+    """Computes, stores and serves per-commit layouts."""
+
+    def __init__(self, root: Path, cache_size: int = 8):
+        self.root = root
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str, str], Dict[str, Tuple[float, float]]]" = OrderedDict()
+        self._guard = threading.Lock()
+        self._computing: SingleFlight[Tuple[str, str, str], Dict[str, Tuple[float, float]]] = SingleFlight()
+
+    def _path(self, repo_id: str, commit: str, layout: str) -> Path:
+        return self.root / check_repo_id(repo_id) / f"{commit}-{layout}.npz"
+
+    def _latest(self, repo_id: str, layout: str) -> Path | None:
+        paths = list((self.root / check_repo_id(repo_id)).glob(f"*-{layout}.npz"))
+        return max(paths, key=lambda p: p.stat().st_mtime, default=None)
+
+    def get(self, repo_id: str, snap: GraphSnapshot, layout: str = "force") -> Dict[str, Tuple[float, float]]:
+        """Positions for the snapshot's commit: cached, or computed (seeded from the latest stored layout)."""
+        key = (repo_id, snap.commit, layout)
+        with self._guard:
+            hit = self._cache.get(key)
+            if hit is not None:
+                self._cache.move_to_end(key)
+                return hit
+        # Concurrent requests for a new commit share one computation.
+        return self._computing.do(key, self._load_or_compute, key, snap)
+
+    def _load_or_compute(self, key: Tuple[str, str, str], snap: GraphSnapshot) -> Dict[str, Tuple[float, float]]:
+        repo_id, _commit, layout = key
+        path = self._path(repo_id, snap.commit, layout)
+        try:
+            positions = _load(path)
+        except FileNotFoundError:
+            t0 = time.monotonic()
+            latest = self._latest(repo_id, layout) if layout == "force" else None
+            previous = _load(latest) if latest is not None else None
+            positions = compute_layout(snap, layout, previous)
+            _save(path, positions)
+            logger.info(
+                "layout %s %s@%s: %d nodes in %.2fs%s", layout, repo_id, snap.commit[:12], len(positions),
+                time.monotonic() - t0, f" (previous layout {latest.stem})" if previous else "",
+            )
+        with self._guard:
+            self._cache[key] = positions
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return positions
+
+
+def with_positions(graph: dict, positions: Dict[str, Tuple[float, float]]) -> dict:
+    """Add `position` (output units) to the nodes of a `GraphSnapshot.to_graph` result."""
+    for node in graph["nodes"]:
+        x, y = positions.get(node["id"], (0.0, 0.0))
+        node["position"] = {"x": round(x * _SPACING, 1) + 0.0, "y": round(y * _SPACING, 1) + 0.0}  # no -0.0
+    return graph
+
+
+_store: GraphLayoutStore | None = None
+
+
+def get_graph_layout_store() -> GraphLayoutStore:
+    global _store
+    if _store is None:
+        _store = GraphLayoutStore(Path(settings.cache_dir) / "layouts")
+    return _store
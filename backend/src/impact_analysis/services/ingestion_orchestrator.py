@@ -1,41 +1,163 @@
 from __future__ import annotations
+from dataclasses import dataclass
 from pathlib import Path
-from typing import List
-from .repo_cloner import clone_or_update_public_repo
+from typing import Awaitable, Callable, List
+from .repo_cloner import clone_or_update_public_repo, head_commit
 from .embedding_client import get_embedding_client
-from .qdrant_client import QdrantVectorStore
-from .neo4j_client import Neo4jDriver
-from ..models.chunk import ChunkIn
-
-# Placeholder file scanning & chunking (to be replaced with real AST logic)
-
-def naive_collect_chunks(repo_path: Path) -> List[ChunkIn]:
-    chunks: List[ChunkIn] = []
-    for p in repo_path.rglob("*.py"):
-        try:
-            content = p.read_text(encoding="utf-8", errors="ignore")
-        except Exception:
-            continue
-        if not content.strip():
-            continue
-        symbol = p.stem
-        chunks.append(ChunkIn(path=str(p.relative_to(repo_path)), language="python", symbol=symbol, kind="file", content=content[:4000]))
-    return chunks
+from .qdrant_client import get_vector_store
+from .neo4j_client import get_graph_driver
+from .garbage_collector import get_garbage_collector
+from .chunk_spool import ChunkSpool, write_spool
+from .cochange import get_cochange_store
+from .file_scanner import tree_fingerprint
+from .graph_builder import build_code_graph
+from .graph_history import get_graph_history_store
+from .reachability import get_reachability_store
+from .repo_parser import ParsedFile, parse_repo
+from .test_impact import get_test_impact_store
+from ..config import settings
+from ..models.chunk import Chunk
+from ..utils.batching import batch_fixed
+from ..utils.concurrency import run_cpu, run_io
+
+def collect_chunks(files: List[ParsedFile]) -> List[Chunk]:
+    return [c for f in files for c in f.chunks]
+
+def naive_collect_chunks(repo_path: Path) -> List[Chunk]:
+    # Every language with a plugin, in one parse pass (see services.repo_parser).
+    return collect_chunks(parse_repo(repo_path))
+
+@dataclass
+class ParsedRepo:
+    repo_url: str
+    path: Path
+    repo_id: str
+    commit: str | None
+    snapshot: str
+    chunks: List[Chunk]
+    chunk_ids: List[str]
+
+
+EmbedFn = Callable[[List[str]], Awaitable[list]]
+ProgressFn = Callable[[int], None]
+
 
 class IngestionOrchestrator:
+    """Clone -> parse -> index pipeline.
+
+    The stages are separate so the batch scheduler (workers.ingestion_worker)
+    can gate each one with its own global limits; `ingest_repo` simply runs
+    them back to back.
+    """
+
     def __init__(self):
         self.emb = get_embedding_client()
-        self.store = QdrantVectorStore()
-        self.graph = Neo4jDriver()
-
-    def ingest_repo(self, repo_url: str) -> dict:
-        path = clone_or_update_public_repo(repo_url)
-        chunks = naive_collect_chunks(path)
-        vecs = []
-        for c in chunks:
-            vecs.append((c, self.emb.embed(c.content)))
-            self.graph.upsert_code_node(c.hash(), c.path, c.symbol, c.kind)
-        self.store.upsert_chunks(vecs)
-        return {"repo": repo_url, "chunks": len(chunks)}
-
-__all__ = ["IngestionOrchestrator"]
\ No newline at end of file
+
+    async def clone(self, repo_url: str) -> Path:
+        return await run_io(clone_or_update_public_repo, repo_url)
+
+    async def parse(self, repo_url: str, path: Path) -> ParsedRepo:
+        repo_id = path.name
+        commit = await run_io(head_commit, path)
+        files = await run_cpu(parse_repo, path)
+        chunks = collect_chunks(files)
+        chunk_ids = [c.hash() for c in chunks]
+        # Non-git trees have no commit; key the snapshot by their content instead, with the
+        # same key the graph indexes are checked against at query time (their `ensure`).
+        snapshot = commit or await run_io(tree_fingerprint, path)
+        # Persist parsed chunks so re-embedding / collection rebuilds skip the re-parse.
+        await run_io(write_spool, repo_id, snapshot, chunks)
+        if commit:
+            # Incremental: only commits since the last ingest are mined.
+            await run_io(get_cochange_store().update, repo_id, path)
+        # One static dependency graph feeds the precomputed graph indexes and the per-commit history.
+        graph = await run_cpu(build_code_graph, path, files)
+        await run_cpu(get_test_impact_store().build, repo_id, path, snapshot, graph)
+        await run_cpu(get_reachability_store().update, repo_id, graph, snapshot)
+        if commit:
+            await run_cpu(get_graph_history_store().record, repo_id, commit, graph)
+        return ParsedRepo(repo_url, path, repo_id, commit, snapshot, chunks, chunk_ids)
+
+    async def embed(self, texts: List[str]) -> list:
+        return await run_cpu(self.emb.embed_batch, texts)
+
+    async def index(self, parsed: ParsedRepo, embed: EmbedFn | None = None, on_progress: ProgressFn | None = None) -> dict:
+        """Embed and upsert the parsed chunks batch by batch, then record the snapshot and GC."""
+        embed = embed or self.embed
+        store = await get_vector_store()
+        graph = await get_graph_driver()
+        gc = get_garbage_collector()
+        repo_id, snapshot = parsed.repo_id, parsed.snapshot
+        rows = list(zip(parsed.chunk_ids, parsed.chunks))
+        done = 0
+        async with gc.repo_lock(repo_id):
+            for batch in batch_fixed(rows, settings.batch_size):
+                chunks = [c for _cid, c in batch]
+                # With content dedup, content already stored for any repo is not embedded again.
+                need = await store.needs_embedding(chunks)
+                todo = [c.content for c, n in zip(chunks, need) if n]
+                fresh = iter(await embed(todo) if todo else [])
+                await graph.upsert_code_nodes(
+                    repo_id, snapshot,
+                    ({"chunk_id": cid, "path": c.path, "symbol": c.symbol, "kind": c.kind} for cid, c in batch),
+                )
+                pending = await store.upsert_chunks(
+                    [(c, next(fresh) if n else None) for c, n in zip(chunks, need)], repo_id=repo_id, commit=snapshot,
+                )
+                if pending:
+                    embeddings = await embed([c.content for c in pending])
+                    await store.upsert_chunks(list(zip(pending, embeddings)), repo_id=repo_id, commit=snapshot)
+                done += len(batch)
+                if on_progress:
+                    on_progress(done)
+            await gc.record_snapshot(repo_id, snapshot, parsed.chunk_ids)
+            gc_stats = await gc.collect(repo_id, locked=True) if settings.gc_after_ingest else None
+        return {
+            "repo": parsed.repo_url,
+            "repo_id": repo_id,
+            "commit": parsed.commit,
+            "chunks": len(parsed.chunks),
+            "gc": gc_stats.to_dict() if gc_stats else None,
+        }
+
+    async def ingest_repo(self, repo_url: str) -> dict:
+        path = await self.clone(repo_url)
+        parsed = await self.parse(repo_url, path)
+        return await self.index(parsed)
+
+    async def reindex_from_spool(self, repo_id: str, snapshot: str | None = None) -> dict:
+        """Re-embed and re-upsert a repo snapshot straight from its chunk spool.
+
+        Used after an embedding model change or a collection rebuild: a
+        sequential columnar read, no clone and no parsing. Only the repo's
+        current snapshot (the one GC keeps) can be reindexed, otherwise
+        ValueError: points are stamped with their snapshot, and re-stamping
+        live points with an older one would have the next GC delete them.
+        Runs under the repo's GC lock, like an ingest.
+        """
+        store = await get_vector_store()
+        graph = await get_graph_driver()
+        gc = get_garbage_collector()
+        spool = await run_io(ChunkSpool.open, repo_id, snapshot)
+        snapshot = spool.meta["snapshot"]
+        total = 0
+        async with gc.repo_lock(repo_id):
+            current = await run_io(gc.manifests.current, repo_id)
+            if current is not None and snapshot != current:
+                raise ValueError(f"Snapshot {snapshot} of {repo_id} is not the current one ({current}); re-ingest instead")
+            batches = spool.iter_batches()
+            while True:
+                batch = await run_io(next, batches, None)
+                if batch is None:
+                    break
+                records = list(batch.records())
+                embeddings = await run_cpu(self.emb.embed_batch, batch.content)
+                await graph.upsert_code_nodes(
+                    repo_id, snapshot,
+                    ({"chunk_id": r.chunk_id, "path": r.path, "symbol": r.symbol, "kind": r.kind} for r in records),
+                )
+                await store.upsert_chunks(list(zip(records, embeddings)), repo_id=repo_id, commit=snapshot)
+                total += len(records)
+        return {"repo_id": repo_id, "snapshot": snapshot, "chunks": total}
+
+__all__ = ["IngestionOrchestrator", "ParsedRepo", "naive_collect_chunks"]
\ No newline at end of file
@@ -1,7 +1,9 @@
 from __future__ import annotations
+import asyncio
 import os
-from neo4j import GraphDatabase
 from typing import Iterable
+from ..config import settings
+from ..utils.hashing import repo_scoped_uuid
 
 _NEO4J_URI = os.getenv("NEO4J_URI", "bolt://localhost:7687")
 _NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
@@ -9,25 +11,127 @@ _NEO4J_PASS = os.getenv("NEO4J_PASS", "neo4jpass")
 
 class Neo4jDriver:
     def __init__(self):
-        self.driver = GraphDatabase.driver(_NEO4J_URI, auth=(_NEO4J_USER, _NEO4J_PASS))
-        self._ensure_indexes()
+        from neo4j import AsyncGraphDatabase  # lazy: keeps API startup light
+        self.driver = AsyncGraphDatabase.driver(
+            _NEO4J_URI,
+            auth=(_NEO4J_USER, _NEO4J_PASS),
+            connection_acquisition_timeout=settings.db_timeout_s,
+        )
+        self._ready = False
 
-    def _ensure_indexes(self):
+    async def ensure_indexes(self):
+        if self._ready:
+            return
         cypher = [
-            "CREATE CONSTRAINT IF NOT EXISTS FOR (f:File) REQUIRE f.path IS UNIQUE",
+            "CREATE CONSTRAINT file_repo_path IF NOT EXISTS FOR (f:File) REQUIRE (f.repo_id, f.path) IS UNIQUE",
             "CREATE CONSTRAINT IF NOT EXISTS FOR (c:Code) REQUIRE c.id IS UNIQUE",
+            "CREATE INDEX code_repo_commit IF NOT EXISTS FOR (c:Code) ON (c.repo_id, c.commit)",
         ]
-        with self.driver.session() as s:
+        async with self.driver.session() as s:
+            # Files used to be unique by path alone, which merged same-named files
+            # of different repos into one node; drop that legacy constraint.
+            legacy = await s.run(
+                "SHOW CONSTRAINTS YIELD name, labelsOrTypes, properties "
+                "WHERE labelsOrTypes = ['File'] AND properties = ['path'] RETURN name"
+            )
+            for record in [r async for r in legacy]:
+                await s.run(f"DROP CONSTRAINT `{record['name']}` IF EXISTS")
             for stmt in cypher:
-                s.run(stmt)
-
-    def upsert_code_node(self, chunk_id: str, path: str, symbol: str, kind: str):
-        with self.driver.session() as s:
-            s.run(
-                "MERGE (f:File {path:$path})"
-                "MERGE (n:Code {id:$id}) SET n.symbol=$symbol, n.kind=$kind"
-                "MERGE (f)-[:CONTAINS]->(n)",
-                path=path, id=chunk_id, symbol=symbol, kind=kind
+                await s.run(stmt)
+        self._ready = True
+
+    async def upsert_code_node(self, repo_id: str, commit: str, chunk_id: str, path: str, symbol: str, kind: str):
+        await self.upsert_code_nodes(repo_id, commit, [{"chunk_id": chunk_id, "path": path, "symbol": symbol, "kind": kind}])
+
+    async def upsert_code_nodes(self, repo_id: str, commit: str, rows: Iterable[dict]):
+        """Batched variant: one round-trip per call instead of one per chunk.
+
+        Rows carry chunk_id/path/symbol/kind; nodes are scoped to the repo and
+        stamped with the snapshot commit that last saw them (used by GC).
+        """
+        from neo4j import Query
+        rows = [dict(r, id=repo_scoped_uuid(repo_id, r["chunk_id"])) for r in rows]
+        if not rows:
+            return
+        await self.ensure_indexes()
+        async with self.driver.session() as s:
+            await s.run(
+                Query(
+                    "UNWIND $rows AS row "
+                    "MERGE (f:File {repo_id:$repo_id, path:row.path}) "
+                    "MERGE (n:Code {id:row.id}) "
+                    "SET n.repo_id=$repo_id, n.chunk_id=row.chunk_id, n.commit=$commit, "
+                    "n.symbol=row.symbol, n.kind=row.kind "
+                    "MERGE (f)-[:CONTAINS]->(n)",
+                    timeout=settings.db_timeout_s,
+                ),
+                rows=rows, repo_id=repo_id, commit=commit,
+            )
+
+    async def delete_code_nodes(self, repo_id: str, chunk_ids: list[str]) -> int:
+        """Detach-delete one batch of a repo's Code nodes; returns how many went."""
+        from neo4j import Query
+        if not chunk_ids:
+            return 0
+        async with self.driver.session() as s:
+            res = await s.run(
+                Query(
+                    "UNWIND $ids AS id MATCH (n:Code {id:id}) DETACH DELETE n RETURN count(*) AS deleted",
+                    timeout=settings.db_timeout_s,
+                ),
+                ids=[repo_scoped_uuid(repo_id, cid) for cid in chunk_ids],
+            )
+            record = await res.single()
+            return record["deleted"] if record else 0
+
+    async def delete_stale_code_nodes(self, repo_id: str, commit: str, limit: int) -> int:
+        """Delete up to `limit` Code nodes of the repo not seen by `commit`, unstamped ones included."""
+        from neo4j import Query
+        async with self.driver.session() as s:
+            res = await s.run(
+                Query(
+                    "MATCH (n:Code {repo_id:$repo_id}) WHERE n.commit IS NULL OR n.commit <> $commit "
+                    "WITH n LIMIT $limit DETACH DELETE n RETURN count(*) AS deleted",
+                    timeout=settings.db_timeout_s,
+                ),
+                repo_id=repo_id, commit=commit, limit=limit,
+            )
+            record = await res.single()
+            return record["deleted"] if record else 0
+
+    async def delete_empty_files(self, repo_id: str, limit: int) -> int:
+        """Delete up to `limit` File nodes of the repo that no longer contain code."""
+        from neo4j import Query
+        async with self.driver.session() as s:
+            res = await s.run(
+                Query(
+                    "MATCH (f:File {repo_id:$repo_id}) WHERE NOT (f)-[:CONTAINS]->() "
+                    "WITH f LIMIT $limit DETACH DELETE f RETURN count(*) AS deleted",
+                    timeout=settings.db_timeout_s,
+                ),
+                repo_id=repo_id, limit=limit,
             )
+            record = await res.single()
+            return record["deleted"] if record else 0
+
+    async def close(self):
+        await self.driver.close()
+
+_driver: Neo4jDriver | None = None
+_driver_lock = asyncio.Lock()
+
+async def get_graph_driver() -> Neo4jDriver:
+    global _driver
+    if _driver is None:
+        async with _driver_lock:
+            if _driver is None:
+                _driver = Neo4jDriver()
+    return _driver
+
+async def close_graph_driver():
+    global _driver
+    if _driver is not None:
+        await _driver.close()
+        _driver = None
 
-__all__ = ["Neo4jDriver"]
\ No newline at end of file
+__all__ = ["Neo4jDriver", "get_graph_driver", "close_graph_driver"]
@@ -0,0 +1,226 @@
+"""Where each deduplicated chunk content occurs, for the content-addressed vector layer.
+
+With `settings.chunk_dedup` on, identical chunk content (same
+`stable_file_hash`) is embedded once and stored as one shared Qdrant point
+(see qdrant_client.ContentAddressedVectorStore). Every (repo, chunk) carrying
+that content is a lightweight occurrence row here, in SQLite at
+`<cache_dir>/occurrences.sqlite`:
+
+    occurrences(repo_id, chunk_id) -> content_hash, commit, path, language, ...
+    contents(content_hash) -> stored   (1 once its shared vector is written)
+
+A content whose last occurrence is removed is orphaned and its point deleted.
+Search hits are expanded back to their occurrences from this table.
+"""
+from __future__ import annotations
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Sequence, Set, Tuple
+
+from ..config import settings
+
+__all__ = ["OccurrenceStore", "get_occurrence_store"]
+
+# Kept well under SQLite's bound-parameter limit.
+_IN_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS occurrences (
+    repo_id TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    commit_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    language TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    start_line INTEGER,
+    end_line INTEGER,
+    PRIMARY KEY (repo_id, chunk_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS occurrences_content ON occurrences(content_hash);
+CREATE INDEX IF NOT EXISTS occurrences_path ON occurrences(path);
+CREATE TABLE IF NOT EXISTS contents (
+    content_hash TEXT PRIMARY KEY,
+    stored INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+"""
+
+_FIELDS = ("chunk_id", "repo_id", "commit", "path", "language", "symbol", "kind", "summary", "start_line", "end_line")
+
+
+def _batches(items: Sequence[str]) -> Iterator[Sequence[str]]:
+    for i in range(0, len(items), _IN_BATCH):
+        yield items[i:i + _IN_BATCH]
+
+
+def _marks(n: int) -> str:
+    return ",".join("?" * n)
+
+
+class OccurrenceStore:
+    """Thread-safe; every method is one short transaction (call via run_io)."""
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def _select(self, sql: str, keys: Sequence[str], *args) -> List[tuple]:
+        """Run `sql` (with one `{}` for an IN list) over `keys` in batches."""
+        rows: List[tuple] = []
+        for part in _batches(list(keys)):
+            rows += self._conn.execute(sql.format(_marks(len(part))), (*args, *part)).fetchall()
+        return rows
+
+    def _labels(self, hashes: Sequence[str]) -> Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]]:
+        repos: Dict[str, Set[str]] = {h: set() for h in hashes}
+        langs: Dict[str, Set[str]] = {h: set() for h in hashes}
+        sql = "SELECT DISTINCT content_hash, repo_id, language FROM occurrences WHERE content_hash IN ({})"
+        for h, repo_id, language in self._select(sql, hashes):
+            repos[h].add(repo_id)
+            langs[h].add(language)
+        return {h: (tuple(sorted(repos[h])), tuple(sorted(langs[h]))) for h in hashes}
+
+    def labels(self, hashes: Iterable[str]) -> Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]]:
+        """content_hash -> (repo ids, languages) over all its occurrences."""
+        with self._lock:
+            return self._labels(sorted(set(hashes)))
+
+    def missing(self, hashes: Iterable[str]) -> Set[str]:
+        """Hashes without a stored shared vector."""
+        hashes = sorted(set(hashes))
+        with self._lock:
+            stored = {h for (h,) in self._select(
+                "SELECT content_hash FROM contents WHERE stored = 1 AND content_hash IN ({})", hashes,
+            )}
+        return set(hashes) - stored
+
+    def add(self, repo_id: str, commit: str, rows: Sequence[Tuple[object, str]]) -> Tuple[Set[str], Set[str]]:
+        """Record (chunk, content_hash) occurrences of one repo.
+
+        Returns (hashes still without a stored vector, hashes whose repo or
+        language labels changed).
+        """
+        hashes = sorted({h for _c, h in rows})
+        with self._lock:
+            before = self._labels(hashes)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO occurrences VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                    [
+                        (repo_id, c.hash(), h, commit, c.path, c.language, c.symbol, c.kind,
+                         c.summary or "", c.start_line, c.end_line)
+                        for c, h in rows
+                    ],
+                )
+                self._conn.executemany("INSERT OR IGNORE INTO contents (content_hash) VALUES (?)", [(h,) for h in hashes])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            after = self._labels(hashes)
+            pending = {h for (h,) in self._select(
+                "SELECT content_hash FROM contents WHERE stored = 0 AND content_hash IN ({})", hashes,
+            )}
+        return pending, {h for h in hashes if before[h] != after[h]}
+
+    def mark_stored(self, hashes: Iterable[str]) -> None:
+        with self._lock:
+            self._conn.executemany("UPDATE contents SET stored = 1 WHERE content_hash = ?", [(h,) for h in set(hashes)])
+
+    def remove(
+        self, repo_id: str, chunk_ids: Sequence[str] | None = None, keep_commit: str | None = None
+    ) -> Tuple[Set[str], Set[str]]:
+        """Drop a repo's occurrences by chunk id, or all not stamped with `keep_commit`.
+
+        Returns (orphaned hashes, now without any occurrence; hashes whose
+        labels changed but still occur elsewhere).
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if chunk_ids is not None:
+                    ids = list(chunk_ids)
+                    affected = {h for (h,) in self._select(
+                        "SELECT content_hash FROM occurrences WHERE repo_id = ? AND chunk_id IN ({})", ids, repo_id,
+                    )}
+                    for part in _batches(ids):
+                        self._conn.execute(
+                            f"DELETE FROM occurrences WHERE repo_id = ? AND chunk_id IN ({_marks(len(part))})",
+                            (repo_id, *part),
+                        )
+                else:
+                    where = "repo_id = ? AND commit_id != ?"
+                    affected = {h for (h,) in self._conn.execute(
+                        f"SELECT DISTINCT content_hash FROM occurrences WHERE {where}", (repo_id, keep_commit),
+                    )}
+                    self._conn.execute(f"DELETE FROM occurrences WHERE {where}", (repo_id, keep_commit))
+                hashes = sorted(affected)
+                alive = {h for (h,) in self._select(
+                    "SELECT DISTINCT content_hash FROM occurrences WHERE content_hash IN ({})", hashes,
+                )}
+                orphaned = affected - alive
+                self._conn.executemany("DELETE FROM contents WHERE content_hash = ?", [(h,) for h in orphaned])
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return orphaned, alive
+
+    def hashes_for_path(self, path: str, repo_id: str | None = None) -> List[str]:
+        sql, args = "SELECT DISTINCT content_hash FROM occurrences WHERE path = ?", [path]
+        if repo_id is not None:
+            sql, args = sql + " AND repo_id = ?", args + [repo_id]
+        with self._lock:
+            return [h for (h,) in self._conn.execute(sql, args)]
+
+    def expand(
+        self, hashes: Sequence[str], repo_id: str | None = None, language: str | None = None, path: str | None = None
+    ) -> Dict[str, List[dict]]:
+        """content_hash -> its occurrences (matching the filters), as point-style payloads."""
+        sql = (
+            "SELECT content_hash, chunk_id, repo_id, commit_id, path, language, symbol, kind, summary, "
+            "start_line, end_line FROM occurrences WHERE content_hash IN ({})"
+        )
+        args: list = []
+        for column, value in (("repo_id", repo_id), ("language", language), ("path", path)):
+            if value is not None:
+                sql += f" AND {column} = ?"
+                args.append(value)
+        out: Dict[str, List[dict]] = {}
+        with self._lock:
+            for part in _batches(list(dict.fromkeys(hashes))):
+                query = sql.format(_marks(len(part)))
+                for h, *values in self._conn.execute(query, (*part, *args)):
+                    out.setdefault(h, []).append(dict(zip(_FIELDS, values)))
+        for occ in out.values():
+            occ.sort(key=lambda o: (o["repo_id"], o["path"], o["start_line"] or 0))
+        return out
+
+    def count(self, repo_id: str) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM occurrences WHERE repo_id = ?", (repo_id,)).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: OccurrenceStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_occurrence_store() -> OccurrenceStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = OccurrenceStore(Path(settings.cache_dir) / "occurrences.sqlite")
+    return _store
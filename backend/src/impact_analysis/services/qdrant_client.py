@@ -1,33 +1,176 @@
 from __future__ import annotations
+import asyncio
 import os
-from typing import List, Tuple
-from qdrant_client import QdrantClient
-from qdrant_client.http.models import VectorParams, Distance, PointStruct
-from ..models.chunk import ChunkIn
+from dataclasses import dataclass
+from collections import defaultdict
+from typing import Dict, List, Sequence, Tuple
+from ..config import settings
+from ..models.chunk import Chunk
+from ..utils.concurrency import run_io
+from ..utils.hashing import content_uuid, repo_scoped_uuid
+from .embedding_client import _EMBED_DIM
+from .repo_cloner import check_repo_id
 
 _QDRANT_URL = os.getenv("QDRANT_URL", "http://localhost:6333")
 _COLLECTION = os.getenv("QDRANT_COLLECTION", "impact_chunks")
 
+# Payload fields that get a keyword index; every repo-scoped filter goes through these.
+_KEYWORD_INDEXES = ("repo_id", "path", "language", "chunk_id", "commit")
+
+
+def _storage_profile() -> tuple[dict, object, object]:
+    """(VectorParams kwargs, quantization_config, search params) for the configured profile."""
+    from qdrant_client.http.models import (
+        BinaryQuantization, BinaryQuantizationConfig, QuantizationSearchParams,
+        ScalarQuantization, ScalarQuantizationConfig, ScalarType, SearchParams,
+    )
+    profile = settings.vector_storage_profile
+    if profile == "float":
+        return {"on_disk": settings.vector_on_disk}, None, None
+    if profile == "int8":
+        quantization = ScalarQuantization(
+            scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    elif profile == "binary":
+        quantization = BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    else:
+        raise ValueError(f"Unknown vector_storage_profile: {profile}")
+    search_params = SearchParams(
+        quantization=QuantizationSearchParams(
+            rescore=settings.vector_rescore, oversampling=settings.vector_oversampling
+        )
+    )
+    return {"on_disk": settings.vector_on_disk}, quantization, search_params
+
+
+@dataclass
+class SearchHit:
+    id: str
+    score: float
+    payload: dict
+
+
+class CollectionRouter:
+    """Maps a repo to the collection holding its points.
+
+    `shared` mode keeps every repo in one collection partitioned by the `repo_id`
+    payload (tenant index); `per_repo` gives each repo its own collection, which
+    makes dropping or rebuilding a repo a collection-level operation.
+    """
+
+    def __init__(self, base_name: str, mode: str):
+        if mode not in ("shared", "per_repo"):
+            raise ValueError(f"Unknown qdrant_collection_mode: {mode}")
+        self.base_name = base_name
+        self.mode = mode
+
+    def collection_for(self, repo_id: str | None) -> str:
+        if self.mode == "shared" or repo_id is None:
+            return self.base_name
+        return f"{self.base_name}__{check_repo_id(repo_id)}"
+
+    def is_repo_collection(self, name: str) -> bool:
+        return name.startswith(f"{self.base_name}__")
+
+
 class QdrantVectorStore:
     def __init__(self):
-        self.client = QdrantClient(url=_QDRANT_URL)
+        # Imported lazily: qdrant_client (grpc, numpy, pydantic models) is a large import.
+        from qdrant_client import AsyncQdrantClient
+        self.client = AsyncQdrantClient(url=_QDRANT_URL, timeout=int(settings.db_timeout_s))
         self.collection_name = _COLLECTION
-        self._ensure()
+        self.router = CollectionRouter(_COLLECTION, settings.qdrant_collection_mode)
+        self._known: set[str] = set()
+        self._vector_kwargs, self._quantization, self._search_params = _storage_profile()
+        self._ready = False
 
-    def _ensure(self):
-        existing = [c.name for c in self.client.get_collections().collections]
-        if self.collection_name not in existing:
-            self.client.recreate_collection(
-                collection_name=self.collection_name,
-                vectors_config=VectorParams(size=64, distance=Distance.COSINE),
+    async def ensure(self):
+        if self._ready:
+            return
+        if self.router.mode == "shared":
+            await self._ensure_collection(self.collection_name)
+        else:
+            # Existing repo collections pick up changed settings and indexes now
+            # rather than on their next upsert.
+            for name in await self.repo_collections():
+                await self._ensure_collection(name)
+        self._ready = True
+
+    def _hnsw_config(self):
+        from qdrant_client.http.models import HnswConfigDiff
+        # Shared mode: payload_m adds HNSW links per repo so repo-filtered
+        # searches stay fast and accurate however many repos share the
+        # collection; m keeps the global graph for unscoped searches.
+        return HnswConfigDiff(m=16, payload_m=16) if self.router.mode == "shared" else None
+
+    async def _apply_config(self, name: str, config) -> None:
+        """Bring an existing collection up to the configured HNSW and quantization settings.
+
+        Qdrant only takes these from `create_collection`, so a collection made
+        under older settings keeps them until updated here. Updating rebuilds
+        the index in the background, so it is only requested on a real change.
+        """
+        from qdrant_client.http.models import Disabled
+        hnsw = self._hnsw_config()
+        if hnsw is not None:
+            current = config.hnsw_config
+            if any(getattr(current, key, None) != value for key, value in hnsw.model_dump(exclude_none=True).items()):
+                await self.client.update_collection(collection_name=name, hnsw_config=hnsw)
+        current_q = config.quantization_config
+        if self._quantization is None:
+            if current_q is not None:
+                await self.client.update_collection(collection_name=name, quantization_config=Disabled.DISABLED)
+        elif current_q is None or current_q.model_dump(exclude_none=True) != self._quantization.model_dump(exclude_none=True):
+            await self.client.update_collection(collection_name=name, quantization_config=self._quantization)
+
+    async def _ensure_collection(self, name: str, indexes: tuple = _KEYWORD_INDEXES, tenant: str | None = "repo_id"):
+        if name in self._known:
+            return
+        from qdrant_client.http.models import Distance, KeywordIndexParams, PayloadSchemaType, VectorParams
+        shared = self.router.mode == "shared"
+        created = not await self.client.collection_exists(name)
+        if created:
+            await self.client.create_collection(
+                collection_name=name,
+                vectors_config=VectorParams(size=_EMBED_DIM, distance=Distance.COSINE, **self._vector_kwargs),
+                quantization_config=self._quantization,
+                hnsw_config=self._hnsw_config(),
+            )
+        info = await self.client.get_collection(name)
+        if not created:
+            await self._apply_config(name, info.config)
+        existing = set((info.payload_schema or {}).keys())
+        for field_name in indexes:
+            if field_name in existing:
+                continue
+            schema = (
+                KeywordIndexParams(type="keyword", is_tenant=True)
+                if field_name == tenant and shared
+                else PayloadSchemaType.KEYWORD
             )
+            await self.client.create_payload_index(name, field_name=field_name, field_schema=schema)
+        self._known.add(name)
+
+    async def needs_embedding(self, chunks: Sequence[Chunk]) -> List[bool]:
+        """Which chunks must be embedded before `upsert_chunks`; every one here."""
+        return [True] * len(chunks)
 
-    def upsert_chunks(self, vectors: List[Tuple[ChunkIn, list]]):
+    async def upsert_chunks(
+        self, vectors: List[Tuple[Chunk, list | None]], repo_id: str, commit: str | None = None
+    ) -> List[Chunk]:
+        """Store chunks with their vectors; returns chunks that still need one (none here)."""
+        from qdrant_client.http.models import PointStruct
+        await self.ensure()
+        collection = self.router.collection_for(repo_id)
+        await self._ensure_collection(collection)
         points = []
         for c, vec in vectors:
             cid = c.hash()
             points.append(
-                PointStruct(id=cid, vector=vec, payload={
+                PointStruct(id=repo_scoped_uuid(repo_id, cid), vector=vec, payload={
+                    "chunk_id": cid,
+                    "repo_id": repo_id,
+                    "commit": commit or "",
                     "path": c.path,
                     "language": c.language,
                     "symbol": c.symbol,
@@ -36,6 +179,270 @@ class QdrantVectorStore:
                 })
             )
         if points:
-            self.client.upsert(collection_name=self.collection_name, points=points)
+            await self.client.upsert(collection_name=collection, points=points)
+        return []
+
+    async def search(
+        self,
+        vector: list,
+        repo_id: str | None = None,
+        limit: int | None = None,
+        language: str | None = None,
+        path: str | None = None,
+    ) -> List[SearchHit]:
+        """Nearest chunks, optionally restricted to one repo / language / path."""
+        from qdrant_client.http.models import FieldCondition, Filter, MatchValue
+        await self.ensure()
+        limit = limit or settings.top_k_chunks
+        must = [
+            FieldCondition(key=key, match=MatchValue(value=value))
+            for key, value in (("repo_id", repo_id), ("language", language), ("path", path))
+            if value is not None
+        ]
+        query_filter = Filter(must=must) if must else None
+        if repo_id is not None or self.router.mode == "shared":
+            collections = [self.router.collection_for(repo_id)]
+        else:
+            collections = await self.repo_collections()
+        hits: List[SearchHit] = []
+        for name in collections:
+            if name not in self._known and not await self.client.collection_exists(name):
+                continue
+            res = await self.client.query_points(
+                collection_name=name, query=vector, query_filter=query_filter, limit=limit, with_payload=True,
+                search_params=self._search_params,
+            )
+            hits.extend(SearchHit(id=str(p.id), score=p.score, payload=p.payload or {}) for p in res.points)
+        hits.sort(key=lambda h: h.score, reverse=True)
+        return hits[:limit]
+
+    async def delete_chunks(self, repo_id: str, chunk_ids: List[str]):
+        """Bulk-delete one batch of a repo's chunks by filter."""
+        from qdrant_client.http.models import FieldCondition, Filter, FilterSelector, MatchAny, MatchValue
+        if not chunk_ids:
+            return
+        collection = self.router.collection_for(repo_id)
+        if not await self.client.collection_exists(collection):
+            return
+        await self.client.delete(
+            collection_name=collection,
+            points_selector=FilterSelector(filter=Filter(must=[
+                FieldCondition(key="repo_id", match=MatchValue(value=repo_id)),
+                FieldCondition(key="chunk_id", match=MatchAny(any=list(chunk_ids))),
+            ])),
+        )
+
+    async def delete_stale(self, repo_id: str, commit: str):
+        """Drop every point of the repo not re-written by the `commit` snapshot.
+
+        Catches points that predate snapshot manifests (nothing recorded them);
+        points without a `commit` payload never match the must_not condition,
+        so they are dropped too.
+        """
+        from qdrant_client.http.models import FieldCondition, Filter, FilterSelector, MatchValue
+        collection = self.router.collection_for(repo_id)
+        if not await self.client.collection_exists(collection):
+            return
+        await self.client.delete(
+            collection_name=collection,
+            points_selector=FilterSelector(filter=Filter(
+                must=[FieldCondition(key="repo_id", match=MatchValue(value=repo_id))],
+                must_not=[FieldCondition(key="commit", match=MatchValue(value=commit))],
+            )),
+        )
+
+    async def count(self, repo_id: str) -> int:
+        from qdrant_client.http.models import FieldCondition, Filter, MatchValue
+        collection = self.router.collection_for(repo_id)
+        if not await self.client.collection_exists(collection):
+            return 0
+        res = await self.client.count(
+            collection_name=collection,
+            count_filter=Filter(must=[FieldCondition(key="repo_id", match=MatchValue(value=repo_id))]),
+            exact=True,
+        )
+        return res.count
+
+    async def repo_collections(self) -> List[str]:
+        resp = await self.client.get_collections()
+        return [c.name for c in resp.collections if self.router.is_repo_collection(c.name)]
+
+    async def close(self):
+        await self.client.close()
+
+class ContentAddressedVectorStore(QdrantVectorStore):
+    """One shared point per distinct chunk content, across all repos.
+
+    Points live in `<collection>_content`, keyed by the content's
+    `stable_file_hash` and labelled with the repos and languages it occurs in
+    (for filtering). Which repo/path/symbol carries the content is kept in the
+    occurrence store; search hits are expanded back to every matching
+    occurrence. Content already stored is never re-embedded: `needs_embedding`
+    reports only unseen contents, and `upsert_chunks` just records the others.
+    """
+
+    _INDEXES = ("repo_ids", "languages", "content_hash")
+
+    def __init__(self):
+        super().__init__()
+        from .occurrence_store import get_occurrence_store
+        self.occurrences = get_occurrence_store()
+        self.collection_name = f"{_COLLECTION}_content"
+        # Every repo resolves to the one content collection.
+        self.router = CollectionRouter(self.collection_name, "shared")
+        # Serialises occurrence bookkeeping with point writes/deletes, so GC of
+        # one repo cannot delete a point another repo's ingest just referenced.
+        self._content_lock = asyncio.Lock()
+
+    def _hnsw_config(self):
+        from qdrant_client.http.models import HnswConfigDiff
+        # Points are shared by many repos, so keep the global graph; payload_m
+        # adds per-repo links for repo-filtered searches.
+        return HnswConfigDiff(payload_m=16)
+
+    async def ensure(self):
+        if self._ready:
+            return
+        await self._ensure_collection(self.collection_name, self._INDEXES, tenant=None)
+        self._ready = True
+
+    async def needs_embedding(self, chunks: Sequence[Chunk]) -> List[bool]:
+        hashes = [c.content_hash for c in chunks]
+        missing = await run_io(self.occurrences.missing, hashes)
+        # Only the first chunk of each unseen content; copies reuse its vector.
+        seen: set[str] = set()
+        out = []
+        for h in hashes:
+            out.append(h in missing and h not in seen)
+            seen.add(h)
+        return out
+
+    async def _relabel(self, hashes) -> None:
+        from qdrant_client.http.models import PointIdsList
+        if not hashes:
+            return
+        labels = await run_io(self.occurrences.labels, hashes)
+        groups: Dict[tuple, List[str]] = defaultdict(list)
+        for h, label in labels.items():
+            groups[label].append(content_uuid(h))
+        for (repo_ids, languages), ids in groups.items():
+            await self.client.set_payload(
+                collection_name=self.collection_name,
+                payload={"repo_ids": list(repo_ids), "languages": list(languages)},
+                points=PointIdsList(points=ids),
+            )
+
+    async def upsert_chunks(
+        self, vectors: List[Tuple[Chunk, list | None]], repo_id: str, commit: str | None = None
+    ) -> List[Chunk]:
+        from qdrant_client.http.models import PointStruct
+        await self.ensure()
+        rows = [(c, c.content_hash, vec) for c, vec in vectors]
+        given = {h: vec for _c, h, vec in rows if vec is not None}
+        async with self._content_lock:
+            pending, changed = await run_io(self.occurrences.add, repo_id, commit or "", [(c, h) for c, h, _v in rows])
+            # Provided vectors are always written (re-embedding after a model change).
+            write = sorted(given)
+            labels = await run_io(self.occurrences.labels, write)
+            points = [
+                PointStruct(id=content_uuid(h), vector=given[h], payload={
+                    "content_hash": h, "repo_ids": list(labels[h][0]), "languages": list(labels[h][1]),
+                })
+                for h in write
+            ]
+            if points:
+                await self.client.upsert(collection_name=self.collection_name, points=points)
+                await run_io(self.occurrences.mark_stored, write)
+            await self._relabel(sorted((changed - pending) - set(given)))
+        # Content that has no stored vector and none was given (e.g. GC removed
+        # it since `needs_embedding`): the caller embeds these and retries.
+        return [c for c, h, _v in rows if h in pending and h not in given]
+
+    async def search(
+        self,
+        vector: list,
+        repo_id: str | None = None,
+        limit: int | None = None,
+        language: str | None = None,
+        path: str | None = None,
+    ) -> List[SearchHit]:
+        """Nearest distinct contents, each expanded to the occurrences matching the filters."""
+        from qdrant_client.http.models import FieldCondition, Filter, MatchAny, MatchValue
+        await self.ensure()
+        limit = limit or settings.top_k_chunks
+        must = [
+            FieldCondition(key=key, match=MatchValue(value=value))
+            for key, value in (("repo_ids", repo_id), ("languages", language))
+            if value is not None
+        ]
+        if path is not None:
+            hashes = await run_io(self.occurrences.hashes_for_path, path, repo_id)
+            if not hashes:
+                return []
+            must.append(FieldCondition(key="content_hash", match=MatchAny(any=hashes)))
+        res = await self.client.query_points(
+            collection_name=self.collection_name, query=vector, query_filter=Filter(must=must) if must else None,
+            limit=limit, with_payload=True, search_params=self._search_params,
+        )
+        found = [(p, (p.payload or {}).get("content_hash")) for p in res.points]
+        occurrences = await run_io(self.occurrences.expand, [h for _p, h in found if h], repo_id, language, path)
+        hits: List[SearchHit] = []
+        for p, h in found:
+            occ = occurrences.get(h)
+            if not occ:
+                continue  # repo and language labels matched different occurrences
+            hits.append(SearchHit(id=str(p.id), score=p.score, payload={**occ[0], "content_hash": h, "occurrences": occ}))
+        return hits
+
+    async def _forget(self, repo_id: str, chunk_ids: List[str] | None = None, keep_commit: str | None = None):
+        from qdrant_client.http.models import PointIdsList
+        async with self._content_lock:
+            orphaned, remaining = await run_io(self.occurrences.remove, repo_id, chunk_ids, keep_commit)
+            if orphaned:
+                await self.client.delete(
+                    collection_name=self.collection_name,
+                    points_selector=PointIdsList(points=[content_uuid(h) for h in orphaned]),
+                )
+            await self._relabel(sorted(remaining))
+
+    async def delete_chunks(self, repo_id: str, chunk_ids: List[str]):
+        if chunk_ids:
+            await self._forget(repo_id, chunk_ids=list(chunk_ids))
+
+    async def delete_stale(self, repo_id: str, commit: str):
+        await self._forget(repo_id, keep_commit=commit)
+
+    async def count(self, repo_id: str) -> int:
+        return await run_io(self.occurrences.count, repo_id)
+
+    async def repo_collections(self) -> List[str]:
+        return [self.collection_name]
+
+
+_store: QdrantVectorStore | None = None
+_store_lock = asyncio.Lock()
+
+async def get_vector_store() -> QdrantVectorStore:
+    """Process-wide store; the async client pools its HTTP connections."""
+    global _store
+    if _store is None or not _store._ready:
+        async with _store_lock:
+            if _store is None:
+                _store = ContentAddressedVectorStore() if settings.chunk_dedup else QdrantVectorStore()
+            await _store.ensure()
+    return _store
+
+async def close_vector_store():
+    global _store
+    if _store is not None:
+        await _store.close()
+        _store = None
 
-__all__ = ["QdrantVectorStore"]
\ No newline at end of file
+__all__ = [
+    "QdrantVectorStore",
+    "ContentAddressedVectorStore",
+    "CollectionRouter",
+    "SearchHit",
+    "get_vector_store",
+    "close_vector_store",
+]
@@ -0,0 +1,523 @@
+"""Precomputed reachability over a repo's code dependency graph.
+
+The graph (services.graph_builder, edge A -> B = "A depends on B") is condensed
+into strongly connected components with an iterative Tarjan pass, which also
+yields a topological order (dependencies first). Every component then gets two
+labels, each a sorted list of inclusive intervals over a fixed numbering of the
+units:
+
+* descendants: everything the component depends on, transitively;
+* ancestors: everything that depends on it (the blast radius of a change).
+
+Units are numbered in DFS post-order (descendant positions) and in post-order of
+the reversed graph (ancestor positions), so closures of tree-like regions
+collapse to a handful of intervals. `depends_on` is a binary search in one
+label and `blast_radius` a precomputed count.
+
+Updates are incremental: positions of existing units never change (new units
+are appended), so the labels of every component whose closure did not change
+are reused verbatim; only components upstream (for descendants) or downstream
+(for ancestors) of units whose edges changed are recomputed. When appended and
+tombstoned positions grow past `_REBUILD_RATIO` of the graph, it is renumbered
+from scratch.
+
+Stored per repo at `<cache_dir>/reachability/<repo_id>.npz`.
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Sequence, Set, Tuple
+
+from ..config import settings
+from ..utils.concurrency import check_cancelled
+from .file_scanner import tree_fingerprint
+from .graph_builder import DependencyGraph, build_code_graph
+from .repo_cloner import check_repo_id, head_commit
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["ReachabilityIndex", "ReachabilityStore", "tarjan_scc", "get_reachability_store"]
+
+Interval = Tuple[int, int]
+
+_REBUILD_RATIO = 0.3
+
+
+def tarjan_scc(n: int, indptr: Sequence[int], indices: Sequence[int]) -> Tuple[List[int], List[List[int]]]:
+    """Iterative Tarjan over a CSR graph.
+
+    Returns (comp_of_node, members_per_comp). Components are numbered in the
+    order Tarjan completes them, which is a DFS post-order of the condensation:
+    for every edge u -> v across components, comp[v] < comp[u].
+    """
+    index = [-1] * n
+    low = [0] * n
+    on_stack = [False] * n
+    comp = [-1] * n
+    stack: List[int] = []
+    members: List[List[int]] = []
+    counter = 0
+    for root in range(n):
+        if index[root] != -1:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack[root] = True
+        work = [(root, indptr[root])]
+        while work:
+            v, i = work[-1]
+            if i < indptr[v + 1]:
+                work[-1] = (v, i + 1)
+                w = indices[i]
+                if index[w] == -1:
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    on_stack[w] = True
+                    work.append((w, indptr[w]))
+                elif on_stack[w] and index[w] < low[v]:
+                    low[v] = index[w]
+                continue
+            work.pop()
+            if work:
+                u = work[-1][0]
+                if low[v] < low[u]:
+                    low[u] = low[v]
+            if low[v] == index[v]:
+                c = len(members)
+                group = []
+                while True:
+                    w = stack.pop()
+                    on_stack[w] = False
+                    comp[w] = c
+                    group.append(w)
+                    if w == v:
+                        break
+                members.append(group)
+    return comp, members
+
+
+def _postorder(n: int, succ: List[List[int]], roots: Iterable[int]) -> List[int]:
+    """Iterative DFS post-order of a DAG, starting from `roots` in order."""
+    seen = [False] * n
+    order: List[int] = []
+    for root in roots:
+        if seen[root]:
+            continue
+        seen[root] = True
+        work = [(root, 0)]
+        while work:
+            v, i = work[-1]
+            if i < len(succ[v]):
+                work[-1] = (v, i + 1)
+                w = succ[v][i]
+                if not seen[w]:
+                    seen[w] = True
+                    work.append((w, 0))
+                continue
+            work.pop()
+            order.append(v)
+    return order
+
+
+def _merge(intervals: List[Interval]) -> List[Interval]:
+    intervals.sort()
+    out: List[Interval] = []
+    for lo, hi in intervals:
+        if out and lo <= out[-1][1] + 1:
+            if hi > out[-1][1]:
+                out[-1] = (out[-1][0], hi)
+        else:
+            out.append((lo, hi))
+    return out
+
+
+def _runs(positions: Iterable[int]) -> List[Interval]:
+    return _merge([(p, p) for p in positions])
+
+
+class _Labels:
+    """Interval lists per component, CSR encoded: rows[c] = intervals[indptr[c]:indptr[c + 1]]."""
+
+    def __init__(self, indptr: "np.ndarray", lo: "np.ndarray", hi: "np.ndarray"):
+        self.indptr, self.lo, self.hi = indptr, lo, hi
+
+    @classmethod
+    def from_lists(cls, rows: List[List[Interval]]) -> "_Labels":
+        import numpy as np
+        indptr = np.zeros(len(rows) + 1, np.int64)
+        np.cumsum([len(r) for r in rows], out=indptr[1:])
+        flat = [iv for r in rows for iv in r]
+        lo = np.fromiter((a for a, _ in flat), np.int32, len(flat))
+        hi = np.fromiter((b for _, b in flat), np.int32, len(flat))
+        return cls(indptr, lo, hi)
+
+    def row(self, c: int) -> List[Interval]:
+        a, b = int(self.indptr[c]), int(self.indptr[c + 1])
+        return list(zip(self.lo[a:b].tolist(), self.hi[a:b].tolist()))
+
+    def contains(self, c: int, pos: int) -> bool:
+        a, b = int(self.indptr[c]), int(self.indptr[c + 1])
+        k = a + int(self.lo[a:b].searchsorted(pos, side="right")) - 1
+        return bool(k >= a and self.hi[k] >= pos)
+
+    @property
+    def size(self) -> int:
+        return len(self.lo)
+
+
+@dataclass
+class ReachabilityIndex:
+    units: List[str]
+    comp: np.ndarray  # int32 component per unit
+    desc_pos: np.ndarray  # int32 position per unit in the descendant numbering
+    anc_pos: np.ndarray  # int32 position per unit in the ancestor numbering
+    desc_units: np.ndarray  # int32 unit per descendant position (-1 = tombstone)
+    anc_units: np.ndarray  # int32 unit per ancestor position (-1 = tombstone)
+    desc: _Labels
+    anc: _Labels
+    desc_count: np.ndarray  # int32 live units reachable from each component (itself included)
+    anc_count: np.ndarray  # int32 live units reaching each component (itself included)
+    edge_indptr: np.ndarray  # unit dependency edges (CSR), kept to diff the next update against
+    edge_indices: np.ndarray
+    commit: str | None
+
+    def __post_init__(self):
+        self._index = {u: i for i, u in enumerate(self.units)}
+        self._by_file: Dict[str, List[int]] = defaultdict(list)
+        for i, u in enumerate(self.units):
+            self._by_file[u.split("::", 1)[0]].append(i)
+
+    # --- queries -----------------------------------------------------------
+
+    def unit_index(self, unit_id: str) -> int | None:
+        return self._index.get(unit_id)
+
+    def resolve(self, target: str) -> List[str]:
+        """Unit ids for a unit id, or for every unit of a file path."""
+        if target in self._index and "::" in target:
+            return [target]
+        return [self.units[i] for i in self._by_file.get(target, [])]
+
+    def top_blast_radius(self, limit: int) -> List[Tuple[str, int]]:
+        import numpy as np
+        radius = self.anc_count[self.comp].astype(np.int64) - 1
+        order = np.argsort(-radius, kind="stable")[:limit]
+        return [(self.units[i], int(radius[i])) for i in order.tolist()]
+
+    def depends_on(self, a: str, b: str) -> bool:
+        """True if unit `a` transitively depends on unit `b` (a unit depends on itself)."""
+        ia, ib = self._index.get(a), self._index.get(b)
+        if ia is None or ib is None:
+            return False
+        return self.desc.contains(int(self.comp[ia]), int(self.desc_pos[ib]))
+
+    def blast_radius(self, unit_id: str) -> int:
+        """Number of other units that transitively depend on `unit_id`."""
+        i = self._index.get(unit_id)
+        return int(self.anc_count[self.comp[i]]) - 1 if i is not None else 0
+
+    def dependency_count(self, unit_id: str) -> int:
+        i = self._index.get(unit_id)
+        return int(self.desc_count[self.comp[i]]) - 1 if i is not None else 0
+
+    def _expand(self, labels: _Labels, positions_to_units: "np.ndarray", comps: Iterable[int]) -> List[int]:
+        import numpy as np
+        merged = _merge([iv for c in set(comps) for iv in labels.row(c)])
+        if not merged:
+            return []
+        pos = np.concatenate([np.arange(lo, hi + 1) for lo, hi in merged])
+        units = positions_to_units[pos]
+        return units[units >= 0].tolist()
+
+    def dependents(self, unit_ids: Iterable[str]) -> List[str]:
+        """Every unit that transitively depends on any of `unit_ids` (excluding them)."""
+        idx = [self._index[u] for u in unit_ids if u in self._index]
+        own = set(idx)
+        found = self._expand(self.anc, self.anc_units, (int(self.comp[i]) for i in idx))
+        return [self.units[u] for u in found if u not in own]
+
+    def dependencies(self, unit_ids: Iterable[str]) -> List[str]:
+        idx = [self._index[u] for u in unit_ids if u in self._index]
+        own = set(idx)
+        found = self._expand(self.desc, self.desc_units, (int(self.comp[i]) for i in idx))
+        return [self.units[u] for u in found if u not in own]
+
+    def stats(self) -> dict:
+        return {
+            "units": len(self.units),
+            "components": int(len(self.desc_count)),
+            "edges": int(len(self.edge_indices)),
+            "descendant_intervals": self.desc.size,
+            "ancestor_intervals": self.anc.size,
+            "commit": self.commit,
+        }
+
+    # --- building ----------------------------------------------------------
+
+    @classmethod
+    def build(cls, graph: DependencyGraph, commit: str | None, previous: "ReachabilityIndex | None" = None) -> "ReachabilityIndex":
+        """Index `graph`, reusing the unchanged labels of `previous` when given."""
+        import numpy as np
+        n = len(graph.units)
+        unit_ids = [u.id for u in graph.units]
+        succ = [sorted(d) for d in graph.deps]
+        indptr = [0] * (n + 1)
+        for i, s in enumerate(succ):
+            indptr[i + 1] = indptr[i] + len(s)
+        indices = [j for s in succ for j in s]
+        comp, members = tarjan_scc(n, indptr, indices)
+        n_comp = len(members)
+        check_cancelled()
+
+        csucc: List[List[int]] = [[] for _ in range(n_comp)]
+        cpred: List[List[int]] = [[] for _ in range(n_comp)]
+        for c, group in enumerate(members):
+            out = {comp[j] for v in group for j in succ[v]}
+            out.discard(c)
+            csucc[c] = sorted(out)
+            for d in csucc[c]:
+                cpred[d].append(c)
+
+        reuse = previous is not None and previous._reusable_for(unit_ids)
+        if reuse:
+            assert previous is not None
+            old = previous._index
+            desc_pos = [int(previous.desc_pos[old[u]]) if u in old else -1 for u in unit_ids]
+            anc_pos = [int(previous.anc_pos[old[u]]) if u in old else -1 for u in unit_ids]
+            next_desc, next_anc = len(previous.desc_units), len(previous.anc_units)
+            for i in range(n):
+                if desc_pos[i] < 0:
+                    desc_pos[i], anc_pos[i] = next_desc, next_anc
+                    next_desc += 1
+                    next_anc += 1
+            dirty_out, dirty_in = previous._changed_edges(unit_ids, succ)
+        else:
+            # Tarjan's completion order is a post-order of the condensation; the
+            # ancestor numbering is a post-order of the reversed condensation.
+            desc_pos = [0] * n
+            p = 0
+            for group in members:
+                for v in sorted(group):
+                    desc_pos[v] = p
+                    p += 1
+            anc_pos = [0] * n
+            p = 0
+            for c in _postorder(n_comp, cpred, range(n_comp - 1, -1, -1)):
+                for v in sorted(members[c]):
+                    anc_pos[v] = p
+                    p += 1
+            dirty_out = dirty_in = set(range(n))
+
+        desc_units = np.full(max(desc_pos, default=-1) + 1, -1, np.int32)
+        desc_units[desc_pos] = np.arange(n, dtype=np.int32)
+        anc_units = np.full(max(anc_pos, default=-1) + 1, -1, np.int32)
+        anc_units[anc_pos] = np.arange(n, dtype=np.int32)
+
+        # Components whose closure may have changed: upstream of changed out-edges
+        # (descendant labels) and downstream of changed in-edges (ancestor labels).
+        affected_desc = _closure({comp[v] for v in dirty_out}, cpred)
+        affected_anc = _closure({comp[v] for v in dirty_in}, csucc)
+
+        desc_rows: List[List[Interval]] = [[] for _ in range(n_comp)]
+        anc_rows: List[List[Interval]] = [[] for _ in range(n_comp)]
+        desc_count = np.zeros(n_comp, np.int32)
+        anc_count = np.zeros(n_comp, np.int32)
+        desc_live = np.concatenate([[0], np.cumsum(desc_units >= 0)]).astype(np.int64)
+        anc_live = np.concatenate([[0], np.cumsum(anc_units >= 0)]).astype(np.int64)
+
+        def count(rows: List[Interval], live: "np.ndarray") -> int:
+            return int(sum(live[hi + 1] - live[lo] for lo, hi in rows))
+
+        for c in range(n_comp):  # dependencies complete before their dependents
+            if c % 4096 == 0:
+                check_cancelled()
+            if reuse and c not in affected_desc:
+                oc = int(previous.comp[previous._index[unit_ids[members[c][0]]]])
+                desc_rows[c] = previous.desc.row(oc)
+                desc_count[c] = previous.desc_count[oc]
+                continue
+            rows = _runs(desc_pos[v] for v in members[c])
+            for d in csucc[c]:
+                rows.extend(desc_rows[d])
+            desc_rows[c] = _merge(rows)
+            desc_count[c] = count(desc_rows[c], desc_live)
+        for c in range(n_comp - 1, -1, -1):  # dependents complete before their dependencies
+            if c % 4096 == 0:
+                check_cancelled()
+            if reuse and c not in affected_anc:
+                oc = int(previous.comp[previous._index[unit_ids[members[c][0]]]])
+                anc_rows[c] = previous.anc.row(oc)
+                anc_count[c] = previous.anc_count[oc]
+                continue
+            rows = _runs(anc_pos[v] for v in members[c])
+            for d in cpred[c]:
+                rows.extend(anc_rows[d])
+            anc_rows[c] = _merge(rows)
+            anc_count[c] = count(anc_rows[c], anc_live)
+
+        return cls(
+            units=unit_ids,
+            comp=np.array(comp, np.int32),
+            desc_pos=np.array(desc_pos, np.int32),
+            anc_pos=np.array(anc_pos, np.int32),
+            desc_units=desc_units,
+            anc_units=anc_units,
+            desc=_Labels.from_lists(desc_rows),
+            anc=_Labels.from_lists(anc_rows),
+            desc_count=desc_count,
+            anc_count=anc_count,
+            edge_indptr=np.array(indptr, np.int64),
+            edge_indices=np.array(indices, np.int32),
+            commit=commit,
+        )
+
+    def _reusable_for(self, unit_ids: List[str]) -> bool:
+        """Incremental update only while appended + tombstoned positions stay small."""
+        live = sum(1 for u in unit_ids if u in self._index)
+        churn = (len(unit_ids) - live) + (len(self.units) - live) + int((self.desc_units < 0).sum())
+        return churn <= _REBUILD_RATIO * max(len(unit_ids), 1)
+
+    def _changed_edges(self, unit_ids: List[str], succ: List[List[int]]) -> Tuple[Set[int], Set[int]]:
+        """New-graph units whose dependencies changed (out) / whose dependents changed (in)."""
+        new_index = {u: i for i, u in enumerate(unit_ids)}
+        dirty_out: Set[int] = set()
+        dirty_in: Set[int] = set()
+        for i, uid in enumerate(unit_ids):
+            new_targets = {unit_ids[j] for j in succ[i]}
+            oi = self._index.get(uid)
+            if oi is None:
+                dirty_out.add(i)
+                dirty_in.add(i)
+                dirty_in.update(succ[i])
+                continue
+            a, b = int(self.edge_indptr[oi]), int(self.edge_indptr[oi + 1])
+            old_targets = {self.units[j] for j in self.edge_indices[a:b].tolist()}
+            if new_targets != old_targets:
+                dirty_out.add(i)
+                dirty_in.update(new_index[t] for t in new_targets ^ old_targets if t in new_index)
+        # Units that disappeared changed the dependents of everything they depended on.
+        for oi, uid in enumerate(self.units):
+            if uid not in new_index:
+                a, b = int(self.edge_indptr[oi]), int(self.edge_indptr[oi + 1])
+                dirty_in.update(new_index[self.units[j]] for j in self.edge_indices[a:b].tolist() if self.units[j] in new_index)
+        return dirty_out, dirty_in
+
+    # --- persistence -------------------------------------------------------
+
+    def save(self, path: Path) -> None:
+        import numpy as np
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez(
+            tmp, units=np.array(self.units, dtype=str), comp=self.comp, desc_pos=self.desc_pos,
+            anc_pos=self.anc_pos, desc_units=self.desc_units, anc_units=self.anc_units,
+            desc_indptr=self.desc.indptr, desc_lo=self.desc.lo, desc_hi=self.desc.hi,
+            anc_indptr=self.anc.indptr, anc_lo=self.anc.lo, anc_hi=self.anc.hi,
+            desc_count=self.desc_count, anc_count=self.anc_count,
+            edge_indptr=self.edge_indptr, edge_indices=self.edge_indices,
+            meta=np.array(json.dumps({"commit": self.commit})),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "ReachabilityIndex":
+        import numpy as np
+        with np.load(path) as z:
+            return cls(
+                units=z["units"].tolist(), comp=z["comp"], desc_pos=z["desc_pos"], anc_pos=z["anc_pos"],
+                desc_units=z["desc_units"], anc_units=z["anc_units"],
+                desc=_Labels(z["desc_indptr"], z["desc_lo"], z["desc_hi"]),
+                anc=_Labels(z["anc_indptr"], z["anc_lo"], z["anc_hi"]),
+                desc_count=z["desc_count"], anc_count=z["anc_count"],
+                edge_indptr=z["edge_indptr"], edge_indices=z["edge_indices"],
+                commit=json.loads(str(z["meta"]))["commit"],
+            )
+
+
+def _closure(start: Set[int], adj: List[List[int]]) -> Set[int]:
+    seen = set(start)
+    stack = list(start)
+    while stack:
+        for w in adj[stack.pop()]:
+            if w not in seen:
+                seen.add(w)
+                stack.append(w)
+    return seen
+
+
+class ReachabilityStore:
+    """Loads, caches and incrementally updates per-repo reachability indexes."""
+
+    def __init__(self, root: Path, cache_size: int = 16):
+        self.root = root
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, tuple[float, ReachabilityIndex]]" = OrderedDict()
+        self._locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+
+    def path_for(self, repo_id: str) -> Path:
+        return self.root / f"{check_repo_id(repo_id)}.npz"
+
+    def get(self, repo_id: str) -> ReachabilityIndex | None:
+        p = self.path_for(repo_id)
+        try:
+            mtime = p.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        with self._guard:
+            hit = self._cache.get(repo_id)
+            if hit and hit[0] == mtime:
+                self._cache.move_to_end(repo_id)
+                return hit[1]
+        idx = ReachabilityIndex.load(p)
+        with self._guard:
+            self._cache[repo_id] = (mtime, idx)
+            self._cache.move_to_end(repo_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return idx
+
+    def update(self, repo_id: str, graph: DependencyGraph, commit: str | None) -> ReachabilityIndex:
+        with self._guard:
+            lock = self._locks[repo_id]
+        with lock:
+            t0 = time.monotonic()
+            previous = self.get(repo_id)
+            idx = ReachabilityIndex.build(graph, commit, previous)
+            idx.save(self.path_for(repo_id))
+            logger.info("reachability %s: %s in %.2fs", repo_id, idx.stats(), time.monotonic() - t0)
+        return self.get(repo_id) or idx
+
+    def ensure(self, repo_id: str, repo_path: Path | None) -> ReachabilityIndex | None:
+        """The index for the repo's current HEAD, updating it if missing or stale.
+
+        A tree that is not a git checkout is keyed by its `tree_fingerprint`.
+        """
+        idx = self.get(repo_id)
+        if repo_path is None or not repo_path.exists():
+            return idx
+        commit = head_commit(repo_path) or tree_fingerprint(repo_path)
+        if idx is not None and idx.commit == commit:
+            return idx
+        return self.update(repo_id, build_code_graph(repo_path), commit)
+
+
+_store: ReachabilityStore | None = None
+
+
+def get_reachability_store() -> ReachabilityStore:
+    global _store
+    if _store is None:
+        _store = ReachabilityStore(Path(settings.cache_dir) / "reachability")
+    return _store
@@ -0,0 +1,308 @@
+"""Changes of a ref range (base..head), diffed server-side from the local clone.
+
+A request names a base and a head ref, optionally asking for the merge-base
+of the two as the real base (what a pull request shows). The clone is brought
+up to date with a fetch only (services.repo_cloner.fetch_refs); the work tree
+is never touched.
+
+The range is processed one commit at a time: every non-merge commit of
+base..head is diffed against its parent (`git diff -M -U0`, so renames are
+detected and hunks are exactly the changed lines), the diff is parsed
+(services.diff_analyzer) and its changed lines are mapped to the graph units
+they touch in the old and the new version of each file, parsed with the
+language registry. Each per-commit-pair result is stored under
+`<cache_dir>/ref_diffs/<repo_id>/<parent>-<commit>.json`, so a pull request
+analysed again after new pushes only diffs and parses the new commits.
+
+The net change of the range is a cheap `git diff -M --raw --numstat` of
+base..head; per-commit units are kept for the files it still lists (following
+renames), so a change reverted within the range drops out. A file changed
+only outside the walked commits (merge commits, the base side of a non-merge-base
+range) counts as changed as a whole. Ranges longer than
+`settings.range_max_commits` are diffed as a single base..head pair.
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterable, List, Set, Tuple
+
+from ..config import settings
+from ..utils.concurrency import check_cancelled
+from .ast_chunker.registry import Symbol, extract_symbols, language_for, plugin_for
+from .diff_analyzer import FileDiff, parse_unified_diff
+from .repo_cloner import check_repo_id, fetch_refs, resolve_fetched_ref
+from .repo_parser import MAX_PARSE_BYTES
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["RangeDiff", "RefRangeStore", "get_ref_range_store"]
+
+Pair = Tuple[str, str]  # (parent, commit)
+
+
+def _git(repo_path: Path, *args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        ["git", "-C", str(repo_path), "-c", "core.quotepath=off", *args],
+        capture_output=True, text=True, encoding="utf-8", errors="replace", check=False,
+    )
+
+
+def _read_blobs(repo_path: Path, specs: List[str]) -> Dict[str, bytes]:
+    """Contents of `<rev>:<path>` specs via one `git cat-file --batch`; missing and oversized ones are left out."""
+    if not specs:
+        return {}
+    proc = subprocess.run(
+        ["git", "-C", str(repo_path), "cat-file", "--batch"],
+        input="".join(f"{s}\n" for s in specs).encode("utf-8"), capture_output=True, check=False,
+    )
+    out, pos, blobs = proc.stdout, 0, {}
+    for spec in specs:
+        eol = out.find(b"\n", pos)
+        if eol < 0:
+            break
+        header = out[pos:eol].split()
+        pos = eol + 1
+        if len(header) != 3 or header[1] != b"blob":
+            continue  # "<spec> missing"
+        size = int(header[2])
+        if size <= MAX_PARSE_BYTES:
+            blobs[spec] = out[pos:pos + size]
+        pos += size + 1
+    return blobs
+
+
+def _unit_owners(symbols: List[Symbol], n_lines: int, python: bool) -> List[int]:
+    """Per line (1-based; index 0 unused), the innermost symbol that is a graph unit, or -1 (module level).
+
+    Python graph units (services.graph_builder) are top-level functions and
+    classes and the methods of top-level classes; other languages have a unit
+    for every symbol (services.symbol_graph).
+    """
+    def is_unit(s: Symbol) -> bool:
+        if not python or s.parent is None:
+            return True
+        return s.kind == "method" and symbols[s.parent].parent is None
+
+    owner = [-1] * (n_lines + 1)
+    order = sorted(range(len(symbols)), key=lambda i: symbols[i].end_line - symbols[i].start_line, reverse=True)
+    for i in order:
+        if is_unit(symbols[i]):
+            start, end = symbols[i].start_line, min(symbols[i].end_line, n_lines)
+            if start <= end:
+                owner[start:end + 1] = [i] * (end - start + 1)
+    return owner
+
+
+def _touched_units(path: str, source: bytes, lines: Iterable[int]) -> Set[str]:
+    """Graph unit ids (`path`, `path::qualname`) covering the given lines of one version of a file."""
+    language = language_for(PurePosixPath(path))
+    plugin = plugin_for(language) if language else None
+    if plugin is None:
+        return {path}
+    symbols, _imports, _how = extract_symbols(plugin, source)
+    n_lines = source.count(b"\n") + 1
+    owner = _unit_owners(symbols, n_lines, plugin.name == "python")
+    found = set()
+    for line in lines:
+        if 1 <= line <= n_lines:
+            i = owner[line]
+            found.add(path if i < 0 else f"{path}::{symbols[i].qualname}")
+    return found
+
+
+def _hunk_lines(f: FileDiff) -> Tuple[List[int], List[int]]:
+    """(old, new) line numbers a `-U0` diff changes: removed lines and added lines."""
+    old: List[int] = []
+    new: List[int] = []
+    for old_start, old_len, new_start, new_len in f.hunks:
+        old.extend(range(old_start, old_start + old_len))
+        new.extend(range(new_start, new_start + new_len))
+    return old, new
+
+
+def _diff_pair(repo_path: Path, parent: str, commit: str) -> List[dict]:
+    """Changed files of one commit pair, each with the graph units its changed lines touch."""
+    res = _git(repo_path, "diff", "-M", "-U0", "--no-color", "--no-ext-diff", parent, commit)
+    if res.returncode != 0:
+        raise RuntimeError(f"git diff {parent[:12]}..{commit[:12]} failed: {res.stderr.strip()}")
+    files = parse_unified_diff(res.stdout)
+    wanted = [(f, *_hunk_lines(f)) for f in files]
+    specs = [f"{parent}:{f.old_path}" for f, old, _new in wanted if old and f.old_path]
+    specs += [f"{commit}:{f.new_path}" for f, _old, new in wanted if new and f.new_path]
+    blobs = _read_blobs(repo_path, specs)
+    out = []
+    for f, old, new in wanted:
+        check_cancelled()
+        units: Set[str] = set()
+        for rev, path, lines in ((parent, f.old_path, old), (commit, f.new_path, new)):
+            if lines and path:
+                blob = blobs.get(f"{rev}:{path}")
+                units |= {path} if blob is None else _touched_units(path, blob, lines)
+        # Pure renames, mode changes and binary files change the file as a whole.
+        out.append({**f.to_dict(), "units": sorted(units or {f.path})})
+    return out
+
+
+def _parse_net(raw: str) -> List[dict]:
+    """Entries of `git diff -z --raw --numstat`: status and paths from the raw part, line counts from numstat."""
+    tokens = raw.split("\0")
+    entries: List[dict] = []
+    counts: List[Tuple[str, str]] = []
+    i = 0
+    while i < len(tokens) and tokens[i]:
+        tok = tokens[i]
+        if tok.startswith(":"):
+            status = tok.split()[-1][0]
+            if status in "RC":
+                old, new = tokens[i + 1], tokens[i + 2]
+                i += 3
+            else:
+                old = new = tokens[i + 1]
+                i += 2
+            entries.append({
+                "path": new if status != "D" else old,
+                "old_path": None if status == "A" else old,
+                "status": {"A": "added", "D": "deleted", "R": "renamed"}.get(status, "modified"),
+            })
+        else:
+            added, removed, path = tok.split("\t", 2)
+            i += 1 if path else 3  # renames list both paths as separate tokens
+            counts.append((added, removed))
+    for entry, (added, removed) in zip(entries, counts):
+        entry["added"] = int(added) if added.isdigit() else 0  # "-" for binary files
+        entry["removed"] = int(removed) if removed.isdigit() else 0
+    return entries
+
+
+@dataclass
+class RangeDiff:
+    base: str  # resolved base commit (the merge-base when asked for)
+    head: str
+    commits: List[str]  # non-merge commits of base..head, oldest first
+    files: List[dict] = field(default_factory=list)  # net changes with the units they touch
+    diffed: int = 0  # commit pairs diffed by this call (the rest came from the cache)
+
+    @property
+    def units(self) -> List[str]:
+        return sorted({u for f in self.files for u in f["units"]})
+
+
+class RefRangeStore:
+    """Per-commit-pair diff cache plus the range analysis on top of it."""
+
+    def __init__(self, root: Path, cache_size: int = 64):
+        self.root = root
+        self.cache_size = cache_size
+        self._ranges: "OrderedDict[Tuple[str, str, str], RangeDiff]" = OrderedDict()
+        self._guard = threading.Lock()
+
+    def _path(self, repo_id: str, pair: Pair) -> Path:
+        return self.root / check_repo_id(repo_id) / f"{pair[0]}-{pair[1]}.json"
+
+    def pair(self, repo_id: str, repo_path: Path, pair: Pair) -> Tuple[List[dict], bool]:
+        """(files of one commit pair, whether it had to be diffed)."""
+        path = self._path(repo_id, pair)
+        try:
+            return json.loads(path.read_text()), False
+        except (FileNotFoundError, ValueError):
+            pass
+        files = _diff_pair(repo_path, *pair)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(files))
+        os.replace(tmp, path)
+        return files, True
+
+    def analyze(
+        self, repo_id: str, repo_path: Path, base: str, head: str, merge_base: bool = False, fetch: bool = True,
+    ) -> RangeDiff:
+        """Net changes of base..head with the units they touch.
+
+        Raises ValueError when `repo_id` is not a valid id or `repo_path` is not
+        a git clone, and LookupError when a ref does not resolve (after
+        fetching, if asked to).
+        """
+        check_repo_id(repo_id)
+        if not (repo_path / ".git").exists() and _git(repo_path, "rev-parse", "--git-dir").returncode != 0:
+            raise ValueError(f"{repo_path} is not a git clone")
+        if fetch:
+            fetch_refs(repo_path, [base, head])
+        shas = []
+        for ref in (base, head):
+            sha = resolve_fetched_ref(repo_path, ref)
+            if sha is None:
+                raise LookupError(f"ref {ref!r} not found in repo {repo_id}")
+            shas.append(sha)
+        base_sha, head_sha = shas
+        if merge_base:
+            res = _git(repo_path, "merge-base", base_sha, head_sha)
+            if res.returncode != 0:
+                raise LookupError(f"{base!r} and {head!r} have no common ancestor")
+            base_sha = res.stdout.split()[0]
+
+        key = (repo_id, base_sha, head_sha)
+        with self._guard:
+            hit = self._ranges.get(key)
+            if hit is not None:
+                self._ranges.move_to_end(key)
+                return RangeDiff(hit.base, hit.head, hit.commits, hit.files)
+
+        t0 = time.monotonic()
+        res = _git(repo_path, "rev-list", "--no-merges", "--reverse", "--parents", f"{base_sha}..{head_sha}")
+        walked = [line.split() for line in res.stdout.splitlines()]
+        commits = [w[0] for w in walked]
+        pairs: List[Pair] = [(w[1], w[0]) for w in walked if len(w) == 2]
+        if len(pairs) > settings.range_max_commits:
+            pairs = [(base_sha, head_sha)]
+        diffed = 0
+        per_pair: List[List[dict]] = []
+        for pair in pairs:
+            check_cancelled()
+            files, fresh = self.pair(repo_id, repo_path, pair)
+            per_pair.append(files)
+            diffed += fresh
+
+        net = _git(repo_path, "diff", "-M", "-z", "--raw", "--numstat", base_sha, head_sha)
+        if net.returncode != 0:
+            raise RuntimeError(f"git diff {base_sha[:12]}..{head_sha[:12]} failed: {net.stderr.strip()}")
+        files = _parse_net(net.stdout)
+        for entry in files:
+            # Every name the file had within the range, newest first through renames.
+            names = {entry["path"], entry["old_path"]} - {None}
+            touched = []
+            for pair_files in reversed(per_pair):
+                for f in pair_files:
+                    if f["path"] in names or f["old_path"] in names:
+                        touched.append(f)
+                        if f["status"] == "renamed":
+                            names.add(f["old_path"])
+            entry["commits"] = len(touched)
+            entry["units"] = sorted({u for f in touched for u in f["units"]}) if touched else [entry["path"]]
+
+        result = RangeDiff(base_sha, head_sha, commits, files, diffed)
+        with self._guard:
+            self._ranges[key] = result
+            while len(self._ranges) > self.cache_size:
+                self._ranges.popitem(last=False)
+        logger.info(
+            "ref range %s %s..%s: %d commits (%d diffed), %d files in %.2fs",
+            repo_id, base_sha[:12], head_sha[:12], len(commits), diffed, len(files), time.monotonic() - t0,
+        )
+        return result
+
+
+_store: RefRangeStore | None = None
+
+
+def get_ref_range_store() -> RefRangeStore:
+    global _store
+    if _store is None:
+        _store = RefRangeStore(Path(settings.cache_dir) / "ref_diffs")
+    return _store
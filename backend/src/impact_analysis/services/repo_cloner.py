@@ -5,28 +5,117 @@ Private repository (token / SSH) logic is outlined in comments for future enable
 from __future__ import annotations
 
 import os
-import hashlib
+import logging
+import re
 from pathlib import Path
 from typing import Optional
 
-from git import Repo, GitCommandError  # type: ignore
+from ..utils.fingerprint import short_id
+from ..utils.singleflight import SingleFlight, file_lock
+
+logger = logging.getLogger(__name__)
 
 DATA_REPOS_DIR = Path(os.getenv("DATA_REPOS_DIR", "data/repos"))
-DATA_REPOS_DIR.mkdir(parents=True, exist_ok=True)
+
+_FULL_SHA = re.compile(r"^[0-9a-f]{40}$")
+# Ids become folder names and collection names; ids from URLs are hex.
+_REPO_ID = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+
+def _repos_dir() -> Path:
+    # Created on first use rather than at import time.
+    DATA_REPOS_DIR.mkdir(parents=True, exist_ok=True)
+    return DATA_REPOS_DIR
 
 
 def _safe_dir_name(url: str) -> str:
     """Create a deterministic folder name for a repo URL."""
-    h = hashlib.sha256(url.encode("utf-8")).hexdigest()[:12]
-    return h
+    return short_id(url, 12)
+
+
+def repo_id_for_url(repo_url: str) -> str:
+    """Repo identifier used across stores; equals the clone folder name."""
+    return _safe_dir_name(repo_url)
+
+
+def check_repo_id(repo_id: str) -> str:
+    """`repo_id` itself if it is safe as a path component and collection name; ValueError otherwise."""
+    if not _REPO_ID.match(repo_id):
+        raise ValueError(f"Invalid repo id {repo_id!r}: use letters, digits, '_' and '-'")
+    return repo_id
+
+
+def repo_path_for_id(repo_id: str) -> Path:
+    """Clone folder of an ingested repo (may not exist)."""
+    return DATA_REPOS_DIR / repo_id
+
+
+def resolve_repo(repo_id: str | None, repo_path: str | None) -> tuple[str, Path]:
+    """(repo_id, local path) from either identifier; the id of a local path is its folder name.
+
+    Raises ValueError for an id that is not a safe path component (see `check_repo_id`).
+    """
+    if repo_path:
+        path = Path(repo_path)
+        if repo_id is None and not _REPO_ID.match(path.name):
+            raise ValueError(f"Folder name {path.name!r} is not a valid repo id; pass repo_id")
+        return check_repo_id(repo_id or path.name), path
+    if repo_id:
+        return check_repo_id(repo_id), repo_path_for_id(repo_id)
+    raise ValueError("Provide repo_id or repo_path")
+
+
+def head_commit(repo_path: Path) -> str | None:
+    """Hex sha of HEAD for a local clone, or None if it is not a git checkout."""
+    from git import Repo, InvalidGitRepositoryError, NoSuchPathError  # type: ignore
+    try:
+        return Repo(repo_path).head.commit.hexsha
+    except (InvalidGitRepositoryError, NoSuchPathError, ValueError):
+        return None
+
+
+def resolve_ref(repo_path: Path, ref: str) -> str | None:
+    """Hex sha a branch, tag or (abbreviated) sha points at, or None if it does not resolve."""
+    from git import Repo, InvalidGitRepositoryError, NoSuchPathError  # type: ignore
+    from gitdb.exc import ODBError  # type: ignore
+    try:
+        return Repo(repo_path).commit(ref).hexsha
+    except (InvalidGitRepositoryError, NoSuchPathError, ODBError, ValueError):
+        return None
+
+
+def resolve_fetched_ref(repo_path: Path, ref: str) -> str | None:
+    """Like `resolve_ref`, preferring the remote-tracking ref a fetch updates over a stale local branch."""
+    if not _FULL_SHA.match(ref):
+        sha = resolve_ref(repo_path, f"refs/remotes/origin/{ref}")
+        if sha is not None:
+            return sha
+    return resolve_ref(repo_path, ref)
+
+
+_clones: SingleFlight[str, Path] = SingleFlight()
+_fetches: SingleFlight[str, bool] = SingleFlight()
 
 
 def clone_or_update_public_repo(repo_url: str) -> Path:
     """Clone (or pull) a PUBLIC GitHub repository via HTTPS.
 
+    Concurrent calls for the same repo share one clone/pull; a lock file next
+    to the folder keeps other worker processes out of it meanwhile.
     NOTE: Only public repos are supported now. For private repos, see commented code below.
     """
-    folder = DATA_REPOS_DIR / _safe_dir_name(repo_url)
+    folder = _repos_dir() / _safe_dir_name(repo_url)
+    return _clones.do(str(folder), _locked_clone_or_update, repo_url, folder)
+
+
+def _locked_clone_or_update(repo_url: str, folder: Path) -> Path:
+    with file_lock(folder.with_name(folder.name + ".lock")):
+        return _clone_or_update(repo_url, folder)
+
+
+def _clone_or_update(repo_url: str, folder: Path) -> Path:
+    from git import Repo, GitCommandError  # type: ignore  # lazy: GitPython is slow to import
+
     if folder.exists():
         try:
             repo = Repo(folder)
@@ -45,6 +134,39 @@ def clone_or_update_public_repo(repo_url: str) -> Path:
         Repo.clone_from(repo_url, folder)
     return folder
 
+
+def fetch_refs(repo_path: Path, refs: list[str]) -> bool:
+    """Fetch-only update of a clone: remote branches, tags and `refs` (no checkout, no pull).
+
+    Full shas already in the clone need no fetch; `pull/<n>/head` style refs are
+    fetched to `refs/remotes/origin/pull/<n>/head`. Concurrent calls for the
+    same clone and refs share one fetch. Returns False when nothing could be
+    fetched (no `origin` remote, network error): callers go on with local refs.
+    """
+    refs = sorted(r for r in set(refs) if not (_FULL_SHA.match(r) and resolve_ref(repo_path, r)))
+    if not refs:
+        return True
+    key = f"{repo_path.resolve()}\0{' '.join(refs)}"
+    return _fetches.do(key, _locked_fetch, repo_path, refs)
+
+
+def _locked_fetch(repo_path: Path, refs: list[str]) -> bool:
+    from git import Repo, GitCommandError, InvalidGitRepositoryError, NoSuchPathError  # type: ignore
+    specs = ["+refs/heads/*:refs/remotes/origin/*", "+refs/tags/*:refs/tags/*"]
+    for ref in refs:
+        if ref.startswith("pull/"):
+            specs.append(f"+refs/{ref}:refs/remotes/origin/{ref}")
+        elif _FULL_SHA.match(ref):
+            specs.append(ref)
+    with file_lock(repo_path.with_name(repo_path.name + ".lock")):
+        try:
+            Repo(repo_path).remote("origin").fetch(specs)
+        except (GitCommandError, InvalidGitRepositoryError, NoSuchPathError, ValueError) as e:
+            logger.warning("fetch of %s in %s failed: %s", refs, repo_path, e)
+            return False
+    return True
+
+
 # --- Future private repo logic (commented) ---
 # def clone_or_update_repo(repo_url: str, token: Optional[str] = None) -> Path:
 #     """Clone or update a repository (public or private).
@@ -77,4 +199,7 @@ def clone_or_update_public_repo(repo_url: str) -> Path:
 #     return folder
 # --------------------------------------------
 
-__all__ = ["clone_or_update_public_repo"]
\ No newline at end of file
+__all__ = [
+    "check_repo_id", "clone_or_update_public_repo", "fetch_refs", "repo_id_for_url", "repo_path_for_id", "resolve_repo",
+    "head_commit", "resolve_ref", "resolve_fetched_ref",
+]
\ No newline at end of file
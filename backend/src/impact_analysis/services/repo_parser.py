@@ -0,0 +1,193 @@
+"""One parallel parse pass over every source file of a repository.
+
+Each file whose language has a plugin (services.ast_chunker.registry) is read
+once and turned into a `ParsedFile`: its symbols and imports, the identifiers
+each symbol uses (for graph edges) and, optionally, its chunks. Python,
+Go, Java, TypeScript, ... are parsed in the same pass, so a mixed-language
+monorepo costs one walk.
+
+Parsing holds the GIL (tree-sitter does not release it, the regex fallback
+and reference scan are pure Python), so threads do not parallelise it: files are
+sent in batches to the worker process pool (`settings.parse_workers`, see
+utils.concurrency.map_processes), where grammars and queries are loaded once
+per process. Small trees are parsed in-process.
+
+Graph-only parses (no chunks) are what rescans repeat: every graph build of
+a working tree parses it again. Their results are kept per file, keyed by
+the file's content digest (utils.fingerprint, validated by inode, size and
+mtime), so an unchanged file costs a stat instead of a parse.
+"""
+from __future__ import annotations
+import logging
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, List, Tuple
+
+from ..config import settings
+from ..models.chunk import Chunk
+from ..utils.concurrency import map_processes
+from ..utils.fingerprint import get_fingerprint_cache
+from .ast_chunker.generic_chunker import ChunkPolicy, chunk_file, classify_file
+from .ast_chunker.registry import Symbol, extract_symbols, language_for, plugin_for
+from .ast_chunker.symbol_chunker import chunk_symbols
+from .file_scanner import VENDOR_DIRS, walk_files
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["ParsedFile", "parse_repo"]
+
+# Larger sources are chunked in bounded-memory windows and get no symbols.
+MAX_PARSE_BYTES = 2_000_000
+
+_BATCH_FILES = 32
+
+_IDENTIFIER = re.compile(r"[A-Za-z_$][\w$]*")
+
+
+@dataclass
+class ParsedFile:
+    path: str  # repo-relative, posix
+    language: str
+    parser: str  # "tree-sitter" | "regex" | "none" (not parsed: generated or too large)
+    n_lines: int = 0
+    symbols: List[Symbol] = field(default_factory=list)
+    imports: List[str] = field(default_factory=list)
+    refs: List[FrozenSet[str]] = field(default_factory=list)  # identifiers per symbol, nested symbols excluded
+    module_refs: FrozenSet[str] = frozenset()  # identifiers outside every symbol
+    chunks: List[Chunk] = field(default_factory=list)
+
+
+def _references(lines: List[str], symbols: List[Symbol]) -> Tuple[List[FrozenSet[str]], FrozenSet[str]]:
+    owner = [-1] * len(lines)  # innermost symbol of each line
+    for i in sorted(range(len(symbols)), key=lambda i: symbols[i].end_line - symbols[i].start_line, reverse=True):
+        start, end = symbols[i].start_line - 1, min(symbols[i].end_line, len(lines))
+        if start < end:
+            owner[start:end] = [i] * (end - start)
+    found: List[set] = [set() for _ in range(len(symbols) + 1)]
+    for line, i in zip(lines, owner):
+        found[i].update(_IDENTIFIER.findall(line))
+    return [frozenset(f) for f in found[:-1]], frozenset(found[-1])
+
+
+def parse_file(
+    path: Path, rel_path: str, language: str, policy: ChunkPolicy, with_chunks: bool = True
+) -> ParsedFile | None:
+    """Parse one file; None when it is skipped (binary, too large)."""
+    try:
+        size = path.stat().st_size
+    except OSError:
+        return None
+    action, reason = classify_file(path, size, policy)
+    if action == "skip":
+        return None
+    parsed = ParsedFile(rel_path, language, "none")
+    plugin = plugin_for(language)
+    if plugin is not None and reason != "generated" and size <= MAX_PARSE_BYTES:
+        source = path.read_bytes()
+        parsed.symbols, parsed.imports, parsed.parser = extract_symbols(plugin, source)
+        try:
+            text, raw = source.decode("utf-8"), source
+        except UnicodeDecodeError:
+            text, raw = source.decode("utf-8", "replace"), None
+        lines = text.splitlines()
+        parsed.n_lines = len(lines)
+        if plugin.name != "python":  # Python edges come from graph_builder's own `ast` pass
+            parsed.refs, parsed.module_refs = _references(lines, parsed.symbols)
+        if with_chunks and action == "windows" and parsed.symbols:
+            parsed.chunks = list(chunk_symbols(rel_path, language, text, parsed.symbols, policy, raw))
+            return parsed
+    if with_chunks:
+        parsed.chunks = list(chunk_file(path, rel_path, language, policy))
+    return parsed
+
+
+def _parse_batch(batch: Tuple[str, List[Tuple[str, str]], ChunkPolicy, bool]) -> List[ParsedFile]:
+    root, items, policy, with_chunks = batch
+    out = []
+    for rel_path, language in items:
+        try:
+            parsed = parse_file(Path(root) / rel_path, rel_path, language, policy, with_chunks)
+        except Exception as e:  # one bad file must not fail the repo
+            logger.warning("parsing %s failed: %s", rel_path, e)
+            continue
+        if parsed is not None:
+            out.append(parsed)
+    return out
+
+
+# (path, language, policy, content digest) -> graph-only parse of that file; shared, read-only.
+_ParseKey = Tuple[str, str, ChunkPolicy, str]
+_parsed: "OrderedDict[_ParseKey, ParsedFile]" = OrderedDict()
+_parsed_lock = threading.Lock()
+
+
+def _reuse_parsed(
+    repo_path: Path, items: List[Tuple[str, str]], policy: ChunkPolicy
+) -> Tuple[List[ParsedFile], List[Tuple[str, str]], Dict[str, _ParseKey]]:
+    """(cached parses, items still to parse, cache keys of those items)."""
+    digests = get_fingerprint_cache().fingerprints(repo_path / rel_path for rel_path, _l in items)
+    hits: List[ParsedFile] = []
+    todo: List[Tuple[str, str]] = []
+    keys: Dict[str, _ParseKey] = {}
+    with _parsed_lock:
+        for rel_path, language in items:
+            digest = digests.get(repo_path / rel_path)
+            key = (rel_path, language, policy, digest or "")
+            hit = _parsed.get(key) if digest else None
+            if hit is not None:
+                _parsed.move_to_end(key)
+                hits.append(hit)
+                continue
+            todo.append((rel_path, language))
+            if digest:
+                keys[rel_path] = key
+    return hits, todo, keys
+
+
+def _remember_parsed(parsed: List[ParsedFile], keys: Dict[str, _ParseKey]) -> None:
+    with _parsed_lock:
+        for f in parsed:
+            key = keys.get(f.path)
+            if key is not None:
+                _parsed[key] = f
+        while len(_parsed) > settings.parse_cache_files:
+            _parsed.popitem(last=False)
+
+
+def parse_repo(
+    repo_path: Path,
+    with_chunks: bool = True,
+    skip_languages: Iterable[str] = (),
+    policy: ChunkPolicy | None = None,
+) -> List[ParsedFile]:
+    """Parse every file with a registered language (vendored dirs skipped), sorted by path.
+
+    `skip_languages` are plugin names, e.g. "python" also covers stubs.
+    Without chunks, files unchanged since an earlier parse are not parsed again
+    and the returned ParsedFiles are shared: callers must not modify them.
+    """
+    policy = policy or ChunkPolicy.from_settings()
+    skip = frozenset(skip_languages)
+    items: List[Tuple[str, str]] = []
+    for root, files in walk_files(repo_path, skip_dirs=VENDOR_DIRS):
+        for name in files:
+            p = root / name
+            language = language_for(p)
+            if language is not None and plugin_for(language).name not in skip:
+                items.append((p.relative_to(repo_path).as_posix(), language))
+    cached: List[ParsedFile] = []
+    keys: Dict[str, _ParseKey] = {}
+    if not with_chunks and settings.parse_cache_files > 0:
+        cached, items, keys = _reuse_parsed(repo_path, items, policy)
+    root = str(repo_path)
+    batches = [(root, items[i:i + _BATCH_FILES], policy, with_chunks) for i in range(0, len(items), _BATCH_FILES)]
+    results = map(_parse_batch, batches) if len(batches) <= 1 else map_processes(_parse_batch, batches)
+    parsed = [f for batch in results for f in batch]
+    if keys:
+        _remember_parsed(parsed, keys)
+    parsed += cached
+    parsed.sort(key=lambda f: f.path)
+    return parsed
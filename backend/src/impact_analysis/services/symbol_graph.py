@@ -0,0 +1,264 @@
+"""Dependency graph units for non-Python sources, from the parse pass (services.repo_parser).
+
+Python keeps its precise `ast`-based builder (services.graph_builder); every
+other language gets the same unit kinds (module, function, class, method)
+from its plugin's symbols, and edges on the safe side of what can be told
+without type information:
+
+* every unit depends on its module, methods on their class;
+* a module depends on the modules it imports (resolved to repo files below);
+* a unit depends on each top-level definition it names, looked up in its own
+  file, the files it imports and, for package-scoped languages (Go, Java,
+  Kotlin, ...), the other files of its directory; naming a class depends on
+  all of its methods.
+
+Imports are matched against repo paths: relative specs (`./x`, `../y`)
+against the importer's directory, others by the longest matching path suffix
+(`a.b.C` -> `.../a/b/C.java`, `crate::a::b` -> `a/b.rs`, Go packages via
+`go.mod` -> every file of the package directory). Package-manager imports
+(npm, stdlib) match nothing and are dropped.
+"""
+from __future__ import annotations
+import os
+from collections import defaultdict
+from pathlib import Path, PurePosixPath
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+from ..utils.concurrency import check_cancelled
+from .ast_chunker.registry import LanguagePlugin, plugin_for, registered_extensions
+from .graph_builder import CodeUnit, DependencyGraph, is_test_path
+from .repo_parser import ParsedFile
+
+__all__ = ["add_parsed_files"]
+
+_HEADER_EXTENSIONS = frozenset({".h", ".hh", ".hpp", ".hxx"})
+_SOURCE_EXTENSIONS = frozenset({".c", ".cc", ".cpp", ".cxx", ".c++"})
+_RUST_ROOTS = frozenset({"crate", "self", "super"})
+_MAX_PACKAGE_FILES = 200  # a package import fans out to at most this many files
+_GO_TEST_PREFIXES = ("Test", "Benchmark", "Fuzz", "Example")
+
+
+def _closeness(importer: str):
+    imp = PurePosixPath(importer).parts
+
+    def key(path: str) -> tuple[int, int, str]:
+        parts = PurePosixPath(path).parts
+        common = 0
+        for a, b in zip(parts, imp):
+            if a != b:
+                break
+            common += 1
+        return (-common, len(parts), path)
+
+    return key
+
+
+class _PathIndex:
+    def __init__(self, paths: Iterable[str], go_modules: Dict[str, str]):
+        self.stems: Dict[str, List[str]] = defaultdict(list)  # every suffix of "dir/file" (no extension)
+        self.dirs: Dict[str, List[str]] = defaultdict(list)  # every suffix of "dir" -> its files
+        self.exact_dirs: Dict[str, List[str]] = defaultdict(list)
+        self.paths: Set[str] = set()
+        self.exts = registered_extensions()
+        self.go_modules = go_modules  # module path -> repo dir
+        for path in paths:
+            self.paths.add(path)
+            p = PurePosixPath(path)
+            stem = p.with_suffix("").parts
+            for i in range(len(stem)):
+                self.stems["/".join(stem[i:])].append(path)
+            parent = p.parent.parts
+            self.exact_dirs["/".join(parent)].append(path)
+            for i in range(len(parent)):
+                self.dirs["/".join(parent[i:])].append(path)
+
+    def _strip_ext(self, spec: str) -> str:
+        suffix = PurePosixPath(spec).suffix.lower()
+        return spec[: -len(suffix)] if suffix in self.exts else spec
+
+    def _file(self, stem: str) -> List[str]:
+        """The file at `stem` (no extension), or the `index` / `mod` file of that directory."""
+        for key in (stem, f"{stem}/index", f"{stem}/mod"):
+            found = [p for p in self.stems.get(key, ()) if str(PurePosixPath(p).with_suffix("")) == key]
+            if found:
+                return found[:1]
+        return []
+
+    def _relative(self, spec: str, importer: str, exact: bool = False) -> List[str]:
+        joined = os.path.normpath(os.path.join(str(PurePosixPath(importer).parent), spec)).replace(os.sep, "/")
+        if joined.startswith(".."):
+            return []  # outside the repo
+        if joined in self.paths:
+            return [joined]  # `#include "x.h"`, `import "./x.js"`
+        if exact:
+            return []
+        joined = self._strip_ext(joined)
+        joined = "" if joined == "." else joined
+        return self._file(joined) or self.exact_dirs.get(joined, [])[:_MAX_PACKAGE_FILES]
+
+    def _go(self, spec: str) -> List[str]:
+        for module, root in self.go_modules.items():
+            if spec == module or spec.startswith(module + "/"):
+                rel = "/".join(p for p in (root, spec[len(module) + 1:]) if p)
+                return self.exact_dirs.get(rel, [])[:_MAX_PACKAGE_FILES]
+        return []
+
+    def resolve(self, spec: str, importer: str, plugin: LanguagePlugin) -> List[str]:
+        if plugin.name == "go":
+            return self._go(spec)
+        if spec.startswith("."):
+            return self._relative(spec, importer)
+        if plugin.name in ("javascript", "typescript", "tsx"):
+            if not spec.startswith(("@/", "~/")):
+                return []  # npm package
+            spec = spec[2:]
+        if plugin.name == "cpp":
+            found = self._relative(spec, importer, exact=True)
+            if found:
+                return found
+        parts = [self._strip_ext(spec)]
+        for sep in plugin.separators:
+            parts = [piece for part in parts for piece in part.split(sep)]
+        parts = [p for p in parts if p and p not in _RUST_ROOTS]
+        if not parts:
+            return []
+        ext = PurePosixPath(spec).suffix.lower()
+        closest = _closeness(importer)
+
+        def key(path: str) -> tuple:
+            # A spec naming an extension (`geo.h`) prefers files with it over same-stem ones.
+            return (ext in self.exts and not path.endswith(ext), *closest(path))
+        # Longest path suffix naming a file (or, without its last part, the file defining
+        # an imported member), else a package directory. Multi-part specs need two parts
+        # to match, so `a.b.utils` does not resolve to any `utils` file.
+        shortest = 1 if len(parts) == 1 else 2
+        for end in (len(parts), len(parts) - 1):
+            for start in range(0, end - shortest + 1):
+                suffix = "/".join(parts[start:end])
+                for stem in (suffix, f"{suffix}/index", f"{suffix}/mod"):
+                    if stem in self.stems:
+                        return [min(self.stems[stem], key=key)]
+                if end - start >= 2 and suffix in self.dirs:
+                    return sorted(self.dirs[suffix], key=key)[:_MAX_PACKAGE_FILES]
+        return []
+
+
+def _go_modules(repo_path: Path | None, files: Sequence[ParsedFile]) -> Dict[str, str]:
+    """Module path -> repo-relative directory, from the go.mod files above Go sources."""
+    if repo_path is None:
+        return {}
+    modules: Dict[str, str] = {}
+    dirs = {str(PurePosixPath(f.path).parent) for f in files if f.language == "go"}
+    seen: Set[str] = set()
+    for d in dirs:
+        for parent in (PurePosixPath(d), *PurePosixPath(d).parents):
+            rel = "" if str(parent) == "." else str(parent)
+            if rel in seen:
+                break
+            seen.add(rel)
+            try:
+                with (repo_path / rel / "go.mod").open(encoding="utf-8", errors="replace") as fh:
+                    for line in fh:
+                        if line.startswith("module "):
+                            modules[line.split()[1].strip('"')] = rel
+                            break
+            except OSError:
+                continue
+    # Longest module paths first, so nested modules win.
+    return dict(sorted(modules.items(), key=lambda kv: -len(kv[0])))
+
+
+def _companions(path: str, index: _PathIndex) -> List[str]:
+    """The C/C++ source implementing a header: same stem, nearest to it (`include/x.h` -> `src/x.cpp`)."""
+    p = PurePosixPath(path)
+    if p.suffix.lower() not in _HEADER_EXTENSIONS:
+        return []
+    sources = [q for q in index.stems.get(p.stem, ()) if PurePosixPath(q).suffix.lower() in _SOURCE_EXTENSIONS]
+    return [min(sources, key=_closeness(path))] if sources else []
+
+
+def _is_test_symbol(language: str, in_tests: bool, qualname: str, kind: str) -> bool:
+    """Test functions by naming convention; annotations (`@Test`, `#[test]`) are not in the symbols.
+
+    Go: `Test*`/`Benchmark*`/`Fuzz*`/`Example*` in `_test.go` files; Rust: functions
+    of a `tests` module or in `tests/`; Java, Kotlin, Scala: every method of a test
+    file. JS/TS tests are anonymous callbacks: their file is selected as a whole.
+    """
+    if kind not in ("function", "method"):
+        return False
+    if language == "go":
+        return in_tests and qualname.startswith(_GO_TEST_PREFIXES)
+    if language == "rust":
+        return in_tests or "tests" in qualname.split(".")[:-1]
+    if language in ("java", "kotlin", "scala"):
+        return in_tests and kind == "method"
+    return False
+
+
+def add_parsed_files(graph: DependencyGraph, files: Sequence[ParsedFile], repo_path: Path | None = None) -> None:
+    """Add units and edges for `files` (any language but Python) to `graph`."""
+    files = [f for f in files if plugin_for(f.language) is not None]
+    index = _PathIndex((f.path for f in files), _go_modules(repo_path, files))
+    # Per file: module unit, symbol units, exported names -> units.
+    module_uid: Dict[str, int] = {}
+    symbol_uids: Dict[str, List[int]] = {}
+    names: Dict[str, Dict[str, List[int]]] = {}
+    for f in files:
+        check_cancelled()
+        module_uid[f.path] = graph.add(CodeUnit(f.path, f.path, "", "module", 1, max(f.n_lines, 1)))
+        uids = []
+        in_tests = is_test_path(f.path)
+        for sym in f.symbols:
+            uids.append(graph.add(CodeUnit(
+                f"{f.path}::{sym.qualname}", f.path, sym.qualname, sym.kind, sym.start_line, sym.end_line,
+                is_test=_is_test_symbol(f.language, in_tests, sym.qualname, sym.kind),
+            )))
+        symbol_uids[f.path] = uids
+        table: Dict[str, List[int]] = defaultdict(list)
+        methods: Dict[int, List[int]] = defaultdict(list)
+        for sym, uid in zip(f.symbols, uids):
+            graph.deps[uid].add(module_uid[f.path])
+            if sym.parent is not None:
+                owner = uids[sym.parent]
+                if sym.kind == "method":
+                    graph.deps[uid].add(owner)
+                    methods[owner].append(uid)
+        for sym, uid in zip(f.symbols, uids):
+            if sym.kind == "class" or (sym.parent is None and sym.kind == "function"):
+                table[sym.name] += [uid, *methods.get(uid, ())]
+        names[f.path] = table
+
+    packages: Dict[Tuple[str, str], Dict[str, List[int]]] = {}
+    by_dir: Dict[Tuple[str, str], List[str]] = defaultdict(list)
+    for f in files:
+        plugin = plugin_for(f.language)
+        if plugin.package_scoped:
+            by_dir[(str(PurePosixPath(f.path).parent), plugin.name)].append(f.path)
+    for key, paths in by_dir.items():
+        merged: Dict[str, List[int]] = defaultdict(list)
+        for path in paths:
+            for name, uids in names[path].items():
+                merged[name] += uids
+        packages[key] = merged
+
+    for f in files:
+        check_cancelled()
+        plugin = plugin_for(f.language)
+        imported: Set[str] = set()
+        for spec in f.imports:
+            for target in index.resolve(spec, f.path, plugin):
+                imported.add(target)
+                imported.update(_companions(target, index))
+        imported.discard(f.path)
+        mod = module_uid[f.path]
+        graph.deps[mod].update(module_uid[t] for t in imported)
+        scopes = [names[f.path], *(names[t] for t in sorted(imported))]
+        package = packages.get((str(PurePosixPath(f.path).parent), plugin.name))
+        if package is not None:
+            scopes.append(package)
+        for uid, refs in ((mod, f.module_refs), *zip(symbol_uids[f.path], f.refs)):
+            for name in refs:
+                for scope in scopes:
+                    targets = scope.get(name)
+                    if targets:
+                        graph.deps[uid].update(t for t in targets if t != uid)
@@ -0,0 +1,295 @@
+"""Test impact selection from a precomputed test -> code reachability index.
+
+For every test function (and every test module, for import-time effects) the
+set of code units it can reach in the dependency graph (services.graph_builder)
+is stored as one row of a packed uint64 bitset matrix. Selecting tests for a
+change is then: pack the changed units into a mask, AND it with every row and
+keep rows with any bit set.
+
+Stored per repo at `<cache_dir>/test_impact/<repo_id>.npz`, rebuilt when the
+repo's HEAD moves.
+"""
+from __future__ import annotations
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from ..config import settings
+from ..utils.concurrency import check_cancelled
+from .file_scanner import tree_fingerprint
+from .graph_builder import DependencyGraph, build_code_graph, is_test_path
+from .repo_cloner import check_repo_id, head_commit
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["TestImpactIndex", "TestImpactStore", "TestSelection", "get_test_impact_store"]
+
+# Changing any of these can change how every test runs.
+_GLOBAL_TEST_INPUTS = frozenset({
+    "pytest.ini", "tox.ini", "setup.cfg", "setup.py", "pyproject.toml", "noxfile.py",
+    "requirements.txt", "requirements-dev.txt", "Pipfile.lock", "poetry.lock",
+})
+
+_KINDS = ("module", "function", "class", "method")
+
+# (path, changed line ranges on the indexed side, or None for "the whole file", status)
+Change = Tuple[str, Optional[Sequence[Tuple[int, int]]], str]
+
+
+def _pack(mask: "np.ndarray", words: int) -> "np.ndarray":
+    """bool[n] -> uint64[words], bit i of the mask at word i // 64, bit i % 64."""
+    import numpy as np
+    packed = np.packbits(mask, bitorder="little")
+    out = np.zeros(words * 8, np.uint8)
+    out[: len(packed)] = packed
+    return out.view("<u8")
+
+
+def _pytest_id(path: str, qualname: str) -> str:
+    return f"{path}::{qualname.replace('.', '::')}" if qualname else path
+
+
+@dataclass
+class TestSelection:
+    tests: List[str]
+    test_files: List[str]
+    run_all: bool
+    reasons: List[str]
+    changed_units: List[str]
+    unmapped: List[str]
+
+    def to_dict(self) -> dict:
+        return {
+            "tests": self.tests,
+            "test_files": self.test_files,
+            "run_all": self.run_all,
+            "reasons": self.reasons,
+            "changed_units": self.changed_units,
+            "unmapped": self.unmapped,
+        }
+
+
+@dataclass
+class TestImpactIndex:
+    __test__ = False  # not a pytest test class
+
+    files: List[str]
+    units: List[str]
+    unit_file: np.ndarray  # int32 index into files
+    unit_start: np.ndarray  # int32 first line
+    unit_end: np.ndarray  # int32 last line
+    unit_kind: np.ndarray  # int8 index into _KINDS
+    rows: List[str]  # pytest node ids; a bare path is a test module (import-time row)
+    row_file: np.ndarray  # int32 index into files
+    bits: np.ndarray  # uint64 [rows, words]
+    commit: str | None
+
+    def __post_init__(self):
+        self._file_index = {f: i for i, f in enumerate(self.files)}
+
+    @classmethod
+    def from_graph(cls, graph: DependencyGraph, commit: str | None) -> "TestImpactIndex":
+        import numpy as np
+        files = list(graph.file_units)
+        file_index = {f: i for i, f in enumerate(files)}
+        n = len(graph.units)
+        words = max(1, (n + 63) // 64)
+        test_files = {u.path for u in graph.units if u.is_test}
+        # Outside Python, test bodies are often not named symbols (JS/TS callbacks):
+        # every test file also gets a row of its own, selected as a whole.
+        test_files |= {p for p in files if not p.endswith(".py") and is_test_path(p)}
+        starts = [i for i, u in enumerate(graph.units) if u.is_test]
+        starts += [graph.module_of(p) for p in sorted(test_files)]
+        bits = np.zeros((len(starts), words), np.uint64)
+        reached = np.zeros(n, bool)
+        for r, start in enumerate(starts):
+            check_cancelled()
+            reached[:] = False
+            reached[start] = True
+            stack = [start]
+            while stack:
+                for dep in graph.deps[stack.pop()]:
+                    if not reached[dep]:
+                        reached[dep] = True
+                        stack.append(dep)
+            bits[r] = _pack(reached, words)
+        return cls(
+            files=files,
+            units=[u.id for u in graph.units],
+            unit_file=np.array([file_index[u.path] for u in graph.units], np.int32),
+            unit_start=np.array([u.start_line for u in graph.units], np.int32),
+            unit_end=np.array([u.end_line for u in graph.units], np.int32),
+            unit_kind=np.array([_KINDS.index(u.kind) for u in graph.units], np.int8),
+            rows=[_pytest_id(graph.units[s].path, graph.units[s].qualname) for s in starts],
+            row_file=np.array([file_index[graph.units[s].path] for s in starts], np.int32),
+            bits=bits,
+            commit=commit,
+        )
+
+    def _file_units(self, path: str) -> "np.ndarray":
+        import numpy as np
+        fi = self._file_index.get(path)
+        if fi is None:
+            return np.zeros(0, np.int64)
+        return np.flatnonzero(self.unit_file == fi)
+
+    def units_for(self, path: str, ranges: Sequence[Tuple[int, int]] | None) -> List[int]:
+        """Innermost units covering the changed lines (all units when ranges is None)."""
+        import numpy as np
+        ids = self._file_units(path)
+        if ranges is None or not len(ids):
+            return ids.tolist()
+        lines = np.unique(np.concatenate([np.arange(max(a, 1), max(b, a, 1) + 1) for a, b in ranges]))
+        start, end = self.unit_start[ids], self.unit_end[ids]
+        covers = (start[None, :] <= lines[:, None]) & (end[None, :] >= lines[:, None])
+        span = np.where(covers, (end - start)[None, :], np.iinfo(np.int32).max)
+        return np.unique(ids[span.argmin(axis=1)]).tolist()
+
+    def select(self, changes: Iterable[Change]) -> TestSelection:
+        import numpy as np
+        changed: set[int] = set()
+        new_test_files: List[str] = []
+        unmapped: List[str] = []
+        reasons: List[str] = []
+        for path, ranges, status in changes:
+            name = PurePosixPath(path).name
+            if name in _GLOBAL_TEST_INPUTS:
+                reasons.append(f"{path}: affects every test")
+            elif path in self._file_index:
+                changed.update(self.units_for(path, None if status == "deleted" else ranges))
+            elif status == "added":
+                # New modules are only reachable through other changed files;
+                # new test files are selected as a whole.
+                if is_test_path(path):
+                    new_test_files.append(path)
+            elif path.endswith(".py"):
+                unmapped.append(path)
+                reasons.append(f"{path}: not in the index (built at {self.commit or 'working tree'})")
+        words = self.bits.shape[1] if self.bits.ndim == 2 else 1
+        mask = np.zeros(len(self.units), bool)
+        mask[list(changed)] = True
+        hits = np.flatnonzero(np.bitwise_and(self.bits, _pack(mask, words)).any(axis=1))
+
+        hit_rows = set(hits.tolist())
+        # A hit on a module row (import-time dependency) selects every test in that file.
+        file_hits = {int(self.row_file[r]) for r in hit_rows if "::" not in self.rows[r]}
+        tests = sorted(
+            row for r, row in enumerate(self.rows)
+            if "::" in row and (r in hit_rows or int(self.row_file[r]) in file_hits)
+        )
+        test_files = sorted({t.split("::", 1)[0] for t in tests} | {self.files[f] for f in file_hits} | set(new_test_files))
+        return TestSelection(
+            tests=tests,
+            test_files=test_files,
+            run_all=bool(reasons),
+            reasons=reasons,
+            changed_units=sorted(self.units[u] for u in changed),
+            unmapped=unmapped,
+        )
+
+    # --- persistence -------------------------------------------------------
+
+    def save(self, path: Path) -> None:
+        import numpy as np
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp.npz")
+        np.savez_compressed(  # rows are sparse bitsets; they compress very well
+            tmp, files=np.array(self.files, dtype=str), units=np.array(self.units, dtype=str),
+            unit_file=self.unit_file, unit_start=self.unit_start, unit_end=self.unit_end,
+            unit_kind=self.unit_kind, rows=np.array(self.rows, dtype=str), row_file=self.row_file,
+            bits=self.bits, meta=np.array(json.dumps({"commit": self.commit})),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "TestImpactIndex":
+        import numpy as np
+        with np.load(path) as z:
+            meta = json.loads(str(z["meta"]))
+            return cls(
+                z["files"].tolist(), z["units"].tolist(), z["unit_file"], z["unit_start"], z["unit_end"],
+                z["unit_kind"], z["rows"].tolist(), z["row_file"], z["bits"], meta["commit"],
+            )
+
+
+class TestImpactStore:
+    """Loads, caches and (re)builds per-repo test impact indexes."""
+
+    __test__ = False  # not a pytest test class
+
+    def __init__(self, root: Path, cache_size: int = 16):
+        self.root = root
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, tuple[float, TestImpactIndex]]" = OrderedDict()
+        self._locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+
+    def path_for(self, repo_id: str) -> Path:
+        return self.root / f"{check_repo_id(repo_id)}.npz"
+
+    def get(self, repo_id: str) -> TestImpactIndex | None:
+        p = self.path_for(repo_id)
+        try:
+            mtime = p.stat().st_mtime
+        except FileNotFoundError:
+            return None
+        with self._guard:
+            hit = self._cache.get(repo_id)
+            if hit and hit[0] == mtime:
+                self._cache.move_to_end(repo_id)
+                return hit[1]
+        idx = TestImpactIndex.load(p)
+        with self._guard:
+            self._cache[repo_id] = (mtime, idx)
+            self._cache.move_to_end(repo_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return idx
+
+    def build(
+        self, repo_id: str, repo_path: Path, commit: str | None = None, graph: DependencyGraph | None = None
+    ) -> TestImpactIndex:
+        with self._guard:
+            lock = self._locks[repo_id]
+        with lock:
+            t0 = time.monotonic()
+            graph = graph or build_code_graph(repo_path)
+            idx = TestImpactIndex.from_graph(graph, commit)
+            idx.save(self.path_for(repo_id))
+            logger.info(
+                "test impact %s: %d units, %d edges, %d test rows in %.2fs",
+                repo_id, len(graph.units), graph.edge_count(), len(idx.rows), time.monotonic() - t0,
+            )
+        return self.get(repo_id) or idx
+
+    def ensure(self, repo_id: str, repo_path: Path | None) -> TestImpactIndex | None:
+        """The index for the repo's current HEAD, building it if missing or stale.
+
+        A tree that is not a git checkout is keyed by its `tree_fingerprint`.
+        """
+        idx = self.get(repo_id)
+        if repo_path is None or not repo_path.exists():
+            return idx
+        commit = head_commit(repo_path) or tree_fingerprint(repo_path)
+        if idx is not None and idx.commit == commit:
+            return idx
+        return self.build(repo_id, repo_path, commit)
+
+
+_store: TestImpactStore | None = None
+
+
+def get_test_impact_store() -> TestImpactStore:
+    global _store
+    if _store is None:
+        _store = TestImpactStore(Path(settings.cache_dir) / "test_impact")
+    return _store
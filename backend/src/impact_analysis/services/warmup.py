@@ -0,0 +1,103 @@
+"""Startup warm-up and readiness tracking.
+
+Importing the API is kept cheap; the expensive first-touch work (collection
+checks, index DDL) runs here as a background task started by
+the app lifespan. `/readyz` reports ready once every required step succeeded,
+while `/livez` only reflects that the process is serving.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from ..config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class WarmupStep:
+    name: str
+    run: Callable[[], Awaitable[None]]
+    required: bool = True
+    status: str = "pending"
+    error: str | None = None
+    duration_s: float | None = None
+
+
+@dataclass
+class Readiness:
+    steps: list[WarmupStep] = field(default_factory=list)
+    started_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def ready(self) -> bool:
+        return all(s.status == "ok" for s in self.steps if s.required)
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "uptime_s": round(time.monotonic() - self.started_at, 3),
+            "checks": {
+                s.name: {
+                    "status": s.status,
+                    "required": s.required,
+                    "error": s.error,
+                    "duration_s": s.duration_s,
+                }
+                for s in self.steps
+            },
+        }
+
+
+async def _warm_vector_store() -> None:
+    from .qdrant_client import get_vector_store
+    await get_vector_store()
+
+
+async def _warm_graph_indexes() -> None:
+    from .neo4j_client import get_graph_driver
+    driver = await get_graph_driver()
+    await driver.ensure_indexes()
+
+
+def default_steps() -> list[WarmupStep]:
+    return [
+        WarmupStep("vector_store", _warm_vector_store),
+        WarmupStep("graph_indexes", _warm_graph_indexes),
+    ]
+
+
+readiness = Readiness()
+
+
+async def warm_up(state: Readiness = readiness) -> None:
+    """Run pending steps, retrying failures until every required step succeeded.
+
+    Optional steps are attempted on every round but never hold readiness back.
+    """
+    if not state.steps:
+        state.steps = default_steps()
+    while True:
+        for step in state.steps:
+            if step.status == "ok":
+                continue
+            t0 = time.monotonic()
+            try:
+                await asyncio.wait_for(step.run(), timeout=settings.db_timeout_s * 3)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # dependency not reachable yet, retry later
+                step.status, step.error = "error", f"{type(e).__name__}: {e}"
+                logger.warning("warm-up step %s failed: %s", step.name, step.error)
+            else:
+                step.status, step.error = "ok", None
+            step.duration_s = round(time.monotonic() - t0, 3)
+        if state.ready:
+            return
+        await asyncio.sleep(settings.warmup_retry_s)
+
+
+__all__ = ["Readiness", "WarmupStep", "readiness", "warm_up", "default_steps"]
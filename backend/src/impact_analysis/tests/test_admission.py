@@ -0,0 +1,63 @@
+"""Load shedding of the admission controller: full queues and empty token buckets."""
+import asyncio
+
+import pytest
+
+from impact_analysis.api.admission import AdmissionController, CostClass, Rejected
+
+
+def _controller(limit=1, queue=1, timeout_s=5.0, rate=0.0, burst=10.0):
+    classes = {"query": CostClass("query", limit, queue, 1.0), "heavy": CostClass("heavy", limit, queue, 10.0)}
+    return AdmissionController(classes, timeout_s=timeout_s, rate=rate, burst=burst)
+
+
+@pytest.mark.asyncio
+async def test_full_queue_is_shed_with_503():
+    ctl = _controller(limit=1, queue=1)
+    release = asyncio.Event()
+
+    async def hold():
+        async with ctl.admit("query", "c"):
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    assert ctl.gates["query"].queue_depth == 1
+
+    with pytest.raises(Rejected) as exc:
+        async with ctl.admit("query", "c"):
+            pass
+    assert exc.value.status == 503
+    assert exc.value.retry_after > 0
+
+    release.set()
+    await asyncio.gather(holder, waiter)
+    assert ctl.gates["query"].active == 0
+    assert ctl.metrics()["classes"]["query"]["rejected_queue_full"] == 1
+
+
+@pytest.mark.asyncio
+async def test_queue_wait_times_out_with_503():
+    ctl = _controller(limit=1, queue=1, timeout_s=0.01)
+    async with ctl.admit("query", "c"):
+        with pytest.raises(Rejected) as exc:
+            async with ctl.admit("query", "c"):
+                pass
+    assert exc.value.status == 503
+    assert ctl.gates["query"].active == 0
+
+
+@pytest.mark.asyncio
+async def test_empty_bucket_is_rate_limited_per_client():
+    ctl = _controller(limit=10, rate=0.001, burst=10.0)
+    async with ctl.admit("heavy", "a"):
+        pass
+    with pytest.raises(Rejected) as exc:
+        async with ctl.admit("query", "a"):
+            pass
+    assert exc.value.status == 429
+    assert exc.value.retry_after > 0
+    async with ctl.admit("query", "b"):  # other clients keep their own bucket
+        pass
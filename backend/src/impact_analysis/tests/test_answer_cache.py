@@ -0,0 +1,91 @@
+"""Keying, similarity lookups and snapshot invalidation of the /api/ask answer cache."""
+import pytest
+from fastapi.testclient import TestClient
+
+from impact_analysis.api import routes_ask
+from impact_analysis.main import app
+from impact_analysis.services import answer_cache, garbage_collector
+from impact_analysis.services.answer_cache import AnswerCache, normalize_question
+from impact_analysis.services.garbage_collector import GarbageCollector, SnapshotManifests
+
+
+def _key(question, repo="repo", commit="c1", context=()):
+    return (repo, commit, tuple(sorted(context)), normalize_question(question))
+
+
+def test_questions_are_keyed_by_their_normalized_text_and_context():
+    cache = AnswerCache()
+    cache.put(_key("Where is auth handled?", context=["b", "a"]), None, "in auth.py", ["a"])
+
+    hit = cache.get(_key("  where IS auth\thandled ", context=["a", "b"]))
+    assert hit is not None and hit.answer == "in auth.py" and hit.used_ids == ["a"]
+    assert cache.get(_key("Where is auth handled?", context=["a"])) is None
+    assert cache.get(_key("Where is auth handled?", repo="other")) is None
+
+
+def test_similar_questions_hit_only_within_the_same_repo_commit_and_context():
+    cache = AnswerCache(similarity=0.95)
+    cache.put(_key("where is auth handled"), [1.0, 0.0], "in auth.py", [])
+
+    assert cache.get_similar(_key("where's authentication handled"), [0.99, 0.05]).answer == "in auth.py"
+    assert cache.get_similar(_key("how do I build it"), [0.0, 1.0]) is None
+    assert cache.get_similar(_key("where's authentication handled", context=["x"]), [0.99, 0.05]) is None
+
+
+def test_a_new_commit_drops_the_repos_entries_only():
+    cache = AnswerCache()
+    cache.put(_key("q", repo="repo"), [1.0, 0.0], "old", [])
+    cache.put(_key("q", repo="other"), None, "kept", [])
+
+    assert cache.get(_key("q", repo="repo", commit="c2")) is None
+    assert cache.get_similar(_key("q", repo="repo", commit="c2"), [1.0, 0.0]) is None
+    assert cache.get(_key("q", repo="other")).answer == "kept"
+    assert cache.metrics()["entries"] == 1  # dropped, not just shadowed
+    assert cache.metrics()["invalidations"] == 1
+
+
+def test_entries_expire_and_are_evicted_least_recently_used():
+    cache = AnswerCache(size=2, ttl_s=10)
+    cache.put(_key("a"), None, "A", [])
+    cache.put(_key("b"), None, "B", [])
+    entry = cache.get(_key("a"))
+    cache.put(_key("c"), None, "C", [])
+    assert cache.get(_key("b")) is None
+    entry.created -= 11
+    assert cache.get(_key("a")) is None
+    assert cache.get(_key("c")).answer == "C"
+
+
+def test_ask_is_served_from_cache_until_the_repo_is_reingested(tmp_path, monkeypatch):
+    repo = tmp_path / "demo"
+    repo.mkdir()
+    gc = GarbageCollector(SnapshotManifests(tmp_path / "manifests", keep=2))
+    monkeypatch.setattr(garbage_collector, "_gc", gc)
+    monkeypatch.setattr(answer_cache, "_cache", None)
+    monkeypatch.setattr(routes_ask.settings, "ask_cache_enabled", True)
+    answered = []
+    real_answer = routes_ask._answer
+
+    async def counting_answer(body):
+        answered.append(body.question)
+        return await real_answer(body)
+
+    monkeypatch.setattr(routes_ask, "_answer", counting_answer)
+    client = TestClient(app)
+    ask = {"question": "What does it do?", "repo_path": str(repo)}
+
+    gc.manifests.record("demo", "s1", ["a"])
+    assert client.post("/api/ask", json=ask).json()["cached"] is None
+    assert client.post("/api/ask", json={**ask, "question": "what does it do"}).json()["cached"] == "exact"
+    assert len(answered) == 1
+
+    gc.manifests.record("demo", "s2", ["a", "b"])
+    assert client.post("/api/ask", json=ask).json()["cached"] is None
+    assert len(answered) == 2
+
+
+@pytest.mark.parametrize("repo_path", ["/tmp/has.dot", "/tmp/.."])
+def test_ask_rejects_folder_names_that_are_not_repo_ids(repo_path, monkeypatch):
+    monkeypatch.setattr(routes_ask.settings, "ask_cache_enabled", True)
+    resp = TestClient(app).post("/api/ask", json={"question": "q", "repo_path": repo_path})
+    assert resp.status_code == 400
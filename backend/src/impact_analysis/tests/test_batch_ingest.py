@@ -0,0 +1,154 @@
+"""Batch embed/upsert stage of the ingest pipeline and the fair scheduler around it."""
+import asyncio
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import pytest
+
+from impact_analysis.config import settings
+from impact_analysis.models.chunk import Chunk
+from impact_analysis.services import ingestion_orchestrator
+from impact_analysis.services.ingestion_orchestrator import IngestionOrchestrator, ParsedRepo
+from impact_analysis.workers.ingestion_worker import BatchIngestScheduler
+from impact_analysis.workers.queue import FairGate, JobRegistry
+
+
+class FakeStore:
+    """Contents in `stored` need no embedding; `lost` ones vanish between the check and the upsert."""
+
+    def __init__(self):
+        self.stored: set = set()
+        self.lost: set = set()
+        self.points = {}
+
+    async def needs_embedding(self, chunks):
+        return [c.content not in self.stored and c.content not in self.lost for c in chunks]
+
+    async def upsert_chunks(self, vectors, repo_id, commit=None):
+        pending = []
+        for c, vec in vectors:
+            if vec is None and c.content in self.lost:
+                self.lost.discard(c.content)
+                pending.append(c)
+            else:
+                self.points[c.content] = (vec, repo_id, commit)
+        return pending
+
+
+class FakeGraph:
+    def __init__(self):
+        self.nodes = []
+
+    async def upsert_code_nodes(self, repo_id, commit, rows):
+        self.nodes.extend((repo_id, commit, row["chunk_id"]) for row in rows)
+
+
+class FakeGC:
+    def __init__(self):
+        self.snapshots = []
+
+    @asynccontextmanager
+    async def repo_lock(self, repo_id):
+        yield
+
+    async def record_snapshot(self, repo_id, snapshot, chunk_ids):
+        self.snapshots.append((repo_id, snapshot, list(chunk_ids)))
+
+
+def _parsed(n: int) -> ParsedRepo:
+    chunks = [Chunk("a.py", "python", f"f{i}", "function", f"def f{i}(): pass\n") for i in range(n)]
+    return ParsedRepo("https://github.com/o/demo.git", Path("demo"), "demo", "c1", "c1", chunks, [c.hash() for c in chunks])
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    store, graph, gc = FakeStore(), FakeGraph(), FakeGC()
+
+    async def get_store():
+        return store
+
+    async def get_graph():
+        return graph
+
+    monkeypatch.setattr(ingestion_orchestrator, "get_vector_store", get_store)
+    monkeypatch.setattr(ingestion_orchestrator, "get_graph_driver", get_graph)
+    monkeypatch.setattr(ingestion_orchestrator, "get_garbage_collector", lambda: gc)
+    monkeypatch.setattr(settings, "batch_size", 2)
+    monkeypatch.setattr(settings, "gc_after_ingest", False)
+    return store, graph, gc
+
+
+@pytest.mark.asyncio
+async def test_index_embeds_only_missing_content_batch_by_batch(backends):
+    store, graph, gc = backends
+    parsed = _parsed(5)
+    contents = [c.content for c in parsed.chunks]
+    store.stored = {contents[1]}
+    store.lost = {contents[3]}
+    calls, progress = [], []
+
+    async def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(t))] for t in texts]
+
+    result = await IngestionOrchestrator().index(parsed, embed=embed, on_progress=progress.append)
+
+    # Stored content is skipped; content lost before the upsert is embedded on the retry.
+    assert calls == [[contents[0]], [contents[2]], [contents[3]], [contents[4]]]
+    assert progress == [2, 4, 5]
+    assert store.points[contents[3]][0] == [float(len(contents[3]))]
+    assert store.points[contents[1]][0] is None
+    assert {commit for _vec, _repo, commit in store.points.values()} == {"c1"}
+    assert [cid for _repo, _commit, cid in graph.nodes] == parsed.chunk_ids
+    assert gc.snapshots == [("demo", "c1", parsed.chunk_ids)]
+    assert result["chunks"] == 5 and result["gc"] is None
+
+
+@pytest.mark.asyncio
+async def test_scheduler_runs_a_job_through_every_stage(backends, monkeypatch):
+    store, _graph, _gc = backends
+    scheduler = BatchIngestScheduler(JobRegistry(history=10))
+    parsed = _parsed(3)
+
+    async def clone(repo_url):
+        return Path("/tmp/demo")
+
+    async def parse(repo_url, path):
+        return parsed
+
+    async def embed(texts):
+        return [[0.0] for _t in texts]
+
+    monkeypatch.setattr(scheduler.orchestrator, "clone", clone)
+    monkeypatch.setattr(scheduler.orchestrator, "parse", parse)
+    monkeypatch.setattr(scheduler.orchestrator, "embed", embed)
+
+    [job] = scheduler.submit([(parsed.repo_url, 5)], batch_id="b1")
+    await asyncio.gather(*scheduler._tasks)
+
+    assert job.status == "done", job.error
+    assert (job.repo_id, job.commit, job.chunks_total, job.chunks_done) == ("demo", "c1", 3, 3)
+    assert len(store.points) == 3
+    assert scheduler.queue_depths()["active_jobs"] == 0
+
+
+@pytest.mark.asyncio
+async def test_fair_gate_interleaves_a_small_flow_with_a_large_one():
+    gate = FairGate(1)
+    order = []
+
+    async def take(flow):
+        async with gate.slot(flow):
+            order.append(flow)
+            await asyncio.sleep(0)
+
+    async with gate.slot("holder"):
+        tasks = [asyncio.create_task(take("big")) for _ in range(3)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(take("small")))
+        await asyncio.sleep(0)
+        assert gate.queue_depth == 4
+    await asyncio.gather(*tasks)
+
+    # Queued last, the small flow still goes second instead of waiting behind every big batch.
+    assert order == ["big", "small", "big", "big"]
@@ -0,0 +1,36 @@
+"""Compact Chunk records: ids and hashes match ChunkIn, bytes content, pickling."""
+import pickle
+
+from impact_analysis.models.chunk import Chunk, ChunkIn
+from impact_analysis.utils.hashing import stable_file_hash
+
+SOURCE = "def f():\n    return 'é'\n\ndef g():\n    pass\n".encode("utf-8")
+SPLIT = SOURCE.index(b"def g")
+
+
+def test_ids_match_the_api_model_for_text_and_byte_content():
+    text = SOURCE[:SPLIT].decode("utf-8")
+    api = ChunkIn(path="a.py", language="python", symbol="f", kind="function", content=text)
+    from_text = Chunk("a.py", "python", "f", "function", text)
+    from_view = Chunk("a.py", "python", "f", "function", memoryview(SOURCE)[:SPLIT])
+
+    assert from_text.hash() == from_view.hash() == api.hash() == api.to_chunk().hash()
+    assert from_view.content == text
+    assert from_text.content_hash == from_view.content_hash == stable_file_hash(text.encode("utf-8"))
+
+
+def test_chunks_share_interned_strings_and_keep_no_instance_dict():
+    a = Chunk("".join(["pkg/", "mod.py"]), "python", "f", "function", "x")
+    b = Chunk("pkg/mod.py", "".join(["py", "thon"]), "g", "function", "y")
+    assert a.path is b.path and a.language is b.language
+    assert not hasattr(a, "__dict__")
+
+
+def test_pickle_round_trip_keeps_content_ids_and_interning():
+    chunk = Chunk("a.py", "python", "g", "function", memoryview(SOURCE)[SPLIT:], start_line=4, end_line=5)
+    copy = pickle.loads(pickle.dumps(chunk))
+
+    assert copy.content == chunk.content and copy.hash() == chunk.hash()
+    assert copy._id is not None  # computed before crossing the process boundary
+    assert (copy.start_line, copy.end_line) == (4, 5)
+    assert copy.path is Chunk("a.py", "python", "h", "function", "").path
@@ -0,0 +1,66 @@
+"""Chunk spool round-trips, including spools written by format version 1."""
+import json
+
+import pytest
+
+from impact_analysis.config import settings
+from impact_analysis.models.chunk import Chunk
+from impact_analysis.services.chunk_spool import ChunkSpool, latest_snapshot, write_spool
+from impact_analysis.utils.hashing import stable_file_hash
+
+
+@pytest.fixture
+def chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "chunks_dir", str(tmp_path / "chunks"))
+    return [
+        Chunk("a.py", "python", "f", "function", "def f():\n    return 1\n", start_line=1, end_line=2),
+        Chunk("a.py", "python", "g", "function", b"def g():\n    return '\xc3\xa9'\n", start_line=4, end_line=5),
+        Chunk("b.go", "go", "", "module", "package b\n"),
+    ]
+
+
+def test_round_trip(chunks):
+    write_spool("repo", "c1", chunks)
+    assert latest_snapshot("repo") == "c1"
+    spool = ChunkSpool.open("repo")
+    assert len(spool) == len(chunks)
+    records = list(spool.iter_records(batch_size=2))
+    for chunk, record in zip(chunks, records):
+        assert record.hash() == chunk.hash()
+        assert (record.path, record.language, record.symbol, record.kind) == (chunk.path, chunk.language, chunk.symbol, chunk.kind)
+        assert record.content == chunk.content
+        assert record.content_hash == chunk.content_hash
+        assert record.start_line == (chunk.start_line or 0)
+    assert spool.record(1).content == chunks[1].content
+
+
+def test_version_1_spool_recomputes_the_dedup_key(chunks):
+    directory = write_spool("repo", "c1", chunks)
+    meta = json.loads((directory / "meta.json").read_text())
+    (directory / "meta.json").write_text(json.dumps({**meta, "version": 1}))
+    records = list(ChunkSpool.open("repo", "c1").iter_records())
+    assert [r.content_hash for r in records] == [stable_file_hash(c.content) for c in chunks]
+
+
+def test_unknown_version_is_rejected(chunks):
+    directory = write_spool("repo", "c1", chunks)
+    meta = json.loads((directory / "meta.json").read_text())
+    (directory / "meta.json").write_text(json.dumps({**meta, "version": 99}))
+    with pytest.raises(ValueError):
+        ChunkSpool.open("repo", "c1")
+
+
+@pytest.mark.parametrize("repo_id, snapshot", [("../x", "c1"), ("repo", "../../x"), ("repo", ".c1.tmp")])
+def test_unsafe_path_components_are_rejected(chunks, repo_id, snapshot):
+    with pytest.raises(ValueError):
+        write_spool(repo_id, snapshot, chunks)
+    with pytest.raises(ValueError):
+        ChunkSpool.open(repo_id, snapshot)
+
+
+def test_reindex_rejects_an_unsafe_snapshot_with_400():
+    from fastapi.testclient import TestClient
+    from impact_analysis.main import app
+
+    resp = TestClient(app).post("/api/repos/repo/reindex", json={"snapshot": "../../x"})
+    assert resp.status_code == 400
@@ -0,0 +1,103 @@
+"""Co-change mining: CSR merge, time decay and incremental updates across ingests."""
+import math
+import os
+import subprocess
+
+import pytest
+
+from impact_analysis.config import settings
+from impact_analysis.services.cochange import CoChangeIndex, CoChangeStore
+
+DAY = 86400
+HALF_LIFE = 30.0
+
+
+def _git(repo, *args, when=None):
+    env = dict(os.environ, GIT_AUTHOR_NAME="t", GIT_AUTHOR_EMAIL="t@t", GIT_COMMITTER_NAME="t", GIT_COMMITTER_EMAIL="t@t")
+    if when is not None:
+        env["GIT_AUTHOR_DATE"] = env["GIT_COMMITTER_DATE"] = f"{when} +0000"
+    subprocess.run(["git", "-C", str(repo), *args], check=True, capture_output=True, env=env)
+
+
+def _commit(repo, when, *paths):
+    for p in paths:
+        f = repo / p
+        f.parent.mkdir(parents=True, exist_ok=True)
+        f.write_text(f"{p} {when}\n")
+    _git(repo, "add", *paths)
+    _git(repo, "commit", "-q", "-m", f"change {when}", when=when)
+
+
+def _pairs(idx):
+    return {(a, b): w for a in idx.files for b, w, _conf in idx.neighbours(a)}
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "cochange_half_life_days", HALF_LIFE)
+    monkeypatch.setattr(settings, "cochange_min_weight", 0.0)
+    monkeypatch.setattr(settings, "cochange_max_files_per_commit", 3)
+    path = tmp_path / "repo"
+    path.mkdir()
+    _git(path, "init", "-q")
+    return path
+
+
+def test_merge_is_symmetric_decayed_and_skips_bulk_commits():
+    t0 = 1_700_000_000
+    history = [
+        (t0, ["a.py", "b.py"]),
+        (t0 - int(HALF_LIFE * DAY), ["a.py", "b.py", "c.py"]),
+        (t0, ["a.py", "b.py", "c.py", "d.py"]),  # bulk: counts for the files, not for pairs
+    ]
+    idx = CoChangeIndex.empty(HALF_LIFE).merged(history, "head", max_files_per_commit=3, min_weight=0.0)
+    pairs = _pairs(idx)
+    assert pairs[("a.py", "b.py")] == pytest.approx(1.5)
+    assert pairs[("a.py", "c.py")] == pytest.approx(0.5)
+    assert all(pairs[(b, a)] == w for (a, b), w in pairs.items())
+    assert ("a.py", "d.py") not in pairs
+    assert idx.file_weight[idx.files.index("a.py")] == pytest.approx(2.5)
+    assert all((idx.indices[lo:hi] == sorted(idx.indices[lo:hi])).all() for lo, hi in zip(idx.indptr, idx.indptr[1:]))
+
+
+def test_incremental_mine_equals_a_full_mine(repo, tmp_path):
+    t0 = 1_700_000_000
+    _commit(repo, t0, "a.py", "b.py")
+    _commit(repo, t0 + 5 * DAY, "a.py", "c.py")
+    incremental = CoChangeStore(tmp_path / "inc")
+    first = incremental.update("repo", repo)
+    assert first.commits == 2
+
+    _commit(repo, t0 + 40 * DAY, "a.py", "b.py")
+    _commit(repo, t0 + 90 * DAY, "b.py", "c.py", "d.py")
+    second = incremental.update("repo", repo)
+    full = CoChangeStore(tmp_path / "full").update("repo", repo)
+
+    assert second.commits == full.commits == 4
+    assert second.ref_time == full.ref_time == t0 + 90 * DAY
+    inc_pairs, full_pairs = _pairs(second), _pairs(full)
+    assert inc_pairs.keys() == full_pairs.keys()
+    for pair, w in full_pairs.items():
+        assert inc_pairs[pair] == pytest.approx(w, rel=1e-5)
+    decay = math.exp(-math.log(2) / HALF_LIFE * 90)
+    assert full_pairs[("a.py", "b.py")] == pytest.approx(decay + math.exp(-math.log(2) / HALF_LIFE * 50), rel=1e-5)
+
+
+def test_unchanged_head_is_not_mined_again(repo, tmp_path):
+    _commit(repo, 1_700_000_000, "a.py", "b.py")
+    store = CoChangeStore(tmp_path / "cc")
+    first = store.update("repo", repo)
+    assert store.update("repo", repo) is first
+
+
+def test_path_for_rejects_traversal(tmp_path):
+    with pytest.raises(ValueError):
+        CoChangeStore(tmp_path).path_for("../../x")
+
+
+def test_analyze_diff_rejects_traversal_with_400():
+    from fastapi.testclient import TestClient
+    from impact_analysis.main import app
+
+    resp = TestClient(app).post("/api/analyze_diff", json={"diff_patch": "", "repo_id": "../../x"})
+    assert resp.status_code == 400
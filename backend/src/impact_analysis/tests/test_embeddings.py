@@ -0,0 +1,82 @@
+"""Embedding cache codecs per storage profile, and the Qdrant settings of each profile."""
+import numpy as np
+import pytest
+
+from impact_analysis.config import settings
+from impact_analysis.services import embedding_cache
+from impact_analysis.services.embedding_cache import EmbeddingCache, content_key, get_embedding_cache
+from impact_analysis.services.qdrant_client import _storage_profile
+
+DIM = 8
+
+
+def _vectors(n: int) -> list:
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(n, DIM)).astype(np.float32).tolist()
+
+
+@pytest.mark.parametrize("profile, rescore, codec", [
+    ("float", True, "float32"),
+    ("int8", True, "float32"),  # stored vectors are the originals candidates are rescored against
+    ("binary", True, "float32"),
+    ("int8", False, "int8"),
+])
+def test_codec_follows_the_storage_profile(tmp_path, monkeypatch, profile, rescore, codec):
+    monkeypatch.setattr(settings, "cache_dir", str(tmp_path))
+    monkeypatch.setattr(settings, "vector_storage_profile", profile)
+    monkeypatch.setattr(settings, "vector_rescore", rescore)
+    monkeypatch.setattr(embedding_cache, "_cache", None)
+    cache = get_embedding_cache(DIM)
+    assert cache.codec == codec
+    assert cache.root.name.endswith(f"-{DIM}-{codec}")
+
+
+def test_float32_rows_round_trip_exactly_and_survive_a_reopen(tmp_path):
+    cache = EmbeddingCache(tmp_path, DIM, "float32")
+    vecs = _vectors(3)
+    keys = [content_key(f"chunk {i}") for i in range(3)]
+    cache.put_many(zip(keys, vecs))
+    cache.put_many([(keys[0], [0.0] * DIM)])  # first write wins
+
+    reopened = EmbeddingCache(tmp_path, DIM, "float32")
+    assert len(reopened) == 3
+    got = reopened.get_many(keys + [content_key("missing")])
+    assert [got[k] for k in keys] == vecs
+
+
+def test_int8_rows_are_close_and_a_torn_tail_is_dropped(tmp_path):
+    cache = EmbeddingCache(tmp_path, DIM, "int8")
+    vecs = _vectors(4)
+    keys = [content_key(f"chunk {i}") for i in range(4)]
+    cache.put_many(zip(keys, vecs))
+    assert (tmp_path / "vectors.bin").stat().st_size == 4 * DIM
+
+    # A crash after writing the vectors but before their keys.
+    with open(tmp_path / "vectors.bin", "ab") as fh:
+        fh.write(b"\x01" * DIM)
+    reopened = EmbeddingCache(tmp_path, DIM, "int8")
+    assert len(reopened) == 4
+    got = reopened.get_many(keys)
+    for k, v in zip(keys, vecs):
+        v = np.asarray(v)
+        assert np.abs(np.asarray(got[k]) - v).max() <= np.abs(v).max() / 127.0
+    assert (tmp_path / "vectors.bin").stat().st_size == 4 * DIM
+
+
+def test_storage_profiles_map_to_qdrant_quantization(monkeypatch):
+    from qdrant_client.http.models import BinaryQuantization, ScalarQuantization
+
+    monkeypatch.setattr(settings, "vector_storage_profile", "float")
+    assert _storage_profile()[1:] == (None, None)
+
+    monkeypatch.setattr(settings, "vector_rescore", True)
+    monkeypatch.setattr(settings, "vector_oversampling", 3.0)
+    for profile, kind in (("int8", ScalarQuantization), ("binary", BinaryQuantization)):
+        monkeypatch.setattr(settings, "vector_storage_profile", profile)
+        _vector_kwargs, quantization, search = _storage_profile()
+        assert isinstance(quantization, kind)
+        assert search.quantization.rescore and search.quantization.oversampling == 3.0
+
+    monkeypatch.setattr(settings, "vector_storage_profile", "int4")
+    with pytest.raises(ValueError):
+        _storage_profile()
@@ -0,0 +1,54 @@
+"""Snapshot manifests and per-repo locking of the garbage collector."""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from impact_analysis.main import app
+from impact_analysis.services.garbage_collector import GarbageCollector, SnapshotManifests
+
+
+def test_old_snapshots_are_diffed_once_and_pruned(tmp_path):
+    m = SnapshotManifests(tmp_path, keep=2)
+    m.record("repo", "s1", ["a", "b"])
+    m.record("repo", "s2", ["b", "c"])
+    assert m.current("repo") == "s2"
+    assert m.uncollected("repo") == ["s1"]
+    m.mark_collected("repo", "s2")
+    assert m.uncollected("repo") == []
+    m.record("repo", "s3", ["c"])
+    assert m.uncollected("repo") == ["s2"]
+    m.mark_collected("repo", "s3")
+    assert not (tmp_path / "repo" / "s1.ids").exists()
+    assert m.chunk_ids("repo", "s2") == {"b", "c"}
+    assert m.repos() == ["repo"]
+
+
+@pytest.mark.parametrize("repo_id, snapshot", [("../x", "s1"), ("repo", "../s1")])
+def test_unsafe_path_components_are_rejected(tmp_path, repo_id, snapshot):
+    with pytest.raises(ValueError):
+        SnapshotManifests(tmp_path / "m", keep=2).record(repo_id, snapshot, ["a"])
+    assert not list(tmp_path.rglob("*.ids*"))
+
+
+@pytest.mark.asyncio
+async def test_repo_lock_serialises_and_is_dropped_when_idle(tmp_path):
+    gc = GarbageCollector(SnapshotManifests(tmp_path, keep=2))
+    order = []
+
+    async def hold(name):
+        async with gc.repo_lock("repo"):
+            order.append(f"{name}+")
+            await asyncio.sleep(0.01)
+            order.append(f"{name}-")
+
+    await asyncio.gather(hold("a"), hold("b"), *(hold(f"r{i}") for i in range(3)))
+    assert all(order[i][:-1] == order[i + 1][:-1] for i in range(0, len(order), 2))
+    async with gc.repo_lock("other"):
+        assert set(gc._locks) == {"other"}
+    assert gc._locks == {} and gc._users == {}
+
+
+def test_gc_route_rejects_invalid_repo_id_with_400():
+    resp = TestClient(app).post("/api/repos/bad.id/gc")
+    assert resp.status_code == 400
@@ -0,0 +1,71 @@
+"""Per-commit graph snapshots stored as bases plus deltas."""
+import random
+
+import pytest
+from fastapi.testclient import TestClient
+
+from impact_analysis.main import app
+from impact_analysis.services.graph_builder import CodeUnit, DependencyGraph
+from impact_analysis.services.graph_history import GraphHistoryStore, GraphSnapshot
+
+KINDS = ("module", "function", "class", "method")
+
+
+def _graph(snap):
+    g = DependencyGraph()
+    index = {n: g.add(CodeUnit(n, n.split("::")[0], "", kind, 1, 1)) for n, kind in sorted(snap.nodes.items())}
+    for a, b in snap.edges:
+        g.deps[index[a]].add(index[b])
+    return g
+
+
+def _history(commits, seed=0):
+    """Snapshots that drift a little per commit: units added, removed, retyped, edges rewired."""
+    rng = random.Random(seed)
+    nodes = {f"m{i}.py::f{i}": "function" for i in range(60)}
+    edges = set()
+    out = []
+    for c in range(commits):
+        for _ in range(3):
+            nodes[f"m{rng.randrange(1000)}.py::g{c}"] = rng.choice(KINDS)
+        for n in rng.sample(sorted(nodes), 2):
+            del nodes[n]
+        n = rng.choice(sorted(nodes))
+        nodes[n] = rng.choice(KINDS)
+        ids = sorted(nodes)
+        edges = {(a, b) for a, b in edges if a in nodes and b in nodes}
+        edges -= set(rng.sample(sorted(edges), min(3, len(edges))))
+        edges |= {(rng.choice(ids), rng.choice(ids)) for _ in range(8)}
+        out.append(GraphSnapshot(f"{c:040x}", dict(nodes), set(edges)))
+    return out
+
+
+def test_bases_and_deltas_round_trip(tmp_path):
+    snaps = _history(12)
+    store = GraphHistoryStore(tmp_path, base_interval=4, cache_size=2)
+    for snap in snaps:
+        store.record("repo", snap.commit, _graph(snap))
+    entries = store.snapshots("repo")
+    assert [e["commit"] for e in entries] == [s.commit for s in snaps]
+    assert sum(e["parent"] is None for e in entries) >= 3  # a base at least every 4 snapshots
+    assert any(e["parent"] is not None for e in entries)
+
+    cold = GraphHistoryStore(tmp_path, base_interval=4)  # nothing cached: replays deltas from disk
+    for snap in reversed(snaps):
+        got = cold.get("repo", snap.commit)
+        assert got.nodes == snap.nodes
+        assert got.edges == snap.edges
+
+
+def test_recording_a_stored_commit_is_a_no_op(tmp_path):
+    snap = _history(1)[0]
+    store = GraphHistoryStore(tmp_path)
+    entry = store.record("repo", snap.commit, _graph(snap))
+    assert store.record("repo", snap.commit, DependencyGraph()) == entry
+
+
+@pytest.mark.parametrize("body", [{"repo_id": "../x"}, {"repo_path": "/tmp/some.repo"}])
+def test_graph_routes_reject_invalid_repo_ids_with_400(body):
+    client = TestClient(app)
+    assert client.post("/api/graph/snapshots", json=body).status_code == 400
+    assert client.post("/api/graph/at_ref", json={**body, "ref": "HEAD"}).status_code == 400
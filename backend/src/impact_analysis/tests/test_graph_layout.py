@@ -0,0 +1,74 @@
+"""Graph layouts: per-commit caching and seeding from the repo's previous layout."""
+import numpy as np
+import pytest
+
+from impact_analysis.services import graph_layout
+from impact_analysis.services.graph_history import GraphSnapshot
+from impact_analysis.services.graph_layout import GraphLayoutStore, compute_layout
+
+
+def _chain(commit, n, extra=()):
+    nodes = {f"m{i}.py": "module" for i in range(n)}
+    edges = {(f"m{i}.py", f"m{i + 1}.py") for i in range(n - 1)}
+    for node, dep in extra:
+        nodes[node] = "module"
+        edges.add((node, dep))
+    return GraphSnapshot(commit=commit, nodes=nodes, edges=edges)
+
+
+def test_layout_is_cached_in_memory_and_on_disk(tmp_path, monkeypatch):
+    store = GraphLayoutStore(tmp_path)
+    snap = _chain("c1", 30)
+    first = store.get("repo", snap)
+    assert set(first) == set(snap.nodes)
+    assert store.get("repo", snap) is first
+    assert (tmp_path / "repo" / "c1-force.npz").exists()
+
+    def fail(*_args, **_kwargs):
+        raise AssertionError("layout recomputed")
+
+    monkeypatch.setattr(graph_layout, "compute_layout", fail)
+    reloaded = GraphLayoutStore(tmp_path).get("repo", snap)
+    assert reloaded.keys() == first.keys()
+    assert all(np.allclose(reloaded[u], first[u], atol=1e-4) for u in first)
+
+
+def test_new_commit_is_seeded_from_the_previous_layout(tmp_path):
+    store = GraphLayoutStore(tmp_path)
+    before = store.get("repo", _chain("c1", 100))
+    after = store.get("repo", _chain("c2", 100, extra=[("new.py", "m50.py")]))
+    # Nodes away from the new one keep their relative positions (only the centre shifts).
+    far = [f"m{i}.py" for i in range(10)]
+    shift = np.array(after[far[0]]) - np.array(before[far[0]])
+    assert all(np.allclose(np.array(after[u]) - np.array(before[u]), shift, atol=1e-4) for u in far)
+    new = np.array(after["new.py"]) - shift
+    assert np.linalg.norm(new - np.array(before["m50.py"])) < 5.0
+
+
+def test_large_changes_are_laid_out_from_scratch():
+    previous = compute_layout(_chain("c1", 20))
+    ids = [f"x{i}.py" for i in range(20)]
+    edges = graph_layout._edge_index(ids, {(a, b) for a, b in zip(ids, ids[1:])})
+    assert graph_layout._seeded(ids, edges, previous) is None
+
+
+def test_grid_repulsion_approximates_exact_repulsion():
+    rng = np.random.default_rng(0)
+    pos = rng.normal(0.0, 20.0, (3000, 2))
+    exact = graph_layout._repulsion_exact(pos)
+    grid = graph_layout._repulsion_grid(pos)
+    rows = np.array([5, 500, 2999])
+    assert np.allclose(graph_layout._repulsion_grid(pos, rows), grid[rows])
+    cos = np.einsum("ij,ij->i", exact, grid) / (np.linalg.norm(exact, axis=1) * np.linalg.norm(grid, axis=1))
+    assert np.median(cos) > 0.95
+
+
+def test_layered_puts_dependencies_below_dependents():
+    positions = compute_layout(_chain("c1", 5), "layered")
+    ys = [positions[f"m{i}.py"][1] for i in range(5)]
+    assert ys == sorted(ys)  # m0 depends on m1 ... m4, which sits in the bottom layer
+
+
+def test_unsafe_repo_ids_are_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        GraphLayoutStore(tmp_path).get("../x", _chain("c1", 3))
@@ -0,0 +1,39 @@
+"""Parse stage of the ingest pipeline on trees without a git checkout."""
+import pytest
+
+from impact_analysis.config import settings
+from impact_analysis.services import reachability, test_impact
+from impact_analysis.services.chunk_spool import latest_snapshot
+from impact_analysis.services.file_scanner import tree_fingerprint
+from impact_analysis.services.ingestion_orchestrator import IngestionOrchestrator
+
+
+@pytest.fixture
+def stores(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "cache_dir", str(tmp_path / "cache"))
+    monkeypatch.setattr(settings, "chunks_dir", str(tmp_path / "chunks"))
+    monkeypatch.setattr(reachability, "_store", None)
+    monkeypatch.setattr(test_impact, "_store", None)
+    return reachability.get_reachability_store(), test_impact.get_test_impact_store()
+
+
+@pytest.mark.asyncio
+async def test_non_git_tree_indexes_are_not_rebuilt_by_the_first_query(tmp_path, stores, monkeypatch):
+    repo = tmp_path / "tree"
+    repo.mkdir()
+    (repo / "lib.py").write_text("def add(a, b):\n    return a + b\n")
+    (repo / "test_lib.py").write_text("from lib import add\n\n\ndef test_add():\n    assert add(1, 2) == 3\n")
+
+    parsed = await IngestionOrchestrator().parse("local", repo)
+    assert parsed.commit is None
+    assert parsed.snapshot == tree_fingerprint(repo) == latest_snapshot("tree")
+
+    reach, tests = stores
+
+    def rebuilt(*_args, **_kwargs):
+        raise AssertionError("index rebuilt right after ingest")
+
+    monkeypatch.setattr(reach, "update", rebuilt)
+    monkeypatch.setattr(tests, "build", rebuilt)
+    assert reach.ensure("tree", repo).commit == parsed.snapshot
+    assert tests.ensure("tree", repo).commit == parsed.snapshot
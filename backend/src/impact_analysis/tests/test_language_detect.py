@@ -0,0 +1,21 @@
+"""Binary sniffing must not reject UTF-8 source in non-Latin scripts."""
+from impact_analysis.utils.language_detect import looks_like_text
+
+
+def test_utf8_source_in_non_latin_scripts_is_text():
+    src = "# 日本語のコメント\ndef 挨拶():\n    return 'こんにちは、世界'\n" * 50
+    assert looks_like_text(src.encode("utf-8"))
+    assert looks_like_text("// Привет, мир\nconst x = 'Ελληνικά';\n".encode("utf-8") * 50)
+
+
+def test_sample_cut_inside_a_multibyte_character_is_text():
+    raw = ("値" * 100).encode("utf-8")
+    assert looks_like_text(raw[:-1])
+
+
+def test_nul_bytes_are_binary():
+    assert not looks_like_text(b"\x7fELF\x02\x01\x01\x00\x00\x00" + bytes(range(256)))
+
+
+def test_latin1_text_is_still_text():
+    assert looks_like_text("café, naïve, déjà vu\n".encode("latin-1") * 20)
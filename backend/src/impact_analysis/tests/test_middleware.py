@@ -0,0 +1,95 @@
+"""Deadline, disconnect and body-size handling of RequestDeadlineMiddleware (raw ASGI)."""
+import asyncio
+
+import pytest
+
+from impact_analysis.api.middleware import RequestDeadlineMiddleware
+
+
+class SlowApp:
+    """Answers 200 after `delay` seconds; records whether it was cancelled."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.cancelled = False
+        self.body = b""
+
+    async def __call__(self, scope, receive, send):
+        while True:
+            message = await receive()
+            self.body += message.get("body", b"")
+            if not message.get("more_body", False):
+                break
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+
+async def _call(middleware, path="/api/search", chunks=(b"{}",), headers=(), disconnect_after=None):
+    scope = {"type": "http", "path": path, "headers": list(headers)}
+    pending = [
+        {"type": "http.request", "body": chunk, "more_body": i < len(chunks) - 1} for i, chunk in enumerate(chunks)
+    ]
+
+    async def receive():
+        if pending:
+            return pending.pop(0)
+        if disconnect_after is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(disconnect_after)
+        return {"type": "http.disconnect"}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    await middleware(scope, receive, send)
+    return [m["status"] for m in sent if m["type"] == "http.response.start"]
+
+
+@pytest.mark.asyncio
+async def test_slow_request_gets_504_and_its_handler_is_cancelled():
+    app = SlowApp(delay=5)
+    assert await _call(RequestDeadlineMiddleware(app, timeout_s=0.05)) == [504]
+    assert app.cancelled
+
+
+@pytest.mark.asyncio
+async def test_fast_request_passes_through_with_its_body():
+    app = SlowApp(delay=0)
+    assert await _call(RequestDeadlineMiddleware(app, timeout_s=1), chunks=(b'{"q":', b' 1}')) == [200]
+    assert app.body == b'{"q": 1}'
+
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_the_handler_without_answering():
+    app = SlowApp(delay=5)
+    assert await _call(RequestDeadlineMiddleware(app, timeout_s=5), disconnect_after=0.05) == []
+    assert app.cancelled
+
+
+@pytest.mark.asyncio
+async def test_exempt_paths_run_past_the_deadline_but_not_past_a_disconnect():
+    middleware = RequestDeadlineMiddleware(SlowApp(delay=0.2), timeout_s=0.05, exempt=["/api/repos/*/gc"])
+    assert await _call(middleware, path="/api/repos/demo/gc") == [200]
+
+    app = SlowApp(delay=5)
+    middleware = RequestDeadlineMiddleware(app, timeout_s=0.05, exempt=["/api/ingest_repo"])
+    assert await _call(middleware, path="/api/ingest_repo", disconnect_after=0.1) == []
+    assert app.cancelled
+
+
+@pytest.mark.asyncio
+async def test_oversized_bodies_are_rejected_before_the_handler_runs():
+    app = SlowApp(delay=0)
+    middleware = RequestDeadlineMiddleware(app, timeout_s=1, max_body_bytes=8)
+    assert await _call(middleware, headers=[(b"content-length", b"100")]) == [413]
+    # Streamed without a length: rejected once the running total passes the limit.
+    assert await _call(middleware, chunks=(b"12345", b"67890")) == [413]
+    assert app.body == b""
+    assert await _call(middleware, chunks=(b"1234", b"5678")) == [200]
@@ -0,0 +1,51 @@
+"""Occurrence bookkeeping of the content-addressed (dedup) vector layer."""
+from impact_analysis.models.chunk import Chunk
+from impact_analysis.services.occurrence_store import OccurrenceStore
+
+
+def _rows(path, language, *contents):
+    chunks = [Chunk(path, language, f"f{i}", "function", c, start_line=i + 1, end_line=i + 1) for i, c in enumerate(contents)]
+    return [(c, c.content_hash) for c in chunks]
+
+
+def test_identical_content_is_one_pending_vector(tmp_path):
+    store = OccurrenceStore(tmp_path / "occ.sqlite")
+    rows_a = _rows("a.py", "python", "def f(): pass", "def g(): pass")
+    pending, changed = store.add("repo_a", "c1", rows_a)
+    assert pending == changed == {h for _c, h in rows_a}
+
+    store.mark_stored(pending)
+    rows_b = _rows("lib/a.py", "python", "def f(): pass")
+    pending, changed = store.add("repo_b", "c1", rows_b)
+    shared = rows_b[0][1]
+    assert pending == set()  # already embedded for repo_a
+    assert changed == {shared}  # but its repo labels grew
+    assert store.labels([shared])[shared] == (("repo_a", "repo_b"), ("python",))
+    assert store.missing([h for _c, h in rows_a]) == set()
+
+
+def test_content_is_orphaned_with_its_last_occurrence(tmp_path):
+    store = OccurrenceStore(tmp_path / "occ.sqlite")
+    rows_a = _rows("a.py", "python", "shared()", "only_a()")
+    rows_b = _rows("b.py", "python", "shared()")
+    store.add("repo_a", "c1", rows_a)
+    store.add("repo_b", "c1", rows_b)
+    shared, only_a = rows_a[0][1], rows_a[1][1]
+
+    orphaned, remaining = store.remove("repo_a", [c.hash() for c, _h in rows_a])
+    assert orphaned == {only_a}
+    assert remaining == {shared}
+    assert store.count("repo_a") == 0
+    assert store.labels([shared])[shared][0] == ("repo_b",)
+
+
+def test_remove_keeps_occurrences_of_the_current_commit(tmp_path):
+    store = OccurrenceStore(tmp_path / "occ.sqlite")
+    old = _rows("a.py", "python", "old()")
+    new = _rows("a.py", "python", "new()")
+    store.add("repo", "c1", old)
+    store.add("repo", "c2", new)
+
+    orphaned, _remaining = store.remove("repo", keep_commit="c2")
+    assert orphaned == {old[0][1]}
+    assert store.count("repo") == 1
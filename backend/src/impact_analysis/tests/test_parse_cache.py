@@ -0,0 +1,41 @@
+"""The graph-only parse cache serves unchanged files and re-parses edited ones."""
+import pytest
+
+from impact_analysis.config import settings
+from impact_analysis.services import repo_parser
+from impact_analysis.services.repo_parser import parse_repo
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "parse_cache_files", 100)
+    (tmp_path / "a.py").write_text("def first():\n    return 1\n")
+    (tmp_path / "b.py").write_text("import a\n\n\ndef other():\n    return a.first()\n")
+    return tmp_path
+
+
+def _names(parsed):
+    return {f.path: [s.name for s in f.symbols] for f in parsed}
+
+
+def test_unchanged_files_are_reused(repo):
+    first = parse_repo(repo, with_chunks=False)
+    second = parse_repo(repo, with_chunks=False)
+    assert [f.path for f in second] == ["a.py", "b.py"]
+    assert all(a is b for a, b in zip(first, second))
+
+
+def test_edited_file_is_parsed_again(repo):
+    first = {f.path: f for f in parse_repo(repo, with_chunks=False)}
+    (repo / "a.py").write_text("def first():\n    return 1\n\n\ndef second():\n    return 2\n")
+    second = {f.path: f for f in parse_repo(repo, with_chunks=False)}
+    assert second["b.py"] is first["b.py"]
+    assert second["a.py"] is not first["a.py"]
+    assert _names(second.values())["a.py"] == ["first", "second"]
+
+
+def test_chunked_parses_bypass_the_cache(repo):
+    parse_repo(repo, with_chunks=False)
+    parsed = parse_repo(repo, with_chunks=True)
+    assert all(f.chunks for f in parsed)
+    assert not any(f is cached for f in parsed for cached in repo_parser._parsed.values())
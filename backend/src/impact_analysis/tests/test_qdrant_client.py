@@ -0,0 +1,98 @@
+"""Collection routing, repo filters and settings migration of the Qdrant store (in-memory client)."""
+from types import SimpleNamespace
+
+import pytest
+
+from impact_analysis.config import settings
+from impact_analysis.models.chunk import Chunk
+from impact_analysis.services.embedding_client import _EMBED_DIM
+from impact_analysis.services.qdrant_client import CollectionRouter, QdrantVectorStore
+
+
+def _vector(i: int) -> list:
+    vec = [0.0] * _EMBED_DIM
+    vec[i] = 1.0
+    return vec
+
+
+def _store(monkeypatch, mode: str) -> QdrantVectorStore:
+    import qdrant_client
+    client = qdrant_client.AsyncQdrantClient(location=":memory:")
+    monkeypatch.setattr(qdrant_client, "AsyncQdrantClient", lambda **_kwargs: client)
+    monkeypatch.setattr(settings, "qdrant_collection_mode", mode)
+    monkeypatch.setattr(settings, "vector_storage_profile", "float")
+    return QdrantVectorStore()
+
+
+async def _fill(store: QdrantVectorStore) -> None:
+    for i, repo in enumerate(("alpha", "beta")):
+        chunk = Chunk(f"{repo}.py", "python", "f", "function", f"def f():\n    return {i}\n")
+        await store.upsert_chunks([(chunk, _vector(0))], repo, commit="c1")
+
+
+def test_router_names_one_collection_per_repo():
+    router = CollectionRouter("chunks", "per_repo")
+    assert router.collection_for("alpha") == "chunks__alpha"
+    assert router.collection_for(None) == "chunks"
+    assert router.is_repo_collection("chunks__alpha")
+    assert not router.is_repo_collection("chunks")
+    with pytest.raises(ValueError):
+        router.collection_for("../alpha")
+    assert CollectionRouter("chunks", "shared").collection_for("alpha") == "chunks"
+    with pytest.raises(ValueError):
+        CollectionRouter("chunks", "sharded")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["shared", "per_repo"])
+async def test_search_is_scoped_to_the_repo_and_unscoped_search_sees_all(monkeypatch, mode):
+    store = _store(monkeypatch, mode)
+    await _fill(store)
+
+    scoped = await store.search(_vector(0), repo_id="beta", limit=10)
+    assert [h.payload["repo_id"] for h in scoped] == ["beta"]
+    everything = await store.search(_vector(0), limit=10)
+    assert sorted(h.payload["repo_id"] for h in everything) == ["alpha", "beta"]
+    assert await store.search(_vector(0), repo_id="gamma", limit=10) == []
+    assert await store.count("alpha") == 1
+    if mode == "per_repo":
+        assert sorted(await store.repo_collections()) == [f"{store.collection_name}__alpha", f"{store.collection_name}__beta"]
+
+
+@pytest.mark.asyncio
+async def test_existing_collection_is_updated_to_the_configured_settings(monkeypatch):
+    from qdrant_client.http.models import Distance, VectorParams
+    store = _store(monkeypatch, "shared")
+    await store.client.create_collection(
+        store.collection_name, vectors_config=VectorParams(size=_EMBED_DIM, distance=Distance.COSINE)
+    )
+    # What a collection created with the old shared settings (no global graph) reports.
+    legacy = SimpleNamespace(m=0, payload_m=16)
+    real_get = store.client.get_collection
+
+    async def get_collection(name):
+        info = await real_get(name)
+        info.config.hnsw_config = legacy
+        return info
+
+    updates = []
+
+    async def update_collection(collection_name, **kwargs):
+        updates.append((collection_name, kwargs))
+        return True
+
+    monkeypatch.setattr(store.client, "get_collection", get_collection)
+    monkeypatch.setattr(store.client, "update_collection", update_collection)
+    await store.ensure()
+
+    assert [name for name, _kw in updates] == [store.collection_name]
+    hnsw = updates[0][1]["hnsw_config"]
+    assert hnsw.m > 0 and hnsw.payload_m == 16
+
+    # Already up to date: nothing to rebuild.
+    updates.clear()
+    legacy.m = hnsw.m
+    store._known.clear()
+    store._ready = False
+    await store.ensure()
+    assert updates == []
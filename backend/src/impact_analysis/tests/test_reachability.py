@@ -0,0 +1,31 @@
+"""Reachability requests: repo ids must be safe path components."""
+import pytest
+from fastapi.testclient import TestClient
+
+from impact_analysis.main import app
+from impact_analysis.services.reachability import ReachabilityStore
+from impact_analysis.services.repo_cloner import resolve_repo
+
+
+@pytest.mark.parametrize("repo_id", ["../../x", "a/b", "..", "x" * 200])
+def test_unsafe_repo_ids_are_rejected(tmp_path, repo_id):
+    with pytest.raises(ValueError):
+        resolve_repo(repo_id, None)
+    with pytest.raises(ValueError):
+        resolve_repo(repo_id, str(tmp_path))
+    with pytest.raises(ValueError):
+        ReachabilityStore(tmp_path).path_for(repo_id)
+
+
+def test_folder_name_fallback_must_be_a_valid_id(tmp_path):
+    with pytest.raises(ValueError):
+        resolve_repo(None, str(tmp_path / "my.repo"))
+    assert resolve_repo("my-repo", str(tmp_path / "my.repo"))[0] == "my-repo"
+    assert resolve_repo(None, str(tmp_path / "my_repo"))[0] == "my_repo"
+
+
+def test_blast_radius_rejects_traversal_with_400(tmp_path):
+    client = TestClient(app)
+    resp = client.post("/api/graph/blast_radius", json={"repo_id": "../../x", "repo_path": str(tmp_path)})
+    assert resp.status_code == 400
+    assert not list(tmp_path.parent.parent.glob("x.npz"))
@@ -0,0 +1,43 @@
+"""Ref-range analysis from a local clone, with the per-commit-pair diff cache."""
+import os
+import subprocess
+
+import pytest
+
+from impact_analysis.services.ref_range import RefRangeStore
+
+
+def _git(repo, *args):
+    env = dict(os.environ, GIT_AUTHOR_NAME="t", GIT_AUTHOR_EMAIL="t@t", GIT_COMMITTER_NAME="t", GIT_COMMITTER_EMAIL="t@t")
+    return subprocess.run(["git", "-C", str(repo), *args], check=True, capture_output=True, text=True, env=env).stdout
+
+
+@pytest.fixture
+def repo(tmp_path):
+    path = tmp_path / "repo"
+    path.mkdir()
+    _git(path, "init", "-q")
+    (path / "a.py").write_text("def f():\n    return 1\n\n\ndef g():\n    return 2\n")
+    _git(path, "add", "a.py")
+    _git(path, "commit", "-q", "-m", "one")
+    _git(path, "tag", "v1")
+    (path / "a.py").write_text("def f():\n    return 1\n\n\ndef g():\n    return 3\n")
+    _git(path, "commit", "-q", "-am", "two")
+    return path
+
+
+def test_range_lists_changed_units_and_caches_pairs(repo, tmp_path):
+    store = RefRangeStore(tmp_path / "ref_diffs")
+    rng = store.analyze("repo", repo, "v1", "HEAD", fetch=False)
+    assert [f["path"] for f in rng.files] == ["a.py"]
+    assert rng.units == ["a.py::g"]
+    assert rng.diffed == 1
+    assert len(list((tmp_path / "ref_diffs" / "repo").glob("*.json"))) == 1
+    again = RefRangeStore(tmp_path / "ref_diffs").analyze("repo", repo, "v1", "HEAD", fetch=False)
+    assert again.diffed == 0 and again.units == rng.units
+
+
+def test_unsafe_repo_id_is_rejected_before_touching_git(repo, tmp_path):
+    with pytest.raises(ValueError, match="Invalid repo id"):
+        RefRangeStore(tmp_path / "ref_diffs").analyze("../../x", repo, "v1", "HEAD", fetch=False)
+    assert not (tmp_path / "x").exists()
@@ -0,0 +1,134 @@
+"""Coalescing of concurrent identical calls, on threads and on the event loop."""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from impact_analysis.utils.concurrency import OperationCancelled
+from impact_analysis.utils.singleflight import AsyncSingleFlight, SingleFlight
+
+
+def _wait_in_flight(flight, key):
+    for _ in range(200):
+        if flight.in_flight(key):
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError(f"{key!r} never went in flight")
+
+
+def test_concurrent_callers_share_one_execution_and_its_error():
+    release = threading.Event()
+    calls = []
+
+    def work(fail):
+        calls.append(1)
+        release.wait(5)
+        if fail:
+            raise RuntimeError("boom")
+        return 42
+
+    for fail in (False, True):
+        flight: SingleFlight[str, int] = SingleFlight()
+        calls.clear()
+        release.clear()
+        with ThreadPoolExecutor(4) as pool:
+            leader = pool.submit(flight.do, "k", work, fail)
+            _wait_in_flight(flight, "k")
+            followers = [pool.submit(flight.do, "k", work, fail) for _ in range(3)]
+            while flight.coalesced < 3:
+                threading.Event().wait(0.01)
+            release.set()
+            futures = [leader, *followers]
+            if fail:
+                for f in futures:
+                    with pytest.raises(RuntimeError):
+                        f.result()
+            else:
+                assert [f.result() for f in futures] == [42] * 4
+        assert len(calls) == 1
+        assert not flight.in_flight("k")
+
+
+def test_do_many_only_runs_keys_nobody_else_has_in_flight():
+    flight: SingleFlight[str, str] = SingleFlight()
+    release = threading.Event()
+    batches = []
+
+    def work(keys):
+        batches.append(sorted(keys))
+        if "a" in keys:
+            release.wait(5)
+        return {k: k.upper() for k in keys}
+
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(flight.do_many, ["a", "b"], work)
+        _wait_in_flight(flight, "b")
+        second = pool.submit(flight.do_many, ["b", "c", "c"], work)
+        while flight.coalesced < 1:
+            threading.Event().wait(0.01)
+        release.set()
+        assert first.result() == {"a": "A", "b": "B"}
+        assert second.result() == {"b": "B", "c": "C"}
+    assert batches == [["a", "b"], ["c"]]
+
+
+def test_followers_retry_when_the_leader_was_cancelled():
+    flight: SingleFlight[str, str] = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def work(who):
+        runs.append(who)
+        if who == "leader":
+            release.wait(5)
+            raise OperationCancelled()
+        return who
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(flight.do, "k", work, "leader")
+        _wait_in_flight(flight, "k")
+        follower = pool.submit(flight.do, "k", work, "follower")
+        while flight.coalesced < 1:
+            threading.Event().wait(0.01)
+        release.set()
+        with pytest.raises(OperationCancelled):
+            leader.result()
+        assert follower.result() == "follower"
+    assert runs == ["leader", "follower"]
+
+
+@pytest.mark.asyncio
+async def test_async_calls_share_a_task_cancelled_only_when_every_caller_left():
+    flight: AsyncSingleFlight[str, int] = AsyncSingleFlight()
+    started, release = asyncio.Event(), asyncio.Event()
+    cancelled = []
+
+    async def work():
+        started.set()
+        try:
+            await release.wait()
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+        return 7
+
+    a = asyncio.create_task(flight.do("k", work))
+    b = asyncio.create_task(flight.do("k", work))
+    await started.wait()
+    a.cancel()
+    await asyncio.sleep(0)
+    assert not cancelled  # b still waits for it
+    release.set()
+    assert await b == 7
+    assert flight.coalesced == 1
+
+    started.clear()
+    release.clear()
+    c = asyncio.create_task(flight.do("k", work))
+    await started.wait()
+    c.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await c
+    await asyncio.sleep(0)
+    assert cancelled == [True]
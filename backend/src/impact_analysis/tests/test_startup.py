@@ -0,0 +1,53 @@
+"""Import-time budget for the API module.
+
+Cold-start time of autoscaled API pods is dominated by `import impact_analysis.main`.
+Heavy clients must stay lazy; this test fails CI when one leaks back into the
+import path or the total import time regresses past the budget.
+"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parents[2]
+
+# Generous enough for slow CI runners; FastAPI + pydantic alone take ~0.4s locally.
+IMPORT_BUDGET_S = float(os.getenv("IMPACT_IMPORT_BUDGET_S", "2.0"))
+
+HEAVY_MODULES = ("qdrant_client", "neo4j", "git", "numpy", "tiktoken", "tree_sitter")
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import impact_analysis.main
+elapsed = time.perf_counter() - t0
+print(json.dumps({"elapsed": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def _probe_import(cwd: Path) -> dict:
+    env = dict(os.environ, PYTHONPATH=str(SRC_DIR))
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=cwd, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_main_import_does_not_load_heavy_clients(tmp_path):
+    result = _probe_import(tmp_path)
+    loaded = set(result["modules"])
+    leaked = [m for m in HEAVY_MODULES if m in loaded]
+    assert not leaked, f"heavy modules imported at startup: {leaked}"
+
+
+def test_main_import_within_budget(tmp_path):
+    result = _probe_import(tmp_path)
+    assert result["elapsed"] < IMPORT_BUDGET_S, (
+        f"import impact_analysis.main took {result['elapsed']:.2f}s (budget {IMPORT_BUDGET_S}s)"
+    )
+
+
+def test_main_import_has_no_filesystem_side_effects(tmp_path):
+    _probe_import(tmp_path)
+    assert list(tmp_path.iterdir()) == []
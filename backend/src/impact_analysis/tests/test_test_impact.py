@@ -0,0 +1,77 @@
+"""Test selection: test files across languages, and repo ids that must be safe path components."""
+import pytest
+from fastapi.testclient import TestClient
+
+from impact_analysis.main import app
+from impact_analysis.services.graph_builder import build_code_graph, is_test_path
+from impact_analysis.services.test_impact import TestImpactIndex, TestImpactStore
+
+SOURCES = {
+    "pkg/calc.py": "def add(a, b):\n    return a + b\n",
+    "tests/test_calc.py": "from pkg.calc import add\n\n\ndef test_add():\n    assert add(1, 2) == 3\n",
+    "a/a.go": "package a\n\nfunc Add(a, b int) int { return a + b }\n",
+    "a/a_test.go": (
+        "package a\n\nimport \"testing\"\n\nfunc helper() int { return 1 }\n\n"
+        "func TestAdd(t *testing.T) { if Add(1, 2) != 3 { t.Fatal() } }\n"
+    ),
+    "src/lib.rs": (
+        "pub fn add(a: i32, b: i32) -> i32 { a + b }\n\n#[cfg(test)]\nmod tests {\n    use super::*;\n"
+        "    #[test]\n    fn adds() { assert_eq!(add(1, 2), 3); }\n}\n"
+    ),
+    "web/sum.ts": "export function sum(a: number, b: number): number { return a + b; }\n",
+    "web/sum.test.ts": (
+        "import { sum } from \"./sum\";\n"
+        "describe(\"sum\", () => { it(\"adds\", () => { expect(sum(1, 2)).toBe(3); }); });\n"
+    ),
+}
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("tests/helpers.py", True),
+    ("pkg/test_calc.py", True),
+    ("pkg/calc.py", False),
+    ("a/a_test.go", True),
+    ("test/a.go", False),
+    ("src/test/java/com/x/CalcTest.java", True),
+    ("src/main/java/com/x/CalcIT.java", True),
+    ("src/main/java/com/x/Calc.java", False),
+    ("app/src/main/kotlin/CalcTests.kt", True),
+    ("tests/it.rs", True),
+    ("src/lib.rs", False),
+    ("web/sum.test.ts", True),
+    ("web/sum.spec.jsx", True),
+    ("web/__tests__/sum.js", True),
+    ("web/sum.ts", False),
+    ("tests/fixtures/data.json", False),
+])
+def test_test_files_are_recognised_per_language(path, expected):
+    assert is_test_path(path) is expected
+
+
+def test_changes_select_tests_in_every_language(tmp_path):
+    for rel, text in SOURCES.items():
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_text(text)
+    index = TestImpactIndex.from_graph(build_code_graph(tmp_path), None)
+
+    def select(path):
+        return index.select([(path, None, "modified")])
+
+    assert select("pkg/calc.py").tests == ["tests/test_calc.py::test_add"]
+    assert select("a/a.go").tests == ["a/a_test.go::TestAdd"]
+    assert select("src/lib.rs").tests == ["src/lib.rs::tests::adds"]
+    assert select("web/sum.ts").test_files == ["web/sum.test.ts"]
+    assert index.select([("web/other.test.ts", None, "added")]).test_files == ["web/other.test.ts"]
+
+
+def test_path_for_rejects_traversal(tmp_path):
+    with pytest.raises(ValueError):
+        TestImpactStore(tmp_path).path_for("../../x")
+    assert TestImpactStore(tmp_path).path_for("repo_1") == tmp_path / "repo_1.npz"
+
+
+def test_select_tests_rejects_traversal_with_400(tmp_path):
+    resp = TestClient(app).post(
+        "/api/select_tests", json={"repo_id": "../../x", "repo_path": str(tmp_path), "changed_files": ["a.py"]},
+    )
+    assert resp.status_code == 400
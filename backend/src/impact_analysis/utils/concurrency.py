@@ -0,0 +1,155 @@
+from __future__ import annotations
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from ..config import settings
+
+__all__ = [
+    "CancelToken",
+    "OperationCancelled",
+    "check_cancelled",
+    "map_processes",
+    "run_io",
+    "run_cpu",
+    "shutdown_executors",
+]
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+class OperationCancelled(Exception):
+    """Raised inside offloaded work once the awaiting request has gone away."""
+
+
+class CancelToken:
+    __slots__ = ("_event",)
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise OperationCancelled()
+
+
+# Token of the offloaded call currently running in this thread (if any).
+_current_token: contextvars.ContextVar[CancelToken | None] = contextvars.ContextVar(
+    "impact_cancel_token", default=None
+)
+
+
+def check_cancelled() -> None:
+    """Cooperative cancellation point for long loops running in an executor.
+
+    No-op when called outside of `run_io` / `run_cpu`.
+    """
+    token = _current_token.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+_pools: dict[str, ThreadPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(kind: str) -> ThreadPoolExecutor:
+    pool = _pools.get(kind)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(kind)
+            if pool is None:
+                size = settings.io_workers if kind == "io" else settings.max_workers
+                pool = ThreadPoolExecutor(max_workers=size, thread_name_prefix=f"impact-{kind}")
+                _pools[kind] = pool
+    return pool
+
+
+async def _run(kind: str, fn: Callable[..., T], args: tuple, kwargs: dict, timeout: float | None) -> T:
+    token = CancelToken()
+    ctx = contextvars.copy_context()
+    ctx.run(_current_token.set, token)
+    loop = asyncio.get_running_loop()
+    fut = loop.run_in_executor(_pool(kind), functools.partial(ctx.run, fn, *args, **kwargs))
+    try:
+        return await asyncio.wait_for(fut, timeout)
+    except BaseException:
+        # Timeout, request cancellation or failure: tell the worker to stop at
+        # its next check_cancelled() instead of running to completion unobserved.
+        token.cancel()
+        raise
+
+
+async def run_io(fn: Callable[..., T], *args, timeout: float | None = None, **kwargs) -> T:
+    """Run blocking filesystem / git work on the bounded IO executor."""
+    return await _run("io", fn, args, kwargs, timeout)
+
+
+async def run_cpu(fn: Callable[..., T], *args, timeout: float | None = None, **kwargs) -> T:
+    """Run CPU-bound work (parsing, embedding, graph building) on the CPU executor."""
+    return await _run("cpu", fn, args, kwargs, timeout)
+
+
+_processes: ProcessPoolExecutor | None = None
+
+
+def _process_pool() -> ProcessPoolExecutor | None:
+    global _processes
+    if settings.parse_workers <= 0:
+        return None
+    with _pools_lock:
+        if _processes is None:
+            # spawn: forking a process that runs an event loop and thread pools is unsafe.
+            _processes = ProcessPoolExecutor(
+                max_workers=settings.parse_workers, mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _processes
+
+
+def map_processes(fn: Callable[[T], R], items: Iterable[T]) -> Iterator[R]:
+    """Yield `fn(item)` for every item, computed on the worker process pool.
+
+    For CPU-bound pure-Python work (parsing) that threads cannot parallelise.
+    `fn` must be a picklable module-level function; results come back in
+    completion order. Runs in the calling thread when `parse_workers` is 0.
+    Cancellation is checked while waiting; pending items are then dropped.
+    """
+    pool = _process_pool()
+    if pool is None:
+        for item in items:
+            check_cancelled()
+            yield fn(item)
+        return
+    pending: set[Future] = {pool.submit(fn, item) for item in items}
+    try:
+        while pending:
+            check_cancelled()
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield fut.result()
+    finally:
+        for fut in pending:
+            fut.cancel()
+
+
+def shutdown_executors() -> None:
+    global _processes
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _pools.clear()
+        if _processes is not None:
+            _processes.shutdown(wait=False, cancel_futures=True)
+            _processes = None
@@ -0,0 +1,184 @@
+"""Content fingerprints: change detection and stable ids.
+
+Two kinds of hashes, kept apart on purpose:
+
+* change detection ("did this file change since the last scan?"): BLAKE2b
+  with a 128-bit digest (as embedding_cache uses for its keys), faster than
+  SHA-256 on CPUs without SHA extensions. Files are streamed through `mmap`
+  in blocks, never read whole or decoded, and `hash_files` spreads a batch
+  over threads (hashlib releases the GIL on large updates). Most of the
+  saving is not the algorithm: `FingerprintCache` remembers digests by
+  (inode, size, mtime), so a rescan of an unchanged tree only stats it.
+  These digests are never persisted, so the algorithm can change freely.
+* stable ids: SHA-256, byte for byte the schemes existing clone folders,
+  chunk points/nodes and spools are keyed by. `chunk_id` is the one chunk
+  id (models.chunk and utils.hashing both use it); `short_id` names clone
+  folders; the content dedup key stays `utils.hashing.stable_file_hash`.
+"""
+from __future__ import annotations
+import hashlib
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Tuple, Union
+
+from ..config import settings
+from .concurrency import check_cancelled
+
+__all__ = [
+    "FingerprintCache",
+    "chunk_id",
+    "fast_digest",
+    "get_fingerprint_cache",
+    "hash_file",
+    "hash_files",
+    "short_id",
+]
+
+_DIGEST_BYTES = 16
+_BLOCK_BYTES = 1 << 20
+
+Data = Union[str, bytes, memoryview]
+
+
+def _raw(data: Data) -> Union[bytes, memoryview]:
+    return data.encode("utf-8", errors="replace") if isinstance(data, str) else data
+
+
+def fast_digest(data: Data) -> str:
+    """BLAKE2b-128 hex digest, for change detection."""
+    return hashlib.blake2b(_raw(data), digest_size=_DIGEST_BYTES).hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    """`fast_digest` of a file's bytes, streamed through mmap."""
+    h = hashlib.blake2b(digest_size=_DIGEST_BYTES)
+    with open(path, "rb") as fh:
+        try:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            return h.hexdigest()
+        with mm, memoryview(mm) as view:
+            for pos in range(0, len(view), _BLOCK_BYTES):
+                h.update(view[pos:pos + _BLOCK_BYTES])
+    return h.hexdigest()
+
+
+def hash_files(paths: Iterable[Path], workers: int | None = None) -> Dict[Path, str | None]:
+    """`hash_file` of many files on a thread pool; None for files that cannot be read."""
+    paths = list(paths)
+    if not paths:
+        return {}
+    workers = max(1, min(workers or settings.io_workers, len(paths)))
+
+    def one(path: Path) -> str | None:
+        try:
+            return hash_file(path)
+        except OSError:
+            return None
+
+    if workers == 1:
+        out = {}
+        for p in paths:
+            check_cancelled()
+            out[p] = one(p)
+        return out
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="impact-hash") as pool:
+        out = {}
+        for p, digest in zip(paths, pool.map(one, paths)):
+            check_cancelled()
+            out[p] = digest
+        return out
+
+
+def chunk_id(path: str, symbol: str, content: Data) -> str:
+    """Deterministic chunk id: SHA-256 of path, symbol and content, 16 hex chars."""
+    h = hashlib.sha256()
+    h.update(path.encode())
+    h.update(symbol.encode())
+    h.update(_raw(content))
+    return h.hexdigest()[:16]
+
+
+def short_id(text: str, length: int = 12) -> str:
+    """Leading hex chars of the SHA-256 of `text` (clone folder names / repo ids)."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:length]
+
+
+Stamp = Tuple[int, int, int]  # (inode, size, mtime_ns)
+
+
+class FingerprintCache:
+    """File digests keyed by path and validated by (inode, size, mtime).
+
+    A file rewritten in place within the filesystem's mtime resolution and
+    without a size change goes unnoticed (the same trade-off as git's index).
+    """
+
+    def __init__(self, size: int = 200_000):
+        self.size = size
+        self._entries: "OrderedDict[str, Tuple[Stamp, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def fingerprints(self, paths: Iterable[Path]) -> Dict[Path, str]:
+        """Digest of every readable file; only files whose stamp changed are hashed."""
+        out: Dict[Path, str] = {}
+        stale: Dict[Path, Stamp] = {}
+        with self._lock:
+            for p in paths:
+                try:
+                    st = os.stat(p)
+                except OSError:
+                    continue
+                stamp = (st.st_ino, st.st_size, st.st_mtime_ns)
+                entry = self._entries.get(str(p))
+                if entry is not None and entry[0] == stamp:
+                    self._entries.move_to_end(str(p))
+                    out[p] = entry[1]
+                    self.hits += 1
+                else:
+                    stale[p] = stamp
+                    self.misses += 1
+        if not stale:
+            return out
+        # Threads only pay off for large files; small ones are hashed inline.
+        hashed = hash_files([p for p, stamp in stale.items() if stamp[1] >= _BLOCK_BYTES])
+        for p, stamp in stale.items():
+            if stamp[1] < _BLOCK_BYTES:
+                check_cancelled()
+                try:
+                    hashed[p] = hash_file(p)
+                except OSError:
+                    pass
+        with self._lock:
+            for p, digest in hashed.items():
+                if digest is None:
+                    continue
+                out[p] = digest
+                self._entries[str(p)] = (stale[p], digest)
+                self._entries.move_to_end(str(p))
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return out
+
+    def fingerprint(self, path: Path) -> str | None:
+        return self.fingerprints([path]).get(path)
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+_cache: FingerprintCache | None = None
+
+
+def get_fingerprint_cache() -> FingerprintCache:
+    global _cache
+    if _cache is None:
+        _cache = FingerprintCache(settings.fingerprint_cache_files)
+    return _cache
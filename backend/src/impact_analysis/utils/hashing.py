@@ -1,20 +1,25 @@
 import hashlib
+import uuid
 from typing import Union
 
+from .fingerprint import chunk_id
+
 __all__ = [
     "stable_hash_hex",
     "stable_file_hash",
     "stable_path_symbol_hash",
     "derive_chunk_id",
+    "repo_scoped_uuid",
+    "content_uuid",
 ]
 
-# NOTE: Keep the first 16 hex chars for short IDs (same as existing ChunkIn.hash slice)
+# NOTE: Keep the first 16 hex chars for short IDs (same length as chunk ids)
 _SHORT_LEN = 16
 
-StrOrBytes = Union[str, bytes]
+StrOrBytes = Union[str, bytes, memoryview]
 
-def _to_bytes(data: StrOrBytes) -> bytes:
-    if isinstance(data, bytes):
+def _to_bytes(data: StrOrBytes) -> Union[bytes, memoryview]:
+    if isinstance(data, (bytes, memoryview)):
         return data
     return data.encode("utf-8", errors="replace")
 
@@ -49,5 +54,18 @@ def stable_path_symbol_hash(path: str, symbol: str, content_hash: str | None = N
     return stable_hash_hex(*parts, short=short)
 
 def derive_chunk_id(path: str, symbol: str, content: StrOrBytes) -> str:
-    """Convenience helper mirroring previous inline logic in ChunkIn.hash()."""
-    return stable_path_symbol_hash(path, symbol, stable_file_hash(content), short=True)
+    """The chunk id stores key points and nodes by (same as ChunkIn.hash(), see utils.fingerprint)."""
+    return chunk_id(path, symbol, content)
+
+def repo_scoped_uuid(repo_id: str, chunk_id: str) -> str:
+    """UUID for a chunk occurrence inside one repo.
+
+    Used as Qdrant point id (which only accepts UUIDs / unsigned ints) and as the
+    Neo4j Code node id. Chunk ids alone collide across repos (forks, vendored
+    files), so the repo is part of the key.
+    """
+    return str(uuid.UUID(stable_hash_hex(repo_id, chunk_id)[:32]))
+
+def content_uuid(content_hash: str) -> str:
+    """UUID for a content-addressed (deduplicated) chunk point: shared by every repo."""
+    return str(uuid.UUID(content_hash[:32]))
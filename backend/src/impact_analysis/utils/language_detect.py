@@ -1,8 +1,9 @@
 from __future__ import annotations
+import codecs
 from pathlib import Path
 from typing import Optional
 
-__all__ = ["detect_language", "is_probably_text"]
+__all__ = ["detect_language", "is_probably_text", "looks_like_text", "read_prefix"]
 
 # Mapping of extensions to canonical language identifiers used across the system
 _EXT_MAP = {
@@ -69,17 +70,38 @@ _BINARY_SNIFF_BYTES = 4096
 
 _TEXT_CHAR_RATIO_THRESHOLD = 0.90
 
+# Bytes >= 0x80 count as printable: non-UTF-8 text (latin-1, cp1252) is still text.
+_TEXT_BYTES = bytes([8, 9, 10, 12, 13, 27, *range(32, 127), *range(128, 256)])
+
+def read_prefix(path: Path, size: int = _BINARY_SNIFF_BYTES) -> bytes:
+    """First `size` bytes of a file, without reading the rest."""
+    with path.open("rb") as fh:
+        return fh.read(size)
+
+def looks_like_text(raw: bytes) -> bool:
+    """Heuristic binary detection: no NUL byte and valid UTF-8, else mostly printable bytes."""
+    if not raw:
+        return True
+    raw = raw[:_BINARY_SNIFF_BYTES]
+    if b"\x00" in raw:
+        return False
+    try:
+        # final=False: a multi-byte character cut off by the sample end is fine.
+        codecs.getincrementaldecoder("utf-8")().decode(raw, final=False)
+        return True
+    except UnicodeDecodeError:
+        pass
+    printable = len(raw) - len(raw.translate(None, _TEXT_BYTES))
+    ratio = printable / len(raw)
+    return ratio >= _TEXT_CHAR_RATIO_THRESHOLD
+
 def is_probably_text(path: Path) -> bool:
     """Heuristic binary detection by proportion of printable chars in first chunk."""
     try:
-        raw = path.read_bytes()[:_BINARY_SNIFF_BYTES]
+        raw = read_prefix(path)
     except Exception:
         return False
-    if not raw:
-        return True
-    printable = sum(32 <= b < 127 or b in (9, 10, 13) for b in raw)
-    ratio = printable / len(raw)
-    return ratio >= _TEXT_CHAR_RATIO_THRESHOLD
+    return looks_like_text(raw)
 
 def _shebang_language(first_line: str) -> Optional[str]:
     if not first_line.startswith("#!"):
@@ -98,7 +120,7 @@ def detect_language(path: Path, content_first_1k: Optional[str] = None) -> Optio
     # Shebang fallback (scripts without extension)
     if content_first_1k is None:
         try:
-            content_first_1k = path.read_text(encoding="utf-8", errors="ignore")[:1000]
+            content_first_1k = read_prefix(path, 1000).decode("utf-8", errors="ignore")
         except Exception:
             content_first_1k = ""
     first_line = content_first_1k.splitlines()[0] if content_first_1k else ""
@@ -0,0 +1,189 @@
+"""Coalescing of concurrent identical work ("singleflight").
+
+While an operation for a key is in flight, every other caller asking for the
+same key waits for it and gets the same result (or exception) instead of
+running it again. Nothing is cached: once the call finishes, the next caller
+starts a fresh one.
+
+* `SingleFlight`: for blocking code running on threads (executors);
+  `do_many` coalesces per key across overlapping batches.
+* `AsyncSingleFlight`: for coroutines on the event loop; the shared task is
+  cancelled only when every caller waiting on it has gone away.
+* `file_lock`: advisory cross-process lock (`fcntl.flock`) for work that must
+  not run concurrently in several workers, e.g. two processes cloning into the
+  same folder. A no-op where `fcntl` is unavailable.
+
+A leader that was cancelled (`OperationCancelled` from its request's token)
+does not fail its followers: they retry and one of them leads.
+"""
+from __future__ import annotations
+import asyncio
+import contextlib
+import os
+import threading
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Iterable, Iterator, List, TypeVar
+
+from .concurrency import OperationCancelled, check_cancelled
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not POSIX
+    fcntl = None  # type: ignore[assignment]
+
+__all__ = ["AsyncSingleFlight", "SingleFlight", "file_lock"]
+
+K = TypeVar("K", bound=Hashable)
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: T | None = None
+        self.error: BaseException | None = None
+
+    def outcome(self) -> T:
+        if self.error is not None:
+            raise self.error
+        return self.result  # type: ignore[return-value]
+
+
+class SingleFlight(Generic[K, T]):
+    """Thread-safe keyed registry of in-flight calls."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: Dict[K, _Call[T]] = {}
+        self.coalesced = 0  # calls served by another caller's execution
+
+    def in_flight(self, key: K) -> bool:
+        with self._lock:
+            return key in self._calls
+
+    def _wait(self, call: _Call[T]) -> bool:
+        """Wait for another caller's call; False if it was cancelled and must be retried."""
+        while not call.done.wait(0.5):
+            check_cancelled()
+        return not isinstance(call.error, OperationCancelled)
+
+    def do(self, key: K, fn: Callable[..., T], *args, **kwargs) -> T:
+        while True:
+            with self._lock:
+                call = self._calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self._calls[key] = _Call()
+                else:
+                    self.coalesced += 1
+            if leader:
+                try:
+                    call.result = fn(*args, **kwargs)
+                except BaseException as e:
+                    call.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        del self._calls[key]
+                    call.done.set()
+                return call.result  # type: ignore[return-value]
+            if self._wait(call):
+                return call.outcome()
+
+    def do_many(self, keys: Iterable[K], fn: Callable[[List[K]], Dict[K, T]]) -> Dict[K, T]:
+        """Results for every key; `fn(keys)` runs only for keys nobody else has in flight.
+
+        `fn` must return a result for each key it is given.
+        """
+        pending = list(dict.fromkeys(keys))
+        out: Dict[K, T] = {}
+        while pending:
+            led: Dict[K, _Call[T]] = {}
+            followed: Dict[K, _Call[T]] = {}
+            with self._lock:
+                for key in pending:
+                    call = self._calls.get(key)
+                    if call is None:
+                        led[key] = self._calls[key] = _Call()
+                    else:
+                        followed[key] = call
+                self.coalesced += len(followed)
+            if led:
+                try:
+                    results = fn(list(led))
+                    for key, call in led.items():
+                        call.result = out[key] = results[key]
+                except BaseException as e:
+                    for call in led.values():
+                        call.error = e
+                    raise
+                finally:
+                    with self._lock:
+                        for key in led:
+                            del self._calls[key]
+                    for call in led.values():
+                        call.done.set()
+            pending = []
+            for key, call in followed.items():
+                if self._wait(call):
+                    out[key] = call.outcome()
+                else:
+                    pending.append(key)
+        return out
+
+
+class AsyncSingleFlight(Generic[K, T]):
+    """Keyed in-flight registry for coroutines on one event loop."""
+
+    def __init__(self) -> None:
+        self._tasks: Dict[K, asyncio.Task] = {}
+        self._waiters: Dict[K, int] = {}
+        self.coalesced = 0
+
+    async def do(self, key: K, fn: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn(*args, **kwargs))
+            self._tasks[key] = task
+            self._waiters[key] = 0
+
+            def _done(t: asyncio.Task, key=key) -> None:
+                if self._tasks.get(key) is t:
+                    del self._tasks[key]
+                    del self._waiters[key]
+                if not t.cancelled():
+                    t.exception()  # mark retrieved; callers re-raise it themselves
+
+            task.add_done_callback(_done)
+        else:
+            self.coalesced += 1
+        self._waiters[key] += 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._tasks.get(key) is task:
+                self._waiters[key] -= 1
+                if self._waiters[key] == 0:
+                    # Last interested caller left: stop the shared work too.
+                    task.cancel()
+            raise
+
+
+@contextlib.contextmanager
+def file_lock(path: Path) -> Iterator[None]:
+    """Exclusive advisory lock on `path` (created if missing), held for the block."""
+    if fcntl is None:
+        yield
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
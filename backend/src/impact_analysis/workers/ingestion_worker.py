@@ -0,0 +1,101 @@
+"""Concurrent multi-repository ingestion with global limits and fair scheduling.
+
+Every repo in a batch becomes a Job that walks clone -> parse -> embed/index.
+Each stage is gated by a process-wide FairGate:
+
+* clones:     settings.max_concurrent_clones (network / disk bound)
+* parsing:    settings.max_workers (CPU executor size)
+* embeddings: settings.max_concurrent_embeds, one slot per embedding batch
+
+Gates are weighted by job priority and charge per unit of work, so a monorepo
+with 100k chunks interleaves its embedding batches with those of small repos
+instead of holding the embedder until it is done.
+"""
+from __future__ import annotations
+import asyncio
+import logging
+from typing import Iterable, List
+
+from ..config import settings
+from ..services.ingestion_orchestrator import IngestionOrchestrator
+from .queue import FairGate, Job, JobRegistry, get_job_registry
+
+logger = logging.getLogger(__name__)
+
+__all__ = ["BatchIngestScheduler", "get_batch_scheduler", "shutdown_batch_scheduler"]
+
+
+class BatchIngestScheduler:
+    def __init__(self, registry: JobRegistry):
+        self.registry = registry
+        self.orchestrator = IngestionOrchestrator()
+        self.clone_gate = FairGate(settings.max_concurrent_clones)
+        self.parse_gate = FairGate(settings.max_workers)
+        self.embed_gate = FairGate(settings.max_concurrent_embeds)
+        self._tasks: set[asyncio.Task] = set()
+
+    def submit(self, repos: Iterable[tuple[str, int]], batch_id: str) -> List[Job]:
+        """Register one job per (repo_url, priority) and start them; returns immediately."""
+        jobs = []
+        for repo_url, priority in repos:
+            job = self.registry.add(Job(repo_url=repo_url, batch_id=batch_id, priority=priority))
+            task = asyncio.create_task(self._run(job))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            jobs.append(job)
+        return jobs
+
+    def queue_depths(self) -> dict:
+        return {
+            "clone": self.clone_gate.queue_depth,
+            "parse": self.parse_gate.queue_depth,
+            "embed": self.embed_gate.queue_depth,
+            "active_jobs": len(self._tasks),
+        }
+
+    async def _run(self, job: Job) -> None:
+        flow, weight = job.job_id, float(job.priority)
+        try:
+            async with self.clone_gate.slot(flow, weight):
+                job.update(status="cloning")
+                path = await self.orchestrator.clone(job.repo_url)
+            job.update(status="parsing", repo_id=path.name, repo_path=str(path))
+            async with self.parse_gate.slot(flow, weight):
+                parsed = await self.orchestrator.parse(job.repo_url, path)
+            job.update(status="embedding", commit=parsed.commit, chunks_total=len(parsed.chunks))
+
+            async def fair_embed(texts: List[str]) -> list:
+                async with self.embed_gate.slot(flow, weight, cost=len(texts)):
+                    return await self.orchestrator.embed(texts)
+
+            await self.orchestrator.index(parsed, embed=fair_embed, on_progress=lambda n: job.update(chunks_done=n))
+            job.update(status="done")
+        except asyncio.CancelledError:
+            job.update(status="failed", error="cancelled")
+            raise
+        except Exception as e:
+            logger.exception("ingest job %s (%s) failed", job.job_id, job.repo_url)
+            job.update(status="failed", error=f"{type(e).__name__}: {e}")
+        finally:
+            for gate in (self.clone_gate, self.parse_gate, self.embed_gate):
+                gate.forget(flow)
+
+    async def shutdown(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+_scheduler: BatchIngestScheduler | None = None
+
+
+def get_batch_scheduler() -> BatchIngestScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = BatchIngestScheduler(get_job_registry())
+    return _scheduler
+
+
+async def shutdown_batch_scheduler() -> None:
+    if _scheduler is not None:
+        await _scheduler.shutdown()
@@ -0,0 +1,143 @@
+"""Job registry and fair-share admission gate for background ingestion."""
+from __future__ import annotations
+import asyncio
+import heapq
+import itertools
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, field
+from typing import AsyncIterator
+
+from ..config import settings
+
+__all__ = ["Job", "JobRegistry", "FairGate", "get_job_registry"]
+
+# Job.status values, in pipeline order.
+JOB_STATUSES = ("queued", "cloning", "cloned", "parsing", "embedding", "done", "failed")
+
+
+@dataclass
+class Job:
+    repo_url: str
+    job_id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    batch_id: str | None = None
+    priority: int = 5
+    status: str = "queued"
+    repo_id: str | None = None
+    repo_path: str | None = None
+    commit: str | None = None
+    chunks_total: int = 0
+    chunks_done: int = 0
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    def update(self, **changes) -> None:
+        for key, value in changes.items():
+            setattr(self, key, value)
+        self.updated_at = time.time()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed")
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d["progress"] = round(self.chunks_done / self.chunks_total, 4) if self.chunks_total else (
+            1.0 if self.status == "done" else 0.0
+        )
+        return d
+
+
+class JobRegistry:
+    """In-process job table; finished jobs beyond `history` are evicted oldest first."""
+
+    def __init__(self, history: int):
+        self.history = history
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    def add(self, job: Job) -> Job:
+        self._jobs[job.job_id] = job
+        self._evict()
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        return self._jobs.get(job_id)
+
+    def list(self, batch_id: str | None = None) -> list[Job]:
+        return [j for j in self._jobs.values() if batch_id is None or j.batch_id == batch_id]
+
+    def _evict(self) -> None:
+        finished = [jid for jid, j in self._jobs.items() if j.finished]
+        for jid in finished[: max(0, len(finished) - self.history)]:
+            del self._jobs[jid]
+
+
+class FairGate:
+    """Concurrency limiter that hands free slots out by weighted fair queuing.
+
+    Each flow (a repo job) gets a virtual clock advanced by cost / weight for
+    every slot it takes; a freed slot goes to the waiter with the smallest
+    virtual finish time. A giant repo submitting thousands of batches therefore
+    alternates with small repos instead of queueing ahead of them, and a higher
+    weight (priority) buys a proportionally larger share, not exclusivity.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = max(1, capacity)
+        self.in_use = 0
+        self._vclock = 0.0
+        self._flow_finish: dict[str, float] = {}
+        self._waiting: list[tuple[float, int, float, asyncio.Future]] = []
+        self._seq = itertools.count()
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for *_rest, fut in self._waiting if not fut.done())
+
+    @asynccontextmanager
+    async def slot(self, flow: str, weight: float = 1.0, cost: float = 1.0) -> AsyncIterator[None]:
+        start = max(self._flow_finish.get(flow, 0.0), self._vclock)
+        finish = start + cost / max(weight, 1e-6)
+        self._flow_finish[flow] = finish
+        if self.in_use < self.capacity and not self.queue_depth:
+            self.in_use += 1
+            self._vclock = start
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._waiting, (finish, next(self._seq), start, fut))
+            try:
+                await fut
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self._release()  # slot was handed to us just as we got cancelled
+                raise
+        try:
+            yield
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        while self._waiting:
+            _finish, _seq, start, fut = heapq.heappop(self._waiting)
+            if fut.done():
+                continue
+            self._vclock = max(self._vclock, start)
+            fut.set_result(None)  # slot passes straight to the waiter
+            return
+        self.in_use -= 1
+
+    def forget(self, flow: str) -> None:
+        self._flow_finish.pop(flow, None)
+
+
+_registry: JobRegistry | None = None
+
+
+def get_job_registry() -> JobRegistry:
+    global _registry
+    if _registry is None:
+        _registry = JobRegistry(settings.job_history)
+    return _registry